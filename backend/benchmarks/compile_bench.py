@@ -0,0 +1,298 @@
+"""
+LaTeX Compile Benchmark
+Compiles the sample decks, resumes and synthetic e-books through PDFService.generate_pdf
+
+Corpus:
+- backend/PPT_samples/*.md     Beamer decks (one per theme)
+- backend/resume_samples/*.md  resumes
+- synthetic e-books            generated chapters with a table of contents
+                               (--ebook-sizes sets the chapter counts)
+
+The corpus is compiled once per --engines entry: "auto" uses the engine
+PDFService selects for each document (services/tex_engine_service.py), any
+other name forces that engine; engines that are not installed are skipped.
+Per engine and document it reports cold latency (first compile in this
+process), warm latency (median of the repeats), engine passes, output size
+and the peak RSS of any TeX child so far. Then it compiles the whole corpus
+at each --concurrency level and reports throughput and p50/p95 latency.
+Documents that fail to compile (the samples reference files that are not in
+the repository, e.g. resume.cls) are reported with their error, not skipped.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.compile_bench [--repeats 3] [--concurrency 1,2,4]
+        [--ebook-sizes 5,20,80] [--engines auto,pdflatex,xelatex,lualatex,tectonic]
+        [--preview] [--json results.json]
+
+--json writes the full results with the git commit, engine versions and
+machine details, so runs can be compared across commits.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+ENGINE_CHOICES = ('auto', 'pdflatex', 'xelatex', 'lualatex', 'tectonic')
+
+LOREM = (
+    "Compilation time grows with the number of pages, fonts and cross references in a document. "
+    "This paragraph is repeated to give every section a realistic amount of running text, with "
+    "enough words per line for the paragraph builder to break lines and pages as it would in a book. "
+)
+
+
+def synthetic_ebook(chapters: int) -> str:
+    """A deterministic book with a table of contents (forces a second pass), lists, tables and math"""
+    parts = [
+        "\\documentclass[11pt]{book}",
+        "\\usepackage[utf8]{inputenc}",
+        "\\usepackage{amsmath}",
+        "\\usepackage{hyperref}",
+        "\\title{Synthetic E-book (%d chapters)}" % chapters,
+        "\\author{Compile Benchmark}",
+        "\\begin{document}",
+        "\\maketitle",
+        "\\tableofcontents",
+    ]
+    for c in range(1, chapters + 1):
+        parts.append(f"\\chapter{{Chapter {c}}}\\label{{ch:{c}}}")
+        for s in range(1, 4):
+            parts.append(f"\\section{{Section {c}.{s}}}")
+            parts.append(LOREM * 4)
+            parts.append("\\begin{itemize}\n\\item First point\n\\item Second point\n\\item Third point\n\\end{itemize}")
+            parts.append(
+                "\\begin{equation}\nE_{%d} = \\sum_{k=1}^{n} \\frac{k^2}{%d + k}\n\\end{equation}" % (c * 10 + s, s)
+            )
+        parts.append(
+            "\\begin{tabular}{|l|r|r|}\n\\hline\nItem & Count & Share \\\\\n\\hline\n"
+            "Alpha & 10 & 50\\%% \\\\\nBeta & 6 & 30\\%% \\\\\nGamma & 4 & 20\\%% \\\\\n\\hline\n\\end{tabular}"
+        )
+        if c > 1:
+            parts.append(f"See Chapter~\\ref{{ch:{c - 1}}} on page~\\pageref{{ch:{c - 1}}}.")
+    parts.append("\\end{document}")
+    return "\n\n".join(parts)
+
+
+def load_corpus(ebook_sizes: List[int]) -> List[Tuple[str, str, str]]:
+    """(name, kind, latex) for every benchmark document"""
+    corpus = []
+    for kind, directory in (('beamer', 'PPT_samples'), ('resume', 'resume_samples')):
+        for path in sorted((BACKEND_DIR / directory).glob('*.md')):
+            corpus.append((f"{directory}/{path.stem}", kind, path.read_text(encoding='utf-8')))
+    for chapters in ebook_sizes:
+        corpus.append((f"ebook-{chapters}ch", 'ebook', synthetic_ebook(chapters)))
+    return corpus
+
+
+def child_peak_rss_kb() -> Optional[int]:
+    """Largest resident set of any finished child process (TeX engine), in KiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS reports bytes
+
+
+def self_peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def compile_once(pdf_service, latex: str, preview: bool, engine: Optional[str] = None) -> Dict:
+    started = time.perf_counter()
+    try:
+        pdf_bytes = await pdf_service.generate_pdf(latex, preview_mode=preview, engine=engine)
+        return {'seconds': time.perf_counter() - started, 'bytes': len(pdf_bytes), 'error': None}
+    except Exception as e:
+        message = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+        return {'seconds': time.perf_counter() - started, 'bytes': None, 'error': message[:200]}
+
+
+def total_passes(passes_counter, engines, preview: bool) -> float:
+    return sum(passes_counter.value(engine=engine, preview=str(preview).lower()) for engine in engines)
+
+
+async def bench_document(pdf_service, passes_counter, engines, name: str, kind: str, latex: str,
+                         engine: Optional[str], repeats: int, preview: bool) -> Dict:
+    before = total_passes(passes_counter, engines, preview)
+    cold = await compile_once(pdf_service, latex, preview, engine)
+    passes = total_passes(passes_counter, engines, preview) - before
+
+    warm = [await compile_once(pdf_service, latex, preview, engine) for _ in range(repeats)] if not cold['error'] else []
+    warm_seconds = [w['seconds'] for w in warm if not w['error']]
+    return {
+        'name': name,
+        'kind': kind,
+        'engine': engine or 'auto',
+        'source_bytes': len(latex.encode('utf-8')),
+        'ok': cold['error'] is None,
+        'error': cold['error'],
+        'cold_ms': round(cold['seconds'] * 1000, 1),
+        'warm_median_ms': round(statistics.median(warm_seconds) * 1000, 1) if warm_seconds else None,
+        'warm_min_ms': round(min(warm_seconds) * 1000, 1) if warm_seconds else None,
+        'engine_passes': int(passes),
+        'output_bytes': cold['bytes'],
+        'child_peak_rss_kb': child_peak_rss_kb(),
+    }
+
+
+async def bench_concurrency(pdf_service, corpus: List[Tuple[str, str, str]], engine: Optional[str], level: int,
+                            rounds: int, preview: bool) -> Dict:
+    semaphore = asyncio.Semaphore(level)
+    jobs = [latex for _ in range(rounds) for _, _, latex in corpus]
+
+    async def run(latex: str) -> Dict:
+        async with semaphore:
+            return await compile_once(pdf_service, latex, preview, engine)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run(latex) for latex in jobs))
+    wall = time.perf_counter() - started
+    latencies = [r['seconds'] for r in results if not r['error']]
+    return {
+        'engine': engine or 'auto',
+        'concurrency': level,
+        'compiles': len(results),
+        'failed': sum(1 for r in results if r['error']),
+        'wall_seconds': round(wall, 3),
+        'compiles_per_second': round(len(latencies) / wall, 3) if wall else None,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'child_peak_rss_kb': child_peak_rss_kb(),
+    }
+
+
+def environment() -> Dict:
+    def command(args: List[str]) -> Optional[str]:
+        try:
+            out = subprocess.run(args, capture_output=True, text=True, timeout=10, cwd=BACKEND_DIR)
+            return out.stdout.strip().splitlines()[0] if out.returncode == 0 and out.stdout.strip() else None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': command(['git', 'rev-parse', 'HEAD']),
+        'engines': {name: command([name, '--version']) for name in ('pdflatex', 'xelatex', 'lualatex', 'tectonic')},
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+async def run_benchmark(args) -> Dict:
+    # Imported here so the compile pools are sized from the environment set in main()
+    from backend.services.pdf_service import PDFLATEX_PASSES, PDFService
+    from backend.services.tex_engine_service import ENGINES, get_tex_engine_service
+
+    pdf_service = PDFService()
+    selector = get_tex_engine_service()
+    corpus = load_corpus(args.ebook_sizes)
+    documents = []
+    throughput = []
+    skipped = []
+    for engine in args.engines:
+        if engine != 'auto' and not selector.installed(ENGINES[engine]):
+            print(f"{engine}: not installed, skipped")
+            skipped.append(engine)
+            continue
+        forced = None if engine == 'auto' else engine
+        results = []
+        for name, kind, latex in corpus:
+            result = await bench_document(
+                pdf_service, PDFLATEX_PASSES, ENGINES, name, kind, latex, forced, args.repeats, args.preview
+            )
+            if forced is None:
+                result['selected_engine'] = selector.candidates(latex)[0][0].name
+            results.append(result)
+            status = f"{result['warm_median_ms'] or '-':>9} ms warm" if result['ok'] else f"FAILED: {result['error']}"
+            print(f"{engine:9s} {name:32s} {result['cold_ms']:9.1f} ms cold  {status}")
+        documents.extend(results)
+
+        compilable = [doc for doc, result in zip(corpus, results) if result['ok']]
+        if compilable:
+            for level in args.concurrency:
+                row = await bench_concurrency(pdf_service, compilable, forced, level, args.rounds, args.preview)
+                throughput.append(row)
+                print(f"{engine:9s} concurrency {level:3d}: {row['compiles_per_second']} compiles/s, "
+                      f"p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms")
+
+    return {
+        'environment': environment(),
+        'settings': {
+            'preview': args.preview,
+            'repeats': args.repeats,
+            'rounds': args.rounds,
+            'engines': args.engines,
+            'skipped_engines': skipped,
+            'compile_workers': int(os.environ['EXECUTOR_COMPILE_WORKERS']),
+        },
+        'documents': documents,
+        'throughput': throughput,
+        'self_peak_rss_kb': self_peak_rss_kb(),
+    }
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def engine_list(value: str) -> List[str]:
+    engines = [v.strip() for v in value.split(',') if v.strip()]
+    unknown = set(engines) - set(ENGINE_CHOICES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown engines: {', '.join(sorted(unknown))}")
+    return engines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=3, help="Warm compiles per document")
+    parser.add_argument('--concurrency', type=int_list, default=[1, 2, 4], help="Comma-separated levels")
+    parser.add_argument('--rounds', type=int, default=2, help="Passes over the corpus per concurrency level")
+    parser.add_argument('--ebook-sizes', type=int_list, default=[5, 20, 80], help="Synthetic e-book chapter counts")
+    parser.add_argument('--engines', type=engine_list, default=['auto'],
+                        help=f"Comma-separated, from {', '.join(ENGINE_CHOICES)}")
+    parser.add_argument('--preview', action='store_true', help="Use preview mode (single pass unless a TOC is present)")
+    parser.add_argument('--json', type=Path, default=None, help="Write results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show PDFService logs")
+    args = parser.parse_args()
+
+    # The compile pools must not be the bottleneck at the highest concurrency level
+    for variable in ('EXECUTOR_COMPILE_WORKERS', 'EXECUTOR_XELATEX_WORKERS', 'EXECUTOR_LUALATEX_WORKERS',
+                     'EXECUTOR_TECTONIC_WORKERS'):
+        os.environ.setdefault(variable, str(max(args.concurrency or [1])))
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    results = asyncio.run(run_benchmark(args))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding='utf-8')
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Import-Time Benchmark
+Measures how long a fresh interpreter takes to import backend/server.py
+
+Each run starts a new Python process with `-X importtime`, so module caches
+never carry over between runs. Reports the wall time per run, the median, and
+the modules with the largest cumulative import time from the last run.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.import_time_bench [--runs 5] [--top 15] [--budget 1.5]
+
+With --budget the exit status is 1 when the median exceeds it (seconds), so
+the benchmark can guard cold start in CI.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def import_once(module: str) -> Tuple[float, str]:
+    """(wall seconds, -X importtime report) for importing `module` in a new interpreter"""
+    env = dict(os.environ)
+    # Services refuse to build without these; no network calls are made at import
+    env.setdefault('GEMINI_API_KEY', 'benchmark')
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def slowest_modules(report: str, top: int) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, module) pairs, largest first"""
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        try:
+            rows.append((int(cumulative), name.rstrip()))
+        except ValueError:
+            continue  # header line
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='server', help="Module to import from backend/")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument('--top', type=int, default=15, help="Slowest modules to list")
+    parser.add_argument('--budget', type=float, default=None, help="Fail when the median exceeds this (seconds)")
+    args = parser.parse_args()
+
+    times = []
+    report = ''
+    for i in range(args.runs):
+        elapsed, report = import_once(args.module)
+        times.append(elapsed)
+        print(f"run {i + 1}: {elapsed * 1000:8.0f} ms")
+
+    median = statistics.median(times)
+    print(f"\nimport {args.module}: median {median * 1000:.0f} ms, min {min(times) * 1000:.0f} ms")
+    print("\nslowest modules (cumulative, last run):")
+    for micros, name in slowest_modules(report, args.top):
+        print(f"{micros / 1000:10.1f} ms  {name}")
+
+    if args.budget is not None and median > args.budget:
+        print(f"\nFAIL: median {median:.2f}s exceeds budget {args.budget:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
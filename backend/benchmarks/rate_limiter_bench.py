@@ -0,0 +1,57 @@
+"""
+Rate Limiter Benchmark
+Measures check throughput and in-memory bucket footprint
+
+Usage (from the repository root):
+    python -m backend.benchmarks.rate_limiter_bench [--keys 1000000] [--checks 200000]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from backend.services.rate_limiter_service import MemoryBucketStore, RateLimiter
+
+
+def bench_checks(algorithm: str, checks: int, distinct_keys: int) -> float:
+    """Checks per second through RateLimiter.check_limit (includes result construction)"""
+    limiter = RateLimiter(MemoryBucketStore(algorithm=algorithm, max_buckets=distinct_keys))
+    keys = [f"key-{i}" for i in range(distinct_keys)]
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.check_limit(keys[i % distinct_keys], 'pro')
+    return checks / (time.perf_counter() - start)
+
+
+def bench_memory(algorithm: str, keys: int) -> float:
+    """Bytes of bucket state per million keys (key strings excluded)"""
+    names = [f"key-{i}" for i in range(keys)]
+    store = MemoryBucketStore(algorithm=algorithm, max_buckets=keys, evict_per_take=0)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for name in names:
+        store.take(name, 100, 100 / 60)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / keys * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=1_000_000, help="Distinct keys for the memory test")
+    parser.add_argument('--checks', type=int, default=200_000, help="Checks for the throughput test")
+    args = parser.parse_args()
+
+    for algorithm in MemoryBucketStore.ALGORITHMS:
+        hot = bench_checks(algorithm, args.checks, 100)
+        cold = bench_checks(algorithm, args.checks, args.checks)
+        per_million = bench_memory(algorithm, args.keys)
+        print(f"{algorithm:13s} {hot:>12,.0f} checks/s (100 keys)  "
+              f"{cold:>12,.0f} checks/s (all new keys)  "
+              f"{per_million / 1024 / 1024:8.1f} MiB per 1M keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -44,8 +45,155 @@ class Settings:
     # Updated based on user request and available models
     GEMINI_MODEL_STARTER: str = "gemini-2.5-flash" 
     GEMINI_MODEL_PRO: str = "gemini-2.5-pro"
+
+    # Upstream API endpoints; overridden to point at local stand-ins by the load-test harness (backend/loadtest)
+    GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "")  # empty = google-genai default
+    PEXELS_BASE_URL: str = os.getenv("PEXELS_BASE_URL", "https://api.pexels.com/v1")
+    PERPLEXITY_BASE_URL: str = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+
+    # Caching
+    # Users rows are cached briefly across requests; CreditService writes invalidate them
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "5"))
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+    # Validated API keys; revocation in this process evicts immediately, other workers within the TTL
+    API_KEY_CACHE_TTL_SECONDS: float = float(os.getenv("API_KEY_CACHE_TTL_SECONDS", "60"))
+    API_KEY_NEGATIVE_CACHE_TTL_SECONDS: float = float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL_SECONDS", "10"))
+    API_KEY_CACHE_MAX_ENTRIES: int = int(os.getenv("API_KEY_CACHE_MAX_ENTRIES", "10000"))
+    API_KEY_LAST_USED_FLUSH_SECONDS: float = float(os.getenv("API_KEY_LAST_USED_FLUSH_SECONDS", "60"))
+
+    # Dashboard session listing pages, per user; create/delete in this worker invalidates
+    SESSION_LIST_CACHE_TTL_SECONDS: float = float(os.getenv("SESSION_LIST_CACHE_TTL_SECONDS", "15"))
+
+    # Session LaTeX history: a full snapshot every N versions, compressed deltas in between
+    DOCUMENT_SNAPSHOT_INTERVAL: int = int(os.getenv("DOCUMENT_SNAPSHOT_INTERVAL", "10"))
+    DOCUMENT_CACHE_MAX_ENTRIES: int = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "256"))
+
+    # API usage tracking (buffered, written in batches)
+    USAGE_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5"))
+    USAGE_QUEUE_MAX_SIZE: int = int(os.getenv("USAGE_QUEUE_MAX_SIZE", "10000"))
+
+    # API rate limiting: 'memory' (per worker), 'sqlite' (shared by workers on one host) or 'redis'
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv(
+        "RATE_LIMIT_SQLITE_PATH",
+        str(Path(tempfile.gettempdir()) / "hugpdf_rate_limits.sqlite3")
+    )
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    # In-memory store only: 'token_bucket' or 'gcra', and a cap on buckets held per worker
+    RATE_LIMIT_ALGORITHM: str = os.getenv("RATE_LIMIT_ALGORITHM", "token_bucket")
+    RATE_LIMIT_MAX_BUCKETS: int = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+    # Executor pools for blocking work dispatched from async routes (see core/executors.py)
+    EXECUTOR_LLM_WORKERS: int = int(os.getenv("EXECUTOR_LLM_WORKERS", "64"))
+    EXECUTOR_HEDGE_WORKERS: int = int(os.getenv("EXECUTOR_HEDGE_WORKERS", "64"))
+    EXECUTOR_DB_WORKERS: int = int(os.getenv("EXECUTOR_DB_WORKERS", "32"))
+    EXECUTOR_SCRAPE_WORKERS: int = int(os.getenv("EXECUTOR_SCRAPE_WORKERS", "16"))
+    EXECUTOR_COMPILE_WORKERS: int = int(os.getenv("EXECUTOR_COMPILE_WORKERS", "4"))
+    # Unicode engines compile on their own pools (see services/tex_engine_service.py)
+    EXECUTOR_XELATEX_WORKERS: int = int(os.getenv("EXECUTOR_XELATEX_WORKERS", "2"))
+    EXECUTOR_LUALATEX_WORKERS: int = int(os.getenv("EXECUTOR_LUALATEX_WORKERS", "2"))
+    EXECUTOR_TECTONIC_WORKERS: int = int(os.getenv("EXECUTOR_TECTONIC_WORKERS", "2"))
+    # 0 = one process per CPU
+    EXECUTOR_CPU_WORKERS: int = int(os.getenv("EXECUTOR_CPU_WORKERS", "0"))
+
+    # Outbound HTTP (core/http_client.py): pooled keep-alive clients, one per host
+    HTTP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+    # Hosts with an open client (per event loop); the least recently used one is closed beyond this
+    HTTP_MAX_HOSTS: int = int(os.getenv("HTTP_MAX_HOSTS", "64"))
+
+    # LLM scheduler: per-model concurrency (adaptive below this cap) and tokens-per-minute budget (0 = unlimited)
+    LLM_STARTER_MAX_CONCURRENCY: int = int(os.getenv("LLM_STARTER_MAX_CONCURRENCY", "32"))
+    LLM_STARTER_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_STARTER_TOKENS_PER_MINUTE", "1000000"))
+    LLM_PRO_MAX_CONCURRENCY: int = int(os.getenv("LLM_PRO_MAX_CONCURRENCY", "16"))
+    LLM_PRO_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_PRO_TOKENS_PER_MINUTE", "1000000"))
+    LLM_DEFAULT_MAX_CONCURRENCY: int = int(os.getenv("LLM_DEFAULT_MAX_CONCURRENCY", "8"))
+    LLM_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+    LLM_MAX_THROTTLE_RETRIES: int = int(os.getenv("LLM_MAX_THROTTLE_RETRIES", "2"))
+
+    # LLM resilience: request deadline, hedging to the starter model, per-model circuit breaker
+    LLM_REQUEST_DEADLINE_SECONDS: float = float(os.getenv("LLM_REQUEST_DEADLINE_SECONDS", "240"))
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+    # LLM response cache for idempotent call sites (memory LRU + files under LLM_CACHE_DIR)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+    LLM_CACHE_MAX_DISK_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "5000"))
+
+    # LLM token/latency accounting: users kept for GET /api/usage/llm
+    LLM_USAGE_MAX_USERS: int = int(os.getenv("LLM_USAGE_MAX_USERS", "10000"))
+
+    # GET /metrics: label combinations kept per metric before folding into __overflow__
+    METRICS_MAX_SERIES: int = int(os.getenv("METRICS_MAX_SERIES", "500"))
+    # Bearer token required by the operational endpoints (/metrics, /api/system/*, /api/metrics/*);
+    # they answer 403 to everyone while it is unset
+    OPS_TOKEN: str = os.getenv("OPS_TOKEN", "")
+
+    # Logging pipeline (core/logging_setup.py): 'json' or 'text' records written from a background
+    # queue; LOG_SAMPLING keeps a fraction of INFO/DEBUG records per logger ("httpx=0.1,services.x=0.5")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "httpx=0.1")
+    LOG_QUEUE_MAX_SIZE: int = int(os.getenv("LOG_QUEUE_MAX_SIZE", "10000"))
+    # Large blobs (LaTeX source, TeX logs) spilled to files under LOG_ARTIFACT_DIR, newest kept
+    LOG_ARTIFACT_MAX_FILES: int = int(os.getenv("LOG_ARTIFACT_MAX_FILES", "500"))
+    LOG_ARTIFACT_MAX_BYTES: int = int(os.getenv("LOG_ARTIFACT_MAX_BYTES", "5242880"))
+
+    # Static checks before pdflatex (services/latex_preflight_service.py): doomed documents are
+    # rejected with line-numbered diagnostics, trivially repairable ones are fixed
+    LATEX_PREFLIGHT_ENABLED: bool = os.getenv("LATEX_PREFLIGHT_ENABLED", "true").lower() == "true"
+    # Package/font rewrites applied before compiling (services/latex_sanitizer_service.py): extra rules as
+    # a JSON list of {"name", "pattern", "replacement"}; built-in rules disabled by comma-separated name
+    LATEX_SANITIZE_RULES: str = os.getenv("LATEX_SANITIZE_RULES", "")
+    LATEX_SANITIZE_DISABLED: str = os.getenv("LATEX_SANITIZE_DISABLED", "")
+    # Opt-in repair of failed compiles (services/latex_repair_service.py): the lines around the first
+    # error in the TeX log are patched by the starter model and the document is recompiled
+    LATEX_REPAIR_ENABLED: bool = os.getenv("LATEX_REPAIR_ENABLED", "false").lower() == "true"
+    LATEX_REPAIR_MAX_ATTEMPTS: int = int(os.getenv("LATEX_REPAIR_MAX_ATTEMPTS", "2"))
+    LATEX_REPAIR_CONTEXT_LINES: int = int(os.getenv("LATEX_REPAIR_CONTEXT_LINES", "4"))
+    # TeX engine per document (services/tex_engine_service.py): "auto" picks the first engine in
+    # TEX_ENGINE_PREFERENCE that is installed and can compile the document; a name pins that engine
+    TEX_ENGINE: str = os.getenv("TEX_ENGINE", "auto")
+    TEX_ENGINE_PREFERENCE: str = os.getenv("TEX_ENGINE_PREFERENCE", "pdflatex,xelatex,lualatex")
+    # tectonic: bundle URL or local file, package cache directory, and no network once cached
+    TECTONIC_BUNDLE: str = os.getenv("TECTONIC_BUNDLE", "")
+    TECTONIC_CACHE_DIR: str = os.getenv("TECTONIC_CACHE_DIR", "")
+    TECTONIC_ONLY_CACHED: bool = os.getenv("TECTONIC_ONLY_CACHED", "false").lower() == "true"
+
+    # Optional background warmup after start-up (core/providers.py): builds these lazy
+    # providers, spawns the compile workers and opens Supabase/Pexels connections
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+    WARMUP_DELAY_SECONDS: float = float(os.getenv("WARMUP_DELAY_SECONDS", "1"))
+    WARMUP_PROVIDERS: str = os.getenv("WARMUP_PROVIDERS", "gemini,pexels,ppt_generator")
+
+    # Request tracing (core/tracing.py): Server-Timing is always sent; spans are exported by
+    # the comma-separated TRACE_EXPORTERS ('jsonl', 'otlp'), for TRACE_SAMPLE_RATE of requests
+    TRACE_EXPORTERS: str = os.getenv("TRACE_EXPORTERS", "")
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    TRACE_JSONL_MAX_BYTES: int = int(os.getenv("TRACE_JSONL_MAX_BYTES", "52428800"))
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+    OTEL_SERVICE_NAME: str = os.getenv("OTEL_SERVICE_NAME", "hugpdf-backend")
+
     # Paths
     BACKEND_DIR = ROOT_DIR / "backend"
     TEMP_UPLOADS_DIR = BACKEND_DIR / "temp_uploads"
+    # Each worker process spills to <stem>.<pid>.jsonl beside this path (services/usage_tracker_service.py)
+    USAGE_SPILL_PATH = Path(os.getenv("USAGE_SPILL_PATH", str(BACKEND_DIR / "temp_usage" / "usage_spill.jsonl")))
+    # Empty (default) = memory-only LLM cache. Cached responses include resume and
+    # LinkedIn content, so only point this at a private, access-controlled directory
+    LLM_CACHE_DIR: str = os.getenv("LLM_CACHE_DIR", "")
+    # Empty = do not spill log artifacts
+    LOG_ARTIFACT_DIR: str = os.getenv("LOG_ARTIFACT_DIR", str(BACKEND_DIR / "temp_log_artifacts"))
+    TRACE_JSONL_PATH = Path(os.getenv("TRACE_JSONL_PATH", str(BACKEND_DIR / "temp_traces" / "spans.jsonl")))
+
+    def gemini_http_options(self):
+        """http_options for genai.Client (None keeps the library's endpoint)"""
+        return {'base_url': self.GEMINI_BASE_URL} if self.GEMINI_BASE_URL else None
 
 settings = Settings()
@@ -1,30 +1,73 @@
 from fastapi import Header, HTTPException
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+import hmac
 import logging
-from services.auth_service import AuthService
+import threading
+from services.auth_service import get_auth_service
 from backend.core.config import settings
-from supabase import create_client, Client
+from backend.core.executors import run_in_pool
+from backend.core.llm_scheduler import set_llm_caller
+from backend.services.user_cache_service import get_user_cache
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase clients (Singleton-ish)
-supabase: Optional[Client] = None
-supabase_admin: Optional[Client] = None
+# Supabase clients, created on first use (importing supabase is a large share of cold start)
+supabase: Optional["Client"] = None
+supabase_admin: Optional["Client"] = None
+_supabase_initialized = False
+_supabase_lock = threading.Lock()
 
-try:
-    if settings.SUPABASE_URL and settings.SUPABASE_KEY:
-        supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-        
-        if settings.SUPABASE_SERVICE_ROLE_KEY:
-            supabase_admin = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
-            logger.info("Supabase Admin client initialized")
-        else:
-            logger.warning("SUPABASE_SERVICE_ROLE_KEY not found! Admin actions will fail.")
-            supabase_admin = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-except Exception as e:
-    logger.warning(f"Failed to initialize Supabase: {e}")
 
-auth_service = AuthService()
+def _init_supabase() -> None:
+    global supabase, supabase_admin, _supabase_initialized
+    if _supabase_initialized:
+        return
+    with _supabase_lock:
+        if _supabase_initialized:
+            return
+        try:
+            if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+                from supabase import create_client
+
+                supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+                if settings.SUPABASE_SERVICE_ROLE_KEY:
+                    supabase_admin = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+                    logger.info("Supabase Admin client initialized")
+                else:
+                    logger.warning("SUPABASE_SERVICE_ROLE_KEY not found! Admin actions will fail.")
+                    supabase_admin = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        except Exception as e:
+            logger.warning(f"Failed to initialize Supabase: {e}")
+        _supabase_initialized = True
+
+auth_service = get_auth_service()
+
+
+def load_user_row(user_id: str) -> Optional[dict]:
+    """
+    Return the users row for `user_id`, served from the short-TTL user cache when possible.
+
+    This is the single read path for users rows: the auth dependency calls it once per
+    request and passes the row on, so credit checks and deductions never re-read it.
+    """
+    user_cache = get_user_cache()
+    cached = user_cache.get(user_id)
+    if cached:
+        return cached
+
+    client = get_supabase_admin() or get_supabase_client()
+    if not client:
+        return None
+
+    response = client.table("users").select("*").eq("user_id", user_id).execute()
+    if response.data and len(response.data) > 0:
+        user_cache.set(user_id, response.data[0])
+        return response.data[0]
+    return None
 
 async def get_current_user(authorization: Optional[str] = Header(None)) -> Optional[dict]:
     """Get current user from JWT token using Supabase for persistence (Shared Dependency)"""
@@ -38,18 +81,22 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Optio
         logger.warning("get_current_user: Token verification FAILED — check SUPABASE_JWT_SECRET env var")
         return None
         
-    if not supabase:
+    if not get_supabase_client():
         logger.error("get_current_user: Supabase client is None — check SUPABASE_URL and SUPABASE_KEY env vars")
         return None
         
-    # Check DB
-    response = supabase.table("users").select("*").eq("user_id", payload['user_id']).execute()
+    # LLM calls made by this request are scheduled fairly per user
+    set_llm_caller(user_id=payload['user_id'])
+    
+    # Check cache / DB
+    user = await run_in_pool('db', load_user_row, payload['user_id'])
     
     # If user exists, return immediately
-    if response.data and len(response.data) > 0:
-        return response.data[0]
+    if user:
+        return user
     
     # User doesn't exist, try to create
+    supabase_admin = get_supabase_admin()
     try:
         if not supabase_admin:
             logger.warning("No admin client available to create user")
@@ -61,8 +108,9 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Optio
             "credits": 3,
             "plan": "free"
         }
-        res = supabase_admin.table("users").insert(new_user).execute()
+        res = await run_in_pool('db', supabase_admin.table("users").insert(new_user).execute)
         if res.data and len(res.data) > 0:
+            get_user_cache().set(payload['user_id'], res.data[0])
             return res.data[0]
     except Exception as e:
         # Handle 409 Conflict (user already exists due to race condition)
@@ -70,8 +118,9 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Optio
         if '409' in error_str or 'conflict' in error_str.lower() or '23505' in error_str or 'duplicate key' in error_str.lower():
             # User was created by another request, fetch it
             logger.info("User already exists (race condition), fetching...")
-            retry = supabase_admin.table("users").select("*").eq("user_id", payload['user_id']).execute()
+            retry = await run_in_pool('db', supabase_admin.table("users").select("*").eq("user_id", payload['user_id']).execute)
             if retry.data and len(retry.data) > 0:
+                get_user_cache().set(payload['user_id'], retry.data[0])
                 return retry.data[0]
         logger.error(f"Failed to create user: {e}")
         return None
@@ -79,8 +128,16 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Optio
     logger.warning("User creation returned no data")
     return None
 
+def require_ops_access(authorization: Optional[str] = Header(None)) -> None:
+    """Guard for operational endpoints (metrics, executor/LLM stats): `Authorization: Bearer <OPS_TOKEN>`"""
+    token = authorization[len('Bearer '):] if authorization and authorization.startswith('Bearer ') else ''
+    if not settings.OPS_TOKEN or not hmac.compare_digest(token.encode(), settings.OPS_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
 def get_supabase_client():
+    _init_supabase()
     return supabase
 
 def get_supabase_admin():
+    _init_supabase()
     return supabase_admin
@@ -0,0 +1,238 @@
+"""
+Managed executors for blocking work called from async routes
+
+Route handlers are `async def`, but the Gemini SDK, the Supabase client,
+pdflatex and most HTTP integrations block. Running them on the event loop
+stalls every other request on the worker, so they are dispatched to named,
+separately sized pools instead:
+
+- llm:     Gemini / speech / other model API calls (long, I/O bound)
+- hedge:   individual model attempts raced by core/llm_resilience.py
+- db:      Supabase (PostgREST) calls (short, I/O bound)
+- scrape:  outbound HTTP to third-party sites and APIs
+- compile: pdflatex subprocesses (bounded, each one is a heavy process) and
+  the sanitize/pre-flight step before them
+- compile-xelatex / compile-lualatex / compile-tectonic: the same for the
+  Unicode engines (services/tex_engine_service.py), sized separately
+- cpu:     process pool for CPU-bound parsing (e.g. PDF text extraction)
+
+Separate pools keep a burst of slow LLM calls from starving quick DB reads.
+Each pool records queue depth and how long tasks wait before starting; see
+`executor_stats()` and GET /api/system/executors. Within a request each
+`run_in_pool` hop is also a tracing span (core/tracing.py) carrying its wait.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+import logging
+
+from backend.core.config import settings
+from backend.core.metrics import request_stats
+from backend.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PoolStats:
+    """Queue depth, in-flight count and wait/run times for one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def submitted(self) -> None:
+        with self._lock:
+            self.queued += 1
+
+    def started(self, waited: float) -> None:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def finished(self, ran: float, ok: bool) -> None:
+        with self._lock:
+            self.active -= 1
+            self.run_seconds_total += ran
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                'queued': self.queued,
+                'active': self.active,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_ms': round(self.wait_seconds_total / done * 1000, 2) if done else 0,
+                'max_wait_ms': round(self.wait_seconds_max * 1000, 2),
+                'avg_run_ms': round(self.run_seconds_total / done * 1000, 2) if done else 0
+            }
+
+
+class ManagedThreadPool:
+    """ThreadPoolExecutor that measures queueing and propagates contextvars"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.stats = PoolStats()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"pool-{name}")
+
+    def submit(self, fn: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        context = contextvars.copy_context()
+        enqueued = time.perf_counter()
+        self.stats.submitted()
+
+        def run():
+            started = time.perf_counter()
+            self.stats.started(started - enqueued)
+            ok = False
+            try:
+                result = context.run(fn, *args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self.stats.finished(time.perf_counter() - started, ok)
+
+        return self._executor.submit(run)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+class ManagedProcessPool:
+    """ProcessPoolExecutor with the same accounting (functions and arguments must be picklable)"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.stats = PoolStats()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app never forks
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def submit(self, fn: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        # Wait time here includes pickling and process start-up; run time is measured end to end
+        enqueued = time.perf_counter()
+        self.stats.submitted()
+        self.stats.started(0.0)
+        future = self._get().submit(fn, *args, **kwargs)
+        future.add_done_callback(
+            lambda f: self.stats.finished(time.perf_counter() - enqueued, f.exception() is None)
+        )
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+
+
+_pools: Dict[str, object] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_sizes() -> Dict[str, int]:
+    return {
+        'llm': settings.EXECUTOR_LLM_WORKERS,
+        'hedge': settings.EXECUTOR_HEDGE_WORKERS,
+        'db': settings.EXECUTOR_DB_WORKERS,
+        'scrape': settings.EXECUTOR_SCRAPE_WORKERS,
+        'compile': settings.EXECUTOR_COMPILE_WORKERS,
+        'compile-xelatex': settings.EXECUTOR_XELATEX_WORKERS,
+        'compile-lualatex': settings.EXECUTOR_LUALATEX_WORKERS,
+        'compile-tectonic': settings.EXECUTOR_TECTONIC_WORKERS,
+        'cpu': settings.EXECUTOR_CPU_WORKERS or (os.cpu_count() or 2),
+    }
+
+
+def get_executor(name: str):
+    """Get or create the named pool"""
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if name not in _pools:
+            sizes = _pool_sizes()
+            if name not in sizes:
+                raise ValueError(f"Unknown executor pool: {name}")
+            cls = ManagedProcessPool if name == 'cpu' else ManagedThreadPool
+            _pools[name] = cls(name, sizes[name])
+            logger.info(f"Started executor pool '{name}' with {sizes[name]} workers")
+        return _pools[name]
+
+
+# Server-Timing phase for hops whose pool identifies the backend (see core/tracing.py)
+POOL_PHASES = {'db': 'supabase'}
+
+
+async def run_in_pool(name: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking `fn(*args, **kwargs)` on the named pool and await its result"""
+    started = time.perf_counter()
+    pool = get_executor(name)
+    label = getattr(fn, '__qualname__', type(fn).__name__)
+    with span(f"pool.{name}", phase=POOL_PHASES.get(name), pool=name, function=label) as hop:
+        if hop is not None and isinstance(pool, ManagedThreadPool):
+            target = functools.partial(fn, *args, **kwargs)
+
+            def call():
+                hop.set_attribute('queue_wait_ms', round((time.perf_counter() - started) * 1000, 2))
+                return target()
+            future = pool.submit(call)
+        else:
+            future = pool.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            _tally(name, started)
+
+
+def _tally(name: str, started: float) -> None:
+    # Per-request tally (e.g. Supabase round trips for the 'db' pool), see core/metrics.py
+    stats = request_stats.get()
+    if stats is not None:
+        stats.add(name, time.perf_counter() - started)
+
+
+def executor_stats() -> Dict[str, Dict]:
+    """Per-pool size, queue depth and wait times"""
+    stats = {}
+    for name, size in _pool_sizes().items():
+        pool = _pools.get(name)
+        stats[name] = {'max_workers': size, 'started': pool is not None}
+        if pool is not None:
+            stats[name].update(pool.stats.snapshot())
+    return stats
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=wait)
+        _pools.clear()
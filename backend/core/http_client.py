@@ -0,0 +1,269 @@
+"""
+Shared HTTP client layer for outbound integrations
+
+Services used to call `requests.get/post` directly, paying for a new TCP and
+TLS handshake on every call. This module keeps one pooled httpx client per
+host instead:
+
+- keep-alive connection pooling with a per-host connection limit
+- HTTP/2 when the optional `h2` package is installed
+- connect/read timeouts from settings
+- RetryPolicy: exponential backoff with jitter on connection errors and
+  retryable statuses (honours Retry-After); only idempotent methods retry
+  unless the caller opts in
+
+Async code awaits `HTTPClient.request`; blocking code (services that still run
+on executor threads) uses `HTTPClient.request_sync`, which shares the same
+pooling settings through a thread-safe sync client.
+
+The per-host clients are an LRU of at most `max_hosts` entries (scrapers reach
+many one-off hosts); an evicted client is closed as soon as its in-flight
+requests have finished.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import logging
+
+import httpx
+
+from backend.core.config import settings
+from backend.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """When and how long to wait before retrying a request"""
+
+    max_attempts: int = 3
+    backoff_base: float = 0.25
+    backoff_max: float = 4.0
+    retry_statuses: FrozenSet[int] = frozenset({429, 502, 503, 504})
+    retry_methods: FrozenSet[str] = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+    def should_retry(self, method: str, attempt: int, response: Optional[httpx.Response] = None,
+                     error: Optional[Exception] = None) -> bool:
+        if attempt >= self.max_attempts or method.upper() not in self.retry_methods:
+            return False
+        if error is not None:
+            return isinstance(error, httpx.TransportError)
+        return response is not None and response.status_code in self.retry_statuses
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return backoff * (0.5 + random.random() / 2)
+
+
+DEFAULT_RETRY = RetryPolicy()
+NO_RETRY = RetryPolicy(max_attempts=1)
+# Non-idempotent calls that are safe to repeat (e.g. read-only POST APIs)
+RETRY_POST = RetryPolicy(retry_methods=frozenset({'GET', 'HEAD', 'OPTIONS', 'POST'}))
+
+
+@dataclass
+class HTTPStats:
+    requests: int = 0
+    retries: int = 0
+    errors: int = 0
+    evictions: int = 0
+    clients: Dict[str, int] = field(default_factory=dict)
+
+
+AnyClient = Union[httpx.Client, httpx.AsyncClient]
+
+
+class HTTPClient:
+    """Per-host pooled httpx clients shared by every service in the process"""
+
+    def __init__(self, timeout: float = 30.0, connect_timeout: float = 5.0,
+                 max_connections_per_host: int = 20, keepalive_expiry: float = 30.0, max_hosts: int = 64):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_connections_per_host,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_hosts = max(1, max_hosts)
+        # Async clients are bound to the event loop that created their connections
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OrderedDict[str, httpx.AsyncClient]]" = \
+            weakref.WeakKeyDictionary()
+        self._sync_clients: "OrderedDict[str, httpx.Client]" = OrderedDict()
+        # Requests in flight per client, and evicted clients waiting for theirs to finish
+        self._in_use: Counter = Counter()
+        self._retired: set = set()
+        self._lock = threading.Lock()
+        self.stats = HTTPStats()
+
+    @staticmethod
+    def _host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _checkout(self, clients: "OrderedDict[str, AnyClient]", host: str,
+                  factory: Callable[[], AnyClient]) -> Tuple[AnyClient, List[AnyClient]]:
+        """The host's client (marked in use) and evicted clients that are idle and must be closed"""
+        with self._lock:
+            client = clients.get(host)
+            if client is None:
+                client = clients[host] = factory()
+                self.stats.clients[host] = self.stats.clients.get(host, 0) + 1
+            clients.move_to_end(host)
+            self._in_use[client] += 1
+            idle = []
+            while len(clients) > self.max_hosts:
+                evicted_host, evicted = clients.popitem(last=False)
+                self.stats.evictions += 1
+                self.stats.clients.pop(evicted_host, None)
+                if self._in_use[evicted]:
+                    self._retired.add(evicted)
+                else:
+                    idle.append(evicted)
+            return client, idle
+
+    def _checkin(self, client: AnyClient) -> bool:
+        """Release one use of `client`; True if it was evicted meanwhile and is now idle"""
+        with self._lock:
+            self._in_use[client] -= 1
+            if self._in_use[client] > 0:
+                return False
+            del self._in_use[client]
+            if client in self._retired:
+                self._retired.discard(client)
+                return True
+            return False
+
+    def _async_client(self, url: str) -> Tuple[httpx.AsyncClient, List[httpx.AsyncClient]]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, OrderedDict())
+        return self._checkout(clients, self._host(url), lambda: httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE, timeout=self.timeout, limits=self.limits, follow_redirects=True
+        ))
+
+    def _sync_client(self, url: str) -> Tuple[httpx.Client, List[httpx.Client]]:
+        return self._checkout(self._sync_clients, self._host(url), lambda: httpx.Client(
+            http2=HTTP2_AVAILABLE, timeout=self.timeout, limits=self.limits, follow_redirects=True
+        ))
+
+    async def request(self, method: str, url: str, retry: RetryPolicy = DEFAULT_RETRY, **kwargs) -> httpx.Response:
+        """Send a request on the pooled async client for the URL's host, retrying per `retry`"""
+        with span(f"http.{method.upper()}", host=self._host(url)) as current:
+            client, idle = self._async_client(url)
+            try:
+                for evicted in idle:
+                    await evicted.aclose()
+                attempt = 0
+                while True:
+                    attempt += 1
+                    self.stats.requests += 1
+                    try:
+                        response = await client.request(method, url, **kwargs)
+                    except Exception as e:
+                        if not retry.should_retry(method, attempt, error=e):
+                            self.stats.errors += 1
+                            raise
+                        response = None
+                        wait = retry.delay(attempt)
+                    else:
+                        if not retry.should_retry(method, attempt, response=response):
+                            if current is not None:
+                                current.set_attribute('status', response.status_code)
+                                current.set_attribute('attempts', attempt)
+                            return response
+                        wait = retry.delay(attempt, response)
+                    self.stats.retries += 1
+                    logger.info(f"Retrying {method} {self._host(url)} in {wait:.2f}s (attempt {attempt + 1})")
+                    await asyncio.sleep(wait)
+            finally:
+                if self._checkin(client):
+                    await client.aclose()
+
+    def request_sync(self, method: str, url: str, retry: RetryPolicy = DEFAULT_RETRY, **kwargs) -> httpx.Response:
+        """Blocking variant of `request` for code running on executor threads"""
+        with span(f"http.{method.upper()}", host=self._host(url)) as current:
+            client, idle = self._sync_client(url)
+            try:
+                for evicted in idle:
+                    evicted.close()
+                attempt = 0
+                while True:
+                    attempt += 1
+                    self.stats.requests += 1
+                    try:
+                        response = client.request(method, url, **kwargs)
+                    except Exception as e:
+                        if not retry.should_retry(method, attempt, error=e):
+                            self.stats.errors += 1
+                            raise
+                        response = None
+                        wait = retry.delay(attempt)
+                    else:
+                        if not retry.should_retry(method, attempt, response=response):
+                            if current is not None:
+                                current.set_attribute('status', response.status_code)
+                                current.set_attribute('attempts', attempt)
+                            return response
+                        wait = retry.delay(attempt, response)
+                    self.stats.retries += 1
+                    logger.info(f"Retrying {method} {self._host(url)} in {wait:.2f}s (attempt {attempt + 1})")
+                    time.sleep(wait)
+            finally:
+                if self._checkin(client):
+                    client.close()
+
+    async def aclose(self) -> None:
+        """Close the async clients of the running loop and every sync client"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.pop(loop, {}).values())
+            sync_clients, self._sync_clients = list(self._sync_clients.values()), OrderedDict()
+        for client in clients:
+            await client.aclose()
+        for client in sync_clients:
+            client.close()
+
+    def get_stats(self) -> Dict:
+        return {
+            'requests': self.stats.requests,
+            'retries': self.stats.retries,
+            'errors': self.stats.errors,
+            'http2': HTTP2_AVAILABLE,
+            'evictions': self.stats.evictions,
+            'hosts': dict(self.stats.clients)
+        }
+
+
+# Singleton instance
+_http_client: Optional[HTTPClient] = None
+
+
+def get_http_client() -> HTTPClient:
+    """Get or create the shared HTTP client"""
+    global _http_client
+    if _http_client is None:
+        _http_client = HTTPClient(
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+            connect_timeout=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            max_connections_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_hosts=settings.HTTP_MAX_HOSTS
+        )
+    return _http_client
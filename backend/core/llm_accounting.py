@@ -0,0 +1,228 @@
+"""
+Token and latency accounting for model calls
+
+Every attempt made through core/llm_resilience.py is recorded with the token
+counts Gemini reports in `usage_metadata` (prompt, cached, output, thinking),
+its latency, model, mode, tier and outcome:
+
+- counters and latency/token histograms per (model, mode, tier, outcome),
+  served at GET /api/metrics/llm (and as llm_* series at GET /metrics); the
+  histograms live in the core/metrics.py registry and are read back from it
+- a per-user summary (calls, tokens and time by mode), served to the user at
+  GET /api/usage/llm; users are kept in an LRU bounded by LLM_USAGE_MAX_USERS
+
+Figures are per worker process and reset on restart.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+from backend.core.metrics import Histogram, MetricsRegistry, get_metrics
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+# Mode labels come partly from request bodies; anything else is reported as 'other'
+MODES = frozenset({'normal', 'ebook', 'research', 'modify', 'extract_json', 'resume', 'linkedin'})
+
+SERIES_LABELS = ('model', 'mode', 'tier', 'outcome')
+
+TOKEN_FIELDS = (
+    ('prompt_tokens', 'prompt_token_count'),
+    ('cached_tokens', 'cached_content_token_count'),
+    ('output_tokens', 'candidates_token_count'),
+    ('thinking_tokens', 'thoughts_token_count'),
+)
+
+
+def usage_from_response(response) -> Dict[str, int]:
+    """Token counts from a generate_content response (zeros when not reported)"""
+    usage = getattr(response, 'usage_metadata', None)
+    counts = {}
+    for name, attr in TOKEN_FIELDS:
+        value = getattr(usage, attr, None) if usage is not None else None
+        counts[name] = value if isinstance(value, int) else 0
+    return counts
+
+
+class CallStats:
+    __slots__ = ('calls', 'prompt_tokens', 'cached_tokens', 'output_tokens', 'thinking_tokens', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.thinking_tokens = 0
+        self.seconds = 0.0
+
+    def add(self, seconds: float, usage: Dict[str, int]) -> None:
+        self.calls += 1
+        self.prompt_tokens += usage['prompt_tokens']
+        self.cached_tokens += usage['cached_tokens']
+        self.output_tokens += usage['output_tokens']
+        self.thinking_tokens += usage['thinking_tokens']
+        self.seconds += seconds
+
+
+class UserUsage:
+    __slots__ = ('calls', 'errors', 'prompt_tokens', 'cached_tokens', 'output_tokens', 'thinking_tokens',
+                 'seconds', 'by_mode', 'last_call_at')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.thinking_tokens = 0
+        self.seconds = 0.0
+        self.by_mode: Dict[str, List] = {}  # mode -> [calls, total tokens, seconds]
+        self.last_call_at = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'prompt_tokens': self.prompt_tokens,
+            'cached_tokens': self.cached_tokens,
+            'output_tokens': self.output_tokens,
+            'thinking_tokens': self.thinking_tokens,
+            'total_tokens': self.prompt_tokens + self.output_tokens + self.thinking_tokens,
+            'model_seconds': round(self.seconds, 3),
+            'by_mode': {
+                mode: {'calls': calls, 'tokens': tokens, 'model_seconds': round(seconds, 3)}
+                for mode, (calls, tokens, seconds) in sorted(self.by_mode.items())
+            },
+            'last_call_at': self.last_call_at,
+        }
+
+
+class LLMAccounting:
+    def __init__(self, max_users: int = 10000, registry: Optional[MetricsRegistry] = None):
+        self.max_users = max_users
+        registry = registry or get_metrics()
+        self.latency = registry.histogram(
+            'llm_request_seconds', 'Latency of one Gemini attempt', SERIES_LABELS, buckets=LATENCY_BUCKETS
+        )
+        self.prompt_size = registry.histogram(
+            'llm_prompt_tokens', 'Prompt tokens per Gemini attempt', SERIES_LABELS, buckets=TOKEN_BUCKETS
+        )
+        self.output_size = registry.histogram(
+            'llm_output_tokens', 'Output tokens per Gemini attempt', SERIES_LABELS, buckets=TOKEN_BUCKETS
+        )
+        self.tokens = registry.counter('llm_tokens_total', 'Tokens reported in usage_metadata', ('model', 'kind'))
+        self._calls: Dict[Tuple[str, str, str, str], CallStats] = {}
+        self._users: "OrderedDict[str, UserUsage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, model: str, seconds: float, outcome: str, response=None,
+               mode: Optional[str] = None, tier: Optional[str] = None, user_id: Optional[str] = None) -> None:
+        usage = usage_from_response(response)
+        mode = mode if mode in MODES else 'other'
+        tier = tier or _tier_for(model)
+        labels = {'model': model, 'mode': mode, 'tier': tier, 'outcome': outcome}
+        self.latency.observe(seconds, **labels)
+        if usage['prompt_tokens']:
+            self.prompt_size.observe(usage['prompt_tokens'], **labels)
+        if usage['output_tokens']:
+            self.output_size.observe(usage['output_tokens'], **labels)
+        for kind, count in usage.items():
+            if count:
+                self.tokens.inc(count, model=model, kind=kind)
+        with self._lock:
+            key = (model, mode, tier, outcome)
+            stats = self._calls.get(key)
+            if stats is None:
+                stats = self._calls[key] = CallStats()
+            stats.add(seconds, usage)
+
+            if user_id:
+                user = self._users.get(user_id)
+                if user is None:
+                    user = self._users[user_id] = UserUsage()
+                    while len(self._users) > self.max_users:
+                        self._users.popitem(last=False)
+                else:
+                    self._users.move_to_end(user_id)
+                user.calls += 1
+                user.errors += outcome != 'ok'
+                user.prompt_tokens += usage['prompt_tokens']
+                user.cached_tokens += usage['cached_tokens']
+                user.output_tokens += usage['output_tokens']
+                user.thinking_tokens += usage['thinking_tokens']
+                user.seconds += seconds
+                entry = user.by_mode.setdefault(mode, [0, 0, 0.0])
+                entry[0] += 1
+                entry[1] += usage['prompt_tokens'] + usage['output_tokens'] + usage['thinking_tokens']
+                entry[2] += seconds
+                user.last_call_at = time.time()
+
+    def user_summary(self, user_id: str) -> Dict:
+        with self._lock:
+            user = self._users.get(user_id)
+            return user.to_dict() if user else UserUsage().to_dict()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            calls = [(key, stats) for key, stats in sorted(self._calls.items())]
+            users = len(self._users)
+        series = []
+        for key, stats in calls:
+            labels = dict(zip(SERIES_LABELS, key))
+            series.append({
+                **labels,
+                'calls': stats.calls,
+                'prompt_tokens': stats.prompt_tokens,
+                'cached_tokens': stats.cached_tokens,
+                'output_tokens': stats.output_tokens,
+                'thinking_tokens': stats.thinking_tokens,
+                'avg_latency_ms': round(stats.seconds / stats.calls * 1000, 1) if stats.calls else 0,
+                'p50_latency_le_s': self.latency.quantile(0.5, **labels),
+                'p95_latency_le_s': self.latency.quantile(0.95, **labels),
+                'latency_seconds': _histogram_dict(self.latency, labels),
+                'prompt_tokens_hist': _histogram_dict(self.prompt_size, labels),
+                'output_tokens_hist': _histogram_dict(self.output_size, labels),
+            })
+        return {'since': self.started_at, 'tracked_users': users, 'series': series}
+
+
+def _histogram_dict(histogram: Histogram, labels: Dict[str, str]) -> Dict:
+    """Cumulative bucket counts (Prometheus `le` semantics) for one series of a registry histogram"""
+    snapshot = histogram.snapshot(**labels)
+    if snapshot is None:  # never observed, or folded into the registry's overflow series
+        return {'buckets': {}, 'sum': 0, 'count': 0}
+    cumulative, total, count = snapshot
+    buckets = {str(bound): running for bound, running in zip(histogram.buckets, cumulative)}
+    buckets['+Inf'] = count
+    return {'buckets': buckets, 'sum': round(total, 4), 'count': count}
+
+
+def _tier_for(model: str) -> str:
+    if model == settings.GEMINI_MODEL_PRO:
+        return 'pro'
+    if model == settings.GEMINI_MODEL_STARTER:
+        return 'starter'
+    return 'other'
+
+
+# Singleton instance
+_llm_accounting: Optional[LLMAccounting] = None
+_llm_accounting_lock = threading.Lock()
+
+
+def get_llm_accounting() -> LLMAccounting:
+    """Get or create the process-wide LLM accounting"""
+    global _llm_accounting
+    if _llm_accounting is None:
+        with _llm_accounting_lock:
+            if _llm_accounting is None:
+                _llm_accounting = LLMAccounting(max_users=settings.LLM_USAGE_MAX_USERS)
+    return _llm_accounting
@@ -0,0 +1,245 @@
+"""
+Response cache for idempotent LLM calls
+
+Some model calls are repeated with byte-identical inputs: retries and
+double-clicks on PPT outlines, LinkedIn extraction of the same profile, the
+same resume optimized against the same job description. Call sites that are
+safe to cache opt in through `get_llm_cache().get_or_compute(key, compute)`,
+with the key built by `cache_key(model, contents, schema, config)`.
+
+- memory: LRU with a TTL, bounded by entry count
+- disk (opt-in, LLM_CACHE_DIR unset by default): one JSON file per key, so
+  entries survive restarts and are shared by workers on the same host; pruned
+  oldest-first past LLM_CACHE_MAX_DISK_ENTRIES. Responses contain personal
+  data (resumes, LinkedIn profiles) in plain text, so the directory must be
+  private to the service
+- coalescing: concurrent calls with the same key wait for the first one
+  instead of each spending tokens
+
+Values must be JSON-serializable. They are stored as JSON text and decoded on
+every hit, so callers may mutate what they get back. Failures are not cached.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(value: Any) -> str:
+    if value is None:
+        return ''
+    if hasattr(value, 'model_dump'):
+        value = value.model_dump(exclude_none=True, mode='json')
+    raw = value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def cache_key(model: str, contents: Any, schema: Any = None, config: Any = None, namespace: str = '') -> str:
+    """Key for a call: (namespace, model, prompt hash, schema hash, config hash)"""
+    parts = [namespace, model, _digest(contents), _digest(schema), _digest(config)]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400.0,
+                 disk_dir: Optional[str] = None, max_disk_entries: int = 5000, enabled: bool = True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+        # key -> (expires_at, json text); wall-clock expiry so disk entries agree across processes
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0, 'stores': 0, 'errors': 0}
+
+    # ------------------------------------------------------------------ memory
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry[1]
+
+    def _memory_set(self, key: str, expires_at: float, text: str) -> None:
+        self._memory[key] = (expires_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------ disk
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable LLM cache file {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        if entry['expires_at'] <= time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry['expires_at'], entry['value']
+
+    def _disk_set(self, key: str, expires_at: float, text: str) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({'expires_at': expires_at, 'value': text}), encoding='utf-8')
+            os.replace(tmp, path)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Failed to write LLM cache file {path}: {e}")
+            return
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """Drop expired files, then the oldest ones beyond max_disk_entries; returns files removed"""
+        if self.disk_dir is None or not self.disk_dir.exists():
+            return 0
+        now = time.time()
+        files = []
+        removed = 0
+        for path in self.disk_dir.glob('*/*.json'):
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime + self.ttl_seconds <= now:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                files.append((mtime, path))
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.max_disk_entries)]:
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    # ------------------------------------------------------------------ public
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            text = self._memory_get(key)
+            if text is not None:
+                self.stats['memory_hits'] += 1
+                return json.loads(text)
+        entry = self._disk_get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._memory_set(key, *entry)
+        return json.loads(entry[1])
+
+    def set(self, key: str, value: Any) -> None:
+        self._store(key, json.dumps(value))
+
+    def _store(self, key: str, text: str) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._memory_set(key, expires_at, text)
+            self.stats['stores'] += 1
+        self._disk_set(key, expires_at, text)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Cached value for `key`, or the result of `compute()` (shared with concurrent callers)"""
+        if not self.enabled:
+            return compute()
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not owner:
+            # The owner publishes JSON text, so each waiter decodes its own copy
+            return json.loads(future.result())
+
+        try:
+            value = compute()
+            text = json.dumps(value)
+            if value is not None:
+                self._store(key, text)
+            future.set_result(text)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses'] + self.stats['coalesced']
+            hits = lookups - self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._memory),
+                'in_flight': len(self._in_flight),
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'disk': str(self.disk_dir) if self.disk_dir else None
+            }
+
+
+# Singleton instance
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get or create the process-wide LLM response cache"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(
+                    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                    disk_dir=settings.LLM_CACHE_DIR or None,
+                    max_disk_entries=settings.LLM_CACHE_MAX_DISK_ENTRIES,
+                    enabled=settings.LLM_CACHE_ENABLED
+                )
+    return _llm_cache
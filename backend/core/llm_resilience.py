@@ -0,0 +1,396 @@
+"""
+Deadlines, hedging and circuit breaking for Gemini calls
+
+Sits in front of the LLM scheduler (core/llm_scheduler.py):
+
+- deadline: each HTTP request sets an absolute deadline (server.py middleware);
+  every model call made on its behalf, including queueing in the scheduler,
+  is bounded by the time left and fails with DeadlineExceeded when it runs out.
+  The remaining time is also sent to the SDK as the HTTP timeout, so an
+  abandoned call does not hold a worker thread.
+- hedging: for call sites that opt in, if the primary call is still running
+  after the model's observed latency percentile, a second request goes to the
+  faster model (GEMINI_MODEL_STARTER) and whichever succeeds first is used.
+  Hedges are queued as BATCH so they never delay interactive primaries.
+  Whichever request loses is cancelled: dropped from the scheduler queue if
+  it has not started yet, otherwise its response is discarded (the SDK call
+  itself cannot be interrupted).
+- fallback tiers: when the primary fails with a transient error (429, 5xx,
+  timeouts; see is_transient) or its breaker is open, the call moves on to
+  the starter model while time remains. Other errors (e.g. 400 for a bad
+  request) are raised as-is, since the starter model would reject them too.
+- circuit breaker per model: after consecutive transient failures the model
+  is skipped for a cool-down period, then a single probe call decides whether
+  to close.
+
+Stats (latency percentiles, breaker state, hedges fired/won) are served at
+GET /api/system/llm together with the scheduler stats. Each attempt, hedges
+included, is recorded in core/llm_accounting.py.
+"""
+
+import contextvars
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Deque, Dict, Optional, Tuple
+import logging
+
+import httpx
+
+from backend.core.config import settings
+from backend.core.executors import get_executor
+from backend.core.llm_accounting import get_llm_accounting
+from backend.core.llm_scheduler import (
+    BATCH, LLMCancelled, LLMQueueTimeout, LLMScheduler, get_llm_scheduler, is_throttled, llm_user
+)
+from backend.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('llm_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before a model answered"""
+
+
+class CircuitOpen(Exception):
+    """Every model tier is currently failing"""
+
+
+_TRANSIENT = re.compile(r"^\s*(?:408|429|5\d\d)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|INTERNAL|DEADLINE_EXCEEDED|overloaded")
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors worth retrying elsewhere: throttling, server errors and timeouts (not 4xx)"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and not isinstance(code, bool):
+        return code in (408, 429) or code >= 500
+    if isinstance(error, (TimeoutError, ConnectionError, LLMQueueTimeout, httpx.TransportError)):
+        return True
+    return bool(_TRANSIENT.search(str(error)))
+
+
+def set_deadline(seconds: Optional[float]) -> None:
+    """Bound all model calls made by the current request to `seconds` from now"""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Time left before the current request's deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half-open probe after `reset_seconds`"""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def available(self) -> bool:
+        """Whether `allow` would let a call through now, without taking the half-open probe"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at >= self.reset_seconds
+            return not self._probing
+
+    def release(self) -> None:
+        """Give back the half-open probe of a call that ended without an outcome (cancelled, deadline, queue timeout)"""
+        with self._lock:
+            if self.state == 'half_open':
+                self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state, self.failures, self._probing = 'closed', 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state, self.opened_at, self._probing = 'open', time.monotonic(), False
+
+
+class LatencyWindow:
+    """Latencies of the last `size` successful calls"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class ResilientLLM:
+    def __init__(self, scheduler: LLMScheduler, fallback_model: str, hedge_percentile: float = 90.0,
+                 hedge_min_delay: float = 2.0, hedge_min_samples: int = 20,
+                 failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.scheduler = scheduler
+        self.fallback_model = fallback_model
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hedges_fired': 0, 'hedges_won': 0, 'fallbacks': 0, 'deadline_exceeded': 0, 'circuit_rejected': 0}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return self._breakers[model]
+
+    def latency(self, model: str) -> LatencyWindow:
+        with self._lock:
+            return self._latency.setdefault(model, LatencyWindow())
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        observed = self.latency(model).percentile(self.hedge_percentile, self.hedge_min_samples)
+        return None if observed is None else max(self.hedge_min_delay, observed)
+
+    # ------------------------------------------------------------------ calls
+
+    def generate(self, client, model: str, contents: Any, config: Any = None, hedge: bool = False,
+                 mode: Optional[str] = None, tier: Optional[str] = None):
+        """
+        Call `model`, falling back to the starter tier on transient failures.
+
+        With `hedge=True` a backup request to the starter model is started once
+        the primary is slower than the model's latency percentile. `mode` and
+        `tier` label the call in core/llm_accounting.py.
+        """
+        labels = {'mode': mode, 'tier': tier}
+        tiers = [model] if model == self.fallback_model else [model, self.fallback_model]
+        last_error: Optional[Exception] = None
+        for index, tier in enumerate(tiers):
+            if not self.breaker(tier).allow():
+                self.stats['circuit_rejected'] += 1
+                continue
+            if index:
+                self.stats['fallbacks'] += 1
+                logger.warning(f"Falling back from {model} to {tier}: {last_error}")
+            try:
+                if hedge and not index:
+                    return self._hedged(client, tier, contents, config, labels)
+                return self._attempt(client, tier, contents, config, labels)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                last_error = e
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpen(f"Circuit open for {', '.join(tiers)}")
+
+    def _timeout(self) -> Optional[float]:
+        remaining = remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            self.stats['deadline_exceeded'] += 1
+            raise DeadlineExceeded("Request deadline exceeded before the model call")
+        return remaining
+
+    def _attempt(self, client, model: str, contents: Any, config: Any, labels: Dict,
+                 priority: Optional[int] = None, cancel: Optional[threading.Event] = None):
+        with span('gemini.attempt', phase='gemini', model=model, priority=priority):
+            settled = False  # the breaker saw this call's outcome
+            try:
+                timeout = self._timeout()
+                started = time.monotonic()
+                try:
+                    response = self.scheduler.generate(
+                        client, model, contents, config=_with_timeout(config, timeout), priority=priority,
+                        timeout=timeout, cancel=cancel
+                    )
+                except LLMCancelled:
+                    raise
+                except LLMQueueTimeout as e:
+                    if remaining_seconds() is not None and remaining_seconds() <= 0:
+                        self.stats['deadline_exceeded'] += 1
+                        raise DeadlineExceeded(str(e))
+                    raise
+                except Exception as e:
+                    elapsed = time.monotonic() - started
+                    remaining = remaining_seconds()
+                    if remaining is not None and remaining <= 0:
+                        self.stats['deadline_exceeded'] += 1
+                        self._account(model, elapsed, 'deadline', None, labels)
+                        raise DeadlineExceeded(f"Request deadline exceeded during {model} call: {e}")
+                    self._account(model, elapsed, 'throttled' if is_throttled(e) else 'error', None, labels)
+                    settled = True
+                    if is_transient(e):
+                        self.breaker(model).record_failure()
+                    else:
+                        # The model answered (e.g. 400 for this request), so it is healthy
+                        self.breaker(model).record_success()
+                    raise
+                elapsed = time.monotonic() - started
+                settled = True
+                self.breaker(model).record_success()
+                self.latency(model).record(elapsed)
+                self._account(model, elapsed, 'ok', response, labels)
+                return response
+            finally:
+                if not settled:
+                    self.breaker(model).release()
+
+    @staticmethod
+    def _account(model: str, seconds: float, outcome: str, response, labels: Dict) -> None:
+        get_llm_accounting().record(
+            model, seconds, outcome, response, mode=labels['mode'], tier=labels['tier'], user_id=llm_user.get()
+        )
+
+    def _hedged(self, client, model: str, contents: Any, config: Any, labels: Dict):
+        # The primary's _attempt raises DeadlineExceeded itself, giving back its breaker probe
+        timeout = remaining_seconds()
+        delay = self.hedge_delay(model)
+        pool = get_executor('hedge')
+        running: Dict[Future, Tuple[threading.Event, str, bool]] = {}
+
+        def submit(call, tier: str, holds_probe: bool, *args) -> Future:
+            cancel = threading.Event()
+            future = pool.submit(call, client, tier, contents, config, labels, *args, cancel)
+            running[future] = (cancel, tier, holds_probe)
+            return future
+
+        # generate() already passed the primary through its breaker
+        primary = submit(self._attempt, model, True, None)
+        if delay is None or (timeout is not None and delay >= timeout):
+            return self._result(running, timeout)
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if not self.breaker(self.fallback_model).available():
+            return self._result(running, remaining_seconds())
+        self.stats['hedges_fired'] += 1
+        logger.info(f"{model} slower than p{self.hedge_percentile:.0f} ({delay:.1f}s), hedging to {self.fallback_model}")
+        backup = submit(self._backup, self.fallback_model, False)
+        response = self._result(running, remaining_seconds())
+        if backup.done() and not backup.cancelled() and not backup.exception() and backup.result() is response:
+            self.stats['hedges_won'] += 1
+        return response
+
+    def _backup(self, client, model: str, contents: Any, config: Any, labels: Dict, cancel: threading.Event):
+        """The hedge call; it takes the model's breaker probe only once it actually starts"""
+        if not self.breaker(model).allow():
+            self.stats['circuit_rejected'] += 1
+            raise CircuitOpen(f"Circuit open for {model}")
+        return self._attempt(client, model, contents, config, labels, BATCH, cancel)
+
+    def _result(self, running: Dict[Future, Tuple[threading.Event, str, bool]], timeout: Optional[float]):
+        """First successful result; the last error if all fail. Unfinished calls are cancelled either way."""
+        pending = set(running)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    self.stats['deadline_exceeded'] += 1
+                    raise DeadlineExceeded("Request deadline exceeded waiting for the model")
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+                timeout = remaining_seconds()
+            raise error
+        finally:
+            # Not started yet: never runs. Queued in the scheduler: leaves the queue.
+            # Already calling the model: keeps its worker until the SDK returns, result discarded.
+            for future in pending:
+                cancel, model, holds_probe = running[future]
+                if future.cancel() and holds_probe:
+                    self.breaker(model).release()
+                cancel.set()
+                self.scheduler.wake(model)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            models = set(self._breakers) | set(self._latency)
+        per_model = {}
+        for model in sorted(models):
+            window = self.latency(model)
+            breaker = self.breaker(model)
+            entry = {'circuit': breaker.state, 'consecutive_failures': breaker.failures, 'samples': len(window)}
+            for p in (50, 90, 99):
+                entry[f"p{p}_ms"] = _ms(window.percentile(p))
+            entry['hedge_delay_ms'] = _ms(self.hedge_delay(model))
+            per_model[model] = entry
+        return {**self.stats, 'models': per_model}
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _with_timeout(config: Any, timeout: Optional[float]):
+    """Attach the remaining deadline as the SDK's per-request HTTP timeout (milliseconds)"""
+    if timeout is None:
+        return config
+    from google.genai import types
+    http_options = types.HttpOptions(timeout=max(1000, int(timeout * 1000)))
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    return config.model_copy(update={'http_options': http_options})
+
+
+# Singleton instance
+_resilient_llm: Optional[ResilientLLM] = None
+_resilient_llm_lock = threading.Lock()
+
+
+def get_resilient_llm() -> ResilientLLM:
+    """Get or create the process-wide resilient LLM caller"""
+    global _resilient_llm
+    if _resilient_llm is None:
+        with _resilient_llm_lock:
+            if _resilient_llm is None:
+                _resilient_llm = ResilientLLM(
+                    get_llm_scheduler(),
+                    fallback_model=settings.GEMINI_MODEL_STARTER,
+                    hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+                    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+                    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+                    failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                    reset_seconds=settings.LLM_BREAKER_RESET_SECONDS
+                )
+    return _resilient_llm
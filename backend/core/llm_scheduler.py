@@ -0,0 +1,361 @@
+"""
+Concurrency governor for Gemini model calls
+
+Every `client.models.generate_content` call goes through `LLMScheduler.generate`,
+which admits it to a per-model lane before the request is sent:
+
+- concurrency: at most `limit` calls in flight per model. The limit adapts
+  (AIMD): it is halved when Gemini answers 429/503 and grows by 1/limit on
+  each success, up to the configured maximum
+- tokens per minute: a token bucket per model, charged with an estimate of
+  the prompt + output tokens and corrected from `usage_metadata` afterwards
+- priority: INTERACTIVE calls (chat, editor) are admitted before BATCH calls
+  (public API, bulk jobs)
+- fairness: within a priority class waiting users are served round-robin, so
+  one user's burst cannot hold the lane
+
+Calls run on executor threads, so admission blocks the calling thread. The
+priority and user are read from contextvars set by the request
+(`set_llm_caller`); executors copy them into the worker thread.
+
+Throttled calls (429/503) are retried after a backoff that also pauses the
+lane, honouring the server's retry delay when one is given.
+"""
+
+import contextvars
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+import logging
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+llm_priority: contextvars.ContextVar[int] = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+llm_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('llm_user', default=None)
+
+
+def set_llm_caller(user_id: Optional[str] = None, priority: Optional[int] = None) -> None:
+    """Tag LLM calls made by the current request with its user and priority"""
+    if user_id is not None:
+        llm_user.set(user_id)
+    if priority is not None:
+        llm_priority.set(priority)
+
+
+class LLMCancelled(Exception):
+    """The caller abandoned the call (e.g. a hedge that lost) before it reached the model"""
+
+
+class LLMQueueTimeout(Exception):
+    """The call waited longer than the queue timeout for a slot"""
+
+
+_RETRY_DELAY = re.compile(r"retry(?:Delay|[ _-]?after)['\"]?\s*[:=]?\s*['\"]?(\d+(?:\.\d+)?)s?", re.IGNORECASE)
+
+
+def is_throttled(error: Exception) -> bool:
+    message = str(error)
+    return any(marker in message for marker in ('429', 'RESOURCE_EXHAUSTED', '503', 'UNAVAILABLE', 'overloaded'))
+
+
+def _server_retry_delay(error: Exception) -> Optional[float]:
+    match = _RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def estimate_tokens(contents: Any, output_tokens: int = 0) -> int:
+    """Rough token count (~4 characters per token) used until usage_metadata is known"""
+    if isinstance(contents, str):
+        chars = len(contents)
+    elif isinstance(contents, (list, tuple)):
+        chars = sum(len(c) if isinstance(c, str) else 1000 for c in contents)
+    else:
+        chars = 4000
+    return chars // 4 + output_tokens
+
+
+class _Ticket:
+    __slots__ = ('priority', 'user', 'tokens', 'enqueued', 'granted')
+
+    def __init__(self, priority: int, user: str, tokens: int):
+        self.priority = priority
+        self.user = user
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class ModelLane:
+    """Admission state for one model: adaptive concurrency, TPM bucket and fair queues"""
+
+    def __init__(self, model: str, max_concurrency: int, tokens_per_minute: int):
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.tokens_updated = time.monotonic()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        # priority -> user -> tickets; users rotate to the back after each grant
+        self.queues: Dict[int, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self.cond = threading.Condition()
+        self.stats = {
+            'granted': 0, 'throttled': 0, 'timeouts': 0, 'tokens_used': 0,
+            'wait_seconds_total': {p: 0.0 for p in PRIORITY_NAMES},
+            'wait_seconds_max': {p: 0.0 for p in PRIORITY_NAMES},
+            'granted_by_priority': {p: 0 for p in PRIORITY_NAMES},
+        }
+
+    # All methods below are called with self.cond held
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute <= 0:
+            return
+        elapsed = now - self.tokens_updated
+        self.tokens = min(float(self.tokens_per_minute), self.tokens + elapsed * self.tokens_per_minute / 60.0)
+        self.tokens_updated = now
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        for priority in sorted(self.queues):
+            users = self.queues[priority]
+            if users:
+                return users[next(iter(users))][0]
+        return None
+
+    def _pop(self, ticket: _Ticket) -> None:
+        users = self.queues[ticket.priority]
+        tickets = users[ticket.user]
+        tickets.popleft()
+        if tickets:
+            users.move_to_end(ticket.user)
+        else:
+            del users[ticket.user]
+
+    def remove(self, ticket: _Ticket) -> None:
+        users = self.queues[ticket.priority]
+        tickets = users.get(ticket.user)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del users[ticket.user]
+
+    def grant(self, now: float) -> float:
+        """Admit queued tickets while capacity allows; returns seconds until capacity may free up"""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        granted_any = False
+        while self.in_flight < int(self.limit):
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            if self.tokens_per_minute > 0:
+                # A call larger than the whole budget only needs a full bucket
+                needed = min(ticket.tokens, self.tokens_per_minute)
+                if self.tokens < needed:
+                    if granted_any:
+                        self.cond.notify_all()
+                    return (needed - self.tokens) * 60.0 / self.tokens_per_minute
+                self.tokens -= ticket.tokens
+            self._pop(ticket)
+            ticket.granted = True
+            self.in_flight += 1
+            waited = now - ticket.enqueued
+            self.stats['granted'] += 1
+            self.stats['granted_by_priority'][ticket.priority] += 1
+            self.stats['wait_seconds_total'][ticket.priority] += waited
+            self.stats['wait_seconds_max'][ticket.priority] = max(self.stats['wait_seconds_max'][ticket.priority], waited)
+            granted_any = True
+        if granted_any:
+            self.cond.notify_all()
+        return 1.0
+
+    def snapshot(self) -> Dict:
+        with self.cond:
+            self._refill(time.monotonic())
+            return {
+                'limit': round(self.limit, 2),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self.in_flight,
+                'queued': {
+                    PRIORITY_NAMES[p]: sum(len(t) for t in users.values()) for p, users in self.queues.items()
+                },
+                'tokens_available': int(self.tokens) if self.tokens_per_minute > 0 else None,
+                'tokens_per_minute': self.tokens_per_minute or None,
+                'paused_for_seconds': round(max(0.0, self.paused_until - time.monotonic()), 2),
+                'granted': self.stats['granted'],
+                'throttled': self.stats['throttled'],
+                'timeouts': self.stats['timeouts'],
+                'tokens_used': self.stats['tokens_used'],
+                'avg_wait_ms': {
+                    PRIORITY_NAMES[p]: round(self.stats['wait_seconds_total'][p] / n * 1000, 2) if n else 0
+                    for p, n in self.stats['granted_by_priority'].items()
+                },
+                'max_wait_ms': {
+                    PRIORITY_NAMES[p]: round(w * 1000, 2) for p, w in self.stats['wait_seconds_max'].items()
+                },
+            }
+
+
+class LLMScheduler:
+    def __init__(self, queue_timeout: float = 120.0, max_retries: int = 2, output_token_estimate: int = 2048,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.output_token_estimate = output_token_estimate
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lanes: Dict[str, ModelLane] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, model: str, max_concurrency: int, tokens_per_minute: int = 0) -> ModelLane:
+        """Create or replace the lane for `model`"""
+        with self._lock:
+            lane = self._lanes[model] = ModelLane(model, max_concurrency, tokens_per_minute)
+            return lane
+
+    def lane(self, model: str) -> ModelLane:
+        lane = self._lanes.get(model)
+        if lane is not None:
+            return lane
+        with self._lock:
+            if model not in self._lanes:
+                concurrency, tpm = _model_limits(model)
+                self._lanes[model] = ModelLane(model, concurrency, tpm)
+            return self._lanes[model]
+
+    # ------------------------------------------------------------------ admission
+
+    def acquire(self, model: str, tokens: int, priority: Optional[int] = None, user_id: Optional[str] = None,
+                timeout: Optional[float] = None, cancel: Optional[threading.Event] = None) -> _Ticket:
+        """Block until the call may start; raises LLMQueueTimeout after `timeout` (default: queue_timeout)
+        and LLMCancelled once `cancel` is set (see `wake`)"""
+        lane = self.lane(model)
+        priority = llm_priority.get() if priority is None else priority
+        if priority not in PRIORITY_NAMES:
+            priority = BATCH
+        # Unauthenticated calls share one fairness slot
+        user = user_id or llm_user.get() or 'anonymous'
+        ticket = _Ticket(priority, user, tokens)
+        queue_timeout = self.queue_timeout if timeout is None else max(0.0, min(timeout, self.queue_timeout))
+        deadline = ticket.enqueued + queue_timeout
+        with lane.cond:
+            lane.queues[priority].setdefault(user, deque()).append(ticket)
+            while True:
+                if cancel is not None and cancel.is_set() and not ticket.granted:
+                    lane.remove(ticket)
+                    raise LLMCancelled(f"Call to {model} cancelled while queued")
+                now = time.monotonic()
+                wait = lane.grant(now)
+                if ticket.granted:
+                    return ticket
+                if now >= deadline:
+                    lane.remove(ticket)
+                    lane.stats['timeouts'] += 1
+                    raise LLMQueueTimeout(f"Timed out after {queue_timeout:.0f}s waiting for {model}")
+                lane.cond.wait(timeout=min(wait, deadline - now))
+
+    def wake(self, model: str) -> None:
+        """Wake the callers queued for `model` so cancelled ones can leave the queue"""
+        lane = self.lane(model)
+        with lane.cond:
+            lane.cond.notify_all()
+
+    def release(self, model: str, ticket: _Ticket, used_tokens: Optional[int] = None,
+                throttled: bool = False, retry_delay: Optional[float] = None, attempt: int = 1) -> None:
+        lane = self.lane(model)
+        with lane.cond:
+            lane.in_flight -= 1
+            if used_tokens is not None:
+                lane.stats['tokens_used'] += used_tokens
+                if lane.tokens_per_minute > 0:
+                    # Correct the estimate charged at admission
+                    lane.tokens = min(float(lane.tokens_per_minute), lane.tokens + ticket.tokens - used_tokens)
+            if throttled:
+                lane.stats['throttled'] += 1
+                lane.limit = max(1.0, lane.limit / 2)
+                pause = retry_delay or min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                lane.paused_until = max(lane.paused_until, time.monotonic() + pause)
+                logger.warning(f"{model} throttled; concurrency limit now {lane.limit:.1f}, pausing {pause:.1f}s")
+            else:
+                lane.limit = min(float(lane.max_concurrency), lane.limit + 1.0 / lane.limit)
+            lane.grant(time.monotonic())
+
+    # ------------------------------------------------------------------ calls
+
+    def generate(self, client, model: str, contents: Any, config: Any = None,
+                 priority: Optional[int] = None, user_id: Optional[str] = None, timeout: Optional[float] = None,
+                 cancel: Optional[threading.Event] = None):
+        """
+        `client.models.generate_content` admitted through the model's lane, retried on 429/503.
+
+        `timeout` bounds the total time spent queueing (including retries). Once
+        `cancel` is set the call gives up before its next admission.
+        """
+        tokens = estimate_tokens(contents, self.output_token_estimate)
+        give_up = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = None if give_up is None else give_up - time.monotonic()
+            ticket = self.acquire(model, tokens, priority, user_id, timeout=remaining, cancel=cancel)
+            try:
+                kwargs = {'model': model, 'contents': contents}
+                if config is not None:
+                    kwargs['config'] = config
+                response = client.models.generate_content(**kwargs)
+            except Exception as e:
+                throttled = is_throttled(e)
+                self.release(model, ticket, throttled=throttled, retry_delay=_server_retry_delay(e), attempt=attempt)
+                if not throttled or attempt > self.max_retries:
+                    raise
+                logger.info(f"Retrying throttled {model} call (attempt {attempt + 1})")
+                continue
+            self.release(model, ticket, used_tokens=_usage_tokens(response))
+            return response
+
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            lanes = dict(self._lanes)
+        return {model: lane.snapshot() for model, lane in lanes.items()}
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, 'usage_metadata', None)
+    total = getattr(usage, 'total_token_count', None) if usage is not None else None
+    return total if isinstance(total, int) else None
+
+
+def _model_limits(model: str):
+    if model == settings.GEMINI_MODEL_PRO:
+        return settings.LLM_PRO_MAX_CONCURRENCY, settings.LLM_PRO_TOKENS_PER_MINUTE
+    if model == settings.GEMINI_MODEL_STARTER:
+        return settings.LLM_STARTER_MAX_CONCURRENCY, settings.LLM_STARTER_TOKENS_PER_MINUTE
+    return settings.LLM_DEFAULT_MAX_CONCURRENCY, 0
+
+
+# Singleton instance
+_llm_scheduler: Optional[LLMScheduler] = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get or create the process-wide LLM scheduler"""
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        with _llm_scheduler_lock:
+            if _llm_scheduler is None:
+                _llm_scheduler = LLMScheduler(
+                    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+                    max_retries=settings.LLM_MAX_THROTTLE_RETRIES
+                )
+    return _llm_scheduler
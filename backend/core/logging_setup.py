@@ -0,0 +1,236 @@
+"""
+Logging pipeline: queue-based, structured, sampled
+
+`configure_logging()` (called once by server.py) installs a single
+QueueHandler on the root logger. Request threads only append the LogRecord to
+a bounded in-memory queue; a background QueueListener formats and writes it.
+Message arguments are not merged on the request thread either, so
+`logger.info("Compiled %s bytes", n)` costs almost nothing when the record is
+sampled out or filtered by level. When the queue is full, records below
+WARNING are dropped (and counted) instead of blocking the caller.
+
+Records are written as one JSON object per line (LOG_FORMAT=json, default) with
+the trace and span id of the request (core/tracing.py) and any `extra=` fields,
+or in the previous plain-text layout (LOG_FORMAT=text).
+
+LOG_SAMPLING keeps only a fraction of high-frequency INFO/DEBUG records per
+logger, e.g. "services.pdf_service=0.1,httpx=0.01". Sampling is 1-in-N per
+call site (logger and message template), so a rare message in a noisy logger
+is still seen; WARNING and above are never sampled.
+
+Large blobs (LaTeX source, TeX logs) do not belong in log lines: pass them to
+`spill_artifact()`, which writes them under LOG_ARTIFACT_DIR and returns an
+id to log instead. The directory is pruned to LOG_ARTIFACT_MAX_FILES.
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import math
+import os
+import queue
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from backend.core.config import settings
+from backend.core.tracing import current_span
+
+# LogRecord attributes that are not user-supplied `extra=` fields
+_RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with trace/span ids and `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in N records per (logger, message template) for loggers with a sample rate below 1"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def _rate(self, name: str) -> float:
+        # Most specific configured ancestor wins ("services" covers "services.pdf_service")
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        every = math.ceil(1 / rate)
+        key = (record.name, str(record.msg))
+        with self._lock:
+            seen = self._counts.get(key, 0)
+            self._counts[key] = seen + 1
+            if len(self._counts) > 10000:
+                self._counts.clear()
+        if seen % every:
+            return False
+        record.sampled_1_in = every
+        return True
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds the current request's trace_id/span_id (set on the calling thread, before queueing)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = current_span()
+        if current is not None:
+            record.trace_id = current.trace.trace_id
+            record.span_id = current.span_id
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers message formatting to the listener and never blocks on a full queue"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record (args, exc_info) can be passed as is
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                # Keep problems even under pressure: wait briefly for the listener
+                try:
+                    self.queue.put(record, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_lock = threading.Lock()
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """'a=0.1,b.c=0.5' -> {'a': 0.1, 'b.c': 0.5} (malformed entries are ignored)"""
+    rates = {}
+    for item in spec.split(','):
+        name, _, rate = item.partition('=')
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    rates.pop('', None)
+    return rates
+
+
+def configure_logging(force: bool = False) -> None:
+    """Route the root logger through the queue pipeline (no-op if the host already configured logging)"""
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    with _lock:
+        if _listener is not None or (root.handlers and not force):
+            return
+
+        output = logging.StreamHandler(sys.stdout)
+        if settings.LOG_FORMAT == 'json':
+            output.setFormatter(JSONFormatter())
+        else:
+            output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_MAX_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _queue_handler.addFilter(SamplingFilter(parse_sampling(settings.LOG_SAMPLING)))
+        _queue_handler.addFilter(TraceContextFilter())
+
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(settings.LOG_LEVEL)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def logging_stats() -> Dict:
+    if _queue_handler is None:
+        return {'pipeline': 'direct'}
+    return {
+        'pipeline': 'queue',
+        'queued': _queue_handler.queue.qsize(),
+        'dropped': _queue_handler.dropped,
+    }
+
+
+def spill_artifact(kind: str, content: str, suffix: str = '.txt') -> Optional[str]:
+    """Write a large blob to LOG_ARTIFACT_DIR and return its id (None when disabled or on error)"""
+    if not settings.LOG_ARTIFACT_DIR:
+        return None
+    artifact_id = f"{kind}-{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    directory = Path(settings.LOG_ARTIFACT_DIR)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{artifact_id}{suffix}").write_text(content[:settings.LOG_ARTIFACT_MAX_BYTES], encoding='utf-8')
+        _prune_artifacts(directory)
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"Could not write log artifact {artifact_id}: {e}")
+        return None
+    return artifact_id
+
+
+def _prune_artifacts(directory: Path) -> None:
+    files = list(directory.iterdir())
+    excess = len(files) - settings.LOG_ARTIFACT_MAX_FILES
+    if excess <= 0:
+        return
+    files.sort(key=lambda p: p.stat().st_mtime)
+    for path in files[:excess]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
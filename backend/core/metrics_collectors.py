@@ -0,0 +1,77 @@
+"""
+Scrape-time collectors for GET /metrics
+
+These read state that other components already keep (executor queues, LLM
+lanes, cache hit counters, the log queue) instead of mirroring it into
+registry metrics.
+Registered once by server.py through `register_default_collectors`.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from backend.core.executors import executor_stats
+from backend.core.llm_cache import get_llm_cache
+from backend.core.llm_scheduler import get_llm_scheduler
+from backend.core.logging_setup import logging_stats
+from backend.core.metrics import Collected, MetricsRegistry
+from backend.services.user_cache_service import get_user_cache
+
+
+def collect_queues() -> Iterable[Collected]:
+    queued, active = [], []
+    for pool, stats in executor_stats().items():
+        if stats.get('started'):
+            queued.append(({'pool': pool}, stats['queued']))
+            active.append(({'pool': pool}, stats['active']))
+    yield 'executor_queue_depth', 'gauge', 'Tasks waiting for a worker', queued
+    yield 'executor_active_tasks', 'gauge', 'Tasks running on a worker', active
+
+    lane_queued, in_flight, limits = [], [], []
+    for model, lane in get_llm_scheduler().get_stats().items():
+        for priority, depth in lane['queued'].items():
+            lane_queued.append(({'model': model, 'priority': priority}, depth))
+        in_flight.append(({'model': model}, lane['in_flight']))
+        limits.append(({'model': model}, lane['limit']))
+    yield 'llm_queue_depth', 'gauge', 'Model calls waiting for admission', lane_queued
+    yield 'llm_in_flight', 'gauge', 'Model calls in progress', in_flight
+    yield 'llm_concurrency_limit', 'gauge', 'Current adaptive concurrency limit', limits
+
+
+def _cache_counts(token_cache) -> List[Tuple[str, int, int]]:
+    llm = get_llm_cache().stats
+    user = get_user_cache().stats
+    counts = [
+        ('llm_response', llm['memory_hits'] + llm['disk_hits'] + llm['coalesced'], llm['misses']),
+        ('user_row', user['hits'], user['misses']),
+    ]
+    if token_cache is not None:
+        counts.append(('jwt', token_cache.stats['hits'], token_cache.stats['misses']))
+    return counts
+
+
+def collect_caches(token_cache=None) -> Iterable[Collected]:
+    hits: List[Tuple[Dict, float]] = []
+    misses: List[Tuple[Dict, float]] = []
+    ratios: List[Tuple[Dict, float]] = []
+    for cache, hit, miss in _cache_counts(token_cache):
+        hits.append(({'cache': cache}, hit))
+        misses.append(({'cache': cache}, miss))
+        ratios.append(({'cache': cache}, round(hit / (hit + miss), 4) if hit + miss else 0.0))
+    yield 'cache_hits_total', 'counter', 'Cache lookups served from the cache', hits
+    yield 'cache_misses_total', 'counter', 'Cache lookups that fell through', misses
+    yield 'cache_hit_ratio', 'gauge', 'hits / (hits + misses) since start', ratios
+
+
+def collect_logging() -> Iterable[Collected]:
+    stats = logging_stats()
+    if stats['pipeline'] != 'queue':
+        return
+    yield 'log_queue_depth', 'gauge', 'Log records waiting for the writer thread', [({}, stats['queued'])]
+    yield 'log_records_dropped_total', 'counter', 'Log records dropped on a full queue', [({}, stats['dropped'])]
+
+
+def register_default_collectors(registry: MetricsRegistry, token_cache=None) -> None:
+    """`token_cache` is the auth service's VerifiedTokenCache (JWT verifications)"""
+    registry.register_collector(collect_queues)
+    registry.register_collector(collect_logging)
+    registry.register_collector(lambda: collect_caches(token_cache))
@@ -0,0 +1,214 @@
+"""
+Lazy service providers
+
+server.py used to build every service at import time: a GeminiService (with
+its genai client) for PPT generation, another inside ContentConverterService,
+the Firecrawl and Dodo clients, and so on. Importing those modules pulls in
+google.genai, google.cloud.speech and firecrawl, which dominated cold start.
+
+Each provider below builds its service on first use (importing the module
+only then) and hands the same instance to every later caller. Providers are
+plain callables, so routes can use them directly as FastAPI dependencies
+(`Depends(get_gemini_service)`). `provider_stats()` reports which ones have
+been built and how long each took.
+
+`warmup()` is the optional start-up hook (WARMUP_ENABLED): scheduled by
+server.py once the app has started, it builds the configured providers,
+spawns the compile pool's workers with a tiny pdflatex run each (loading the
+TeX format into the page cache), runs each other installed engine in
+TEX_ENGINE_PREFERENCE once on its own pool (xelatex/lualatex also build
+their font caches on first use) and opens connections to Supabase and Pexels,
+all on executor threads so the server is already accepting requests.
+"""
+
+import asyncio
+import functools
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Generic, Optional, TypeVar
+import logging
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Provider(Generic[T]):
+    """Builds its service once, on first call, and returns the same instance afterwards"""
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        functools.update_wrapper(self, factory)
+        self.name = name
+        self.factory = factory
+        self.init_seconds: Optional[float] = None
+        self._instance: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    def __call__(self) -> T:
+        if self._built:
+            return self._instance
+        with self._lock:
+            if not self._built:
+                started = time.perf_counter()
+                self._instance = self.factory()
+                self.init_seconds = time.perf_counter() - started
+                self._built = True
+                logger.info(f"Initialized {self.name} in {self.init_seconds * 1000:.0f}ms")
+        return self._instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._built
+
+    def reset(self) -> None:
+        with self._lock:
+            self._instance = None
+            self._built = False
+            self.init_seconds = None
+
+
+_providers: Dict[str, Provider] = {}
+
+
+def provider(name: str) -> Callable[[Callable[[], T]], Provider[T]]:
+    """Register `factory` as the lazy provider `name`"""
+    def decorator(factory: Callable[[], T]) -> Provider[T]:
+        instance = Provider(name, factory)
+        _providers[name] = instance
+        return instance
+    return decorator
+
+
+# Services are imported through the same `services.` path the GeminiService
+# stack already uses, so each module is loaded only once.
+
+@provider('gemini')
+def get_gemini_service():
+    from services.gemini_service import GeminiService
+    return GeminiService()
+
+
+@provider('pexels')
+def get_pexels_service():
+    from services.pexels_service import PexelsService
+    return PexelsService()
+
+
+@provider('ppt_generator')
+def get_ppt_generator_service():
+    from services.ppt_generator_service import PPTGeneratorService
+    return PPTGeneratorService(get_gemini_service(), get_pexels_service())
+
+
+@provider('content_converter')
+def get_content_converter_service():
+    from services.content_converter_service import ContentConverterService
+    return ContentConverterService()
+
+
+@provider('resume_optimizer')
+def get_resume_optimizer_service():
+    from services.resume_optimizer_service import ResumeOptimizerService
+    return ResumeOptimizerService()
+
+
+@provider('pdf_extractor')
+def get_pdf_extractor_service():
+    from services.pdf_extractor_service import PDFExtractorService
+    return PDFExtractorService()
+
+
+@provider('payment')
+def get_payment_service():
+    from services.payment_service import PaymentService
+    return PaymentService()
+
+
+@provider('speech')
+def get_speech_service():
+    from services.speech_service import get_speech_service as build
+    return build(settings.GOOGLE_CLOUD_CREDENTIALS_PATH)
+
+
+def provider_stats() -> Dict[str, Dict]:
+    return {
+        name: {
+            'initialized': p.initialized,
+            'init_ms': round(p.init_seconds * 1000, 1) if p.init_seconds is not None else None,
+        }
+        for name, p in _providers.items()
+    }
+
+
+# --- Warmup ---
+
+WARMUP_LATEX = r"""\documentclass{article}
+\begin{document}
+warmup
+\end{document}
+"""
+
+warmup_state: Dict = {'status': 'disabled'}
+
+
+def _warm_compile(engine_name: str = 'pdflatex') -> None:
+    from services.pdf_service import PDFService
+    from backend.services.tex_engine_service import get_engine
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        PDFService._run_tex(WARMUP_LATEX, True, Path(tmpdir), get_engine(engine_name))
+
+
+def _warm_supabase() -> None:
+    from backend.core.deps import get_supabase_admin
+
+    client = get_supabase_admin()
+    if client is not None:
+        client.table("users").select("user_id").limit(1).execute()
+
+
+async def _step(name: str, coro) -> None:
+    started = time.perf_counter()
+    try:
+        await coro
+        warmup_state['steps'][name] = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        warmup_state['steps'][name] = f"failed: {type(e).__name__}: {e}"
+        logger.warning(f"Warmup step '{name}' failed: {e}")
+
+
+async def warmup() -> None:
+    """Build providers, spawn compile workers and open connections without delaying start-up"""
+    from backend.core.executors import run_in_pool
+    from backend.core.http_client import NO_RETRY, get_http_client
+    from backend.services.tex_engine_service import get_tex_engine_service
+
+    warmup_state.update(status='running', steps={})
+    started = time.perf_counter()
+    # Let the server finish binding before competing with it for the GIL
+    await asyncio.sleep(settings.WARMUP_DELAY_SECONDS)
+
+    names = [n.strip() for n in settings.WARMUP_PROVIDERS.split(',') if n.strip()]
+    for name in names:
+        if name not in _providers:
+            logger.warning(f"Unknown provider '{name}' in WARMUP_PROVIDERS")
+            continue
+        await _step(f"provider:{name}", run_in_pool('llm', _providers[name]))
+
+    steps = [_step(f"compile:{i}", run_in_pool('compile', _warm_compile))
+             for i in range(settings.EXECUTOR_COMPILE_WORKERS)]
+    engines = get_tex_engine_service()
+    for engine in engines.preference:
+        if engine.name != 'pdflatex' and engines.installed(engine):
+            steps.append(_step(f"compile:{engine.name}", run_in_pool(engine.pool, _warm_compile, engine.name)))
+    steps.append(_step('supabase', run_in_pool('db', _warm_supabase)))
+    steps.append(_step('pexels', get_http_client().request('HEAD', settings.PEXELS_BASE_URL + '/', retry=NO_RETRY)))
+    await asyncio.gather(*steps)
+
+    warmup_state.update(status='done', total_ms=round((time.perf_counter() - started) * 1000, 1))
+    logger.info(f"Warmup finished in {warmup_state['total_ms']:.0f}ms")
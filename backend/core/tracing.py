@@ -0,0 +1,403 @@
+"""
+Per-request tracing spans
+
+A request handled by server.py opens a root span; code on the request path
+opens child spans with `span(...)` or the `@traced(...)` decorator. The
+current span lives in a contextvar, so children nest correctly across awaits
+and across executor hops (core/executors.py copies the context into the
+worker thread, and `run_in_pool` records each hop as its own span).
+
+Spans that carry a `phase` (gemini, pexels, perplexity, scrape, supabase,
+pdflatex, ...) are summed per phase into the response's `Server-Timing`
+header; nested spans of the same phase are not counted twice. Concurrent
+spans of one phase (parallel image downloads) add up, so a phase can exceed
+the wall-clock total.
+
+Finished traces are handed to a background thread that sends them to the
+configured exporters (TRACE_EXPORTERS):
+
+- jsonl: one JSON object per span appended to TRACE_JSONL_PATH
+- otlp:  OTLP/HTTP JSON POSTed to OTEL_EXPORTER_OTLP_ENDPOINT (/v1/traces)
+
+An incoming W3C `traceparent` header continues the caller's trace. Spans
+opened outside a request (startup, background threads) are not recorded.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Spans kept per trace; later ones are counted in `dropped` but not recorded
+MAX_SPANS_PER_TRACE = 512
+
+
+def _new_id(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+class Trace:
+    """All spans recorded for one request"""
+
+    __slots__ = ('trace_id', 'remote_parent_id', 'sampled', 'spans', 'dropped', 'finished', '_lock')
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None,
+                 sampled: bool = True):
+        self.trace_id = trace_id or _new_id(16)
+        self.remote_parent_id = remote_parent_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            if self.finished:
+                return
+            if len(self.spans) >= MAX_SPANS_PER_TRACE:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+    def server_timing(self) -> Dict[str, float]:
+        """Milliseconds spent per phase, counting only the outermost span of each phase"""
+        with self._lock:
+            spans = list(self.spans)
+        by_id = {s.span_id: s for s in spans}
+        phases: Dict[str, float] = {}
+        for s in spans:
+            if not s.phase or s.duration is None:
+                continue
+            parent = by_id.get(s.parent_id)
+            nested = False
+            while parent is not None:
+                if parent.phase == s.phase:
+                    nested = True
+                    break
+                parent = by_id.get(parent.parent_id)
+            if not nested:
+                phases[s.phase] = phases.get(s.phase, 0.0) + s.duration * 1000
+        return phases
+
+
+class Span:
+    __slots__ = ('name', 'phase', 'trace', 'span_id', 'parent_id', 'kind', 'start_ns', 'duration',
+                 'attributes', 'error', '_started')
+
+    def __init__(self, name: str, trace: Trace, parent_id: Optional[str], phase: Optional[str] = None,
+                 kind: str = 'internal', attributes: Optional[Dict] = None):
+        self.name = name
+        self.phase = phase
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"[:500]
+
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+            self.trace.add(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'phase': self.phase,
+            'kind': self.kind,
+            'start_ns': self.start_ns,
+            'duration_ms': round((self.duration or 0.0) * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('current_span', default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, phase: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+    """Record a child of the current span; yields None (and records nothing) outside a request"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace, parent.span_id, phase=phase,
+                 attributes={k: v for k, v in attributes.items() if v is not None})
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def traced(name: str, phase: Optional[str] = None) -> Callable:
+    """Decorator form of `span` for sync and async functions"""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, phase=phase):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, phase=phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None if malformed"""
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Tuple[Span, contextvars.Token]:
+    """Open the root span of a request; pass the returned token to `finish_trace`"""
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace = Trace(remote[0], remote_parent_id=remote[1], sampled=remote[2])
+    else:
+        trace = Trace(sampled=random.random() < settings.TRACE_SAMPLE_RATE)
+    root = Span(name, trace, trace.remote_parent_id, kind='server', attributes=attributes)
+    return root, _current_span.set(root)
+
+
+def finish_trace(root: Span, token: contextvars.Token) -> None:
+    """End the root span, close the trace and queue it for export if sampled"""
+    _current_span.reset(token)
+    root.end()
+    trace = root.trace
+    with trace._lock:
+        trace.finished = True
+    if trace.sampled:
+        get_trace_exporter().submit(trace)
+
+
+def format_server_timing(root: Span) -> str:
+    """Server-Timing header value: one entry per phase plus the request total"""
+    entries = [f"{phase};dur={ms:.1f}" for phase, ms in sorted(root.trace.server_timing().items())]
+    if root.duration is not None:
+        total = root.duration * 1000
+    else:
+        total = (time.perf_counter() - root._started) * 1000
+    entries.append(f"total;dur={total:.1f}")
+    return ', '.join(entries)
+
+
+class JSONLExporter:
+    """Appends spans to a local file, rotating it to `<path>.1` past `max_bytes`"""
+
+    name = 'jsonl'
+
+    def __init__(self, path: Path, max_bytes: int = 50 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+    def export(self, spans: List[Span]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + '.1'))
+        except FileNotFoundError:
+            pass
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for s in spans:
+                f.write(json.dumps(s.to_dict(), default=str) + '\n')
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPExporter:
+    """OTLP/HTTP JSON exporter (any OpenTelemetry collector accepts this on /v1/traces)"""
+
+    name = 'otlp'
+    KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+    def __init__(self, endpoint: str, service_name: str, headers: Optional[Dict[str, str]] = None):
+        endpoint = endpoint.rstrip('/')
+        self.url = endpoint if endpoint.endswith('/v1/traces') else f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self.headers = headers or {}
+
+    def payload(self, spans: List[Span]) -> Dict:
+        otlp_spans = []
+        for s in spans:
+            attributes = dict(s.attributes)
+            if s.phase:
+                attributes['phase'] = s.phase
+            otlp_span = {
+                'traceId': s.trace.trace_id,
+                'spanId': s.span_id,
+                'name': s.name,
+                'kind': self.KINDS.get(s.kind, 1),
+                'startTimeUnixNano': str(s.start_ns),
+                'endTimeUnixNano': str(s.start_ns + int((s.duration or 0.0) * 1e9)),
+                'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in attributes.items()],
+                'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+            }
+            if s.parent_id:
+                otlp_span['parentSpanId'] = s.parent_id
+            otlp_spans.append(otlp_span)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{'scope': {'name': 'hugpdf.backend'}, 'spans': otlp_spans}],
+        }]}
+
+    def export(self, spans: List[Span]) -> None:
+        from backend.core.http_client import NO_RETRY, get_http_client
+
+        response = get_http_client().request_sync(
+            'POST', self.url, json=self.payload(spans), headers=self.headers, retry=NO_RETRY, timeout=10
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(f"OTLP collector returned {response.status_code}")
+
+
+class TraceExporter:
+    """Background thread that batches finished traces to the exporters; drops traces when its queue is full"""
+
+    def __init__(self, exporters: List, max_queue_size: int = 1000, flush_interval_seconds: float = 2.0):
+        self.exporters = exporters
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {'exported_traces': 0, 'dropped_traces': 0, 'errors': 0}
+
+    def submit(self, trace: Trace) -> None:
+        if not self.exporters:
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.stats['dropped_traces'] += 1
+            return
+        self._ensure_worker()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                traces = [self._queue.get(timeout=self.flush_interval_seconds)]
+            except queue.Empty:
+                continue
+            self.flush(traces)
+
+    def flush(self, traces: Optional[List[Trace]] = None) -> None:
+        """Export `traces` plus everything queued so far"""
+        traces = list(traces or [])
+        while True:
+            try:
+                traces.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        spans = [s for trace in traces for s in trace.spans]
+        if not spans:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Trace exporter '{exporter.name}' failed: {e}")
+        self.stats['exported_traces'] += len(traces)
+
+    def get_stats(self) -> Dict:
+        return {
+            'exporters': [e.name for e in self.exporters],
+            'queued': self._queue.qsize(),
+            **self.stats,
+        }
+
+
+def _configured_exporters() -> List:
+    exporters = []
+    for name in filter(None, (n.strip().lower() for n in settings.TRACE_EXPORTERS.split(','))):
+        if name == 'jsonl':
+            exporters.append(JSONLExporter(settings.TRACE_JSONL_PATH, settings.TRACE_JSONL_MAX_BYTES))
+        elif name == 'otlp':
+            if not settings.OTEL_EXPORTER_OTLP_ENDPOINT:
+                logger.warning("TRACE_EXPORTERS includes 'otlp' but OTEL_EXPORTER_OTLP_ENDPOINT is not set")
+                continue
+            exporters.append(OTLPExporter(settings.OTEL_EXPORTER_OTLP_ENDPOINT, settings.OTEL_SERVICE_NAME))
+        else:
+            logger.warning(f"Unknown trace exporter '{name}' ignored")
+    return exporters
+
+
+# Singleton instance
+_trace_exporter: Optional[TraceExporter] = None
+_trace_exporter_lock = threading.Lock()
+
+
+def get_trace_exporter() -> TraceExporter:
+    """Get or create the process-wide trace exporter"""
+    global _trace_exporter
+    if _trace_exporter is None:
+        with _trace_exporter_lock:
+            if _trace_exporter is None:
+                _trace_exporter = TraceExporter(_configured_exporters())
+    return _trace_exporter
@@ -0,0 +1,621 @@
+"""
+Local stand-ins for the upstream APIs the backend calls
+
+Each fake is a stdlib ThreadingHTTPServer on 127.0.0.1 that speaks just
+enough of the real wire protocol for the production client libraries:
+
+- FakeGemini      google-genai `models/{model}:generateContent` (LaTeX text, or
+                  JSON shaped by the request's responseSchema)
+- FakePexels      /v1/search, /v1/curated and the image URLs they return
+- FakePerplexity  /chat/completions with citations
+- FakeSupabase    PostgREST under /rest/v1 (select/insert/update/upsert/delete,
+                  column and or/and filters, order, limit/offset, single,
+                  count=exact, RPCs) over in-memory tables, plus an empty JWKS
+
+Every fake takes a FaultProfile ("latency=800,jitter=300,dist=lognormal,
+errors=0.02,status=503") that delays each response and fails a fraction of
+them, so capacity can be measured against slow or flaky dependencies offline.
+"""
+
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+Response = Tuple[int, Dict[str, str], bytes]
+Query = List[Tuple[str, str]]
+
+
+@dataclass
+class FaultProfile:
+    """Latency and error distribution applied to every response of a fake"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    distribution: str = 'normal'  # 'fixed', 'normal' or 'lognormal'
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    @classmethod
+    def parse(cls, spec: str) -> 'FaultProfile':
+        """'latency=800,jitter=300,dist=lognormal,errors=0.02,status=503' (all keys optional)"""
+        profile = cls()
+        for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+            key, _, value = item.partition('=')
+            if key == 'latency':
+                profile.latency_ms = float(value)
+            elif key == 'jitter':
+                profile.jitter_ms = float(value)
+            elif key == 'dist':
+                if value not in ('fixed', 'normal', 'lognormal'):
+                    raise ValueError(f"Unknown latency distribution: {value}")
+                profile.distribution = value
+            elif key == 'errors':
+                profile.error_rate = float(value)
+            elif key == 'status':
+                profile.error_status = int(value)
+            else:
+                raise ValueError(f"Unknown fault profile key: {key}")
+        return profile
+
+    def delay_seconds(self, rng: random.Random) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.distribution == 'fixed' or self.jitter_ms <= 0:
+            ms = self.latency_ms
+        elif self.distribution == 'lognormal':
+            # Median latency_ms, with jitter_ms setting the spread of the long tail
+            sigma = math.log1p(self.jitter_ms / self.latency_ms)
+            ms = self.latency_ms * math.exp(rng.gauss(0.0, sigma))
+        else:
+            ms = rng.gauss(self.latency_ms, self.jitter_ms)
+        return max(0.0, ms) / 1000.0
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+class FakeService:
+    """Threaded HTTP server dispatching to `handle()`, with fault injection and request counts"""
+
+    name = 'fake'
+
+    def __init__(self, profile: Optional[FaultProfile] = None, host: str = '127.0.0.1',
+                 port: int = 0, seed: Optional[int] = None):
+        self.profile = profile or FaultProfile()
+        self.host = host
+        self.port = port
+        self.stats: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'FakeService':
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, payload = service._respond(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _respond(self, method: str, raw_path: str, headers, body: bytes) -> Response:
+        self.count('requests')
+        parts = urlsplit(raw_path)
+        with self._lock:
+            delay = self.profile.delay_seconds(self._rng)
+            fail = self.profile.fails(self._rng)
+        if self.exempt(parts.path):
+            delay, fail = 0.0, False
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self.count('injected_errors')
+            return self.error(self.profile.error_status, 'Injected failure')
+        try:
+            return self.handle(method, parts.path, parse_qsl(parts.query, keep_blank_values=True), headers, body)
+        except Exception as e:
+            self.count('handler_errors')
+            return self.error(500, f"{type(e).__name__}: {e}")
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def exempt(self, path: str) -> bool:
+        """Paths served without injected latency or errors"""
+        return False
+
+    def handle(self, method: str, path: str, query: Query, headers, body: bytes) -> Response:
+        """`query` keeps repeated parameters, in order"""
+        raise NotImplementedError
+
+    def error(self, status: int, message: str) -> Response:
+        return json_response(status, {'error': {'code': status, 'message': message}})
+
+
+def json_response(status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return status, {'Content-Type': 'application/json', **(headers or {})}, json.dumps(payload).encode()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def tiny_png(width: int = 64, height: int = 48, rgb: Tuple[int, int, int] = (90, 120, 160)) -> bytes:
+    """A solid-colour PNG, so image downloads and \\includegraphics get a real file"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes(rgb) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+
+# --- Gemini ---
+
+GEMINI_STATUS = {400: 'INVALID_ARGUMENT', 429: 'RESOURCE_EXHAUSTED', 500: 'INTERNAL', 503: 'UNAVAILABLE', 504: 'DEADLINE_EXCEEDED'}
+
+LATEX_PARAGRAPH = (
+    "This paragraph was produced by the local Gemini stand-in. It has enough running text "
+    "to exercise line breaking, hyphenation and page building in pdflatex."
+)
+
+
+def sample_from_schema(schema: Dict, name: str = 'value', depth: int = 0) -> Any:
+    """A deterministic instance of a (Gemini or JSON Schema) response schema"""
+    kind = str(schema.get('type', 'string')).lower()
+    if kind == 'object':
+        return {key: sample_from_schema(sub, key, depth + 1) for key, sub in (schema.get('properties') or {}).items()}
+    if kind == 'array':
+        return [sample_from_schema(schema.get('items') or {}, name, depth + 1) for _ in range(3 if depth < 3 else 1)]
+    if kind in ('integer', 'number'):
+        return 3
+    if kind == 'boolean':
+        return True
+    if schema.get('enum'):
+        return schema['enum'][0]
+    return f"Sample {name.replace('_', ' ')}"
+
+
+class FakeGemini(FakeService):
+    """generateContent for any model: LaTeX for text prompts, schema-shaped JSON for JSON requests"""
+
+    name = 'gemini'
+
+    def __init__(self, *args, sections: int = 4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sections = sections
+
+    def handle(self, method, path, query, headers, body):
+        match = re.fullmatch(r'/[^/]+/models/([^/:]+):generateContent', path)
+        if method != 'POST' or not match:
+            return self.error(404, f"Unknown Gemini route {method} {path}")
+        self.count(f"model:{match.group(1)}")
+        request = json.loads(body or b'{}')
+        prompt = ' '.join(
+            part.get('text', '') for content in request.get('contents', []) for part in content.get('parts', [])
+        )
+        config = request.get('generationConfig') or {}
+        if config.get('responseMimeType') == 'application/json':
+            text = json.dumps(sample_from_schema(config.get('responseSchema') or {'type': 'object'}))
+        else:
+            text = self.latex_document()
+        return json_response(200, {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {
+                'promptTokenCount': estimate_tokens(prompt),
+                'candidatesTokenCount': estimate_tokens(text),
+                'totalTokenCount': estimate_tokens(prompt) + estimate_tokens(text),
+            },
+            'modelVersion': match.group(1),
+        })
+
+    def latex_document(self) -> str:
+        sections = '\n\n'.join(
+            f"\\section{{Section {i}}}\n{LATEX_PARAGRAPH}\n\n\\begin{{itemize}}\n\\item First point\n"
+            f"\\item Second point\n\\end{{itemize}}"
+            for i in range(1, self.sections + 1)
+        )
+        return ("```latex\n\\documentclass{article}\n\\usepackage{amsmath}\n\\title{Load Test Document}\n"
+                f"\\begin{{document}}\n\\maketitle\n\n{sections}\n\n\\end{{document}}\n```")
+
+    def error(self, status, message):
+        return json_response(status, {'error': {'code': status, 'message': message,
+                                                'status': GEMINI_STATUS.get(status, 'UNKNOWN')}})
+
+
+# --- Pexels ---
+
+class FakePexels(FakeService):
+    """Photo search results whose image URLs point back at this server"""
+
+    name = 'pexels'
+    IMAGE = tiny_png()
+
+    def handle(self, method, path, query, headers, body):
+        if path.startswith('/images/'):
+            return 200, {'Content-Type': 'image/png'}, self.IMAGE
+        if path in ('/v1/search', '/v1/curated'):
+            query = dict(query)
+            per_page = min(int(query.get('per_page', 15)), 80)
+            return json_response(200, {
+                'page': int(query.get('page', 1)),
+                'per_page': per_page,
+                'total_results': 1000,
+                'photos': [self.photo(i) for i in range(per_page)],
+            })
+        if path.rstrip('/') in ('', '/v1'):
+            return 200, {}, b''
+        return self.error(404, f"Unknown Pexels route {path}")
+
+    def exempt(self, path):
+        return path.startswith('/images/')
+
+    def photo(self, index: int) -> Dict:
+        image = f"{self.url}/images/{index}.png"
+        return {
+            'id': index, 'width': 64, 'height': 48, 'photographer': 'Load Test',
+            'alt': f"Sample photo {index}",
+            'src': {size: image for size in ('original', 'large2x', 'large', 'medium', 'small', 'portrait', 'landscape', 'tiny')},
+        }
+
+
+# --- Perplexity ---
+
+class FakePerplexity(FakeService):
+    name = 'perplexity'
+
+    def handle(self, method, path, query, headers, body):
+        if method != 'POST' or path != '/chat/completions':
+            return self.error(404, f"Unknown Perplexity route {method} {path}")
+        request = json.loads(body or b'{}')
+        question = (request.get('messages') or [{}])[-1].get('content', '')
+        content = f"Research summary for: {question[:200]}\n\n{LATEX_PARAGRAPH} [1][2]"
+        return json_response(200, {
+            'id': str(uuid.uuid4()),
+            'model': request.get('model', 'sonar'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'citations': ['https://example.org/source-1', 'https://example.org/source-2'],
+            'usage': {'prompt_tokens': estimate_tokens(question), 'completion_tokens': estimate_tokens(content)},
+        })
+
+
+# --- Supabase (PostgREST) ---
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes"""
+    items, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            items.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    if current:
+        items.append(''.join(current))
+    return items
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _coerce(value: str, like: Any) -> Any:
+    """Convert a filter value to the type of the stored column value"""
+    if isinstance(like, bool):
+        return value.lower() == 'true'
+    if isinstance(like, (int, float)):
+        try:
+            return type(like)(float(value)) if isinstance(like, int) else float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _like(pattern: str, value: Any, ignore_case: bool) -> bool:
+    regex = '^' + '.*'.join(re.escape(part) for part in pattern.replace('%', '*').split('*')) + '$'
+    return re.match(regex, str(value), re.IGNORECASE if ignore_case else 0) is not None
+
+
+def _compare(op: str, actual: Any, raw: str) -> bool:
+    if op == 'is':
+        target = {'null': None, 'true': True, 'false': False}.get(raw.lower(), raw)
+        return actual is target if target is None else actual == target
+    if op == 'in':
+        values = [_unquote(v) for v in _split_top_level(raw.strip('()'))]
+        return any(actual == _coerce(v, actual) for v in values)
+    if op in ('like', 'ilike'):
+        return actual is not None and _like(raw, actual, op == 'ilike')
+    if actual is None:
+        return op == 'neq' and raw != 'null'
+    target = _coerce(_unquote(raw), actual)
+    try:
+        return {
+            'eq': lambda: actual == target, 'neq': lambda: actual != target,
+            'gt': lambda: actual > target, 'gte': lambda: actual >= target,
+            'lt': lambda: actual < target, 'lte': lambda: actual <= target,
+        }[op]()
+    except KeyError:
+        raise PostgrestError(400, 'PGRST100', f"Unsupported operator: {op}")
+    except TypeError:
+        return False
+
+
+def _condition(expression: str) -> Callable[[Dict], bool]:
+    """'col.op.value', 'not.col.op.value' (inside or/and), or a nested 'and(...)'/'or(...)'"""
+    for logic in ('and', 'or', 'not.and', 'not.or'):
+        if expression.startswith(logic + '('):
+            inner = [_condition(item) for item in _split_top_level(expression[len(logic) + 1:-1])]
+            combine = all if logic.endswith('and') else any
+            negate = logic.startswith('not.')
+            return lambda row: combine(c(row) for c in inner) != negate
+    column, _, rest = expression.partition('.')
+    return _column_condition(column, rest)
+
+
+def _column_condition(column: str, spec: str) -> Callable[[Dict], bool]:
+    negate = spec.startswith('not.')
+    if negate:
+        spec = spec[4:]
+    op, _, raw = spec.partition('.')
+    return lambda row: _compare(op, row.get(column), raw) != negate
+
+
+class PostgrestStore:
+    """In-memory tables with serial/uuid ids, unique keys and PostgREST query semantics"""
+
+    SERIAL_TABLES = frozenset({'session_messages', 'session_versions'})
+    UNIQUE = {
+        'users': [('user_id',)],
+        'sessions': [('session_id',)],
+        'api_keys': [('key_hash',)],
+        'session_versions': [('session_id', 'version')],
+    }
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict]] = {}
+        self.rpcs: Dict[str, Callable[['PostgrestStore', Dict], Any]] = {
+            'increment_api_key_requests': lambda store, args: store._increment_requests(args['key_id'], 1),
+            'increment_api_key_requests_by': lambda store, args: store._increment_requests(args['key_id'], args['amount']),
+            'apply_api_usage_batch': lambda store, args: store._apply_usage_batch(args['batch_id'], args['key_id'], args['amount']),
+        }
+        self.lock = threading.RLock()
+        self._serial: Counter = Counter()
+
+    def seed(self, table: str, rows: List[Dict]) -> List[Dict]:
+        with self.lock:
+            return [self._insert_one(table, dict(row), upsert_on=None) for row in rows]
+
+    def rows(self, table: str) -> List[Dict]:
+        with self.lock:
+            return [dict(row) for row in self.tables.get(table, [])]
+
+    # Query execution
+
+    def select(self, table: str, query: Query) -> Tuple[List[Dict], int]:
+        with self.lock:
+            matched = [row for row in self.tables.get(table, []) if self._matches(row, query)]
+        params = dict(query)
+        total = len(matched)
+        for column, direction in reversed(self._order(params.get('order', ''))):
+            present = [r for r in matched if r.get(column) is not None]
+            missing = [r for r in matched if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=direction == 'desc')
+            matched = present + missing
+        offset = int(params.get('offset', 0))
+        matched = matched[offset:]
+        if 'limit' in params:
+            matched = matched[:int(params['limit'])]
+        return [self._project(row, params.get('select', '*')) for row in matched], total
+
+    def insert(self, table: str, payload: Any, upsert_on: Optional[Tuple[str, ...]]) -> List[Dict]:
+        rows = payload if isinstance(payload, list) else [payload]
+        with self.lock:
+            return [self._insert_one(table, dict(row), upsert_on) for row in rows]
+
+    def update(self, table: str, query: Query, changes: Dict) -> List[Dict]:
+        with self.lock:
+            updated = []
+            for row in self.tables.get(table, []):
+                if self._matches(row, query):
+                    row.update(changes)
+                    updated.append(dict(row))
+            return updated
+
+    def delete(self, table: str, query: Query) -> List[Dict]:
+        with self.lock:
+            rows = self.tables.get(table, [])
+            deleted = [row for row in rows if self._matches(row, query)]
+            self.tables[table] = [row for row in rows if not self._matches(row, query)]
+            return deleted
+
+    def rpc(self, name: str, args: Dict) -> Any:
+        function = self.rpcs.get(name)
+        if function is None:
+            raise PostgrestError(404, 'PGRST202', f"Could not find the function public.{name}")
+        with self.lock:
+            return function(self, args)
+
+    # Helpers
+
+    def _insert_one(self, table: str, row: Dict, upsert_on: Optional[Tuple[str, ...]]) -> Dict:
+        rows = self.tables.setdefault(table, [])
+        if upsert_on:
+            for existing in rows:
+                if all(existing.get(c) == row.get(c) for c in upsert_on):
+                    existing.update(row)
+                    return dict(existing)
+        if 'id' not in row:
+            if table in self.SERIAL_TABLES:
+                self._serial[table] += 1
+                row['id'] = self._serial[table]
+            else:
+                row['id'] = str(uuid.uuid4())
+        row.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+        for columns in self.UNIQUE.get(table, []) + [('id',)]:
+            if any(all(existing.get(c) == row.get(c) for c in columns) for existing in rows):
+                raise PostgrestError(409, '23505', f'duplicate key value violates unique constraint "{table}_{"_".join(columns)}_key"')
+        rows.append(row)
+        return dict(row)
+
+    def _matches(self, row: Dict, query: Query) -> bool:
+        for key, value in query:
+            if key in ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns'):
+                continue
+            if key in ('or', 'and', 'not.or', 'not.and'):
+                condition = _condition(f"{key}{value}")
+            else:
+                condition = _column_condition(key, value)
+            if not condition(row):
+                return False
+        return True
+
+    @staticmethod
+    def _order(spec: str) -> List[Tuple[str, str]]:
+        order = []
+        for item in filter(None, spec.split(',')):
+            column, _, direction = item.partition('.')
+            order.append((column, 'desc' if direction.startswith('desc') else 'asc'))
+        return order
+
+    @staticmethod
+    def _project(row: Dict, select: str) -> Dict:
+        columns = [c.strip() for c in select.split(',') if c.strip()]
+        if not columns or '*' in columns:
+            return dict(row)
+        return {c: row.get(c) for c in columns}
+
+    def _increment_requests(self, key_id: str, amount: int) -> None:
+        for row in self.tables.get('api_keys', []):
+            if row.get('id') == key_id:
+                row['requests_count'] = row.get('requests_count', 0) + amount
+
+    def _apply_usage_batch(self, batch_id: str, key_id: str, amount: int) -> bool:
+        applied = self.tables.setdefault('api_usage_batches', [])
+        if any(row['batch_id'] == batch_id for row in applied):
+            return False
+        applied.append({'batch_id': batch_id, 'api_key_id': key_id, 'amount': amount})
+        self._increment_requests(key_id, amount)
+        return True
+
+
+class FakeSupabase(FakeService):
+    """PostgREST over a PostgrestStore, plus the auth JWKS endpoint (HS256 tokens need no keys)"""
+
+    name = 'supabase'
+
+    def __init__(self, *args, store: Optional[PostgrestStore] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store or PostgrestStore()
+
+    def exempt(self, path):
+        return path.startswith('/auth/')
+
+    def handle(self, method, path, query, headers, body):
+        if path == '/auth/v1/.well-known/jwks.json':
+            return json_response(200, {'keys': []})
+        if not path.startswith('/rest/v1/'):
+            return self.error(404, f"Unknown Supabase route {path}")
+        target = path[len('/rest/v1/'):].strip('/')
+        params = dict(query)
+        prefer = headers.get('Prefer', '')
+        try:
+            payload = json.loads(body) if body else None
+            if target.startswith('rpc/'):
+                self.count(f"rpc:{target[4:]}")
+                return json_response(200, self.store.rpc(target[4:], payload or {}))
+            self.count(f"{method} {target}")
+            if method in ('GET', 'HEAD'):
+                rows, total = self.store.select(target, query)
+                return self._rows(rows, headers, prefer, total=total, offset=int(params.get('offset', 0)))
+            if method == 'POST':
+                upsert_on = None
+                if 'resolution=merge-duplicates' in prefer:
+                    upsert_on = tuple(c.strip() for c in params.get('on_conflict', 'id').split(','))
+                rows = self.store.insert(target, payload, upsert_on)
+                return self._rows(rows, headers, prefer, status=201)
+            if method == 'PATCH':
+                return self._rows(self.store.update(target, query, payload or {}), headers, prefer)
+            if method == 'DELETE':
+                return self._rows(self.store.delete(target, query), headers, prefer)
+        except PostgrestError as e:
+            return self.postgrest_error(e.status, e.code, str(e))
+        return self.error(405, f"Method {method} not allowed")
+
+    def _rows(self, rows: List[Dict], headers, prefer: str, status: int = 200,
+              total: Optional[int] = None, offset: int = 0) -> Response:
+        extra = {}
+        if rows or total is not None:
+            count = str(total) if 'count=exact' in prefer and total is not None else '*'
+            extra['Content-Range'] = f"{offset}-{offset + max(len(rows), 1) - 1}/{count}" if rows else f"*/{count}"
+        if 'application/vnd.pgrst.object+json' in headers.get('Accept', ''):
+            if len(rows) != 1:
+                return self.postgrest_error(406, 'PGRST116', 'JSON object requested, multiple (or no) rows returned')
+            return json_response(status, rows[0], extra)
+        if status == 201 and 'return=representation' not in prefer:
+            return 201, extra, b''
+        return json_response(status, rows, extra)
+
+    def postgrest_error(self, status: int, code: str, message: str) -> Response:
+        return json_response(status, {'code': code, 'message': message, 'details': None, 'hint': None})
+
+    def error(self, status, message):
+        return self.postgrest_error(status, str(status), message)
@@ -0,0 +1,232 @@
+"""
+Offline End-to-End Load Test
+Runs the real backend against local Gemini, Pexels, Perplexity and Supabase stand-ins
+
+The harness starts the fakes from loadtest/fakes.py, seeds one users row, one
+access token and one API key per virtual user into the fake Supabase, launches
+`uvicorn server:app` with every upstream URL pointed at the fakes, and drives
+the scenarios from loadtest/scenarios.py for --duration seconds. Nothing
+leaves the machine, so capacity can be regression-tested offline.
+
+Reported per endpoint: requests, error rate, throughput and p50/p95/p99
+latency, plus the request counts each fake served (Supabase round trips per
+table, Gemini calls per model, injected failures). PDF endpoints compile with
+the local pdflatex; without it they report 500s.
+
+Usage (from the repository root):
+    python -m backend.loadtest.run [--scenarios editor,api,ppt] [--users 12] [--duration 60]
+        [--workers 1] [--gemini "latency=1500,jitter=800,dist=lognormal,errors=0.01"]
+        [--supabase "latency=20,jitter=5"] [--json report.json]
+
+Fault profiles (--gemini, --pexels, --perplexity, --supabase) take
+latency=<ms>, jitter=<ms>, dist=fixed|normal|lognormal, errors=<fraction>
+and status=<http status for injected errors>.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import jwt
+
+from backend.loadtest.fakes import (
+    FakeGemini, FakePerplexity, FakePexels, FakeService, FakeSupabase, FaultProfile, PostgrestStore
+)
+from backend.loadtest.scenarios import SCENARIOS, VirtualUser, run_load
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_PROFILES = {
+    'gemini': 'latency=1500,jitter=800,dist=lognormal',
+    'pexels': 'latency=120,jitter=40',
+    'perplexity': 'latency=2500,jitter=1000,dist=lognormal',
+    'supabase': 'latency=20,jitter=5',
+}
+
+PLENTY = 10 ** 9
+
+
+def seed_users(store: PostgrestStore, count: int, jwt_secret: str) -> List[VirtualUser]:
+    """users rows with effectively unlimited credits, plus a token and an enterprise API key each"""
+    users = []
+    for index in range(count):
+        user_id = str(uuid.uuid4())
+        store.seed('users', [{
+            'user_id': user_id,
+            'email': f'loadtest-{index}@example.com',
+            'plan': 'pro',
+            'credits': PLENTY,
+            'research_credits': PLENTY,
+            'diagram_credits': PLENTY,
+            'ebook_credits': PLENTY,
+            'pdf_downloads': 0,
+            'credits_reset_date': '2999-01-01T00:00:00',
+        }])
+        api_key = f"pdf_live_{secrets.token_urlsafe(32)}"
+        store.seed('api_keys', [{
+            'user_id': user_id,
+            'name': 'load test',
+            'key_hash': hashlib.sha256(api_key.encode()).hexdigest(),
+            'key_prefix': api_key[:17] + '...',
+            'tier': 'enterprise',
+            'is_active': True,
+            'requests_count': 0,
+            'requests_limit': PLENTY,
+        }])
+        token = jwt.encode(
+            {'sub': user_id, 'email': f'loadtest-{index}@example.com', 'role': 'authenticated',
+             'exp': int(time.time()) + 86400},
+            jwt_secret, algorithm='HS256'
+        )
+        users.append(VirtualUser(index=index, user_id=user_id, token=token, api_key=api_key))
+    return users
+
+
+def backend_env(fakes: Dict[str, FakeService], jwt_secret: str, workdir: Path) -> Dict[str, str]:
+    """Environment that points every upstream integration at the fakes"""
+    service_key = jwt.encode({'role': 'service_role'}, jwt_secret, algorithm='HS256')
+    anon_key = jwt.encode({'role': 'anon'}, jwt_secret, algorithm='HS256')
+    env = dict(os.environ)
+    env.update({
+        'GEMINI_API_KEY': 'loadtest',
+        'GEMINI_BASE_URL': fakes['gemini'].url,
+        'PEXELS_API_KEY': 'loadtest',
+        'PEXELS_BASE_URL': f"{fakes['pexels'].url}/v1",
+        'PERPLEXITY_API_KEY': 'loadtest',
+        'PERPLEXITY_BASE_URL': fakes['perplexity'].url,
+        'SUPABASE_URL': fakes['supabase'].url,
+        'SUPABASE_KEY': anon_key,
+        'SUPABASE_SERVICE_ROLE_KEY': service_key,
+        'SUPABASE_JWT_SECRET': jwt_secret,
+        'SUPABASE_JWT_SECRET_ENCODING': 'raw',
+        'NO_PROXY': '127.0.0.1,localhost',
+        'LLM_CACHE_DIR': '',
+        'USAGE_SPILL_PATH': str(workdir / 'usage_spill.jsonl'),
+        'LOG_ARTIFACT_DIR': str(workdir / 'log_artifacts'),
+        'RATE_LIMIT_SQLITE_PATH': str(workdir / 'rate_limits.sqlite3'),
+        'TRACE_EXPORTERS': '',
+    })
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(env: Dict[str, str], port: int, workers: int, log_path: Path) -> subprocess.Popen:
+    log = open(log_path, 'wb')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 90.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with status {process.returncode} before becoming ready")
+        try:
+            if httpx.get(f"{base_url}/api/", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Backend not ready after {timeout:.0f}s")
+
+
+def print_report(result: Dict) -> None:
+    print(f"\n{'endpoint':30s} {'reqs':>6s} {'err%':>6s} {'ok/s':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  statuses")
+    for label, row in result['endpoints'].items():
+        print(f"{label:30s} {row['requests']:6d} {row['error_rate'] * 100:6.1f} {row['throughput_rps']:7.2f} "
+              f"{row['p50_ms']:8.0f} {row['p95_ms']:8.0f} {row['p99_ms']:8.0f}  {row['statuses']}")
+    print(f"\niterations: {result['iterations']} in {result['elapsed_seconds']:.1f}s")
+    for name, stats in result['upstream'].items():
+        print(f"{name}: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='editor,api,ppt', help=f"Comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--users', type=int, default=12, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds of load after ramp-up starts")
+    parser.add_argument('--ramp-up', type=float, default=5, help="Seconds over which users start")
+    parser.add_argument('--burst', type=int, default=5, help="Concurrent calls per 'api' iteration")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the fakes' latency/error draws")
+    for name, default in DEFAULT_PROFILES.items():
+        parser.add_argument(f'--{name}', default=default, help=f"Fault profile (default: {default})")
+    parser.add_argument('--json', type=Path, default=None, help="Write the report to this file")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fakes: Dict[str, FakeService] = {
+        'gemini': FakeGemini(FaultProfile.parse(args.gemini), seed=args.seed),
+        'pexels': FakePexels(FaultProfile.parse(args.pexels), seed=args.seed),
+        'perplexity': FakePerplexity(FaultProfile.parse(args.perplexity), seed=args.seed),
+        'supabase': FakeSupabase(FaultProfile.parse(args.supabase), seed=args.seed),
+    }
+    for fake in fakes.values():
+        fake.start()
+
+    jwt_secret = secrets.token_urlsafe(32)
+    users = seed_users(fakes['supabase'].store, args.users, jwt_secret)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory(prefix='hugpdf-loadtest-') as tmp:
+        workdir = Path(tmp)
+        log_path = workdir / 'backend.log'
+        process = start_backend(backend_env(fakes, jwt_secret, workdir), port, args.workers, log_path)
+        try:
+            wait_ready(base_url, process)
+            print(f"backend ready on {base_url}; {args.users} users, scenarios {scenarios}, {args.duration:.0f}s")
+            result = asyncio.run(run_load(
+                base_url, users, scenarios, args.duration, ramp_up=args.ramp_up, burst=args.burst
+            ))
+        except Exception:
+            sys.stderr.write(log_path.read_text(errors='replace')[-4000:])
+            raise
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            for fake in fakes.values():
+                fake.stop()
+
+    result['upstream'] = {name: dict(fake.stats) for name, fake in fakes.items()}
+    result['settings'] = {
+        'users': args.users, 'scenarios': scenarios, 'duration': args.duration, 'ramp_up': args.ramp_up,
+        'burst': args.burst, 'workers': args.workers,
+        'profiles': {name: getattr(args, name) for name in DEFAULT_PROFILES},
+    }
+    print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2), encoding='utf-8')
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
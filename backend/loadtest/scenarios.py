@@ -0,0 +1,160 @@
+"""
+Load-test scenarios and the per-endpoint recorder
+
+A scenario is one iteration of a virtual user against the running backend:
+
+- editor  generate-initial -> preview-pdf -> chat -> download-pdf (JWT user)
+- api     a burst of concurrent POST /api/v1/generate calls (API key)
+- ppt     POST /api/generate-ppt from a topic (JWT user)
+
+Prompts carry a unique suffix so the LLM response cache never short-circuits
+the Gemini call. Every request is recorded under its endpoint label with its
+latency and status; transport failures are recorded as "error:<Exception>".
+"""
+
+import asyncio
+import itertools
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+
+@dataclass
+class VirtualUser:
+    index: int
+    user_id: str
+    token: str    # Supabase-style HS256 access token
+    api_key: str  # plaintext developer API key
+
+    @property
+    def auth(self) -> Dict[str, str]:
+        return {'Authorization': f'Bearer {self.token}'}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """Latencies and status counts per endpoint label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self._ids = itertools.count(1)
+
+    def unique(self) -> int:
+        return next(self._ids)
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str,
+                   **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.statuses[label][f"error:{type(e).__name__}"] += 1
+            self.latencies[label].append(time.perf_counter() - started)
+            return None
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][str(response.status_code)] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        rows = {}
+        for label in sorted(self.latencies):
+            latencies = self.latencies[label]
+            ok = sum(n for status, n in self.statuses[label].items() if status.startswith('2'))
+            rows[label] = {
+                'requests': len(latencies),
+                'ok': ok,
+                'error_rate': round(1 - ok / len(latencies), 4) if latencies else 0.0,
+                'throughput_rps': round(ok / elapsed, 3) if elapsed else None,
+                'p50_ms': _ms(percentile(latencies, 0.50)),
+                'p95_ms': _ms(percentile(latencies, 0.95)),
+                'p99_ms': _ms(percentile(latencies, 0.99)),
+                'max_ms': _ms(max(latencies) if latencies else None),
+                'statuses': dict(self.statuses[label]),
+            }
+        return rows
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+async def editor_session(client: httpx.AsyncClient, user: VirtualUser, recorder: Recorder, **_) -> None:
+    n = recorder.unique()
+    generated = await recorder.call(client, 'POST /api/generate-initial', 'POST', '/api/generate-initial',
+                                    headers=user.auth, json={'prompt': f'Quarterly report #{n}', 'mode': 'normal'})
+    if generated is None or generated.status_code != 200:
+        return
+    document = generated.json()
+    await recorder.call(client, 'POST /api/preview-pdf', 'POST', '/api/preview-pdf',
+                        json={'latex_content': document['latex_content']})
+    chatted = await recorder.call(client, 'POST /api/chat', 'POST', '/api/chat', headers=user.auth, json={
+        'session_id': document['session_id'],
+        'message': f'Add a summary section #{n}',
+        'current_html': document['html_content'],
+        'current_latex': document['latex_content'],
+    })
+    latex = chatted.json()['latex_content'] if chatted is not None and chatted.status_code == 200 else document['latex_content']
+    await recorder.call(client, 'POST /api/download-pdf', 'POST', '/api/download-pdf',
+                        headers=user.auth, json={'latex_content': latex})
+
+
+async def api_burst(client: httpx.AsyncClient, user: VirtualUser, recorder: Recorder, burst: int = 5, **_) -> None:
+    headers = {'Authorization': f'Bearer {user.api_key}'}
+    await asyncio.gather(*(
+        recorder.call(client, 'POST /api/v1/generate', 'POST', '/api/v1/generate', headers=headers,
+                      json={'prompt': f'Invoice for order #{recorder.unique()}'})
+        for _ in range(burst)
+    ))
+
+
+async def ppt_generation(client: httpx.AsyncClient, user: VirtualUser, recorder: Recorder, **_) -> None:
+    await recorder.call(client, 'POST /api/generate-ppt', 'POST', '/api/generate-ppt', headers=user.auth, json={
+        'topic': f'Product roadmap #{recorder.unique()}', 'num_slides': 6, 'style': 'minimal',
+    })
+
+
+Scenario = Callable[..., Awaitable[None]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    'editor': editor_session,
+    'api': api_burst,
+    'ppt': ppt_generation,
+}
+
+
+async def run_load(base_url: str, users: List[VirtualUser], scenarios: List[str], duration: float,
+                   ramp_up: float = 0.0, timeout: float = 300.0, **options) -> Dict:
+    """Run each virtual user's scenario in a loop for `duration` seconds; user i runs scenarios[i % len]"""
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    iterations: Counter = Counter()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=len(users) * 8)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def virtual_user(user: VirtualUser) -> None:
+            name = scenarios[user.index % len(scenarios)]
+            if ramp_up:
+                await asyncio.sleep(ramp_up * user.index / len(users))
+            while time.perf_counter() < deadline:
+                await SCENARIOS[name](client, user, recorder, **options)
+                iterations[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(user) for user in users))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'iterations': dict(iterations),
+        'endpoints': recorder.report(elapsed),
+    }
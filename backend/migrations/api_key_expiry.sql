@@ -0,0 +1,7 @@
+-- Migration: Optional expiry for API keys
+-- Run this in your Supabase SQL Editor
+--
+-- NULL means the key never expires. The backend rejects a key once expires_at
+-- has passed, including keys it already holds in its validation cache.
+
+ALTER TABLE public.api_keys ADD COLUMN IF NOT EXISTS expires_at timestamp with time zone;
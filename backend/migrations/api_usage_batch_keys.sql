@@ -0,0 +1,34 @@
+-- Migration: Idempotent API usage counter batches
+-- Run this in your Supabase SQL Editor (after api_usage_batching.sql)
+--
+-- Every batch the backend flushes carries a batch_id. A batch whose write failed
+-- (or timed out after the database applied it) is spilled to disk with the same
+-- id and replayed later; the id is recorded here so the replay is counted once.
+-- Rows older than the spill retention can be deleted at any time.
+
+CREATE TABLE IF NOT EXISTS public.api_usage_batches (
+  batch_id uuid PRIMARY KEY,
+  api_key_id uuid NOT NULL,
+  amount integer NOT NULL,
+  applied_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION apply_api_usage_batch(batch_id uuid, key_id uuid, amount integer)
+RETURNS boolean AS $$
+BEGIN
+  INSERT INTO public.api_usage_batches (batch_id, api_key_id, amount)
+  VALUES (apply_api_usage_batch.batch_id, key_id, amount)
+  ON CONFLICT DO NOTHING;
+  IF NOT FOUND THEN
+    RETURN false;  -- already applied by an earlier attempt
+  END IF;
+  UPDATE public.api_keys
+  SET requests_count = requests_count + amount
+  WHERE id = key_id;
+  RETURN true;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Service role only, like increment_api_key_requests_by
+REVOKE EXECUTE ON FUNCTION apply_api_usage_batch(uuid, uuid, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_api_usage_batch(uuid, uuid, integer) TO service_role;
@@ -0,0 +1,21 @@
+-- Migration: Batched API usage counters
+-- Run this in your Supabase SQL Editor
+--
+-- The backend buffers API usage events and flushes them every few seconds.
+-- One call per API key per flush replaces one increment_api_key_requests call per request.
+
+CREATE OR REPLACE FUNCTION increment_api_key_requests_by(key_id uuid, amount integer)
+RETURNS void AS $$
+BEGIN
+  UPDATE public.api_keys
+  SET requests_count = requests_count + amount
+  WHERE id = key_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Service role only: any client could otherwise push a key past its request limit
+REVOKE EXECUTE ON FUNCTION increment_api_key_requests_by(uuid, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION increment_api_key_requests_by(uuid, integer) TO service_role;
+
+-- Bulk inserts and time-range analytics on api_usage
+CREATE INDEX IF NOT EXISTS api_usage_created_at_idx ON public.api_usage (created_at);
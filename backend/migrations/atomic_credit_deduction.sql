@@ -0,0 +1,29 @@
+-- Migration: Atomic credit deduction
+-- Run this in your Supabase SQL Editor
+--
+-- Credits used to be deducted by writing back a balance read earlier (possibly from a
+-- per-process cache), so concurrent requests could spend the same credit. This function
+-- decrements in a single UPDATE and returns the new balance, or NULL when none was left.
+
+CREATE OR REPLACE FUNCTION deduct_user_credit(p_user_id uuid, p_field text)
+RETURNS integer AS $$
+DECLARE
+  remaining integer;
+BEGIN
+  IF p_field NOT IN ('credits', 'research_credits', 'diagram_credits', 'ebook_credits') THEN
+    RAISE EXCEPTION 'Unknown credit field: %', p_field;
+  END IF;
+
+  EXECUTE format(
+    'UPDATE public.users SET %1$I = %1$I - 1, updated_at = now() '
+    'WHERE user_id = $1 AND %1$I > 0 RETURNING %1$I',
+    p_field
+  ) INTO remaining USING p_user_id;
+
+  RETURN remaining;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Service role only: PostgREST would otherwise let any client spend another user's credits
+REVOKE EXECUTE ON FUNCTION deduct_user_credit(uuid, text) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION deduct_user_credit(uuid, text) TO service_role;
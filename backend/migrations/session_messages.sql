@@ -0,0 +1,29 @@
+-- Migration: Append-only session messages
+-- Run this in your Supabase SQL Editor
+--
+-- Chat turns insert rows here instead of rewriting sessions.messages (JSONB).
+-- Existing sessions keep their old history in sessions.messages; the backend
+-- returns it ahead of the rows below, so no data copy is required.
+
+CREATE TABLE IF NOT EXISTS public.session_messages (
+    id BIGSERIAL PRIMARY KEY,
+    -- Must match the type of sessions.session_id
+    session_id UUID NOT NULL REFERENCES public.sessions(session_id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('user', 'assistant', 'system')),
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Keyset pagination: WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+CREATE INDEX IF NOT EXISTS session_messages_session_id_id_idx
+    ON public.session_messages (session_id, id DESC);
+
+ALTER TABLE public.session_messages ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own session messages"
+    ON public.session_messages FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- New sessions no longer write the JSONB array
+ALTER TABLE public.sessions ALTER COLUMN messages SET DEFAULT '[]'::jsonb;
@@ -0,0 +1,28 @@
+-- Migration: Versioned session LaTeX
+-- Run this in your Supabase SQL Editor
+--
+-- sessions.current_latex becomes version 0 and is no longer rewritten on each
+-- chat turn. Later versions are stored here: every Nth version (10 by default,
+-- DOCUMENT_SNAPSHOT_INTERVAL) is a full snapshot, the others are line deltas
+-- against the previous version. payload is zlib-compressed, Base64-encoded.
+
+CREATE TABLE IF NOT EXISTS public.session_versions (
+    id BIGSERIAL PRIMARY KEY,
+    -- Must match the type of sessions.session_id
+    session_id UUID NOT NULL REFERENCES public.sessions(session_id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    version INTEGER NOT NULL CHECK (version > 0),
+    kind TEXT NOT NULL CHECK (kind IN ('snapshot', 'delta')),
+    payload TEXT NOT NULL,
+    -- Uncompressed length of the document at this version
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- Concurrent writers race on this constraint; the loser reloads and retries
+    UNIQUE (session_id, version)
+);
+
+ALTER TABLE public.session_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own session versions"
+    ON public.session_versions FOR SELECT
+    USING (auth.uid() = user_id);
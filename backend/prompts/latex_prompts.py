@@ -115,3 +115,20 @@ Return COMPLETE LaTeX code with your edit.
 
 REMEMBER: EDIT, DON'T REGENERATE!
 """
+
+LATEX_REPAIR_PROMPT = """
+pdflatex failed on the excerpt below (lines {start} to {end} of a larger LaTeX document).
+
+ERROR (line {line}):
+{error}
+
+EXCERPT:
+{excerpt}
+
+YOUR TASK:
+1. Fix the error by editing ONLY these lines
+2. Do not add a preamble, \\documentclass or new packages
+3. Keep everything that is not broken EXACTLY the same
+
+Return ONLY the corrected lines {start} to {end}, without line numbers, markdown or explanations.
+"""
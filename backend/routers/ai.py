@@ -1,51 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from pydantic import BaseModel
 from backend.schemas.ai import (
     GenerateInitialRequest, GenerateInitialResponse,
     ChatRequest, ChatResponse,
     GeneratePPTRequest, GeneratePPTResponse
 )
-from services.gemini_service import GeminiService
-from services.ppt_generator_service import PPTGeneratorService
 from services.auth_service import AuthService
 from services.credit_service import CreditService
+from backend.services.session_service import get_session_service
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 from backend.core.deps import get_current_user
+from backend.core.executors import run_in_pool
+from backend.core.llm_resilience import DeadlineExceeded
+# Shared, lazily built services (core/providers.py)
+from backend.core.providers import get_gemini_service
 
-# Dependencies (can be moved to a deps.py later)
-def get_gemini_service():
-    return GeminiService()
-
-def get_ppt_service():
-    from services.pexels_service import PexelsService
-    return PPTGeneratorService(get_gemini_service(), PexelsService())
+if TYPE_CHECKING:
+    from services.gemini_service import GeminiService
 
 
 @router.post("/generate-initial", response_model=GenerateInitialResponse)
 async def generate_initial(
     request: GenerateInitialRequest,
     current_user: Optional[dict] = Depends(get_current_user),
-    gemini_service: GeminiService = Depends(get_gemini_service)
+    gemini_service: "GeminiService" = Depends(get_gemini_service)
 ):
     try:
         # Check credits if user is logged in
         if current_user:
             from backend.core.deps import get_supabase_admin
             credit_service = CreditService(get_supabase_admin())
-            has_credit, msg = credit_service.check_credit_available(current_user['user_id'], 'pdf')
+            has_credit, msg = await run_in_pool(
+                'db', credit_service.check_credit_available, current_user['user_id'], 'pdf', user=current_user
+            )
             if not has_credit:
                 raise HTTPException(status_code=402, detail=msg)
             
         # Use 'plan' field (not 'tier') from users table; map free→starter for model selection
         user_plan = current_user.get('plan', 'starter') if current_user else 'starter'
         tier = 'pro' if user_plan in ('pro', 'power') else 'starter'
-        result = gemini_service.generate_html_from_prompt(
-            request.prompt, 
+        result = await run_in_pool(
+            'llm',
+            gemini_service.generate_html_from_prompt,
+            request.prompt,
             mode=request.mode, 
             tier=tier
         )
@@ -54,11 +56,13 @@ async def generate_initial(
         if current_user:
             from backend.core.deps import get_supabase_admin
             credit_service = CreditService(get_supabase_admin())
-            credit_service.deduct_credit(current_user['user_id'], 'pdf', f"Generated {request.mode} document")
+            await run_in_pool(
+                'db', credit_service.deduct_credit,
+                current_user['user_id'], 'pdf', f"Generated {request.mode} document", user=current_user
+            )
         
         # --- Persist session to Supabase ---
         import uuid
-        from datetime import datetime, timezone
         session_id = str(uuid.uuid4())
         title = (request.prompt[:60] + '…') if len(request.prompt) > 60 else request.prompt
         initial_messages = [
@@ -69,16 +73,16 @@ async def generate_initial(
         if current_user:
             try:
                 from backend.core.deps import get_supabase_admin
-                supabase = get_supabase_admin()
-                supabase.table('sessions').insert({
-                    'session_id': session_id,
-                    'user_id': current_user['user_id'],
-                    'title': title,
-                    'messages': initial_messages,
-                    'current_latex': result.get('latex', ''),
-                    'mode': request.mode or 'normal',
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                }).execute()
+                await run_in_pool(
+                    'db',
+                    get_session_service(get_supabase_admin()).create_session,
+                    session_id,
+                    current_user['user_id'],
+                    title,
+                    request.mode or 'normal',
+                    result.get('latex', ''),
+                    initial_messages
+                )
                 logger.info(f"Session {session_id} saved for user {current_user['user_id']}")
             except Exception as db_err:
                 logger.warning(f"Failed to save session to DB (non-fatal): {db_err}")
@@ -88,10 +92,12 @@ async def generate_initial(
             html_content=result['html'],
             latex_content=result['latex'],
             message=result['message'],
-            credits_remaining=10 # fetch actual
+            credits_remaining=current_user.get('credits') if current_user else None
         )
     except HTTPException:
         raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.exception(f"Error in generate_initial: {type(e).__name__}: {e}")
         raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
@@ -101,10 +107,12 @@ async def generate_initial(
 async def chat(
     request: ChatRequest,
     current_user: Optional[dict] = Depends(get_current_user),
-    gemini_service: GeminiService = Depends(get_gemini_service)
+    gemini_service: "GeminiService" = Depends(get_gemini_service)
 ):
     try:
-        result = gemini_service.modify_html(
+        result = await run_in_pool(
+            'llm',
+            gemini_service.modify_html,
             request.current_html,
             request.message,
             current_latex=request.current_latex if hasattr(request, 'current_latex') else None,
@@ -112,20 +120,23 @@ async def chat(
         )
 
         # --- Update session in Supabase ---
+        # Insert-only: the turn's messages are appended, the session row only gets the new LaTeX
         if current_user and request.session_id and request.session_id != 'new_session':
             try:
                 from backend.core.deps import get_supabase_admin
-                supabase = get_supabase_admin()
-                existing = supabase.table('sessions').select('messages').eq('session_id', request.session_id).execute()
-                prev_messages = existing.data[0]['messages'] if existing.data else []
-                updated_messages = prev_messages + [
-                    {"role": "user", "content": request.message},
-                    {"role": "assistant", "content": result['message']}
-                ]
-                supabase.table('sessions').update({
-                    'messages': updated_messages,
-                    'current_latex': result.get('latex', ''),
-                }).eq('session_id', request.session_id).execute()
+                saved = await run_in_pool(
+                    'db',
+                    get_session_service(get_supabase_admin()).append_turn,
+                    request.session_id,
+                    current_user['user_id'],
+                    [
+                        {"role": "user", "content": request.message},
+                        {"role": "assistant", "content": result['message']}
+                    ],
+                    current_latex=result.get('latex', '')
+                )
+                if not saved:
+                    logger.warning(f"Session {request.session_id} not found for user {current_user['user_id']}")
             except Exception as db_err:
                 logger.warning(f"Failed to update session {request.session_id} (non-fatal): {db_err}")
 
@@ -134,6 +145,8 @@ async def chat(
             latex_content=result['latex'],
             message=result['message']
         )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -153,13 +166,15 @@ class ModifyLatexResponse(BaseModel):
 async def modify_latex(
     request: ModifyLatexRequest,
     current_user: Optional[dict] = Depends(get_current_user),
-    gemini_service: GeminiService = Depends(get_gemini_service)
+    gemini_service: "GeminiService" = Depends(get_gemini_service)
 ):
     try:
         if request.mode in ['research', 'ebook'] and not current_user:
             raise HTTPException(status_code=401, detail="Authentication required")
 
-        result_latex = gemini_service.modify_latex(
+        result_latex = await run_in_pool(
+            'llm',
+            gemini_service.modify_latex,
             request.current_latex,
             request.modification,
             mode=request.mode
@@ -170,5 +185,7 @@ async def modify_latex(
             html_content=result_latex,
             message="Content updated successfully"
         )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -3,7 +3,9 @@ from backend.schemas.ai import ConvertToPDFRequest, DownloadPDFRequest
 from services.pdf_service import PDFService
 from typing import Optional
 from backend.core.deps import get_current_user, get_supabase_admin
+from backend.core.executors import run_in_pool
 from services.credit_service import CreditService
+from backend.services.latex_preflight_service import LatexPreflightError
 import logging
 
 router = APIRouter()
@@ -30,6 +32,9 @@ async def preview_pdf(request: DownloadPDFRequest):
                 "Cache-Control": "no-cache"
             }
         )
+    except LatexPreflightError as e:
+        # The document cannot compile: report where, without having run pdflatex
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Error in preview_pdf: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -43,7 +48,9 @@ async def download_pdf(
         # Check credits if user is logged in
         if current_user:
             credit_service = CreditService(get_supabase_admin())
-            has_credit, msg = credit_service.check_credit_available(current_user['user_id'], 'pdf')
+            has_credit, msg = await run_in_pool(
+                'db', credit_service.check_credit_available, current_user['user_id'], 'pdf', user=current_user
+            )
             if not has_credit:
                 raise HTTPException(status_code=402, detail=msg)
 
@@ -59,7 +66,10 @@ async def download_pdf(
         # Deduct credits after successful generation
         if current_user:
             credit_service = CreditService(get_supabase_admin())
-            credit_service.deduct_credit(current_user['user_id'], 'pdf', "Downloaded PDF document")
+            await run_in_pool(
+                'db', credit_service.deduct_credit,
+                current_user['user_id'], 'pdf', "Downloaded PDF document", user=current_user
+            )
 
         return Response(
             content=pdf_bytes,
@@ -70,6 +80,8 @@ async def download_pdf(
         )
     except HTTPException:
         raise
+    except LatexPreflightError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"PDF Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,219 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+from typing import Optional
+import logging
+
+from backend.core.deps import get_current_user, get_supabase_admin
+from backend.core.executors import run_in_pool
+from backend.services.session_service import get_session_service
+from backend.services.document_version_service import get_document_version_service
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Sessions API — Dashboard: list & resume past PDFs
+# ============================================================================
+
+@router.get("/sessions")
+async def list_sessions(
+    limit: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Return the user's sessions, newest first.
+
+    `cursor` is the `next_cursor` of the previous page; `fields` is a comma-separated
+    subset of session_id, title, mode, created_at. Responses carry an ETag and an
+    unchanged page is answered with 304.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        page = await run_in_pool(
+            'db',
+            get_session_service(get_supabase_admin()).list_sessions,
+            current_user["user_id"],
+            limit=limit,
+            cursor=cursor,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing sessions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": page["etag"], "Cache-Control": "private, no-cache"}
+    if if_none_match and page["etag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(
+        {"sessions": page["sessions"], "next_cursor": page["next_cursor"]},
+        headers=headers
+    )
+
+
+@router.get("/sessions/{session_id}")
+async def get_session(
+    session_id: str,
+    messages_limit: Optional[int] = Query(None, ge=1, le=500),
+    messages_before: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Return session data (messages, latex, mode) for resuming in the editor.
+
+    Without `messages_limit` the full history is returned. With it, only the newest
+    messages are included and `messages_cursor` can be passed back as
+    `messages_before` (or to /sessions/{id}/messages) to load older ones.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        session_service = get_session_service(get_supabase_admin())
+        session = await run_in_pool('db', session_service.get_session, session_id, current_user["user_id"])
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        page = await run_in_pool(
+            'db', session_service.get_messages, session_id, limit=messages_limit, before=messages_before
+        )
+        return {**session, "messages": page["messages"], "messages_cursor": page["next_cursor"]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/sessions/{session_id}/messages")
+async def get_session_messages(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Page backwards through a session's messages (newest first, keyset on message id)."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        session_service = get_session_service(get_supabase_admin())
+        if not await run_in_pool('db', session_service.get_session, session_id, current_user["user_id"]):
+            raise HTTPException(status_code=404, detail="Session not found")
+        return await run_in_pool('db', session_service.get_messages, session_id, limit=limit, before=before)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching messages for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str, current_user: dict = Depends(get_current_user)):
+    """Delete a session owned by the authenticated user."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        await run_in_pool(
+            'db', get_session_service(get_supabase_admin()).delete_session, session_id, current_user["user_id"]
+        )
+        return {"success": True}
+    except Exception as e:
+        logger.error(f"Error deleting session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================================================
+# Document versions — history, diff and restore (undo/redo)
+# ============================================================================
+
+@router.get("/sessions/{session_id}/versions")
+async def list_session_versions(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """List LaTeX versions of a session, newest first."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        supabase = get_supabase_admin()
+        if not await run_in_pool('db', get_session_service(supabase).get_session, session_id, current_user["user_id"]):
+            raise HTTPException(status_code=404, detail="Session not found")
+        versions = await run_in_pool(
+            'db', get_document_version_service(supabase).list_versions, session_id, limit=limit, before=before
+        )
+        return {"versions": versions, "next_cursor": versions[-1]["version"] if len(versions) == limit else None}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing versions for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/sessions/{session_id}/versions/{version}")
+async def get_session_version(session_id: str, version: int, current_user: dict = Depends(get_current_user)):
+    """Return the LaTeX of one version."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        latex = await run_in_pool(
+            'db', get_document_version_service(get_supabase_admin()).get_version,
+            session_id, current_user["user_id"], version
+        )
+        if latex is None:
+            raise HTTPException(status_code=404, detail="Version not found")
+        return {"session_id": session_id, "version": version, "latex_content": latex}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching version {version} of session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/sessions/{session_id}/diff")
+async def diff_session_versions(
+    session_id: str,
+    from_version: int,
+    to_version: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """Changed line ranges (and a unified diff) between two versions."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        diff = await run_in_pool(
+            'db', get_document_version_service(get_supabase_admin()).diff,
+            session_id, current_user["user_id"], from_version, to_version
+        )
+        if diff is None:
+            raise HTTPException(status_code=404, detail="Version not found")
+        return diff
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error diffing session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/sessions/{session_id}/versions/{version}/restore")
+async def restore_session_version(session_id: str, version: int, current_user: dict = Depends(get_current_user)):
+    """Make an earlier version current again by saving it as a new version."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        versions = get_document_version_service(get_supabase_admin())
+        latex = await run_in_pool('db', versions.get_version, session_id, current_user["user_id"], version)
+        if latex is None:
+            raise HTTPException(status_code=404, detail="Version not found")
+        new_version = await run_in_pool('db', versions.save, session_id, current_user["user_id"], latex)
+        return {"session_id": session_id, "version": new_version, "restored_from": version, "latex_content": latex}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error restoring version {version} of session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Header, Depends, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Depends, UploadFile, File, Request
 from fastapi.responses import Response, FileResponse
 from starlette.middleware.cors import CORSMiddleware
 from typing import List, Optional
 import os
+import asyncio
 import uuid
+import time
 import logging
 from datetime import datetime, timezone
 from pathlib import Path
@@ -17,8 +19,20 @@ sys.path.append(str(Path(__file__).parent))
 
 # --- New Architecture Imports ---
 from backend.core.config import settings
-from backend.core.deps import get_current_user, get_supabase_admin, get_supabase_client
-from backend.routers import ai, pdf
+from backend.core.deps import (
+    auth_service, get_current_user, get_supabase_admin, get_supabase_client, load_user_row, require_ops_access
+)
+from backend.core.executors import executor_stats, run_in_pool, shutdown_executors
+from backend.core.http_client import get_http_client
+from backend.core.llm_accounting import get_llm_accounting
+from backend.core.logging_setup import configure_logging
+from backend.core.llm_cache import get_llm_cache
+from backend.core.llm_resilience import get_resilient_llm, set_deadline
+from backend.core.llm_scheduler import BATCH, get_llm_scheduler, set_llm_caller
+from backend.core.metrics import RequestStats, get_metrics, request_stats
+from backend.core.metrics_collectors import register_default_collectors
+from backend.core.tracing import finish_trace, format_server_timing, get_trace_exporter, start_trace
+from backend.routers import ai, pdf, sessions
 from backend.schemas.common import StatusCheck, StatusCheckCreate, PurchaseRequest
 from backend.schemas.ai import (
     ConvertToPDFRequest, ConvertToPDFResponse,
@@ -28,25 +42,20 @@ from backend.schemas.ai import (
 )
 from backend.models.user import UserResponse
 
-# Services
-from backend.services.payment_service import PaymentService
-from backend.services.pexels_service import PexelsService
-# Removed RephrasyService
-from backend.services.content_converter_service import ContentConverterService
-from backend.services.pdf_extractor_service import PDFExtractorService
-from backend.services.resume_optimizer_service import ResumeOptimizerService
-from backend.services.ppt_generator_service import PPTGeneratorService
-from backend.services.gemini_service import GeminiService # For PPT service init
-from backend.services.speech_service import get_speech_service
+# Services (heavy ones are built on first use by core/providers.py)
+from backend.core.providers import (
+    get_content_converter_service, get_gemini_service, get_payment_service, get_pdf_extractor_service,
+    get_pexels_service, get_ppt_generator_service, get_resume_optimizer_service, get_speech_service,
+    provider_stats, warmup, warmup_state,
+)
 from backend.services.api_key_service import get_api_key_service
+from backend.services.credit_service import CreditService
+from backend.services.latex_preflight_service import get_latex_preflight_service
 from backend.services.rate_limiter_service import get_rate_limiter
+from backend.services.user_cache_service import get_user_cache
 
-# Initialize Logging
-if not logging.getLogger().handlers:
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+# Initialize Logging (queued, structured, sampled; see core/logging_setup.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 ROOT_DIR = Path(__file__).parent
@@ -67,12 +76,14 @@ async def verify_api_key(authorization: str = Header(None)):
     rate_limiter = get_rate_limiter()
     
     # Validate API key
-    key_data = api_key_service.validate_api_key(api_key)
+    key_data = await run_in_pool('db', api_key_service.validate_api_key, api_key)
     if not key_data:
         raise HTTPException(status_code=401, detail="Invalid or inactive API key")
     
     # Check rate limits
-    rate_limit_result = rate_limiter.check_limit(
+    rate_limit_result = await run_in_pool(
+        'db',
+        rate_limiter.check_limit,
         key_id=key_data['id'],
         tier=key_data['tier'],
         requests_count=key_data['requests_count'],
@@ -95,26 +106,6 @@ async def verify_api_key(authorization: str = Header(None)):
     key_data['rate_limit'] = rate_limit_result
     return key_data
 
-# --- Service Initialization ---
-# (Note: AI and PDF services are now initialized within their routers or dependencies)
-# But we keep these for the legacy/unmoved endpoints
-payment_service = PaymentService()
-pexels_service = PexelsService()
-# rephrasy_service = RephrasyService()
-content_converter_service = ContentConverterService()
-pdf_extractor_service = PDFExtractorService()
-resume_optimizer_service = ResumeOptimizerService()
-# PPT Service needs gemini. We create a fresh instance or use singleton if we had one.
-ppt_generator_service = PPTGeneratorService(GeminiService(), pexels_service)
-
-# Dodo Payment Client (Legacy/For Checkout)
-from dodopayments import DodoPayments
-try:
-    dodo_client = DodoPayments(bearer_token=settings.DODO_PAYMENTS_API_KEY)
-except Exception as e:
-    logger.warning(f"Failed to initialize Dodo Client: {e}")
-    dodo_client = None
-
 # --- App Setup ---
 app = FastAPI(title="HugPDF API", version="2.0.0")
 
@@ -125,12 +116,74 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Every model call made while serving a request is bounded by the request's deadline;
+# clients may ask for a shorter one with X-Request-Timeout (seconds)
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    timeout = settings.LLM_REQUEST_DEADLINE_SECONDS
+    try:
+        timeout = min(timeout, float(request.headers.get('x-request-timeout', timeout)))
+    except ValueError:
+        pass
+    set_deadline(max(1.0, timeout))
+    return await call_next(request)
+
+# Request latency per route template, plus per-request Supabase round trips (core/metrics.py)
+HTTP_REQUESTS = get_metrics().counter('http_requests_total', 'HTTP requests handled', ('method', 'route', 'status'))
+HTTP_SECONDS = get_metrics().histogram('http_request_duration_seconds', 'Time to produce the response', ('method', 'route'))
+DB_CALLS_PER_REQUEST = get_metrics().histogram(
+    'supabase_roundtrips_per_request', 'Supabase calls made by one request', ('route',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21)
+)
+DB_SECONDS_PER_REQUEST = get_metrics().histogram(
+    'supabase_seconds_per_request', 'Time one request spent waiting on Supabase', ('route',)
+)
+register_default_collectors(get_metrics(), token_cache=auth_service.token_cache)
+
+# Outermost middleware: the request's root tracing span (core/tracing.py) and its metrics.
+# Responses carry a Server-Timing breakdown per phase and the trace id.
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    stats = RequestStats()
+    request_stats.set(stats)
+    root, trace_token = start_trace(request.method, traceparent=request.headers.get('traceparent'),
+                                    method=request.method)
+    started = time.perf_counter()
+    status = 500
+    response = None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        route = route.path if route is not None else 'unmatched'
+        root.name = f"{request.method} {route}"
+        root.set_attribute('route', route)
+        root.set_attribute('status', status)
+        if response is not None:
+            response.headers['Server-Timing'] = format_server_timing(root)
+            response.headers['X-Trace-Id'] = root.trace.trace_id
+        finish_trace(root, trace_token)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=f"{status // 100}xx")
+        HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+        if route != 'unmatched':
+            DB_CALLS_PER_REQUEST.observe(stats.calls.get('db', 0), route=route)
+            DB_SECONDS_PER_REQUEST.observe(stats.seconds.get('db', 0.0), route=route)
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_ops_access)])
+async def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(get_metrics().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # --- Include Routers ---
 # AI and PDF endpoints (Refactored)
 app.include_router(ai.router, prefix="/api", tags=["AI"])
 app.include_router(pdf.router, prefix="/api", tags=["PDF"])
+app.include_router(sessions.router, prefix="/api", tags=["Sessions"])
 
 # --- Legacy/Unmoved Routes (Main API Router) ---
 api_router = APIRouter(prefix="/api")
@@ -139,6 +192,37 @@ api_router = APIRouter(prefix="/api")
 async def root():
     return {"message": "HugPDF API - Ready", "version": "2.0.0"}
 
+@api_router.get("/system/executors", dependencies=[Depends(require_ops_access)])
+async def get_executor_stats():
+    """Queue depth and wait times of the blocking-work pools (core/executors.py)"""
+    return executor_stats()
+
+@api_router.get("/system/startup", dependencies=[Depends(require_ops_access)])
+async def get_startup_stats():
+    """Which lazy services have been built (and how long each took), and warmup progress"""
+    return {'providers': provider_stats(), 'warmup': warmup_state}
+
+@api_router.get("/system/llm", dependencies=[Depends(require_ops_access)])
+async def get_llm_scheduler_stats():
+    """Per-model queueing, latency/breakers/hedges and response cache hit rates (core/llm_*.py)"""
+    return {
+        'scheduler': get_llm_scheduler().get_stats(),
+        'resilience': get_resilient_llm().get_stats(),
+        'cache': get_llm_cache().get_stats()
+    }
+
+@api_router.get("/metrics/llm", dependencies=[Depends(require_ops_access)])
+async def get_llm_metrics():
+    """Token counts and latency histograms per model, mode, tier and outcome (core/llm_accounting.py)"""
+    return get_llm_accounting().get_stats()
+
+@api_router.get("/usage/llm")
+async def get_my_llm_usage(current_user: dict = Depends(get_current_user)):
+    """The caller's model usage (tokens and model time by mode) on this worker"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return get_llm_accounting().user_summary(current_user['user_id'])
+
 # Authentication
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_me(current_user: dict = Depends(get_current_user)):
@@ -156,14 +240,14 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 @api_router.get("/images/search")
 async def search_images(query: str, per_page: int = 15, page: int = 1):
     try:
-        return pexels_service.search_images(query, per_page, page)
+        return await get_pexels_service().search_images_async(query, per_page, page)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/images/curated")
 async def get_curated_images(per_page: int = 15, page: int = 1):
     try:
-        return pexels_service.get_curated_images(per_page, page)
+        return await get_pexels_service().get_curated_images_async(per_page, page)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -184,7 +268,9 @@ async def upload_image(file: UploadFile = File(...), current_user: dict = Depend
         storage_path = f"uploads/{unique_name}"
         try:
             mime = f"image/{file_ext}" if file_ext not in ('jpg', 'jpeg') else "image/jpeg"
-            supabase_admin_client.storage.from_("user-images").upload(
+            await run_in_pool(
+                'db',
+                supabase_admin_client.storage.from_("user-images").upload,
                 storage_path, content, {"content-type": mime}
             )
             public_url = supabase_admin_client.storage.from_("user-images").get_public_url(storage_path)
@@ -214,11 +300,14 @@ async def serve_temp_image(filename: str):
 
 # Tools: Converter, Resume, Rephrasy
 @api_router.post("/convert-to-pdf", response_model=ConvertToPDFResponse)
-async def convert_to_pdf(request: ConvertToPDFRequest, current_user: dict = Depends(get_current_user)):
+async def convert_to_pdf(request: ConvertToPDFRequest, current_user: dict = Depends(get_current_user),
+                         content_converter_service=Depends(get_content_converter_service)):
     try:
         if not content_converter_service.validate_url(request.url):
              raise HTTPException(status_code=400, detail="Invalid URL")
-        result = content_converter_service.convert_to_pdf(request.url, request.conversion_type, request.options or {})
+        result = await run_in_pool(
+            'scrape', content_converter_service.convert_to_pdf, request.url, request.conversion_type, request.options or {}
+        )
         if not result: raise HTTPException(status_code=400, detail="Conversion failed")
         return ConvertToPDFResponse(
             latex_content=result['latex'],
@@ -231,11 +320,14 @@ async def convert_to_pdf(request: ConvertToPDFRequest, current_user: dict = Depe
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/optimize-resume", response_model=OptimizeResumeResponse)
-async def optimize_resume(resume_pdf: UploadFile = File(...), job_description: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def optimize_resume(resume_pdf: UploadFile = File(...), job_description: Optional[str] = None, current_user: dict = Depends(get_current_user),
+                          pdf_extractor_service=Depends(get_pdf_extractor_service),
+                          resume_optimizer_service=Depends(get_resume_optimizer_service)):
     try:
         pdf_content = await resume_pdf.read()
-        resume_text = pdf_extractor_service.extract_text_from_pdf(pdf_content)
-        result = resume_optimizer_service.optimize_resume(resume_text, job_description)
+        # PDF parsing is CPU-bound: run it in the process pool, off the GIL
+        resume_text = await run_in_pool('cpu', pdf_extractor_service.extract_text_from_pdf, pdf_content)
+        result = await run_in_pool('llm', resume_optimizer_service.optimize_resume, resume_text, job_description)
         if not result: raise HTTPException(status_code=500, detail="Optimization failed")
         return OptimizeResumeResponse(
             latex_content=result['latex'],
@@ -288,8 +380,11 @@ async def transcribe_audio(
             encoding = "WEBM_OPUS"  # Default
         
         # Get speech service and transcribe
-        speech_service = get_speech_service(settings.GOOGLE_CLOUD_CREDENTIALS_PATH)
-        result = speech_service.transcribe_audio(
+        # First use builds the Speech client (and imports google.cloud.speech) off the event loop
+        speech_service = await run_in_pool('llm', get_speech_service)
+        result = await run_in_pool(
+            'llm',
+            speech_service.transcribe_audio,
             audio_content=audio_content,
             language_code=language or "auto",
             audio_encoding=encoding
@@ -340,7 +435,9 @@ async def create_api_key(
         if not user_id:
             raise HTTPException(status_code=500, detail="User ID not found in token")
         
-        result = api_key_service.generate_api_key(
+        result = await run_in_pool(
+            'db',
+            api_key_service.generate_api_key,
             user_id=user_id,
             name=name,
             tier=tier
@@ -369,7 +466,7 @@ async def list_api_keys(current_user: dict = Depends(get_current_user)):
         api_key_service = get_api_key_service(supabase)
         
         user_id = current_user.get('user_id')  # Auth UUID, not internal PK
-        keys = api_key_service.get_user_api_keys(user_id)
+        keys = await run_in_pool('db', api_key_service.get_user_api_keys, user_id)
         return {"keys": keys}
         
     except HTTPException:
@@ -393,7 +490,7 @@ async def revoke_api_key(
         api_key_service = get_api_key_service(supabase)
         
         user_id = current_user.get('user_id')  # Auth UUID, not internal PK
-        success = api_key_service.revoke_api_key(key_id, user_id)
+        success = await run_in_pool('db', api_key_service.revoke_api_key, key_id, user_id)
         
         if not success:
             raise HTTPException(status_code=404, detail="API key not found")
@@ -429,7 +526,6 @@ async def generate_pdf_api(
     Returns: PDF file (binary)
     """
     try:
-        from backend.services.gemini_service import GeminiService
         from backend.services.pdf_service import PDFService
         
         prompt = request.get('prompt')
@@ -438,25 +534,28 @@ async def generate_pdf_api(
         
         mode = request.get('mode', 'normal')
         user_id = key_data.get('user_id')
+        # Public API generations queue behind interactive editor traffic
+        set_llm_caller(user_id=user_id, priority=BATCH)
         
         # Get Supabase client
         supabase = get_supabase_admin()
         
-        # Check user credits — use list select (avoid .single() which throws PGRST116 on 0 rows)
-        logger.info(f"Looking up user in 'users' table with user_id={user_id}")
-        user_response = supabase.table('users').select('credits, plan').eq('user_id', user_id).execute()
+        # Check user credits (served from the shared user cache when warm)
+        user_row = await run_in_pool('db', load_user_row, user_id)
         
         # Fallback for legacy API keys that stored the internal 'id' instead of 'user_id'
-        if not user_response.data or len(user_response.data) == 0:
+        if not user_row:
             logger.info(f"User not found by user_id, trying fallback lookup by internal id={user_id}")
-            user_response = supabase.table('users').select('credits, plan').eq('id', user_id).execute()
+            # Use list select (avoid .single() which throws PGRST116 on 0 rows)
+            user_response = await run_in_pool('db', supabase.table('users').select('credits, plan').eq('id', user_id).execute)
+            user_row = user_response.data[0] if user_response.data else None
 
-        if not user_response.data or len(user_response.data) == 0:
+        if not user_row:
             logger.error(f"User not found in 'users' table for user_id/id={user_id}. This API key may reference a user that doesn't exist.")
             raise HTTPException(status_code=401, detail=f"Unauthorized: Invalid user account associated with this API key. Please generate a new key.")
         
-        user_credits = user_response.data[0].get('credits', 0)
-        user_plan = user_response.data[0].get('plan', 'free')
+        user_credits = user_row.get('credits', 0)
+        user_plan = user_row.get('plan', 'free')
         
         # Check if user has credits
         if user_credits < 1:
@@ -470,22 +569,22 @@ async def generate_pdf_api(
         tier = 'pro' if user_plan in ['pro', 'on_demand'] else 'free'
         
         # Initialize services
-        gemini_service = GeminiService()
+        gemini_service = await run_in_pool('llm', get_gemini_service)
         pdf_service = PDFService()
         
         # Generate LaTeX code
         logger.info(f"Generating PDF for API key {key_data['id']}, user {user_id}: {prompt[:50]}...")
-        latex_code = gemini_service.generate_latex_from_prompt(prompt, mode=mode, tier=tier)
+        latex_code = await run_in_pool('llm', gemini_service.generate_latex_from_prompt, prompt, mode=mode, tier=tier)
         
         # Compile to PDF
         pdf_bytes = await pdf_service.generate_pdf(latex_code)
         
-        # Deduct 1 credit from user
-        new_credits = user_credits - 1
-        supabase.table('users').update({
-            'credits': new_credits,
-            'updated_at': datetime.now().isoformat()
-        }).eq('user_id', user_id).execute()
+        # Deduct 1 credit from user (atomic in the database; user_credits may be stale)
+        new_credits = await run_in_pool('db', CreditService(supabase).consume_credit, user_id, 'credits')
+        get_user_cache().invalidate(user_id)
+        if new_credits is None:
+            logger.warning(f"No credit left to deduct for user {user_id} after generating a PDF")
+            new_credits = 0
         
         logger.info(f"PDF generated successfully. Credits remaining: {new_credits}")
         
@@ -526,74 +625,12 @@ async def generate_pdf_api(
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
 
-# ============================================================================
-# Sessions API — Dashboard: list & resume past PDFs
-# ============================================================================
-
-@api_router.get("/sessions")
-async def list_sessions(current_user: dict = Depends(get_current_user)):
-    """Return the 30 most recent sessions for the authenticated user."""
-    if not current_user:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    try:
-        supabase = get_supabase_admin()
-        result = (
-            supabase.table("sessions")
-            .select("session_id, title, mode, created_at")
-            .eq("user_id", current_user["user_id"])
-            .order("created_at", desc=True)
-            .limit(30)
-            .execute()
-        )
-        return {"sessions": result.data or []}
-    except Exception as e:
-        logger.error(f"Error listing sessions: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@api_router.get("/sessions/{session_id}")
-async def get_session(session_id: str, current_user: dict = Depends(get_current_user)):
-    """Return full session data (messages, latex, mode) for resuming in the editor."""
-    if not current_user:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    try:
-        supabase = get_supabase_admin()
-        result = (
-            supabase.table("sessions")
-            .select("session_id, title, mode, messages, current_latex, created_at")
-            .eq("session_id", session_id)
-            .eq("user_id", current_user["user_id"])
-            .execute()
-        )
-        if not result.data:
-            raise HTTPException(status_code=404, detail="Session not found")
-        return result.data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error fetching session {session_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@api_router.delete("/sessions/{session_id}")
-async def delete_session(session_id: str, current_user: dict = Depends(get_current_user)):
-    """Delete a session owned by the authenticated user."""
-    if not current_user:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    try:
-        supabase = get_supabase_admin()
-        supabase.table("sessions").delete().eq("session_id", session_id).eq("user_id", current_user["user_id"]).execute()
-        return {"success": True}
-    except Exception as e:
-        logger.error(f"Error deleting session {session_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 # ============================================================================
 # PPT Generation (Legacy/Server kept)
 # ============================================================================
 @api_router.post("/generate-ppt", response_model=GeneratePPTResponse)
-async def generate_ppt(request: GeneratePPTRequest, current_user: dict = Depends(get_current_user)):
+async def generate_ppt(request: GeneratePPTRequest, current_user: dict = Depends(get_current_user),
+                       ppt_generator_service=Depends(get_ppt_generator_service)):
     try:
         if not current_user: raise HTTPException(status_code=401, detail="Auth required")
         
@@ -624,16 +661,18 @@ async def generate_ppt(request: GeneratePPTRequest, current_user: dict = Depends
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     s = StatusCheck(**input.model_dump())
-    get_supabase_client().table("status_checks").insert(s.model_dump(mode='json')).execute()
+    await run_in_pool('db', get_supabase_client().table("status_checks").insert(s.model_dump(mode='json')).execute)
     return s
 
 @api_router.get("/status")
 async def get_status_checks():
-    return get_supabase_client().table("status_checks").select("*").limit(50).execute().data
+    result = await run_in_pool('db', get_supabase_client().table("status_checks").select("*").limit(50).execute)
+    return result.data
 
 # Payment (Keep logic essentially mostly intact or delegate)
 @api_router.post("/payment/create-checkout")
-async def create_checkout(purchase: PurchaseRequest, current_user: dict = Depends(get_current_user)):
+async def create_checkout(purchase: PurchaseRequest, current_user: dict = Depends(get_current_user),
+                          payment_service=Depends(get_payment_service)):
     if not current_user: raise HTTPException(status_code=401)
     return await payment_service.create_checkout_session(current_user['user_id'], purchase.plan, current_user['email'])
 
@@ -665,7 +704,7 @@ async def payment_success(plan: str, user_id: str, session_id: Optional[str] = N
         raise HTTPException(status_code=500, detail="Database unavailable")
 
     # Fetch user
-    user_resp = admin.table("users").select("credits, plan").eq("user_id", user_id).execute()
+    user_resp = await run_in_pool('db', admin.table("users").select("credits, plan").eq("user_id", user_id).execute)
     if not user_resp.data:
         logger.error(f"User {user_id} not found in database")
         raise HTTPException(status_code=404, detail="User not found")
@@ -676,10 +715,11 @@ async def payment_success(plan: str, user_id: str, session_id: Optional[str] = N
     new_total_credits = current_credits + credits_to_add
     final_plan = plan if is_subscription else current_plan
 
-    admin.table("users").update({
+    await run_in_pool('db', admin.table("users").update({
         "credits": new_total_credits,
         "plan": final_plan,
-    }).eq("user_id", user_id).execute()
+    }).eq("user_id", user_id).execute)
+    get_user_cache().invalidate(user_id)
 
     logger.info(f"Updated user {user_id}: credits {current_credits} -> {new_total_credits}, plan={final_plan}")
 
@@ -702,13 +742,13 @@ async def list_templates(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=401, detail="Authentication required")
     try:
         supabase = get_supabase_admin()
-        result = (
+        query = (
             supabase.table("templates")
             .select("id, name, description, category, prompt, variables, created_at, updated_at")
             .eq("user_id", current_user["user_id"])
             .order("created_at", desc=True)
-            .execute()
         )
+        result = await run_in_pool('db', query.execute)
         return {"templates": result.data or []}
     except Exception as e:
         logger.error(f"Error listing templates: {e}")
@@ -731,7 +771,7 @@ async def create_template(request: dict, current_user: dict = Depends(get_curren
         variables = list(dict.fromkeys(re.findall(r'\{\{(\w+)\}\}', prompt)))
 
         supabase = get_supabase_admin()
-        result = supabase.table("templates").insert({
+        insert = supabase.table("templates").insert({
             "user_id": current_user["user_id"],
             "name": name,
             "description": request.get("description", ""),
@@ -740,7 +780,8 @@ async def create_template(request: dict, current_user: dict = Depends(get_curren
             "variables": variables,
             "created_at": datetime.now(timezone.utc).isoformat(),
             "updated_at": datetime.now(timezone.utc).isoformat(),
-        }).execute()
+        })
+        result = await run_in_pool('db', insert.execute)
 
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to create template")
@@ -759,13 +800,13 @@ async def get_template(template_id: str, current_user: dict = Depends(get_curren
         raise HTTPException(status_code=401, detail="Authentication required")
     try:
         supabase = get_supabase_admin()
-        result = (
+        query = (
             supabase.table("templates")
             .select("*")
             .eq("id", template_id)
             .eq("user_id", current_user["user_id"])
-            .execute()
         )
+        result = await run_in_pool('db', query.execute)
         if not result.data:
             raise HTTPException(status_code=404, detail="Template not found")
         return result.data[0]
@@ -794,13 +835,13 @@ async def update_template(template_id: str, request: dict, current_user: dict =
             update_data["variables"] = variables
 
         supabase = get_supabase_admin()
-        result = (
+        query = (
             supabase.table("templates")
             .update(update_data)
             .eq("id", template_id)
             .eq("user_id", current_user["user_id"])
-            .execute()
         )
+        result = await run_in_pool('db', query.execute)
         if not result.data:
             raise HTTPException(status_code=404, detail="Template not found")
         return {"success": True, "template": result.data[0]}
@@ -818,7 +859,7 @@ async def delete_template(template_id: str, current_user: dict = Depends(get_cur
         raise HTTPException(status_code=401, detail="Authentication required")
     try:
         supabase = get_supabase_admin()
-        supabase.table("templates").delete().eq("id", template_id).eq("user_id", current_user["user_id"]).execute()
+        await run_in_pool('db', supabase.table("templates").delete().eq("id", template_id).eq("user_id", current_user["user_id"]).execute)
         return {"success": True}
     except Exception as e:
         logger.error(f"Error deleting template {template_id}: {e}")
@@ -827,3 +868,19 @@ async def delete_template(template_id: str, current_user: dict = Depends(get_cur
 
 app.include_router(api_router)
 
+
+@app.on_event("startup")
+async def schedule_warmup():
+    # Runs in the background: start-up (and binding the port) does not wait for it
+    if settings.WARMUP_ENABLED:
+        app.state.warmup_task = asyncio.create_task(warmup())
+    if settings.LATEX_PREFLIGHT_ENABLED:
+        get_latex_preflight_service().build_index_in_background()
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    shutdown_executors(wait=False)
+    # Flush queued traces while the HTTP client (used by the OTLP exporter) is still open
+    get_trace_exporter().flush()
+    await get_http_client().aclose()
+
@@ -5,17 +5,139 @@ Handles generation, validation, and lifecycle of API keys for developer access
 
 import secrets
 import hashlib
-from datetime import datetime, timedelta
-from typing import Optional, Dict
-from supabase import Client
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional, Dict
 import logging
 
+from backend.core.config import settings
+from backend.services.usage_tracker_service import UsageTracker
+
+if TYPE_CHECKING:
+    from supabase import Client
+
 logger = logging.getLogger(__name__)
 
 
+class LastUsedWriter:
+    """
+    Coalesces `last_used_at` updates for API keys.
+
+    Validation only records the key id in memory; a background thread writes
+    every touched key in a single bulk UPDATE at most once per interval.
+    """
+
+    def __init__(self, supabase_client: "Client", interval_seconds: float = 60.0):
+        self.supabase = supabase_client
+        self.interval_seconds = interval_seconds
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, key_id: str) -> None:
+        """Mark a key as used; the timestamp is written on the next flush"""
+        with self._lock:
+            self._pending.add(key_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="api-key-last-used", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """Write `last_used_at` for every key touched since the previous flush"""
+        with self._lock:
+            key_ids, self._pending = list(self._pending), set()
+        if not key_ids:
+            return 0
+        try:
+            self.supabase.table('api_keys').update({
+                'last_used_at': datetime.utcnow().isoformat()
+            }).in_('id', key_ids).execute()
+            return len(key_ids)
+        except Exception as e:
+            logger.error(f"Failed to flush last_used_at for {len(key_ids)} API keys: {e}")
+            with self._lock:
+                self._pending.update(key_ids)
+            return 0
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval_seconds)
+            self.flush()
+
+
 class APIKeyService:
-    def __init__(self, supabase_client: Client):
+    # Cached "unknown key" marker (negative cache entry)
+    _MISSING = object()
+
+    def __init__(self, supabase_client: "Client"):
         self.supabase = supabase_client
+        self.cache_ttl = settings.API_KEY_CACHE_TTL_SECONDS
+        self.negative_cache_ttl = settings.API_KEY_NEGATIVE_CACHE_TTL_SECONDS
+        self.cache_max_entries = settings.API_KEY_CACHE_MAX_ENTRIES
+        # key_hash -> (cache entry expiry, key record or _MISSING, key expiry as epoch seconds or None)
+        self._key_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # key_id -> key_hash, so revocation by id can evict the cached record
+        self._hash_by_id: Dict[str, str] = {}
+        self._cache_lock = threading.Lock()
+        self.last_used_writer = LastUsedWriter(supabase_client, settings.API_KEY_LAST_USED_FLUSH_SECONDS)
+        self.usage_tracker = UsageTracker(
+            supabase_client,
+            flush_interval_seconds=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+            max_queue_size=settings.USAGE_QUEUE_MAX_SIZE,
+            spill_path=settings.USAGE_SPILL_PATH,
+            on_counts_flushed=self._bump_cached_count
+        )
+    
+    def _cache_get(self, key_hash: str):
+        with self._cache_lock:
+            entry = self._key_cache.get(key_hash)
+            if entry is None:
+                return None
+            expires_at, record, key_expires_at = entry
+            # A key can expire while its record is cached: recheck on every hit
+            if expires_at <= time.monotonic() or (key_expires_at is not None and key_expires_at <= time.time()):
+                self._evict(key_hash)
+                return None
+            self._key_cache.move_to_end(key_hash)
+            return record
+
+    def _cache_set(self, key_hash: str, record, ttl: float, key_expires_at: Optional[float] = None) -> None:
+        if ttl <= 0:
+            return
+        with self._cache_lock:
+            self._key_cache[key_hash] = (time.monotonic() + ttl, record, key_expires_at)
+            self._key_cache.move_to_end(key_hash)
+            if record is not self._MISSING:
+                self._hash_by_id[record['id']] = key_hash
+            while len(self._key_cache) > self.cache_max_entries:
+                oldest_hash, _ = self._key_cache.popitem(last=False)
+                self._evict(oldest_hash)
+
+    def _evict(self, key_hash: str) -> None:
+        """Remove a cache entry; caller holds the cache lock"""
+        entry = self._key_cache.pop(key_hash, None)
+        if entry and entry[1] is not self._MISSING:
+            self._hash_by_id.pop(entry[1]['id'], None)
+
+    @staticmethod
+    def _key_expiry(key_data: Dict) -> Optional[float]:
+        """`expires_at` of an api_keys row as epoch seconds (None = never expires)"""
+        value = key_data.get('expires_at')
+        if not value:
+            return None
+        expires_at = datetime.fromisoformat(value)
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at.timestamp()
+
+    def invalidate_key(self, key_id: str) -> None:
+        """Drop the cached record for a key id (e.g. after revocation)"""
+        with self._cache_lock:
+            key_hash = self._hash_by_id.get(key_id)
+            if key_hash:
+                self._evict(key_hash)
     
     def generate_api_key(self, user_id: str, name: str, tier: str = "free") -> Dict:
         """
@@ -38,6 +160,10 @@ class APIKeyService:
             # Hash the key for storage (never store plaintext)
             key_hash = hashlib.sha256(api_key.encode()).hexdigest()
             
+            # A brand-new key must never be answered from a negative cache entry
+            with self._cache_lock:
+                self._evict(key_hash)
+
             # Store in database
             result = self.supabase.table('api_keys').insert({
                 'user_id': user_id,
@@ -83,35 +209,49 @@ class APIKeyService:
         try:
             # Hash the provided key
             key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-            logger.info(f"Validating API key, hash: {key_hash}")
+
+            cached = self._cache_get(key_hash)
+            if cached is self._MISSING:
+                return None
+            if cached is not None:
+                self.last_used_writer.touch(cached['id'])
+                return self._with_pending_usage(cached)
             
             # Look up in database
             result = self.supabase.table('api_keys').select('*').eq('key_hash', key_hash).eq('is_active', True).execute()
             
             if not result.data:
-                logger.warning(f"No API key found in database for hash: {key_hash[:10]}...")
+                logger.warning("No active API key matches the presented key")
+                self._cache_set(key_hash, self._MISSING, self.negative_cache_ttl)
                 return None
             
             key_data = result.data[0]
             
             # Check if key is active (though already filtered in query, extra safety/logging)
             if not key_data.get('is_active', False):
-                logger.warning(f"API key '{key_data['name']}' ({key_data['id']}) is marked as inactive")
+                logger.warning("API key %s is marked as inactive", key_data['id'])
+                return None
+
+            key_expires_at = self._key_expiry(key_data)
+            if key_expires_at is not None and key_expires_at <= time.time():
+                logger.warning("API key %s expired at %s", key_data['id'], key_data['expires_at'])
+                self._cache_set(key_hash, self._MISSING, self.negative_cache_ttl)
                 return None
             
             # Check request limits
             if key_data['requests_count'] >= key_data['requests_limit']:
-                logger.warning(f"API key '{key_data['name']}' has exceeded its request limit: {key_data['requests_count']}/{key_data['requests_limit']}")
+                logger.warning(
+                    "API key %s has exceeded its request limit: %s/%s",
+                    key_data['id'], key_data['requests_count'], key_data['requests_limit']
+                )
                 # We return it anyway, the rate limiter in server.py will handle the block
             
-            logger.info(f"API key validated successfully: {key_data['name']} (User: {key_data['user_id']})")
+            logger.debug("API key %s validated (user %s)", key_data['id'], key_data['user_id'])
             
-            # Update last used timestamp
-            self.supabase.table('api_keys').update({
-                'last_used_at': datetime.utcnow().isoformat()
-            }).eq('id', key_data['id']).execute()
+            # Update last used timestamp (coalesced, written in bulk)
+            self.last_used_writer.touch(key_data['id'])
             
-            return {
+            record = {
                 'id': key_data['id'],
                 'user_id': key_data['user_id'],
                 'name': key_data['name'],
@@ -119,28 +259,39 @@ class APIKeyService:
                 'requests_count': key_data['requests_count'],
                 'requests_limit': key_data['requests_limit']
             }
+            self._cache_set(key_hash, record, self.cache_ttl, key_expires_at)
+            return self._with_pending_usage(record)
             
         except Exception as e:
-            logger.error(f"API key validation error: {e}", exc_info=True)
+            logger.error("API key validation error: %s", e, exc_info=True)
             return None
     
     def track_usage(self, key_id: str, endpoint: str, status_code: int) -> None:
-        """Track API usage for analytics and rate limiting"""
+        """
+        Track API usage for analytics and rate limiting
+
+        The event is queued and written in a batch by the usage tracker; the
+        request count seen by the rate limiter includes it immediately.
+        """
         try:
-            # Increment request count
-            self.supabase.rpc('increment_api_key_requests', {'key_id': key_id}).execute()
-            
-            # Log usage
-            self.supabase.table('api_usage').insert({
-                'api_key_id': key_id,
-                'endpoint': endpoint,
-                'status_code': status_code,
-                'created_at': datetime.utcnow().isoformat()
-            }).execute()
-            
+            self.usage_tracker.record(key_id, endpoint, status_code)
         except Exception as e:
             logger.error(f"Failed to track usage: {e}")
     
+    def _with_pending_usage(self, record: Dict) -> Dict:
+        """Copy a key record, adding usage recorded locally but not yet flushed"""
+        result = dict(record)
+        result['requests_count'] += self.usage_tracker.pending_count(record['id'])
+        return result
+
+    def _bump_cached_count(self, key_id: str, amount: int = 1) -> None:
+        """Keep the cached monthly request count in step with the database counter"""
+        with self._cache_lock:
+            key_hash = self._hash_by_id.get(key_id)
+            entry = self._key_cache.get(key_hash) if key_hash else None
+            if entry and entry[1] is not self._MISSING:
+                entry[1]['requests_count'] += amount
+
     def get_user_api_keys(self, user_id: str) -> list:
         """Get all API keys for a user"""
         try:
@@ -158,6 +309,7 @@ class APIKeyService:
             self.supabase.table('api_keys').update({
                 'is_active': False
             }).eq('id', key_id).eq('user_id', user_id).execute()
+            self.invalidate_key(key_id)
             
             logger.info(f"Revoked API key {key_id}")
             return True
@@ -171,7 +323,7 @@ class APIKeyService:
 _api_key_service: Optional[APIKeyService] = None
 
 
-def get_api_key_service(supabase_client: Client) -> APIKeyService:
+def get_api_key_service(supabase_client: "Client") -> APIKeyService:
     """Get or create the API key service singleton"""
     global _api_key_service
     if _api_key_service is None:
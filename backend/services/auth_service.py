@@ -1,134 +1,268 @@
+"""
+Authentication Service
+Verifies Supabase access tokens on the request hot path
+
+- The verification strategy (HS256 shared secret and/or JWKS for RS256/ES256)
+  is chosen once when the service is created, not retried per request
+- Verified tokens are cached by SHA-256 hash until they expire
+- JWKS signing keys live in a process-wide cache refreshed in the background
+"""
+
 import logging
 import jwt
 import base64
-from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import os
-from typing import Optional
-import requests
+from typing import Dict, List, Optional
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
 JWT_ALGORITHM = 'HS256'
 
+ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
+
+class JWKSKeyCache:
+    """Process-wide cache of JWKS signing keys with periodic background refresh"""
+
+    def __init__(self, jwks_url: str, refresh_interval: int = 600, min_refresh_interval: int = 30):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._client = jwt.PyJWKClient(jwks_url, cache_jwk_set=False, cache_keys=False)
+        self._keys: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._refresher: Optional[threading.Thread] = None
+
+    def refresh(self) -> bool:
+        """Fetch the JWKS document and replace the cached keys"""
+        try:
+            jwk_set = self._client.get_jwk_set(refresh=True)
+            keys = {jwk.key_id: jwk.key for jwk in jwk_set.keys if jwk.key_id}
+            with self._lock:
+                self._keys = keys
+                self._last_refresh = time.monotonic()
+            logger.info(f"Loaded {len(keys)} JWKS signing keys")
+            return True
+        except Exception as e:
+            with self._lock:
+                self._last_refresh = time.monotonic()
+            logger.warning(f"JWKS refresh failed: {e}")
+            return False
+
+    def get_key(self, kid: Optional[str]):
+        """Return the signing key for `kid`, fetching the JWKS only on a cold or unknown key"""
+        self._ensure_refresher()
+        with self._lock:
+            key = self._keys.get(kid)
+            stale = time.monotonic() - self._last_refresh >= self.min_refresh_interval
+        if key is not None:
+            return key
+
+        # Unknown kid: keys may have rotated. Refetch, but never more than once per interval.
+        if stale and self.refresh():
+            with self._lock:
+                return self._keys.get(kid)
+        return None
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="jwks-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
+
+
+class VerifiedTokenCache:
+    """LRU cache of verified token claims keyed by token hash, honouring `exp`"""
+
+    def __init__(self, max_entries: int = 10000, max_ttl: int = 300):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token_hash: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= now:
+                del self._entries[token_hash]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(token_hash)
+            self.stats['hits'] += 1
+            return dict(claims)
+
+    def set(self, token_hash: str, claims: dict) -> None:
+        expires_at = time.time() + self.max_ttl
+        if claims.get('exp'):
+            expires_at = min(expires_at, float(claims['exp']))
+        with self._lock:
+            self._entries[token_hash] = (expires_at, dict(claims))
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Process-wide JWKS caches, one per JWKS URL
+_jwks_caches: Dict[str, JWKSKeyCache] = {}
+_jwks_lock = threading.Lock()
+
+
+def get_jwks_cache(jwks_url: str) -> JWKSKeyCache:
+    """Get or create the JWKS key cache for a URL"""
+    with _jwks_lock:
+        if jwks_url not in _jwks_caches:
+            _jwks_caches[jwks_url] = JWKSKeyCache(jwks_url)
+        return _jwks_caches[jwks_url]
+
+
 class AuthService:
+    def __init__(self):
+        # Pick the verification strategy once at startup
+        supabase_jwt_secret = os.environ.get('SUPABASE_JWT_SECRET', JWT_SECRET)
+        self.hs256_keys = self._hs256_candidates(supabase_jwt_secret)
+
+        supabase_url = os.environ.get("SUPABASE_URL")
+        self.jwks = get_jwks_cache(f"{supabase_url}/auth/v1/.well-known/jwks.json") if supabase_url else None
+
+        # Legacy custom tokens (signed with JWT_SECRET, 'user_id' instead of 'sub')
+        self.legacy_secret = JWT_SECRET
+
+        self.token_cache = VerifiedTokenCache()
+        logger.info(
+            f"AuthService ready (HS256 keys: {len(self.hs256_keys)}, "
+            f"JWKS: {'enabled' if self.jwks else 'disabled'})"
+        )
+
     @staticmethod
-    def verify_supabase_token(token: str) -> Optional[dict]:
-        """Verify Supabase JWT token"""
-        try:
-            # Supabase tokens are signed with the JWT_SECRET from your Supabase project
-            # For production, you should fetch the public key from Supabase
-            supabase_jwt_secret = os.environ.get('SUPABASE_JWT_SECRET', JWT_SECRET)
-            print(f"DEBUG: Verifying token with secret ending in ...{supabase_jwt_secret[-6:] if supabase_jwt_secret else 'NONE'}")
-            
-            # Decode without verification first to get the header
-            unverified_header = jwt.get_unverified_header(token)
-            print(f"DEBUG: Token Header: {unverified_header}")
-            
-            # Decode without verification first to get the header
-            unverified = jwt.decode(token, options={"verify_signature": False})
-            
-            # Verify the token
+    def _hs256_candidates(secret: Optional[str]) -> List:
+        """
+        Resolve the HS256 verification key(s).
+
+        SUPABASE_JWT_SECRET_ENCODING selects 'raw' or 'base64'. The default 'auto'
+        keeps both candidates until the first token verifies, then pins the winner.
+        """
+        if not secret:
+            return []
+        encoding = os.environ.get('SUPABASE_JWT_SECRET_ENCODING', 'auto').lower()
+        decoded = None
+        if encoding in ('auto', 'base64'):
+            try:
+                decoded = base64.urlsafe_b64decode(secret + "==")  # Ensure padding
+            except Exception:
+                decoded = None
+        if encoding == 'raw' or decoded is None:
+            return [secret]
+        if encoding == 'base64':
+            return [decoded]
+        return [secret, decoded]
+
+    def _verify_hs256(self, token: str) -> Optional[dict]:
+        for index, key in enumerate(self.hs256_keys):
             try:
-                # Try standard string secret first
-                payload = jwt.decode(
-                    token,
-                    supabase_jwt_secret,
-                    algorithms=['HS256'],
-                    options={"verify_aud": False}
-                )
+                payload = jwt.decode(token, key, algorithms=['HS256'], options={"verify_aud": False})
             except jwt.InvalidSignatureError:
-                # If signature fails, try decoding the secret from Base64
-                # Supabase secrets are often Base64 encoded
-                try:
-                    logger.info("DEBUG: Standard verification failed, trying Base64 decoded secret...")
-                    decoded_secret = base64.urlsafe_b64decode(supabase_jwt_secret + "==") # Ensure padding
-                    payload = jwt.decode(
-                        token,
-                        decoded_secret,
-                        algorithms=['HS256'],
-                        options={"verify_aud": False}
-                    )
-                    logger.info("DEBUG: Verification successful with Base64 decoded secret!")
-                except Exception as b64_error:
-                    logger.info(f"DEBUG: Base64 verification also failed: {b64_error}")
-                    raise # Re-raise original or let it fall through to JWKS
-            
-            # Extract user_id from Supabase token structure
-            logging.info(f"DEBUG: Token verified successfully. Payload: {payload}")
-            
-            user_id = payload.get('sub')  # Supabase uses 'sub' for user ID
-            email = payload.get('email')
-            
-            if not user_id:
-                logging.error("DEBUG: Token valid but 'sub' (user_id) is MISSING in payload")
+                continue
+            if index and len(self.hs256_keys) > 1:
+                logger.info("Pinning Base64-decoded SUPABASE_JWT_SECRET for HS256 verification")
+            self.hs256_keys = [key]
+            return payload
+        return None
+
+    def _verify_asymmetric(self, token: str, header: dict) -> Optional[dict]:
+        if not self.jwks:
+            logger.debug("SUPABASE_URL missing, cannot verify asymmetric token")
+            return None
+        signing_key = self.jwks.get_key(header.get('kid'))
+        if signing_key is None:
+            logger.warning("No JWKS signing key found for kid=%s", header.get('kid'))
+            return None
+        return jwt.decode(token, signing_key, algorithms=[header['alg']], options={"verify_aud": False})
+
+    def verify_supabase_token(self, token: str) -> Optional[dict]:
+        """Verify Supabase JWT token"""
+        token_hash = VerifiedTokenCache.token_hash(token)
+        cached = self.token_cache.get(token_hash)
+        if cached:
+            return cached
+
+        try:
+            header = jwt.get_unverified_header(token)
+            alg = header.get('alg')
+            if alg in ASYMMETRIC_ALGORITHMS:
+                payload = self._verify_asymmetric(token, header)
+            elif alg == 'HS256':
+                payload = self._verify_hs256(token)
+            else:
+                logger.debug("Unsupported token algorithm: %s", alg)
                 return None
-                
-            return {
-                'user_id': user_id,
-                'email': email,
-                'exp': payload.get('exp')
-            }
         except (jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
-            # If standard HS256 failed, check if we should try JWKS (for ES256/RS256)
-            try:
-                unverified_header = jwt.get_unverified_header(token)
-                alg = unverified_header.get('alg')
-                
-                if alg in ['RS256', 'ES256']:
-                    print(f"DEBUG: Token uses {alg}, attempting JWKS verification...")
-                    supabase_url = os.environ.get("SUPABASE_URL")
-                    if not supabase_url:
-                        print("DEBUG: SUPABASE_URL missing, cannot fetch JWKS")
-                        return None
-                        
-                    jwks_url = f"{supabase_url}/auth/v1/.well-known/jwks.json"
-                    jwks_client = jwt.PyJWKClient(jwks_url)
-                    signing_key = jwks_client.get_signing_key_from_jwt(token)
-                    
-                    payload = jwt.decode(
-                        token,
-                        signing_key.key,
-                        algorithms=[alg],
-                        options={"verify_aud": False}
-                    )
-                    
-                    # Extract user_id
-                    user_id = payload.get('sub')
-                    email = payload.get('email')
-                    
-                    if not user_id:
-                        return None
-                        
-                    return {
-                        'user_id': user_id,
-                        'email': email,
-                        'exp': payload.get('exp')
-                    }
-            except Exception as jwks_error:
-                print(f"DEBUG: JWKS verification failed: {jwks_error}")
-            
-            # Original error reporting if JWKS didn't succeed
-            print(f"DEBUG: Token verification failed: {e}")
+            logger.debug("Token verification failed: %s", e)
             return None
         except Exception as e:
-            print(f"DEBUG: Token verification error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Token verification error: %s", e)
             return None
-    
-    @staticmethod
-    def verify_token(token: str) -> Optional[dict]:
+
+        if not payload:
+            return None
+
+        user_id = payload.get('sub')  # Supabase uses 'sub' for user ID
+        if not user_id:
+            logger.error("Token valid but 'sub' (user_id) is missing in payload")
+            return None
+
+        claims = {
+            'user_id': user_id,
+            'email': payload.get('email'),
+            'exp': payload.get('exp')
+        }
+        self.token_cache.set(token_hash, claims)
+        return claims
+
+    def verify_token(self, token: str) -> Optional[dict]:
         """Verify JWT token (supports both custom and Supabase tokens)"""
         # Try Supabase token first
-        result = AuthService.verify_supabase_token(token)
+        result = self.verify_supabase_token(token)
         if result:
             return result
-            
+
         # Fallback to custom JWT for backward compatibility
         try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            return payload
-        except:
+            return jwt.decode(token, self.legacy_secret, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidTokenError:
             return None
+
+
+# Singleton instance
+_auth_service: Optional[AuthService] = None
+
+
+def get_auth_service() -> AuthService:
+    """Get or create the auth service singleton"""
+    global _auth_service
+    if _auth_service is None:
+        _auth_service = AuthService()
+    return _auth_service
@@ -17,7 +17,7 @@ class CacheService:
         api_key = os.environ.get('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
-        self.client = genai.Client(api_key=api_key)
+        self.client = genai.Client(api_key=api_key, http_options=settings.gemini_http_options())
         
         # In-memory cache metadata storage
         # In production, consider using Redis or database
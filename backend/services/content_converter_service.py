@@ -1,8 +1,7 @@
 import os
 import logging
 from typing import Dict, Optional
-from firecrawl import FirecrawlApp
-from services.gemini_service import GeminiService
+from backend.core.providers import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -10,12 +9,13 @@ class ContentConverterService:
     """Universal web content converter supporting blogs, articles, websites, and more"""
     
     def __init__(self):
-        self.gemini_service = GeminiService()
+        self.gemini_service = get_gemini_service()
         api_key = os.environ.get('FIRECRAWL_API_KEY')
         if not api_key:
             logger.warning("FIRECRAWL_API_KEY not found in environment variables")
             self.client = None
         else:
+            from firecrawl import FirecrawlApp  # deferred: a heavy import, only needed with a key
             self.client = FirecrawlApp(api_key=api_key)
             logger.info("Firecrawl client initialized successfully")
     
@@ -111,7 +111,8 @@ class ContentConverterService:
                 markdown=markdown,
                 conversion_type=conversion_type,
                 metadata=metadata,
-                options=options
+                options=options,
+                cache=True
             )
             
             return {
@@ -9,11 +9,15 @@ This service handles:
 - Usage tracking and analytics
 """
 
-from supabase import Client
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import TYPE_CHECKING, Optional, Dict
 import logging
 from backend.core.config import settings
+from backend.services.user_cache_service import get_user_cache
+from backend.core.tracing import traced
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +60,8 @@ class CreditService:
         }
     }
     
+    CREDIT_FIELDS = ('credits', 'research_credits', 'diagram_credits', 'ebook_credits')
+
     @staticmethod
     def determine_plan_from_credits(credits: int) -> str:
         """
@@ -69,28 +75,59 @@ class CreditService:
         """
         return 'pro' if credits > 5 else 'free'
     
-    def __init__(self, supabase_admin: Client):
+    def __init__(self, supabase_admin: "Client"):
         """Initialize with admin Supabase client to bypass RLS"""
         self.db = supabase_admin
+        self.user_cache = get_user_cache()
     
-    def get_user_credits(self, user_id: str) -> Optional[Dict]:
-        """Get current credit status for user"""
+    def _load_user(self, user_id: str, user: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Return the users row, preferring the row already loaded for this request,
+        then the shared user cache, and only then the database.
+        """
+        if user and user.get('user_id') == user_id:
+            return user
+
+        cached = self.user_cache.get(user_id)
+        if cached:
+            return cached
+
+        response = self.db.table("users").select("*").eq("user_id", user_id).execute()
+        if not response.data:
+            return None
+
+        self.user_cache.set(user_id, response.data[0])
+        return response.data[0]
+
+    def _invalidate(self, user_id: str, user: Optional[Dict] = None, changes: Optional[Dict] = None) -> None:
+        """Drop the cached row after a write and keep the request-scoped row in sync"""
+        self.user_cache.invalidate(user_id)
+        if user is not None and changes and user.get('user_id') == user_id:
+            user.update(changes)
+
+    def get_user_credits(self, user_id: str, user: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Get current credit status for user
+
+        Args:
+            user_id: User ID
+            user: users row already loaded for this request (skips the DB read)
+        """
         try:
-            response = self.db.table("users").select("*").eq("user_id", user_id).execute()
+            user = self._load_user(user_id, user)
 
-            if not response.data:
+            if not user:
                 return None
 
-            user = response.data[0]
-
             # Check if credits need monthly reset
             reset_date = user.get('credits_reset_date')
             if reset_date and datetime.now() > datetime.fromisoformat(reset_date):
                 logger.info(f"Resetting monthly credits for user {user_id}")
-                self.reset_monthly_credits(user_id, user['plan'])
+                self.reset_monthly_credits(user_id, user['plan'], user=user)
                 # Fetch updated data
                 response = self.db.table("users").select("*").eq("user_id", user_id).execute()
-                user = response.data[0]
+                user.update(response.data[0])
+                self.user_cache.set(user_id, user)
 
             return {
                 'plan': user['plan'],
@@ -106,18 +143,20 @@ class CreditService:
             logger.error(f"Error getting user credits: {str(e)}")
             return None
 
-    def check_credit_available(self, user_id: str, credit_type: str) -> tuple[bool, str]:
+    @traced('credits.check', phase='supabase')
+    def check_credit_available(self, user_id: str, credit_type: str, user: Optional[Dict] = None) -> tuple[bool, str]:
         """
         Check if user has credits available for a feature
 
         Args:
             user_id: User ID
             credit_type: 'research', 'diagram', 'ebook', or 'pdf'
+            user: users row already loaded for this request (skips the DB read)
 
         Returns:
             (has_credit: bool, message: str)
         """
-        credits = self.get_user_credits(user_id)
+        credits = self.get_user_credits(user_id, user=user)
 
         if not credits:
             return False, "User not found"
@@ -147,15 +186,19 @@ class CreditService:
 
         return True, "Credit available"
 
-    def deduct_credit(self, user_id: str, credit_type: str, reason: str = "") -> bool:
+    @traced('credits.deduct', phase='supabase')
+    def deduct_credit(self, user_id: str, credit_type: str, reason: str = "", user: Optional[Dict] = None) -> bool:
         """
         Deduct one credit from user's account
 
+        Args:
+            user: users row already loaded for this request; updated in place on success
+
         Returns:
             True if successful, False otherwise
         """
         try:
-            credits = self.get_user_credits(user_id)
+            credits = self.get_user_credits(user_id, user=user)
 
             if not credits:
                 return False
@@ -167,27 +210,14 @@ class CreditService:
                 return True
 
             # Deduct credit
-            if credit_type == 'pdf':
-                current_credits = credits.get('credits', 0)
-                if current_credits <= 0:
-                    return False
-                new_value = current_credits - 1
-                update_field = 'credits'
-            else:
-                credit_field = f"{credit_type}_credits"
-                current_credits = credits.get(credit_field, 0)
-
-                if current_credits <= 0:
-                    return False
-
-                new_value = current_credits - 1
-                update_field = credit_field
-
-            # Update database
-            self.db.table("users").update({
-                update_field: new_value,
-                'updated_at': datetime.now().isoformat()
-            }).eq("user_id", user_id).execute()
+            update_field = 'credits' if credit_type == 'pdf' else f"{credit_type}_credits"
+
+            # Decrement in the database; the cached balance (possibly stale) is only a hint
+            new_value = self.consume_credit(user_id, update_field, known_value=credits.get(update_field) or None)
+            if new_value is None:
+                self._invalidate(user_id, user, {update_field: 0})
+                return False
+            self._invalidate(user_id, user, {update_field: new_value})
 
             # Log transaction
             self.db.table("credit_transactions").insert({
@@ -198,25 +228,73 @@ class CreditService:
                 "reason": reason or f"Used {credit_type} feature"
             }).execute()
 
-            logger.info(f"Deducted {credit_type} credit from user {user_id}. New value: {new_value}")
+            logger.info("Deducted %s credit from user %s. New value: %s", credit_type, user_id, new_value)
             return True
 
         except Exception as e:
             logger.error(f"Error deducting credit: {str(e)}")
             return False    
-    def reset_monthly_credits(self, user_id: str, plan: str):
+
+    # Attempts of the compare-and-set fallback before giving up on a contended row
+    CAS_ATTEMPTS = 5
+
+    def consume_credit(self, user_id: str, field: str = 'credits', known_value: Optional[int] = None) -> Optional[int]:
+        """
+        Atomically take one credit from `field` and return the new balance (None if none was left).
+
+        Uses the deduct_user_credit RPC (migrations/atomic_credit_deduction.sql). Databases
+        without it get a compare-and-set update that only applies if the balance is still
+        the value it was computed from, retried on conflict; `known_value` (e.g. the cached
+        balance) saves the first read.
+        """
+        if field not in self.CREDIT_FIELDS:
+            raise ValueError(f"Unknown credit field: {field}")
+        try:
+            response = self.db.rpc('deduct_user_credit', {'p_user_id': user_id, 'p_field': field}).execute()
+            return response.data
+        except Exception as e:
+            if not self._missing_function(e, 'deduct_user_credit'):
+                raise
+            logger.debug("deduct_user_credit unavailable, using compare-and-set: %s", e)
+
+        current = known_value
+        for _ in range(self.CAS_ATTEMPTS):
+            if current is None:
+                response = self.db.table("users").select(field).eq("user_id", user_id).execute()
+                if not response.data:
+                    return None
+                current = response.data[0].get(field) or 0
+            if current <= 0:
+                return None
+            response = self.db.table("users").update({
+                field: current - 1,
+                'updated_at': datetime.now().isoformat()
+            }).eq("user_id", user_id).eq(field, current).execute()
+            if response.data:
+                return current - 1
+            current = None  # Another request changed the balance first: re-read and retry
+        raise RuntimeError(f"Could not deduct {field} for user {user_id}: balance kept changing")
+
+    @staticmethod
+    def _missing_function(error: Exception, name: str) -> bool:
+        message = str(error)
+        return name in message and ('PGRST202' in message or '42883' in message or 'Could not find the function' in message)
+
+    def reset_monthly_credits(self, user_id: str, plan: str, user: Optional[Dict] = None):
         """Reset user's credits based on their plan (called monthly)"""
         try:
             plan_config = self.PLAN_LIMITS.get(plan, self.PLAN_LIMITS['starter'])
             
-            self.db.table("users").update({
+            changes = {
                 'research_credits': plan_config['research_credits'],
                 'diagram_credits': plan_config['diagram_credits'],
                 'ebook_credits': plan_config['ebook_credits'],
                 'pdf_downloads': 0,
                 'credits_reset_date': (datetime.now() + timedelta(days=30)).isoformat(),
                 'updated_at': datetime.now().isoformat()
-            }).eq("user_id", user_id).execute()
+            }
+            self.db.table("users").update(changes).eq("user_id", user_id).execute()
+            self._invalidate(user_id, user, changes)
             
             # Log reset
             self.db.table("credit_transactions").insert({
@@ -261,6 +339,7 @@ class CreditService:
                 'plan': new_plan,
                 'updated_at': datetime.now().isoformat()
             }).eq("user_id", user_id).execute()
+            self._invalidate(user_id)
             
             # Log transaction
             self.db.table("credit_transactions").insert({
@@ -306,6 +385,7 @@ class CreditService:
                 'credits_reset_date': (datetime.now() + timedelta(days=30)).isoformat(),
                 'updated_at': datetime.now().isoformat()
             }).eq("user_id", user_id).execute()
+            self._invalidate(user_id)
             
             logger.info(f"Upgraded user {user_id} to {new_plan} plan")
             return True
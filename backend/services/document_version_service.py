@@ -0,0 +1,320 @@
+"""
+Document Version Service
+History of a session's LaTeX as periodic full snapshots plus compressed deltas
+
+Version 0 is the text stored in `sessions.current_latex` when the session was
+created (or, for older sessions, whatever it held when versioning started);
+that column is not rewritten afterwards. Every later version is a row in
+`session_versions`:
+- versions that are multiples of the snapshot interval store the whole text
+- the rest store a line-level delta against the previous version
+Payloads are zlib-compressed and Base64-encoded. A delta is replaced by a
+snapshot whenever it would not be smaller.
+
+Reading version v therefore needs at most one snapshot interval of rows, and a
+chat turn writes only the compressed delta. The newest text of recently used
+sessions is kept in an in-process LRU; since another worker may have written a
+newer version, a cached head is only served after a one-column read confirms
+it is still the newest version. Concurrent writers are detected by the unique
+(session_id, version) constraint and retried against the fresh head.
+"""
+
+import base64
+import difflib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Returned by save() when the session_versions table is unavailable and the
+# full text was written to sessions.current_latex instead
+UNVERSIONED = 0
+
+
+def _pack(obj) -> str:
+    data = obj.encode('utf-8') if isinstance(obj, str) else json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    return base64.b64encode(zlib.compress(data, 6)).decode('ascii')
+
+
+def _unpack(payload: str) -> bytes:
+    return zlib.decompress(base64.b64decode(payload))
+
+
+def make_delta(old: str, new: str) -> List:
+    """Line-level delta: [start, end] copies old lines, a string inserts new text"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops: List = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(new_lines[j1:j2]))
+    return ops
+
+
+def apply_delta(old: str, ops: List) -> str:
+    old_lines = old.splitlines(keepends=True)
+    return ''.join(''.join(old_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+
+def diff_changes(old: str, new: str) -> List[Dict]:
+    """Changed line ranges between two texts, in the shape the editor applies"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    changes = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            changes.append({
+                'tag': tag,
+                'from_start': i1, 'from_end': i2,
+                'to_start': j1, 'to_end': j2,
+                'text': ''.join(new_lines[j1:j2])
+            })
+    return changes
+
+
+class VersionConflict(Exception):
+    """Another writer created the same version first"""
+
+
+class DocumentVersionService:
+    def __init__(self, supabase_client: "Client", snapshot_interval: int = 10, max_cached: int = 256):
+        self.supabase = supabase_client
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.max_cached = max_cached
+        # session_id -> (user_id, version, text)
+        self._heads: "OrderedDict[str, Tuple[str, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'head_hits': 0, 'head_misses': 0, 'conflicts': 0, 'bytes_written': 0, 'bytes_full': 0}
+
+    # ------------------------------------------------------------------ head cache
+
+    def _cached_head(self, session_id: str, user_id: str) -> Optional[Tuple[int, str]]:
+        with self._lock:
+            entry = self._heads.get(session_id)
+            if entry is None or entry[0] != user_id:
+                self.stats['head_misses'] += 1
+                return None
+            self._heads.move_to_end(session_id)
+            self.stats['head_hits'] += 1
+            return entry[1], entry[2]
+
+    def _remember(self, session_id: str, user_id: str, version: int, text: str) -> None:
+        with self._lock:
+            current = self._heads.get(session_id)
+            if current and current[1] > version:
+                return
+            self._heads[session_id] = (user_id, version, text)
+            self._heads.move_to_end(session_id)
+            while len(self._heads) > self.max_cached:
+                self._heads.popitem(last=False)
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._heads.pop(session_id, None)
+
+    # ------------------------------------------------------------------ reads
+
+    def _base_text(self, session_id: str, user_id: str) -> Optional[str]:
+        """Version 0 (sessions.current_latex); None if the session is not the user's"""
+        result = (
+            self.supabase.table('sessions').select('current_latex')
+            .eq('session_id', session_id).eq('user_id', user_id).execute()
+        )
+        if not result.data:
+            return None
+        return result.data[0].get('current_latex') or ''
+
+    def _head_version(self, session_id: str) -> int:
+        """Newest version number in the database (0 when only the base text exists)"""
+        rows = (
+            self.supabase.table('session_versions').select('version')
+            .eq('session_id', session_id).order('version', desc=True).limit(1).execute().data
+        )
+        return rows[0]['version'] if rows else 0
+
+    def _rows_up_to(self, session_id: str, version: Optional[int]) -> List[Dict]:
+        """Rows from the newest snapshot at or below `version` (or the head), oldest first"""
+        query = (
+            self.supabase.table('session_versions').select('version, kind, payload')
+            .eq('session_id', session_id)
+        )
+        if version is not None:
+            query = query.lte('version', version)
+        rows = query.order('version', desc=True).limit(self.snapshot_interval).execute().data or []
+        chain = []
+        for row in rows:
+            chain.append(row)
+            if row['kind'] == 'snapshot':
+                break
+        return list(reversed(chain))
+
+    def _replay(self, base: str, rows: List[Dict]) -> str:
+        text = base
+        for row in rows:
+            raw = _unpack(row['payload'])
+            text = raw.decode('utf-8') if row['kind'] == 'snapshot' else apply_delta(text, json.loads(raw))
+        return text
+
+    def get_head(self, session_id: str, user_id: str, base_text: Optional[str] = None) -> Optional[Tuple[int, str]]:
+        """
+        Return (version, text) of the newest version, or None if the session is not found.
+
+        `base_text` is sessions.current_latex when the caller has already read it.
+        """
+        cached = self._cached_head(session_id, user_id)
+        if cached and cached[0] == self._head_version(session_id):
+            return cached
+        if base_text is None:
+            base_text = self._base_text(session_id, user_id)
+            if base_text is None:
+                return None
+        rows = self._rows_up_to(session_id, None)
+        if rows and rows[0]['kind'] != 'snapshot' and rows[0]['version'] != 1:
+            raise ValueError(f"Version chain for session {session_id} has no snapshot")
+        version = rows[-1]['version'] if rows else 0
+        text = self._replay(base_text, rows)
+        self._remember(session_id, user_id, version, text)
+        return version, text
+
+    def get_version(self, session_id: str, user_id: str, version: int) -> Optional[str]:
+        """Text of a specific version, or None if it does not exist"""
+        cached = self._cached_head(session_id, user_id)
+        if cached and cached[0] == version:
+            return cached[1]
+        base_text = self._base_text(session_id, user_id)
+        if base_text is None or version < 0:
+            return None
+        if version == 0:
+            return base_text
+        rows = self._rows_up_to(session_id, version)
+        if not rows or rows[-1]['version'] != version:
+            return None
+        return self._replay(base_text, rows)
+
+    def list_versions(self, session_id: str, limit: int = 50, before: Optional[int] = None) -> List[Dict]:
+        """Version metadata, newest first (keyset on version)"""
+        query = (
+            self.supabase.table('session_versions').select('version, kind, size, created_at')
+            .eq('session_id', session_id)
+        )
+        if before is not None:
+            query = query.lt('version', before)
+        return query.order('version', desc=True).limit(limit).execute().data or []
+
+    def diff(self, session_id: str, user_id: str, from_version: int, to_version: int) -> Optional[Dict]:
+        old = self.get_version(session_id, user_id, from_version)
+        new = self.get_version(session_id, user_id, to_version)
+        if old is None or new is None:
+            return None
+        return {
+            'from_version': from_version,
+            'to_version': to_version,
+            'changes': diff_changes(old, new),
+            'unified': ''.join(difflib.unified_diff(
+                old.splitlines(keepends=True), new.splitlines(keepends=True),
+                fromfile=f"v{from_version}", tofile=f"v{to_version}"
+            ))
+        }
+
+    # ------------------------------------------------------------------ writes
+
+    def save(self, session_id: str, user_id: str, text: str) -> Optional[int]:
+        """
+        Record `text` as the next version and return its number.
+
+        Returns the current version unchanged if the text did not change, None if
+        the session is not the user's, and UNVERSIONED if the text had to be
+        written to sessions.current_latex because session_versions is missing.
+        """
+        for attempt in range(2):
+            try:
+                head = self.get_head(session_id, user_id)
+            except Exception as e:
+                if not self._missing_table(e):
+                    raise
+                return self._save_unversioned(session_id, user_id, text)
+            if head is None:
+                return None
+            version, previous = head
+            if text == previous:
+                return version
+            try:
+                self._insert(session_id, user_id, version + 1, previous, text)
+            except VersionConflict:
+                self.stats['conflicts'] += 1
+                self.forget(session_id)
+                if attempt:
+                    raise
+                continue
+            except Exception as e:
+                if not self._missing_table(e):
+                    raise
+                return self._save_unversioned(session_id, user_id, text)
+            self._remember(session_id, user_id, version + 1, text)
+            return version + 1
+        return None
+
+    def _insert(self, session_id: str, user_id: str, version: int, previous: str, text: str) -> None:
+        snapshot = _pack(text)
+        payload, kind = snapshot, 'snapshot'
+        if version % self.snapshot_interval:
+            delta = _pack(make_delta(previous, text))
+            if len(delta) < len(snapshot):
+                payload, kind = delta, 'delta'
+        try:
+            self.supabase.table('session_versions').insert({
+                'session_id': session_id,
+                'user_id': user_id,
+                'version': version,
+                'kind': kind,
+                'payload': payload,
+                'size': len(text)
+            }).execute()
+        except Exception as e:
+            if 'duplicate key' in str(e) or '23505' in str(e):
+                raise VersionConflict(str(e))
+            raise
+        self.stats['bytes_written'] += len(payload)
+        self.stats['bytes_full'] += len(text.encode('utf-8'))
+
+    @staticmethod
+    def _missing_table(error: Exception) -> bool:
+        message = str(error)
+        return 'session_versions' in message and ('does not exist' in message or 'PGRST205' in message or '42P01' in message)
+
+    def _save_unversioned(self, session_id: str, user_id: str, text: str) -> Optional[int]:
+        logger.warning("session_versions table missing, writing full LaTeX to sessions.current_latex")
+        result = (
+            self.supabase.table('sessions').update({'current_latex': text})
+            .eq('session_id', session_id).eq('user_id', user_id).execute()
+        )
+        return UNVERSIONED if result.data else None
+
+
+# Singleton instance
+_document_version_service: Optional[DocumentVersionService] = None
+
+
+def get_document_version_service(supabase_client: "Client") -> DocumentVersionService:
+    """Get or create the document version service singleton"""
+    global _document_version_service
+    if _document_version_service is None:
+        _document_version_service = DocumentVersionService(
+            supabase_client,
+            snapshot_interval=settings.DOCUMENT_SNAPSHOT_INTERVAL,
+            max_cached=settings.DOCUMENT_CACHE_MAX_ENTRIES
+        )
+    return _document_version_service
@@ -9,6 +9,9 @@ from services.pexels_service import PexelsService
 from services.cache_service import CacheService
 from backend.prompts import latex_prompts
 from backend.core.config import settings
+from backend.core.llm_cache import cache_key, get_llm_cache
+from backend.core.llm_resilience import get_resilient_llm
+from backend.core.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -17,13 +20,26 @@ class GeminiService:
         api_key = settings.GEMINI_API_KEY
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
-        self.client = genai.Client(api_key=api_key)
+        self.client = genai.Client(api_key=api_key, http_options=settings.gemini_http_options())
         self.perplexity_service = PerplexityService()
         self.web_scraper = WebScraperService()
         self.pexels_service = PexelsService()
         self.cache_service = CacheService()
         self.CACHE_VERSION = "v1"
+        self.llm = get_resilient_llm()
+    
+    def generate_content(self, model: str, contents, config=None, hedge: bool = False,
+                         mode: Optional[str] = None, tier: Optional[str] = None):
+        """
+        Call the model through the shared LLM scheduler (concurrency, TPM budget, fairness),
+        bounded by the request deadline and falling back to the starter model on failure.
+        `hedge=True` races a starter-model request against slow primaries; `mode` and
+        `tier` label the call's token and latency accounting.
+        """
+        with span('gemini.generate_content', phase='gemini', model=model, mode=mode, hedge=hedge):
+            return self.llm.generate(self.client, model, contents, config=config, hedge=hedge, mode=mode, tier=tier)
         
+    @traced('gemini.generate_latex')
     def generate_latex_from_prompt(self, prompt: str, mode: str = 'normal', tier: str = 'pro', research_context: Optional[str] = None, citations: Optional[list] = None) -> str:
         """Generate LaTeX document from user prompt with mode and tier support"""
         
@@ -74,13 +90,11 @@ class GeminiService:
             if citations:
                 # Deep Scrape top citations
                 deep_content = ""
-                for i, url in enumerate(citations[:4]):
-                    try:
-                        text = self.web_scraper.scrape_url(url)
-                        if text:
-                            deep_content += f"\n--- SOURCE {i+1}: {url} ---\n{text[:2000]}...\n"
-                    except Exception as e:
-                        logger.warning(f"Failed to scrape {url}: {e}")
+                top_citations = citations[:4]
+                # Fetched concurrently; scrape_url never raises (failures come back as "")
+                for i, (url, text) in enumerate(zip(top_citations, self.web_scraper.scrape_urls(top_citations))):
+                    if text:
+                        deep_content += f"\n--- SOURCE {i+1}: {url} ---\n{text[:2000]}...\n"
                 
                 if deep_content:
                     research_section += f"\nFULL SOURCE CONTENT:\n{deep_content}"
@@ -145,9 +159,13 @@ class GeminiService:
                 pass
 
             # Proceed with direct generation for now to ensure stability
-            response = self.client.models.generate_content(
+            # (falls back to the starter model if the primary fails or is slow)
+            response = self.generate_content(
                 model=model_name,
-                contents=system_prompt
+                contents=system_prompt,
+                hedge=True,
+                mode=mode,
+                tier=tier
             )
             
             latex_content = self._clean_latex(response.text)
@@ -167,19 +185,9 @@ class GeminiService:
 
         except Exception as e:
             logger.error(f"Error generating LaTeX: {str(e)}")
-            # Try fallback model if 404
-            if "404" in str(e) or "not found" in str(e).lower():
-                logger.warning("Primary model failed, trying fallback gemini-1.5-flash...")
-                try:
-                    response = self.client.models.generate_content(
-                        model=settings.GEMINI_MODEL_STARTER,
-                        contents=system_prompt
-                    )
-                    return self._clean_latex(response.text)
-                except Exception as e2:
-                    logger.error(f"Fallback failed: {e2}")
             raise
 
+    @traced('gemini.modify_latex')
     def modify_latex(self, current_latex: str, modification_request: str, mode: str = 'normal') -> str:
         """Modify LaTeX based on request"""
         
@@ -195,15 +203,18 @@ class GeminiService:
             )
         
         try:
-            response = self.client.models.generate_content(
+            response = self.generate_content(
                 model=settings.GEMINI_MODEL_PRO,
-                contents=system_prompt
+                contents=system_prompt,
+                hedge=True,
+                mode='modify'
             )
             return self._clean_latex(response.text)
         except Exception as e:
             logger.error(f"Error modifying LaTeX: {e}")
             raise
 
+    @traced('gemini.generate_html')
     def generate_html_from_prompt(self, prompt: str, mode: str = 'normal', tier: str = 'pro') -> Dict[str, str]:
         """Orchestrator for generation"""
         research_context = None
@@ -254,11 +265,29 @@ class GeminiService:
         return text
 
     # ... keep other methods like format_content_for_pdf if needed, or stub them
-    def format_content_for_pdf(self, markdown: str, conversion_type: str, metadata: Dict, options: Dict) -> str:
+    def format_content_for_pdf(self, markdown: str, conversion_type: str, metadata: Dict, options: Dict,
+                               cache: bool = False) -> str:
          # Simplified version reusing logic
-         return self.generate_latex_from_prompt(f"Convert this markdown to {conversion_type}: {markdown[:1000]}...", mode='normal')
+         prompt = f"Convert this markdown to {conversion_type}: {markdown[:1000]}..."
+         if not cache:
+             return self.generate_latex_from_prompt(prompt, mode='normal')
+         key = cache_key(settings.GEMINI_MODEL_PRO, prompt, namespace=f"format_content:{self.CACHE_VERSION}")
+         return get_llm_cache().get_or_compute(key, lambda: self.generate_latex_from_prompt(prompt, mode='normal'))
 
-    def extract_json_from_markdown(self, prompt: str, schema: Dict) -> Dict:
+    def extract_json_from_markdown(self, prompt: str, schema: Dict, cache: bool = False) -> Dict:
+        """
+        Structured JSON extraction on the starter model.
+
+        `cache=True` serves byte-identical (prompt, schema) calls from the LLM
+        response cache and coalesces concurrent duplicates.
+        """
+        if not cache:
+            return self._extract_json(prompt, schema)
+        key = cache_key(settings.GEMINI_MODEL_STARTER, prompt, schema, namespace=f"extract_json:{self.CACHE_VERSION}")
+        return get_llm_cache().get_or_compute(key, lambda: self._extract_json(prompt, schema))
+
+    @traced('gemini.extract_json')
+    def _extract_json(self, prompt: str, schema: Dict) -> Dict:
         import json
         try:
             # Use structured output if available in SDK
@@ -271,10 +300,11 @@ class GeminiService:
             # Switch to FLASH model for better stability/availability
             # Use settings constant which now points to the valid 2.5 model
             # OPTIMIZATION: Use STARTER (Flash) for JSON extraction to improve speed
-            response = self.client.models.generate_content(
+            response = self.generate_content(
                 model=settings.GEMINI_MODEL_STARTER, 
                 contents=prompt,
-                config=config
+                config=config,
+                mode='extract_json'
             )
             
             # Additional safety: handle if response is null or text is empty
@@ -290,9 +320,10 @@ class GeminiService:
             try:
                 # Fallback: simplified prompt
                 fallback_prompt = f"{prompt}\n\nRETURN ONLY RAW JSON. NO MARKDOWN."
-                response = self.client.models.generate_content(
+                response = self.generate_content(
                     model=settings.GEMINI_MODEL_STARTER, # Use valid model from settings
-                    contents=fallback_prompt
+                    contents=fallback_prompt,
+                    mode='extract_json'
                 )
                 text = self._clean_latex(response.text) # Reusing clean method to strip markdown
                 if text.startswith('json'): text = text[4:].strip()
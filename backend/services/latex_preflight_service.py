@@ -0,0 +1,369 @@
+"""
+LaTeX Pre-flight Service
+Static checks that reject doomed documents before pdflatex runs
+
+A compile that fails on a missing \\end{document}, an unbalanced brace or a
+package that is not installed still costs one or two pdflatex processes (up
+to the 120s timeout). PDFService runs `preflight()` first:
+
+- one tokenizing pass (comments, \\verb and verbatim-like environments are
+  skipped) checks brace balance and \\begin/\\end pairing in the body;
+  \\url/\\href/\\path arguments are read verbatim (a '%' there is not a
+  comment) and \\newcommand/\\newenvironment/\\def bodies only need to be
+  balanced, their \\begin/\\end are not tracked
+- \\documentclass, \\usepackage and \\RequirePackage names are looked up in an
+  index of installed .cls/.sty files read from the kpathsea ls-R databases
+  ($TEXMFDBS); names missing from the index are confirmed with `kpsewhich`
+  once, so files outside the databases never cause a false rejection
+- trivially repairable problems are fixed instead: environments still open at
+  \\end{document} are closed, and a missing \\end{document} is appended
+
+Anything else is returned as line-numbered diagnostics and PDFService raises
+LatexPreflightError without starting pdflatex. Without kpathsea (e.g. MiKTeX)
+the package check is skipped.
+"""
+
+import bisect
+import os
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import logging
+
+from backend.core.metrics import get_metrics
+from backend.core.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_RESULTS = get_metrics().counter(
+    'latex_preflight_total', 'Documents checked before compiling', ('outcome',)
+)
+
+# Environments whose content is not TeX (braces and \begin inside them are literal)
+VERBATIM_ENVIRONMENTS = frozenset({'verbatim', 'verbatim*', 'Verbatim', 'BVerbatim', 'lstlisting', 'minted', 'comment'})
+
+TOKEN = re.compile(
+    r'\\(?:'
+    r'verb\*?(?P<verb>[^A-Za-z\s*])'
+    r'|(?P<verbatim_arg>url|href|path|nolinkurl)(?![A-Za-z@])'
+    r'|(?P<define>(?:re)?newcommand|providecommand|DeclareRobustCommand|(?:re)?newenvironment|[gex]?def)(?![A-Za-z@])'
+    r'|(?P<env>begin|end)\s*\{(?P<env_name>[^{}]*)\}'
+    r'|(?P<load>usepackage|RequirePackage|documentclass)(?![A-Za-z@])'
+    r'|[A-Za-z@]+|[\s\S])'
+    r'|(?P<comment>%[^\n]*)'
+    r'|(?P<brace>[{}])'
+)
+# \usepackage[options]{a,b}: options may contain one level of braces
+LOAD_ARGUMENTS = re.compile(r'\s*(?:\[(?:[^\[\]{}]|\{[^{}]*\})*\])?\s*\{(?P<names>[^{}]*)\}')
+# What precedes the body of \newcommand*{\name}[2][default] / \newenvironment{name}[1] / \def\name#1#2
+DEFINITION_HEAD = re.compile(
+    r'\*?\s*(?:\{\s*\\(?:[A-Za-z@]+|.)\s*\}|\\(?:[A-Za-z@]+|.)|\{[^{}]*\})\s*(?:\[[^\]]*\]\s*){0,2}'
+)
+DEF_HEAD = re.compile(r'\s*\\(?:[A-Za-z@]+|.)[^{%\n]*')
+SPACES = re.compile(r'\s*')
+# Inside a group: escaped characters and comments do not count as braces
+GROUP_TOKEN = re.compile(r'\\[\s\S]|%[^\n]*|[{}]')
+# \url{...} and friends take their argument verbatim: only the braces count
+VERBATIM_GROUP_TOKEN = re.compile(r'[{}]')
+
+
+def group_end(latex: str, start: int, tokens=GROUP_TOKEN) -> Optional[int]:
+    """Offset just past the group opened by the '{' at `start`, or None if it is never closed"""
+    depth = 0
+    for match in tokens.finditer(latex, start):
+        if match.group(0) == '{':
+            depth += 1
+        elif match.group(0) == '}':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return None
+
+
+class LatexPreflightError(Exception):
+    """The document cannot compile; carries the line-numbered diagnostics"""
+
+    def __init__(self, diagnostics: List['Diagnostic']):
+        self.diagnostics = diagnostics
+        super().__init__("LaTeX pre-flight failed:\n" + "\n".join(str(d) for d in diagnostics))
+
+
+@dataclass
+class Diagnostic:
+    line: int
+    code: str
+    message: str
+    fixed: bool = False
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}" + (" (fixed)" if self.fixed else "")
+
+
+@dataclass
+class PreflightResult:
+    latex: str
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+    packages: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def errors(self) -> List[Diagnostic]:
+        return [d for d in self.diagnostics if not d.fixed]
+
+    @property
+    def fixed(self) -> List[Diagnostic]:
+        return [d for d in self.diagnostics if d.fixed]
+
+
+class TexPackageIndex:
+    """Installed .sty/.cls file names from kpathsea's ls-R databases"""
+
+    def __init__(self, files: Optional[FrozenSet[str]] = None, source: str = 'unavailable', verify: bool = True):
+        self.files = files
+        self.source = source
+        self.verify = verify  # confirm misses with kpsewhich
+        self._confirmed: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.files is not None
+
+    @classmethod
+    def from_kpathsea(cls) -> 'TexPackageIndex':
+        try:
+            result = subprocess.run(
+                ['kpsewhich', '-expand-path', '$TEXMFDBS'], capture_output=True, text=True, timeout=10,
+                stdin=subprocess.DEVNULL
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.info("kpathsea not available, LaTeX package check disabled: %s", e)
+            return cls()
+        databases = [Path(d) / 'ls-R' for d in result.stdout.strip().split(os.pathsep) if d]
+        files = set()
+        read = []
+        for database in databases:
+            try:
+                with open(database, encoding='utf-8', errors='ignore') as f:
+                    files.update(cls.parse_ls_r(f))
+                read.append(str(database))
+            except OSError:
+                continue
+        if not read:
+            logger.info("No kpathsea ls-R database found, LaTeX package check disabled")
+            return cls()
+        logger.info("Indexed %d LaTeX classes/packages from %d ls-R databases", len(files), len(read))
+        return cls(frozenset(files), source=', '.join(read))
+
+    @staticmethod
+    def parse_ls_r(lines) -> List[str]:
+        """File names ending in .sty or .cls (directory headers end with ':')"""
+        return [
+            line.strip() for line in lines
+            if line.rstrip().endswith(('.sty', '.cls')) and not line.rstrip().endswith(':')
+        ]
+
+    def has(self, filename: str) -> Optional[bool]:
+        """True/False when known; None when there is no index to ask"""
+        if self.files is None:
+            return None
+        if filename in self.files:
+            return True
+        if not self.verify:
+            return False
+        with self._lock:
+            if filename in self._confirmed:
+                return self._confirmed[filename]
+        # Not in the databases: it may still live in a tree without ls-R (e.g. TEXMFHOME)
+        try:
+            found = subprocess.run(
+                ['kpsewhich', filename], capture_output=True, text=True, timeout=10, stdin=subprocess.DEVNULL
+            ).returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            found = True  # cannot tell, let pdflatex decide
+        with self._lock:
+            self._confirmed[filename] = found
+        return found
+
+
+class LatexPreflightService:
+    def __init__(self, index: Optional[TexPackageIndex] = None):
+        self._index = index
+        self._index_lock = threading.Lock()
+
+    @property
+    def index(self) -> TexPackageIndex:
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = TexPackageIndex.from_kpathsea()
+        return self._index
+
+    def build_index_in_background(self) -> None:
+        """Read the ls-R databases off the request path (called at server start-up)"""
+        threading.Thread(target=lambda: self.index, name='tex-package-index', daemon=True).start()
+
+    @traced('pdf.preflight')
+    def preflight(self, latex: str) -> PreflightResult:
+        """Check (and trivially repair) `latex`; the result's `errors` mean it cannot compile"""
+        started = time.perf_counter()
+        result = self._analyze(latex)
+        result.seconds = time.perf_counter() - started
+        outcome = 'rejected' if result.errors else ('fixed' if result.fixed else 'ok')
+        PREFLIGHT_RESULTS.inc(outcome=outcome)
+        if result.diagnostics:
+            logger.info(
+                "LaTeX pre-flight %s in %.1fms: %s", outcome, result.seconds * 1000,
+                '; '.join(str(d) for d in result.diagnostics[:5])
+            )
+        return result
+
+    def _analyze(self, latex: str) -> PreflightResult:
+        newlines = [m.start() for m in re.finditer('\n', latex)]
+
+        def line_of(offset: int) -> int:
+            return bisect.bisect_right(newlines, offset - 1) + 1
+
+        diagnostics: List[Diagnostic] = []
+        packages: List[Tuple[str, str, int]] = []  # (name, extension, line)
+        braces: List[int] = []
+        environments: List[Tuple[str, int]] = []
+        begin_document = end_document = None
+        pos = 0
+
+        while True:
+            match = TOKEN.search(latex, pos)
+            if match is None:
+                break
+            pos = match.end()
+            if match.group('comment') is not None:
+                continue
+            brace = match.group('brace')
+            if brace == '{':
+                braces.append(match.start())
+            elif brace == '}':
+                if braces:
+                    braces.pop()
+                else:
+                    diagnostics.append(Diagnostic(line_of(match.start()), 'unmatched_brace', "'}' without a matching '{'"))
+            elif match.group('verb') is not None:
+                close = latex.find(match.group('verb'), pos)
+                newline = latex.find('\n', pos)
+                if close == -1 or (newline != -1 and newline < close):
+                    diagnostics.append(Diagnostic(line_of(match.start()), 'unterminated_verb', "\\verb argument is not closed on the same line"))
+                else:
+                    pos = close + 1
+            elif match.group('verbatim_arg') is not None:
+                # \url{https://example.com/a%20b}: '%', '#' and '\\' are literal here
+                start = SPACES.match(latex, pos).end()
+                if latex.startswith('{', start):
+                    end = group_end(latex, start, VERBATIM_GROUP_TOKEN)
+                    if end is not None:
+                        pos = end
+                elif start < len(latex) and not latex[start].isalnum():
+                    close = latex.find(latex[start], start + 1)
+                    newline = latex.find('\n', start + 1)
+                    if close != -1 and (newline == -1 or close < newline):
+                        pos = close + 1
+            elif match.group('define') is not None:
+                # Definition bodies are balanced text, not document structure: a
+                # \begin{center} in a \newcommand is not an open environment
+                define = match.group('define')
+                head = (DEF_HEAD if define.endswith('def') else DEFINITION_HEAD).match(latex, pos)
+                if head is not None:
+                    end = head.end()
+                    for _ in range(2 if define.endswith('environment') else 1):
+                        end = SPACES.match(latex, end).end()
+                        if not latex.startswith('{', end):
+                            break
+                        end = group_end(latex, end)
+                        if end is None:
+                            break  # unbalanced: let the brace check report it
+                        pos = end
+            elif match.group('env') is not None:
+                name = match.group('env_name').strip()
+                line = line_of(match.start())
+                if match.group('env') == 'begin':
+                    if name == 'document':
+                        begin_document = match.start()
+                        continue
+                    if name in VERBATIM_ENVIRONMENTS:
+                        end = latex.find(f'\\end{{{name}}}', pos)
+                        if end == -1:
+                            diagnostics.append(Diagnostic(line, 'unclosed_environment', f"\\begin{{{name}}} is never closed"))
+                            break
+                        pos = end + len(f'\\end{{{name}}}')
+                        continue
+                    if begin_document is not None:
+                        environments.append((name, line))
+                elif name == 'document':
+                    end_document = match.start()
+                    if environments:
+                        # Trivially repairable: close what is still open, innermost first
+                        closers = ''.join(f'\\end{{{env}}}\n' for env, _ in reversed(environments))
+                        for env, opened in reversed(environments):
+                            diagnostics.append(Diagnostic(opened, 'unclosed_environment', f"\\begin{{{env}}} closed before \\end{{document}}", fixed=True))
+                        latex = latex[:end_document] + closers + latex[end_document:]
+                        end_document += len(closers)
+                        environments = []
+                    break  # TeX ignores everything after \end{document}
+                elif begin_document is not None:
+                    if not environments:
+                        diagnostics.append(Diagnostic(line, 'unmatched_end', f"\\end{{{name}}} without a matching \\begin"))
+                    elif environments[-1][0] != name:
+                        open_name, opened = environments[-1]
+                        diagnostics.append(Diagnostic(line, 'mismatched_environment', f"\\end{{{name}}} closes \\begin{{{open_name}}} from line {opened}"))
+                        environments.pop()
+                    else:
+                        environments.pop()
+            elif match.group('load') is not None:
+                arguments = LOAD_ARGUMENTS.match(latex, pos)
+                if arguments is not None:
+                    pos = arguments.end()
+                    extension = '.cls' if match.group('load') == 'documentclass' else '.sty'
+                    line = line_of(match.start())
+                    for name in arguments.group('names').split(','):
+                        name = name.strip()
+                        if name and not name.startswith('#'):
+                            packages.append((name, extension, line))
+
+        if not any(extension == '.cls' for _, extension, _ in packages):
+            diagnostics.append(Diagnostic(1, 'missing_documentclass', "no \\documentclass"))
+        if begin_document is None:
+            diagnostics.append(Diagnostic(line_of(len(latex)), 'missing_begin_document', "no \\begin{document}"))
+        elif end_document is None and not any(d.code in ('unclosed_environment', 'unterminated_verb') and not d.fixed for d in diagnostics):
+            # Truncated output: close open environments and the document
+            tail = ''.join(f'\\end{{{env}}}\n' for env, _ in reversed(environments)) + '\\end{document}\n'
+            for env, opened in reversed(environments):
+                diagnostics.append(Diagnostic(opened, 'unclosed_environment', f"\\begin{{{env}}} closed at end of input", fixed=True))
+            diagnostics.append(Diagnostic(line_of(len(latex)), 'missing_end_document', "\\end{document} appended", fixed=True))
+            latex = latex.rstrip('\n') + '\n' + tail
+        for opened in braces:
+            diagnostics.append(Diagnostic(line_of(opened), 'unclosed_brace', "'{' is never closed"))
+
+        index = self.index
+        if index.available:
+            for name, extension, line in packages:
+                if index.has(name + extension) is False:
+                    kind = 'document class' if extension == '.cls' else 'package'
+                    diagnostics.append(Diagnostic(line, 'missing_package', f"{kind} '{name}' is not installed ({name}{extension})"))
+
+        diagnostics.sort(key=lambda d: (d.line, d.fixed))
+        return PreflightResult(latex=latex, diagnostics=diagnostics, packages=[n for n, _, _ in packages])
+
+
+_preflight_service: Optional[LatexPreflightService] = None
+_service_lock = threading.Lock()
+
+
+def get_latex_preflight_service() -> LatexPreflightService:
+    global _preflight_service
+    if _preflight_service is None:
+        with _service_lock:
+            if _preflight_service is None:
+                _preflight_service = LatexPreflightService()
+    return _preflight_service
@@ -0,0 +1,121 @@
+"""
+LaTeX Repair Service
+Patches the lines around a compile error with the fast model instead of regenerating the document
+
+When LATEX_REPAIR_ENABLED is set, PDFService hands a failed compile's parsed
+log errors (services/tex_log_service.py) to `repair()`. Only the first error
+with a source line is addressed per attempt (later errors are usually its
+consequences): LATEX_REPAIR_CONTEXT_LINES lines either side of it are sent to
+the starter model, and its answer replaces exactly that excerpt. Answers that
+are empty, unchanged, out of proportion or that bring their own preamble are
+discarded. PDFService recompiles after each patch, up to
+LATEX_REPAIR_MAX_ATTEMPTS times.
+"""
+
+import re
+import threading
+from typing import List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+from backend.core.metrics import get_metrics
+from backend.core.tracing import traced
+from backend.prompts import latex_prompts
+from backend.services.tex_log_service import TexError
+
+logger = logging.getLogger(__name__)
+
+REPAIR_ATTEMPTS = get_metrics().counter(
+    'latex_repair_attempts_total', 'Compile errors sent to the fast model for a local patch', ('outcome',)
+)
+
+NUMBERED_LINE = re.compile(r'^\s*\d+\| ?')
+FENCE = re.compile(r'^```[a-z]*\s*\n?|\n?```\s*$')
+
+
+class LatexRepairService:
+    def __init__(self, gemini_service=None, context_lines: Optional[int] = None):
+        self._gemini = gemini_service
+        self.context_lines = settings.LATEX_REPAIR_CONTEXT_LINES if context_lines is None else context_lines
+
+    @property
+    def gemini(self):
+        if self._gemini is None:
+            from backend.core.providers import get_gemini_service
+            self._gemini = get_gemini_service()
+        return self._gemini
+
+    @staticmethod
+    def locate(errors: List[TexError]) -> Optional[TexError]:
+        return next((e for e in errors if e.line), None)
+
+    def excerpt(self, lines: List[str], line: int) -> Tuple[int, int]:
+        """1-based inclusive (start, end) of the window around `line`"""
+        line = min(max(line, 1), len(lines))
+        return max(1, line - self.context_lines), min(len(lines), line + self.context_lines)
+
+    def build_prompt(self, lines: List[str], error: TexError) -> Tuple[str, int, int]:
+        start, end = self.excerpt(lines, error.line)
+        numbered = '\n'.join(f"{n:>4}| {lines[n - 1]}" for n in range(start, end + 1))
+        details = error.description
+        if error.missing_file:
+            details += f"\nThe file '{error.missing_file}' is not installed; do not use it."
+        prompt = latex_prompts.LATEX_REPAIR_PROMPT.format(
+            start=start, end=end, line=error.line, error=details, excerpt=numbered
+        )
+        return prompt, start, end
+
+    @staticmethod
+    def clean_patch(text: str) -> List[str]:
+        text = FENCE.sub('', text.strip()).strip('\n')
+        lines = text.split('\n')
+        if lines and all(NUMBERED_LINE.match(line) for line in lines if line.strip()):
+            lines = [NUMBERED_LINE.sub('', line) for line in lines]
+        return lines
+
+    @traced('pdf.repair')
+    def repair(self, latex: str, errors: List[TexError]) -> Optional[str]:
+        """`latex` with the excerpt around the first located error patched, or None"""
+        error = self.locate(errors)
+        if error is None:
+            REPAIR_ATTEMPTS.inc(outcome='unlocated')
+            return None
+        lines = latex.split('\n')
+        prompt, start, end = self.build_prompt(lines, error)
+        original = lines[start - 1:end]
+        try:
+            response = self.gemini.generate_content(
+                model=settings.GEMINI_MODEL_STARTER, contents=prompt, mode='latex_repair'
+            )
+            patch = self.clean_patch(response.text or '')
+        except Exception as e:
+            logger.warning("LaTeX repair request failed: %s", e)
+            REPAIR_ATTEMPTS.inc(outcome='llm_error')
+            return None
+
+        patched_text = '\n'.join(patch)
+        original_text = '\n'.join(original)
+        if (not patched_text.strip() or patch == original
+                or len(patched_text) > 3 * len(original_text) + 500
+                or ('\\documentclass' in patched_text and '\\documentclass' not in original_text)
+                or ('\\begin{document}' in patched_text and '\\begin{document}' not in original_text)):
+            logger.info("Discarded LaTeX repair for line %d: %r", error.line, patched_text[:200])
+            REPAIR_ATTEMPTS.inc(outcome='rejected')
+            return None
+
+        REPAIR_ATTEMPTS.inc(outcome='patched')
+        logger.info("Patched lines %d-%d for: %s", start, end, error)
+        return '\n'.join(lines[:start - 1] + patch + lines[end:])
+
+
+_repair_service: Optional[LatexRepairService] = None
+_service_lock = threading.Lock()
+
+
+def get_latex_repair_service() -> LatexRepairService:
+    global _repair_service
+    if _repair_service is None:
+        with _service_lock:
+            if _repair_service is None:
+                _repair_service = LatexRepairService()
+    return _repair_service
@@ -0,0 +1,156 @@
+"""
+LaTeX Sanitizer Service
+Rewrites known-problematic packages and fonts in one pass over the document
+
+Each workaround is a SanitizeRule (regex pattern + replacement). All enabled
+rules are compiled into a single alternation `(?P<r0>...)|(?P<r1>...)|...`,
+so sanitizing costs one scan however many rules exist; the matched group
+name dispatches to the rule. Replacements may refer to the rule's own
+numbered groups (\\1), which are renumbered to their place in the
+alternation; named groups and backreferences are not allowed inside rule
+patterns. Lookarounds see the whole document, not just the matched text.
+
+A rule with `requires` only fires after the named rule fired earlier in the
+same document (mathastext is only dropped when FiraSans was replaced; it is
+loaded after the font, so one forward pass sees them in order).
+
+Extra rules come from LATEX_SANITIZE_RULES, a JSON list of
+{"name", "pattern", "replacement", "requires"?} objects; built-in rules are
+switched off by name with LATEX_SANITIZE_DISABLED. Hits are counted per rule
+in latex_sanitize_rule_hits_total.
+"""
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+from backend.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+RULE_HITS = get_metrics().counter(
+    'latex_sanitize_rule_hits_total', 'Sanitizer rule replacements applied', ('rule',)
+)
+
+# Backreferences (\1, (?(1)...)) in a rule pattern would point at another rule's groups
+BACKREFERENCE = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(')
+# Group references in a replacement; escaped backslashes are matched first so they stay literal
+TEMPLATE_GROUP = re.compile(r'\\\\|\\g<(\d+)>|\\([1-9]\d?)')
+
+# Optional [options] of \usepackage (one level of nested braces allowed)
+OPTIONS = r'(?:\[(?:[^\[\]{}]|\{[^{}]*\})*\])?'
+
+
+@dataclass(frozen=True)
+class SanitizeRule:
+    name: str
+    pattern: str
+    replacement: str
+    requires: Optional[str] = None
+
+
+def usepackage(package: str) -> str:
+    return r'\\usepackage\s*' + OPTIONS + r'\s*\{\s*' + re.escape(package) + r'\s*\}'
+
+
+DEFAULT_RULES: Tuple[SanitizeRule, ...] = (
+    # FiraSans is not in our TeX Live image: fall back to Helvetica as the sans default
+    SanitizeRule('firasans', usepackage('FiraSans'), r'\\usepackage{helvet}\\renewcommand{\\familydefault}{\\sfdefault}'),
+    # mathastext paired with FiraSans expects the missing font's metrics
+    SanitizeRule('mathastext', usepackage('mathastext'), '% mathastext removed', requires='firasans'),
+    # sansmathaccent needs mathkerncmssi10, which is not installed
+    SanitizeRule('sansmathaccent', usepackage('sansmathaccent'), '% sansmathaccent removed (font not available)'),
+    # Fonts the generation prompts forbid, for output that uses them anyway
+    SanitizeRule('beramono', usepackage('beramono'), '% beramono removed (font not available)'),
+    SanitizeRule('libertine', usepackage('libertine'), '% libertine removed (font not available)'),
+    SanitizeRule('fvm', r'\{\s*fvm\s*\}', '{pcr}'),
+)
+
+
+class LatexSanitizer:
+    """Applies a rule table in one regex pass"""
+
+    def __init__(self, rules: Iterable[SanitizeRule]):
+        self.rules: List[SanitizeRule] = list(rules)
+        self._templates: Dict[str, str] = {}
+        alternatives = []
+        offset = 1  # number of the rule's own (?P<rN>...) group in the alternation
+        for index, rule in enumerate(self.rules):
+            compiled = re.compile(rule.pattern)
+            if compiled.groupindex:
+                raise ValueError(f"Sanitize rule '{rule.name}' must not use named groups")
+            if BACKREFERENCE.search(rule.pattern):
+                raise ValueError(f"Sanitize rule '{rule.name}' must not use backreferences")
+            self._templates[f"r{index}"] = _shift_groups(rule, offset, compiled.groups)
+            alternatives.append(f"(?P<r{index}>{rule.pattern})")
+            offset += compiled.groups + 1
+        self._by_group = {f"r{index}": rule for index, rule in enumerate(self.rules)}
+        self._combined = re.compile('|'.join(alternatives)) if alternatives else None
+        self._names = {rule.name for rule in self.rules}
+        for rule in self.rules:
+            if rule.requires and rule.requires not in self._names:
+                raise ValueError(f"Sanitize rule '{rule.name}' requires unknown rule '{rule.requires}'")
+
+    def sanitize(self, latex: str) -> Tuple[str, Dict[str, int]]:
+        """(sanitized latex, {rule name: replacements})"""
+        if self._combined is None:
+            return latex, {}
+        fired: Dict[str, int] = {}
+
+        def replace(match: "re.Match") -> str:
+            group = match.lastgroup
+            rule = self._by_group[group]
+            if rule.requires and rule.requires not in fired:
+                return match.group(0)
+            fired[rule.name] = fired.get(rule.name, 0) + 1
+            return match.expand(self._templates[group])
+
+        sanitized = self._combined.sub(replace, latex)
+        for name, count in fired.items():
+            RULE_HITS.inc(count, rule=name)
+        if fired:
+            logger.info("Sanitized LaTeX: %s", ', '.join(f"{name} x{count}" for name, count in fired.items()))
+        return sanitized, fired
+
+
+def _shift_groups(rule: SanitizeRule, offset: int, groups: int) -> str:
+    """`rule.replacement` with its group references renumbered for the combined pattern"""
+    def shift(ref: "re.Match") -> str:
+        number = ref.group(1) or ref.group(2)
+        if number is None:
+            return ref.group(0)
+        if int(number) > groups:
+            raise ValueError(f"Sanitize rule '{rule.name}' refers to missing group {number}")
+        return f"\\g<{int(number) + offset}>"
+
+    return TEMPLATE_GROUP.sub(shift, rule.replacement)
+
+
+def load_rules(extra_json: str = '', disabled: str = '') -> List[SanitizeRule]:
+    """DEFAULT_RULES minus `disabled` (comma-separated names), plus the rules in `extra_json`"""
+    off = {name.strip() for name in disabled.split(',') if name.strip()}
+    rules = [rule for rule in DEFAULT_RULES if rule.name not in off]
+    if extra_json.strip():
+        for entry in json.loads(extra_json):
+            rules.append(SanitizeRule(
+                name=entry['name'], pattern=entry['pattern'], replacement=entry.get('replacement', ''),
+                requires=entry.get('requires'),
+            ))
+    return rules
+
+
+_sanitizer: Optional[LatexSanitizer] = None
+_lock = threading.Lock()
+
+
+def get_latex_sanitizer() -> LatexSanitizer:
+    global _sanitizer
+    if _sanitizer is None:
+        with _lock:
+            if _sanitizer is None:
+                _sanitizer = LatexSanitizer(load_rules(settings.LATEX_SANITIZE_RULES, settings.LATEX_SANITIZE_DISABLED))
+    return _sanitizer
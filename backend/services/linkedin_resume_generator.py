@@ -8,6 +8,8 @@ from services.perplexity_service import PerplexityService
 from services.web_scraper_service import WebScraperService
 from services.pexels_service import PexelsService
 from services.cache_service import CacheService
+from backend.core.config import settings
+from backend.core.llm_resilience import get_resilient_llm
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +18,7 @@ class GeminiService:
         api_key = os.environ.get('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
-        self.client = genai.Client(api_key=api_key)
+        self.client = genai.Client(api_key=api_key, http_options=settings.gemini_http_options())
         self.perplexity_service = PerplexityService()
         self.web_scraper = WebScraperService()
         self.pexels_service = PexelsService()
@@ -77,9 +79,11 @@ Generate ONLY the complete LaTeX code, nothing else. No explanations, no markdow
 """
         
         try:
-            response = self.client.models.generate_content(
+            response = get_resilient_llm().generate(
+                self.client,
                 model=settings.GEMINI_MODEL_STARTER,
-                contents=system_prompt
+                contents=system_prompt,
+                mode='linkedin'
             )
             latex_content = response.text.strip()
             
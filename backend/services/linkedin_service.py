@@ -1,19 +1,19 @@
 import os
 import logging
 from typing import Dict, Optional
-from firecrawl import FirecrawlApp
-from services.gemini_service import GeminiService
+from backend.core.providers import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
 class LinkedInService:
     def __init__(self):
-        self.gemini_service = GeminiService() # Initialize Gemini Service
+        self.gemini_service = get_gemini_service() # Shared Gemini Service
         api_key = os.environ.get('FIRECRAWL_API_KEY')
         if not api_key:
             logger.warning("FIRECRAWL_API_KEY not found in environment variables")
             self.client = None
         else:
+            from firecrawl import FirecrawlApp  # deferred: a heavy import, only needed with a key
             self.client = FirecrawlApp(api_key=api_key)
             logger.info("Firecrawl client initialized successfully")
     
@@ -127,7 +127,7 @@ class LinkedInService:
             
             # STEP 2: Extract structured data using Gemini
             logger.info("Step 2: Extracting structured data using Gemini...")
-            extracted_data = self.gemini_service.extract_json_from_markdown(markdown_content, schema)
+            extracted_data = self.gemini_service.extract_json_from_markdown(markdown_content, schema, cache=True)
             
             if extracted_data and 'name' in extracted_data:
                 logger.info(f"Successfully extracted LinkedIn data for: {extracted_data.get('name', 'Unknown')}")
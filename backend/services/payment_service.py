@@ -1,8 +1,9 @@
 import os
 import logging
-import requests
 from datetime import datetime
 
+from backend.core.http_client import get_http_client
+
 logger = logging.getLogger(__name__)
 
 class PaymentService:
@@ -100,7 +101,9 @@ class PaymentService:
                 }
             }
             
-            response = requests.post(
+            # Creating a checkout is not idempotent: never retried automatically
+            response = await get_http_client().request(
+                'POST',
                 f'{self.base_url}/checkouts',
                 json=payload,
                 headers=headers,
@@ -4,39 +4,57 @@ import subprocess
 import tempfile
 import os
 import re
-import requests
+import asyncio
 import hashlib
 import shutil
+import time
 from pathlib import Path
+from typing import Optional
+
+from backend.core.config import settings
+from backend.core.executors import run_in_pool
+from backend.core.http_client import get_http_client
+from backend.core.logging_setup import spill_artifact
+from backend.core.metrics import get_metrics
+from backend.core.tracing import traced
+from backend.services.latex_preflight_service import LatexPreflightError, get_latex_preflight_service
+from backend.services.latex_repair_service import get_latex_repair_service
+from backend.services.latex_sanitizer_service import get_latex_sanitizer
+from backend.services.tex_engine_service import ENGINES, TexEngine, get_engine, get_tex_engine_service
+from backend.services.tex_log_service import LatexCompileError, parse_tex_log
 
 logger = logging.getLogger(__name__)
 
+# Named after pdflatex for dashboard continuity; the engine label says which TeX engine ran
+COMPILE_SECONDS = get_metrics().histogram(
+    'pdflatex_compile_seconds', 'Wall time of one PDF compilation (all engine passes)',
+    ('engine', 'preview', 'outcome'), buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+)
+PDFLATEX_PASSES = get_metrics().counter('pdflatex_passes_total', 'TeX engine processes run', ('engine', 'preview'))
+IMAGE_FETCH_SECONDS = get_metrics().histogram(
+    'pdf_image_fetch_seconds', 'Time to fetch one image referenced by a document', ('source', 'outcome'),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+COMPILE_REPAIRS = get_metrics().counter(
+    'pdf_compile_repairs_total', 'Failed compilations handed to the automatic LaTeX repair', ('outcome',)
+)
+
 class PDFService:
     @staticmethod
     def _sanitize_latex(latex_content: str) -> str:
-        """Sanitize LaTeX content to remove known problematic packages/fonts"""
-        # Replace FiraSans with helvet (standard fallback)
-        if 'FiraSans' in latex_content:
-            logger.warning("Replacing FiraSans with helvet to prevent compilation errors")
-            # Use explicit double backslashes to avoid unicode escape issues
-            latex_content = re.sub(
-                '\\\\usepackage\\[.*?\\]\\{FiraSans\\}', 
-                '\\\\usepackage{helvet}\\\\renewcommand{\\\\familydefault}{\\\\sfdefault}', 
-                latex_content
-            )
-            # Remove mathastext if it was coupled with FiraSans (often causes issues if font missing)
-            if 'mathastext' in latex_content:
-                latex_content = latex_content.replace('\\\\usepackage[italic]{mathastext}', '% mathastext removed')
-        
-        # Remove sansmathaccent package (causes mathkerncmssi10 font error)
-        if 'sansmathaccent' in latex_content:
-            logger.warning("Removing sansmathaccent package to prevent mathkerncmssi10 font error")
-            latex_content = re.sub(
-                r'\\usepackage(?:\[.*?\])?\{sansmathaccent\}',
-                '% sansmathaccent removed (font not available)',
-                latex_content
-            )
-        
+        """Rewrite known problematic packages/fonts (one pass over the rule table)"""
+        sanitized, _ = get_latex_sanitizer().sanitize(latex_content)
+        return sanitized
+
+    @staticmethod
+    def _prepare_latex(latex_content: str) -> str:
+        """Sanitize, then pre-flight (raises LatexPreflightError for documents that cannot compile)"""
+        latex_content = PDFService._sanitize_latex(latex_content)
+        if settings.LATEX_PREFLIGHT_ENABLED:
+            result = get_latex_preflight_service().preflight(latex_content)
+            if result.errors:
+                raise LatexPreflightError(result.errors)
+            latex_content = result.latex
         return latex_content
 
     @staticmethod
@@ -45,65 +63,87 @@ class PDFService:
         # Match \includegraphics{http...} patterns
         pattern = r'\\includegraphics(?:\[.*?\])?\{(https?://[^\}]+)\}'
         urls = re.findall(pattern, latex_content)
-        logger.info(f"Found {len(urls)} image URLs in LaTeX")
+        logger.debug("Found %d image URLs in LaTeX", len(urls))
         return urls
     
     @staticmethod
-    def _download_image(url: str, temp_dir: Path) -> str:
+    def _copy_local_image(url: str, temp_dir: Path) -> Optional[str]:
+        """Copy an image uploaded to this server (temp-images URL) instead of downloading it"""
+        filename = url.split('/temp-images/')[-1].split('?')[0]
+        source_path = Path(__file__).parent.parent / "temp_uploads" / filename
+        if source_path.exists():
+            dest_path = temp_dir / filename
+            shutil.copy(source_path, dest_path)
+            logger.debug("Copied local image to: %s", dest_path)
+            return str(dest_path)
+        logger.error("Local image not found: %s", source_path)
+        return None
+
+    @staticmethod
+    def _save_image(url: str, response, temp_dir: Path) -> Optional[str]:
+        if response.status_code != 200:
+            logger.error("Failed to download image from %s: HTTP %s", url, response.status_code)
+            return None
+        
+        # Generate unique filename based on URL hash
+        url_hash = hashlib.md5(url.encode()).hexdigest()
+        
+        # Try to get extension from URL or content-type
+        ext = 'jpg'
+        if '.' in url.split('/')[-1].split('?')[0]:
+            ext = url.split('/')[-1].split('?')[0].split('.')[-1]
+        elif 'content-type' in response.headers:
+            content_type = response.headers['content-type']
+            if 'png' in content_type:
+                ext = 'png'
+            elif 'jpeg' in content_type or 'jpg' in content_type:
+                ext = 'jpg'
+        
+        filepath = temp_dir / f"img_{url_hash}.{ext}"
+        filepath.write_bytes(response.content)
+        
+        logger.debug("Downloaded image to: %s", filepath)
+        return str(filepath)
+
+    @staticmethod
+    def _is_local_upload(url: str) -> bool:
+        return ('localhost' in url or '127.0.0.1' in url) and '/temp-images/' in url
+
+    @staticmethod
+    @traced('pdf.image_fetch', phase='images')
+    async def _download_image_async(url: str, temp_dir: Path) -> Optional[str]:
         """Download image from URL to temp directory"""
+        source = 'local' if PDFService._is_local_upload(url) else 'remote'
+        started = time.perf_counter()
+        path = None
         try:
-            logger.info(f"Downloading image from: {url}")
-            
-            # Check if this is a localhost/temp-images URL - copy directly instead of downloading
-            if 'localhost' in url or '127.0.0.1' in url:
-                if '/temp-images/' in url:
-                    filename = url.split('/temp-images/')[-1].split('?')[0]
-                    # Construct path to uploaded file
-                    from pathlib import Path as PathLib
-                    source_path = PathLib(__file__).parent.parent / "temp_uploads" / filename
-                    
-                    if source_path.exists():
-                        # Copy to temp directory
-                        dest_path = temp_dir / filename
-                        shutil.copy(source_path, dest_path)
-                        logger.info(f"Copied local image to: {dest_path}")
-                        return str(dest_path)
-                    else:
-                        logger.error(f"Local image not found: {source_path}")
-                        return None
-            
-            # For external URLs (Pexels, etc.), download via HTTP
-            response = requests.get(url, timeout=30)
-            
-            if response.status_code == 200:
-                # Generate unique filename based on URL hash
-                url_hash = hashlib.md5(url.encode()).hexdigest()
-                
-                # Try to get extension from URL or content-type
-                ext = 'jpg'
-                if '.' in url.split('/')[-1].split('?')[0]:
-                    ext = url.split('/')[-1].split('?')[0].split('.')[-1]
-                elif 'content-type' in response.headers:
-                    content_type = response.headers['content-type']
-                    if 'png' in content_type:
-                        ext = 'png'
-                    elif 'jpeg' in content_type or 'jpg' in content_type:
-                        ext = 'jpg'
-                
-                filename = f"img_{url_hash}.{ext}"
-                filepath = temp_dir / filename
-                
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                
-                logger.info(f"Successfully downloaded image to: {filepath}")
-                return str(filepath)
+            logger.debug("Downloading image from: %s", url)
+            if source == 'local':
+                path = PDFService._copy_local_image(url, temp_dir)
             else:
-                logger.error(f"Failed to download image from {url}: HTTP {response.status_code}")
-                return None
-                
+                # For external URLs (Pexels, etc.), download via the pooled HTTP client
+                response = await get_http_client().request('GET', url, timeout=30)
+                path = PDFService._save_image(url, response, temp_dir)
+            return path
         except Exception as e:
-            logger.error(f"Error downloading image from {url}: {str(e)}")
+            logger.error("Error downloading image from %s: %s", url, e)
+            return None
+        finally:
+            IMAGE_FETCH_SECONDS.observe(
+                time.perf_counter() - started, source=source, outcome='ok' if path else 'error'
+            )
+
+    @staticmethod
+    def _download_image(url: str, temp_dir: Path) -> Optional[str]:
+        """Blocking variant of _download_image_async"""
+        try:
+            logger.debug("Downloading image from: %s", url)
+            if PDFService._is_local_upload(url):
+                return PDFService._copy_local_image(url, temp_dir)
+            response = get_http_client().request_sync('GET', url, timeout=30)
+            return PDFService._save_image(url, response, temp_dir)
+        except Exception as e:
+            logger.error("Error downloading image from %s: %s", url, e)
             return None
     
     @staticmethod
@@ -115,121 +155,200 @@ class PDFService:
                 # Replace backslashes with forward slashes for LaTeX
                 latex_path = path.replace('\\', '/')
                 modified_latex = modified_latex.replace(url, latex_path)
-                logger.info(f"Replaced URL {url} with local path {latex_path}")
+                logger.debug("Replaced URL %s with local path %s", url, latex_path)
         return modified_latex
     
     
     @staticmethod
-    async def generate_pdf(latex_content: str, preview_mode: bool = False) -> bytes:
-        """Convert LaTeX to PDF using pdflatex
+    @traced('pdf.generate')
+    async def generate_pdf(latex_content: str, preview_mode: bool = False, engine: Optional[str] = None) -> bytes:
+        """Convert LaTeX to PDF using the fastest TeX engine that can compile it
+        
+        Images are downloaded concurrently on the event loop; the blocking engine
+        passes then run on that engine's bounded compile pool.
         
         Args:
             latex_content: LaTeX source code
             preview_mode: If True, skip second compilation pass for faster previews
+            engine: Compile with this engine instead of selecting one (see services/tex_engine_service.py)
         """
         
-        logger.info(f"Attempting PDF generation from LaTeX (preview_mode={preview_mode})")
+        logger.info("Attempting PDF generation from LaTeX (preview_mode=%s)", preview_mode)
         
-        # Sanitize Content (Auto-Fix Fonts)
-        latex_content = PDFService._sanitize_latex(latex_content)
+        # Sanitize Content (Auto-Fix Fonts) and reject documents that cannot compile
+        # before downloading images or starting a TeX engine (off the event loop:
+        # the first pre-flight may build the package index and run kpsewhich)
+        latex_content = await run_in_pool('compile', PDFService._prepare_latex, latex_content)
         
         # Create a temporary directory for LaTeX compilation
         with tempfile.TemporaryDirectory() as tmpdir:
             tmpdir_path = Path(tmpdir)
             
             # Step 1: Extract and download images
-            image_urls = PDFService._extract_image_urls(latex_content)
+            image_urls = list(dict.fromkeys(PDFService._extract_image_urls(latex_content)))
             url_to_path_map = {}
             
             if image_urls:
-                logger.info(f"Processing {len(image_urls)} images...")
-                for url in image_urls:
-                    local_path = PDFService._download_image(url, tmpdir_path)
-                    if local_path:
-                        url_to_path_map[url] = local_path
-                
-                # Replace URLs with local paths
-                latex_content = PDFService._replace_urls_with_paths(latex_content, url_to_path_map)
+                logger.info("Processing %d images...", len(image_urls))
+                local_paths = await asyncio.gather(
+                    *(PDFService._download_image_async(url, tmpdir_path) for url in image_urls)
+                )
+                url_to_path_map = {url: path for url, path in zip(image_urls, local_paths) if path}
+            
+            return await PDFService._compile_with_repair(latex_content, url_to_path_map, preview_mode, tmpdir_path, engine)
+
+    @staticmethod
+    async def _compile_with_repair(latex_content: str, url_to_path_map: dict, preview_mode: bool,
+                                   tmpdir_path: Path, engine_name: Optional[str] = None) -> bytes:
+        """Compile on the selected engine; fall back to the next engine when the log says it was
+        the wrong one and, with LATEX_REPAIR_ENABLED, patch the lines around a log error and recompile
+        
+        Image URLs are swapped for local paths per attempt (same line count), so the
+        log's line numbers index the unmodified source that the repair edits.
+        """
+        engines = get_tex_engine_service()
+        engine = get_engine(engine_name) if engine_name else engines.select(latex_content)
+        tried = [engine]
+        attempts = settings.LATEX_REPAIR_MAX_ATTEMPTS if settings.LATEX_REPAIR_ENABLED else 0
+        repairs = 0
+        while True:
+            compiled = PDFService._replace_urls_with_paths(latex_content, url_to_path_map)
+            try:
+                pdf_bytes = await run_in_pool(
+                    engine.pool, PDFService._compile_pdf, compiled, preview_mode, tmpdir_path, engine
+                )
+            except LatexCompileError as e:
+                fallback = None if engine_name else engines.fallback(e.errors, tried)
+                if fallback is not None:
+                    engine = fallback
+                    tried.append(engine)
+                    PDFService._clear_outputs(tmpdir_path)
+                    continue
+                repaired = None
+                if repairs < attempts:
+                    repaired = await run_in_pool('llm', get_latex_repair_service().repair, latex_content, e.errors)
+                if repaired is not None:
+                    try:
+                        latex_content = await run_in_pool('compile', PDFService._prepare_latex, repaired)
+                    except LatexPreflightError as preflight_error:
+                        logger.info("Discarded LaTeX repair that fails pre-flight: %s", preflight_error)
+                        repaired = None
+                if repaired is None:
+                    if attempts:
+                        COMPILE_REPAIRS.inc(outcome='failed')
+                    raise
+                repairs += 1
+                PDFService._clear_outputs(tmpdir_path)
+                continue
+            if repairs:
+                COMPILE_REPAIRS.inc(outcome='recovered')
+                logger.info("PDF compiled after %d automatic LaTeX repair(s)", repairs)
+            return pdf_bytes
+
+    @staticmethod
+    def _clear_outputs(tmpdir_path: Path) -> None:
+        """Stale .aux/.toc from a failed run would be read by the next pass"""
+        for output in tmpdir_path.glob('document.*'):
+            output.unlink()
+    
+    @staticmethod
+    @traced('pdf.compile', phase='pdflatex')
+    def _compile_pdf(latex_content: str, preview_mode: bool, tmpdir_path: Path,
+                     engine: TexEngine = ENGINES['pdflatex']) -> bytes:
+        """Run `engine` on prepared LaTeX inside `tmpdir_path` (blocking), recording compile time"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            pdf_bytes = PDFService._run_tex(latex_content, preview_mode, tmpdir_path, engine)
+            outcome = 'ok'
+            return pdf_bytes
+        finally:
+            COMPILE_SECONDS.observe(
+                time.perf_counter() - started, engine=engine.name, preview=str(preview_mode).lower(), outcome=outcome
+            )
+
+    @staticmethod
+    def _run_tex(latex_content: str, preview_mode: bool, tmpdir_path: Path,
+                 engine: TexEngine = ENGINES['pdflatex']) -> bytes:
+        # Step 2: Write modified LaTeX to file
+        tex_file = tmpdir_path / "document.tex"
+        pdf_file = tmpdir_path / "document.pdf"
+        log_file = tmpdir_path / "document.log"
+        
+        # Write LaTeX content to file
+        tex_file.write_text(latex_content, encoding='utf-8')
+        
+        try:
+            # Try to compile with the engine
+            # -interaction=nonstopmode: don't stop for errors
+            result = subprocess.run(
+                engine.command(tex_file, tmpdir_path),
+                env=engine.environment(),
+                capture_output=True,
+                text=True,
+                stdin=subprocess.DEVNULL,  # Prevent hanging on input prompts
+                timeout=120,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
             
-            # Step 2: Write modified LaTeX to file
-            tex_file = tmpdir_path / "document.tex"
-            pdf_file = tmpdir_path / "document.pdf"
-            log_file = tmpdir_path / "document.log"
+            PDFLATEX_PASSES.inc(engine=engine.name, preview=str(preview_mode).lower())
+            logger.debug("First %s run completed with return code: %s", engine.name, result.returncode)
             
-            # Write LaTeX content to file
-            tex_file.write_text(latex_content, encoding='utf-8')
+            # Run twice to resolve references (skip for preview mode for speed)
+            # Run twice to resolve references (skip for preview mode unless TOC is present)
+            # Table of Contents requires a second pass to generate the .toc file and include it
+            # (tectonic reruns itself until references settle)
+            needs_second_pass = not engine.reruns_itself and (
+                not preview_mode or '\\tableofcontents' in latex_content
+            )
             
-            try:
-                # Try to compile with pdflatex
-                # -interaction=nonstopmode: don't stop for errors
-                result = subprocess.run(
-                    [
-                        'pdflatex', 
-                        '-interaction=nonstopmode',
-                        '-output-directory', str(tmpdir_path), 
-                        str(tex_file)
-                    ],
+            if pdf_file.exists() and needs_second_pass:
+                logger.info("Running %s second time to resolve references/TOC", engine.name)
+                subprocess.run(
+                    engine.command(tex_file, tmpdir_path),
+                    env=engine.environment(),
                     capture_output=True,
                     text=True,
-                    stdin=subprocess.DEVNULL,  # Prevent hanging on input prompts
+                    stdin=subprocess.DEVNULL,
                     timeout=120,
                     creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
                 )
+                PDFLATEX_PASSES.inc(engine=engine.name, preview=str(preview_mode).lower())
+            elif preview_mode and not engine.reruns_itself:
+                logger.info("Skipping second %s run (preview mode, no TOC found)", engine.name)
+            
+            
+            if pdf_file.exists():
+                pdf_bytes = pdf_file.read_bytes()
+                logger.info("Generated PDF from LaTeX (%d bytes)", len(pdf_bytes))
+                return pdf_bytes
+            else:
+                # Full source, output and TeX log go to artifact files; the log line references them
+                log_content = ''
+                if log_file.exists():
+                    log_content = log_file.read_text(encoding='utf-8', errors='ignore')
+                errors = parse_tex_log(log_content)
+                logger.error(
+                    "%s failed to create PDF (return code %s): %s", engine.name, result.returncode,
+                    '; '.join(str(e) for e in errors[:3]) or 'no error in log',
+                    extra={
+                        'latex_artifact': spill_artifact('latex', latex_content, '.tex'),
+                        'output_artifact': spill_artifact(f'{engine.name}-output', f"{result.stdout}\n{result.stderr}"),
+                        'texlog_artifact': spill_artifact('texlog', log_content, '.log') if log_content else None,
+                    }
+                )
                 
-                logger.info(f"First pdflatex run completed with return code: {result.returncode}")
-                
-                # Run twice to resolve references (skip for preview mode for speed)
-                # Run twice to resolve references (skip for preview mode unless TOC is present)
-                # Table of Contents requires a second pass to generate the .toc file and include it
-                needs_second_pass = not preview_mode or '\\tableofcontents' in latex_content
-                
-                if pdf_file.exists() and needs_second_pass:
-                    logger.info("Running pdflatex second time to resolve references/TOC")
-                    subprocess.run(
-                        [
-                            'pdflatex', 
-                            '-interaction=nonstopmode',
-                            '-output-directory', str(tmpdir_path), 
-                            str(tex_file)
-                        ],
-                        capture_output=True,
-                        text=True,
-                        stdin=subprocess.DEVNULL,
-                        timeout=120,
-                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                    )
-                elif preview_mode:
-                    logger.info("Skipping second pdflatex run (preview mode, no TOC found)")
-                
+                raise LatexCompileError(errors, log_content[-1000:])
                 
-                if pdf_file.exists():
-                    pdf_bytes = pdf_file.read_bytes()
-                    logger.info(f"Successfully generated PDF from LaTeX ({len(pdf_bytes)} bytes)")
-                    return pdf_bytes
-                else:
-                    logger.error(f"pdflatex failed to create PDF.")
-                    logger.error(f"Return code: {result.returncode}")
-                    logger.error(f"STDOUT (full): {result.stdout}")
-                    logger.error(f"STDERR (full): {result.stderr}")
-                    logger.error(f"LaTeX content (first 500 chars): {latex_content[:500]}")
-                    
-                    # Check if .log file exists for more details
-                    error_details = "LaTeX compilation failed."
-                    if log_file.exists():
-                        log_content = log_file.read_text(encoding='utf-8', errors='ignore')
-                        log_tail = log_content[-1000:]
-                        logger.error(f"LaTeX log file (last 2000 chars): {log_content[-2000:]}")
-                        error_details += f"\nLog tail:\n{log_tail}"
-                    
-                    raise Exception(error_details)
-                    
-            except FileNotFoundError:
-                logger.error("pdflatex not found. Please install a TeX distribution (MiKTeX or TeX Live)")
-                raise Exception("PDF generation failed: pdflatex not installed. Please install MiKTeX or TeX Live.")
-            except subprocess.TimeoutExpired:
-                logger.error("LaTeX compilation timed out. This may be due to MiKTeX trying to install packages.")
-                logger.error("Please install required LaTeX packages manually or enable automatic package installation in MiKTeX.")
-                raise Exception("PDF generation timed out. Please ensure all LaTeX packages are installed.")
-            except Exception as e:
-                logger.error(f"LaTeX compilation error: {str(e)}")
-                raise Exception(f"PDF generation failed: {str(e)}")
+        except LatexCompileError:
+            raise
+        except FileNotFoundError:
+            logger.error("%s not found. Please install a TeX distribution (MiKTeX or TeX Live)", engine.binary)
+            raise Exception(f"PDF generation failed: {engine.binary} not installed. Please install MiKTeX or TeX Live.")
+        except subprocess.TimeoutExpired:
+            logger.error("LaTeX compilation timed out. This may be due to MiKTeX trying to install packages.")
+            logger.error("Please install required LaTeX packages manually or enable automatic package installation in MiKTeX.")
+            raise Exception("PDF generation timed out. Please ensure all LaTeX packages are installed.")
+        except Exception as e:
+            logger.error("LaTeX compilation error: %s", e)
+            raise Exception(f"PDF generation failed: {str(e)}")
@@ -1,8 +1,11 @@
 import os
 import logging
-import requests
 from typing import Dict, List, Optional
 
+from backend.core.config import settings
+from backend.core.http_client import RETRY_POST, get_http_client
+from backend.core.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class PerplexityService:
@@ -12,29 +15,16 @@ class PerplexityService:
         self.api_key = os.environ.get('PERPLEXITY_API_KEY')
         if not self.api_key:
             logger.warning("PERPLEXITY_API_KEY not found in environment variables")
-        self.base_url = 'https://api.perplexity.ai'
-        
-    def research_query(self, query: str) -> Optional[Dict]:
-        """
-        Use Perplexity API to research a topic and return results with citations
+        self.base_url = settings.PERPLEXITY_BASE_URL
         
-        Args:
-            query: The research query/topic
-            
-        Returns:
-            Dict with 'content' (researched text) and 'citations' (list of sources)
-        """
-        if not self.api_key:
-            logger.error("Perplexity API key not configured")
-            return None
-            
-        try:
-            headers = {
+    def _request(self, query: str) -> Dict:
+        return {
+            'url': f'{self.base_url}/chat/completions',
+            'headers': {
                 'Authorization': f'Bearer {self.api_key}',
                 'Content-Type': 'application/json'
-            }
-            
-            payload = {
+            },
+            'json': {
                 'model': 'sonar',
                 'messages': [
                     {
@@ -48,32 +38,57 @@ class PerplexityService:
                 ],
                 'return_citations': True,
                 'return_images': False
-            }
+            },
+            'timeout': 30,
+            # Research queries have no side effects, so retrying the POST is safe
+            'retry': RETRY_POST
+        }
+
+    def _result(self, response) -> Optional[Dict]:
+        if response.status_code == 200:
+            data = response.json()
+            
+            # Extract content and citations
+            content = data.get('choices', [{}])[0].get('message', {}).get('content', '')
+            citations = data.get('citations', [])
             
-            response = requests.post(
-                f'{self.base_url}/chat/completions',
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            logger.info(f"Perplexity research completed with {len(citations)} citations")
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract content and citations
-                content = data.get('choices', [{}])[0].get('message', {}).get('content', '')
-                citations = data.get('citations', [])
-                
-                logger.info(f"Perplexity research completed with {len(citations)} citations")
-                
-                return {
-                    'content': content,
-                    'citations': citations
-                }
-            else:
-                logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
-                return None
-                
+            return {
+                'content': content,
+                'citations': citations
+            }
+        logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
+        return None
+
+    @traced('perplexity.research', phase='perplexity')
+    async def research_query_async(self, query: str) -> Optional[Dict]:
+        """
+        Use Perplexity API to research a topic and return results with citations
+        
+        Args:
+            query: The research query/topic
+            
+        Returns:
+            Dict with 'content' (researched text) and 'citations' (list of sources)
+        """
+        if not self.api_key:
+            logger.error("Perplexity API key not configured")
+            return None
+        try:
+            return self._result(await get_http_client().request('POST', **self._request(query)))
+        except Exception as e:
+            logger.error(f"Error calling Perplexity API: {str(e)}")
+            return None
+
+    @traced('perplexity.research', phase='perplexity')
+    def research_query(self, query: str) -> Optional[Dict]:
+        """Blocking variant of research_query_async"""
+        if not self.api_key:
+            logger.error("Perplexity API key not configured")
+            return None
+        try:
+            return self._result(get_http_client().request_sync('POST', **self._request(query)))
         except Exception as e:
             logger.error(f"Error calling Perplexity API: {str(e)}")
             return None
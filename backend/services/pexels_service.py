@@ -1,8 +1,11 @@
 import os
 import logging
-import requests
 from typing import List, Dict, Optional
 
+from backend.core.config import settings
+from backend.core.http_client import get_http_client
+from backend.core.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class PexelsService:
@@ -10,17 +13,14 @@ class PexelsService:
     
     def __init__(self):
         self.api_key = os.environ.get('PEXELS_API_KEY')
-        self.base_url = 'https://api.pexels.com/v1'
+        self.base_url = settings.PEXELS_BASE_URL
         
         if not self.api_key:
             logger.warning("PEXELS_API_KEY not found in environment variables")
     
-    def search_images(self, query: str, per_page: int = 15, page: int = 1) -> Optional[Dict]:
-        """
-        Search for images on Pexels
-        """
-        # Fallback for missing API key or errors
-        fallback_response = {
+    def _fallback_response(self, query: str) -> Dict:
+        # Placeholder used when the API key is missing or the call fails
+        return {
             'photos': [{
                 'src': {
                     'large': f'https://dummyimage.com/1024x768/e0e0e0/000000.png&text={query.replace(" ", "+")}'
@@ -28,43 +28,66 @@ class PexelsService:
             }]
         }
 
-        if not self.api_key:
-            logger.warning("PEXELS_API_KEY not found, using placeholder images")
-            return fallback_response
-        
-        try:
-            headers = {
-                'Authorization': self.api_key
-            }
-            
-            params = {
+    def _search_request(self, query: str, per_page: int, page: int) -> Dict:
+        return {
+            'url': f'{self.base_url}/search',
+            'headers': {'Authorization': self.api_key},
+            'params': {
                 'query': query,
                 'per_page': min(per_page, 80),  # Pexels max is 80
                 'page': page
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/search',
-                headers=headers,
-                params=params,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"Pexels search for '{query}' returned {len(data.get('photos', []))} results")
-                if not data.get('photos'):
-                    return fallback_response
-                return data
-            else:
-                logger.error(f"Pexels API error: {response.status_code} - {response.text}")
-                return fallback_response
-                
+            },
+            'timeout': 10
+        }
+
+    def _search_result(self, query: str, response) -> Dict:
+        if response.status_code == 200:
+            data = response.json()
+            logger.info(f"Pexels search for '{query}' returned {len(data.get('photos', []))} results")
+            if not data.get('photos'):
+                return self._fallback_response(query)
+            return data
+        logger.error(f"Pexels API error: {response.status_code} - {response.text}")
+        return self._fallback_response(query)
+
+    @traced('pexels.search', phase='pexels')
+    async def search_images_async(self, query: str, per_page: int = 15, page: int = 1) -> Optional[Dict]:
+        """
+        Search for images on Pexels
+        """
+        if not self.api_key:
+            logger.warning("PEXELS_API_KEY not found, using placeholder images")
+            return self._fallback_response(query)
+        try:
+            response = await get_http_client().request('GET', **self._search_request(query, per_page, page))
+            return self._search_result(query, response)
         except Exception as e:
             logger.error(f"Error searching Pexels: {str(e)}")
-            return fallback_response
-    
-    def get_curated_images(self, per_page: int = 15, page: int = 1) -> Optional[Dict]:
+            return self._fallback_response(query)
+
+    @traced('pexels.search', phase='pexels')
+    def search_images(self, query: str, per_page: int = 15, page: int = 1) -> Optional[Dict]:
+        """Blocking variant of search_images_async"""
+        if not self.api_key:
+            logger.warning("PEXELS_API_KEY not found, using placeholder images")
+            return self._fallback_response(query)
+        try:
+            response = get_http_client().request_sync('GET', **self._search_request(query, per_page, page))
+            return self._search_result(query, response)
+        except Exception as e:
+            logger.error(f"Error searching Pexels: {str(e)}")
+            return self._fallback_response(query)
+
+    def _curated_result(self, response) -> Optional[Dict]:
+        if response.status_code == 200:
+            data = response.json()
+            logger.info(f"Pexels curated returned {len(data.get('photos', []))} results")
+            return data
+        logger.error(f"Pexels API error: {response.status_code} - {response.text}")
+        return None
+
+    @traced('pexels.curated', phase='pexels')
+    async def get_curated_images_async(self, per_page: int = 15, page: int = 1) -> Optional[Dict]:
         """
         Get curated images from Pexels
         
@@ -78,32 +101,34 @@ class PexelsService:
         if not self.api_key:
             logger.error("Cannot get curated images: PEXELS_API_KEY not configured")
             return None
-        
         try:
-            headers = {
-                'Authorization': self.api_key
-            }
-            
-            params = {
-                'per_page': min(per_page, 80),
-                'page': page
-            }
-            
-            response = requests.get(
+            response = await get_http_client().request(
+                'GET',
                 f'{self.base_url}/curated',
-                headers=headers,
-                params=params,
+                headers={'Authorization': self.api_key},
+                params={'per_page': min(per_page, 80), 'page': page},
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"Pexels curated returned {len(data.get('photos', []))} results")
-                return data
-            else:
-                logger.error(f"Pexels API error: {response.status_code} - {response.text}")
-                return None
-                
+            return self._curated_result(response)
+        except Exception as e:
+            logger.error(f"Error getting curated images: {str(e)}")
+            return None
+
+    @traced('pexels.curated', phase='pexels')
+    def get_curated_images(self, per_page: int = 15, page: int = 1) -> Optional[Dict]:
+        """Blocking variant of get_curated_images_async"""
+        if not self.api_key:
+            logger.error("Cannot get curated images: PEXELS_API_KEY not configured")
+            return None
+        try:
+            response = get_http_client().request_sync(
+                'GET',
+                f'{self.base_url}/curated',
+                headers={'Authorization': self.api_key},
+                params={'per_page': min(per_page, 80), 'page': page},
+                timeout=10
+            )
+            return self._curated_result(response)
         except Exception as e:
             logger.error(f"Error getting curated images: {str(e)}")
             return None
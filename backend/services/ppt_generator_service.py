@@ -8,6 +8,8 @@ import logging
 from typing import Optional, Dict, List
 import asyncio
 
+from backend.core.executors import run_in_pool
+
 logger = logging.getLogger(__name__)
 
 class PPTGeneratorService:
@@ -137,7 +139,7 @@ For each slide provide:
             "required": ["title", "slides"]
         }
         
-        response = self.gemini_service.extract_json_from_markdown(prompt, schema)
+        response = await run_in_pool('llm', self.gemini_service.extract_json_from_markdown, prompt, schema, cache=True)
         return response
     
     async def _generate_from_content(self, content: str, num_slides: int) -> Dict:
@@ -185,7 +187,7 @@ For each slide, suggest a relevant image search query.
             "required": ["title", "slides"]
         }
         
-        response = self.gemini_service.extract_json_from_markdown(prompt, schema)
+        response = await run_in_pool('llm', self.gemini_service.extract_json_from_markdown, prompt, schema, cache=True)
         return response
     
     async def _fetch_slide_images(self, slides: List[Dict]) -> List[str]:
@@ -194,7 +196,7 @@ For each slide, suggest a relevant image search query.
         async def fetch_one(slide):
             if 'image_query' in slide and slide['image_query']:
                 try:
-                    result = self.pexels_service.search_images(
+                    result = await self.pexels_service.search_images_async(
                         query=slide['image_query'],
                         per_page=1
                     )
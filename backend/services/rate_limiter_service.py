@@ -1,99 +1,501 @@
 """
 Rate Limiting Service
 Implements token bucket algorithm for API rate limiting
+
+Bucket state lives in a pluggable BucketStore so every uvicorn worker can
+enforce the same limit:
+- memory: per-process dict (single worker / development)
+- sqlite: WAL-mode SQLite file shared by all workers on one host
+- redis: any server speaking the Redis protocol (multi-host)
+
+Each store refills and debits a bucket atomically in one step; `take_many`
+applies a batch of checks in a single transaction / pipeline. The in-memory
+store keeps compact per-key state and evicts buckets once they have refilled.
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 import logging
+import socket
+import sqlite3
+import threading
+import time
+
+from backend.core.config import settings
+from backend.core.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
+REJECTIONS = get_metrics().counter('rate_limit_rejections_total', 'API requests rejected by the rate limiter', ('reason', 'tier'))
+STORE_ERRORS = get_metrics().counter('rate_limit_store_errors_total', 'Bucket store failures (requests were allowed)')
+
+# (key, capacity, refill tokens per second)
+BucketRequest = Tuple[str, float, float]
+# (allowed, tokens left after the check)
+BucketResult = Tuple[bool, float]
+
+
+class BucketStore(ABC):
+    """Storage for token buckets; implementations must make `take` atomic per key"""
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> BucketResult:
+        """Refill the bucket for the time elapsed since its last update, then try to remove `cost` tokens"""
+
+    def take_many(self, requests: List[BucketRequest]) -> List[BucketResult]:
+        """Apply several checks; backends override this to batch them into one round trip"""
+        return [self.take(key, capacity, rate) for key, capacity, rate in requests]
+
+
+def _refill(tokens: Optional[float], updated: Optional[float], now: float,
+            capacity: float, refill_per_second: float, cost: float) -> BucketResult:
+    """Shared token-bucket arithmetic: lazily refill for elapsed time, then debit"""
+    if tokens is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + max(0.0, now - updated) * refill_per_second)
+    if tokens >= cost:
+        return True, tokens - cost
+    return False, tokens
+
+
+class _Bucket:
+    """Token bucket state; slotted to keep per-key overhead small"""
+
+    __slots__ = ('tokens', 'updated', 'full_at')
+
+    def __init__(self, tokens: float, updated: float, full_at: float):
+        self.tokens = tokens
+        self.updated = updated
+        # Monotonic time at which the bucket is full again, i.e. indistinguishable from a new one
+        self.full_at = full_at
+
+
+class MemoryBucketStore(BucketStore):
+    """
+    In-process buckets; limits are per worker.
+
+    Buckets are kept in LRU order. A bucket that has refilled completely carries
+    no information, so idle buckets at the cold end are dropped as new checks
+    arrive, and `max_buckets` bounds the table even under a flood of distinct keys.
+
+    algorithm='gcra' stores a single float per key (the theoretical arrival time)
+    instead of a token count and timestamp; it admits the same traffic.
+    """
+
+    ALGORITHMS = ('token_bucket', 'gcra')
+
+    def __init__(self, algorithm: str = 'token_bucket', max_buckets: int = 100000,
+                 evict_per_take: int = 2):
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.max_buckets = max_buckets
+        self.evict_per_take = evict_per_take
+        self.buckets: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'evicted_idle': 0, 'evicted_lru': 0}
+
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> BucketResult:
+        now = time.monotonic()
+        with self._lock:
+            if self.algorithm == 'gcra':
+                result = self._take_gcra(key, now, capacity, refill_per_second, cost)
+            else:
+                result = self._take_token_bucket(key, now, capacity, refill_per_second, cost)
+            self._evict(now)
+            return result
+
+    def _take_token_bucket(self, key, now, capacity, refill_per_second, cost) -> BucketResult:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            allowed, tokens = _refill(None, None, now, capacity, refill_per_second, cost)
+            bucket = self.buckets[key] = _Bucket(tokens, now, now)
+        else:
+            allowed, tokens = _refill(bucket.tokens, bucket.updated, now, capacity, refill_per_second, cost)
+            bucket.tokens, bucket.updated = tokens, now
+            self.buckets.move_to_end(key)
+        bucket.full_at = now + (capacity - tokens) / refill_per_second
+        return allowed, tokens
+
+    def _take_gcra(self, key, now, capacity, refill_per_second, cost) -> BucketResult:
+        # Each request pushes the theoretical arrival time (TAT) forward by one
+        # emission interval; a request fits while TAT stays within the burst window.
+        interval = 1.0 / refill_per_second
+        burst = capacity * interval
+        tat = max(self.buckets.get(key, now), now)
+        new_tat = tat + cost * interval
+        allowed = new_tat - now <= burst
+        if allowed:
+            tat = new_tat
+        self.buckets[key] = tat
+        self.buckets.move_to_end(key)
+        return allowed, max(0.0, (burst - (tat - now)) / interval)
+
+    def _evict(self, now: float) -> None:
+        """Drop a few refilled buckets from the cold end, then enforce the size cap"""
+        buckets = self.buckets
+        for _ in range(self.evict_per_take):
+            if not buckets:
+                break
+            key, state = next(iter(buckets.items()))
+            full_at = state if self.algorithm == 'gcra' else state.full_at
+            if full_at > now:
+                break
+            del buckets[key]
+            self.stats['evicted_idle'] += 1
+        while len(buckets) > self.max_buckets:
+            buckets.popitem(last=False)
+            self.stats['evicted_lru'] += 1
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets in a WAL-mode SQLite file, shared by all workers on the host.
+
+    Each check is a single BEGIN IMMEDIATE transaction, which serialises
+    writers across processes without a network round trip.
+    """
+
+    def __init__(self, path: str, busy_timeout_seconds: float = 5.0,
+                 idle_ttl_seconds: float = 3600, prune_interval_seconds: float = 300):
+        self.path = path
+        self.busy_timeout_seconds = busy_timeout_seconds
+        # Buckets idle this long have long since refilled and can be deleted
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self._next_prune = 0.0
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_seconds, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> BucketResult:
+        return self.take_many([(key, capacity, refill_per_second)], cost)[0]
+
+    def take_many(self, requests: List[BucketRequest], cost: float = 1.0) -> List[BucketResult]:
+        conn = self._connection()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            for key, capacity, refill_per_second in requests:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                allowed, tokens = _refill(
+                    row[0] if row else None, row[1] if row else None,
+                    now, capacity, refill_per_second, cost
+                )
+                conn.execute(
+                    "INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now)
+                )
+                results.append((allowed, tokens))
+            if now >= self._next_prune:
+                self._next_prune = now + self.prune_interval_seconds
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (now - self.idle_ttl_seconds,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+
+class RESPConnection:
+    """Minimal Redis-protocol (RESP2) client: enough for EVALSHA/EVAL pipelines"""
+
+    class Error(Exception):
+        pass
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self._roundtrip([('AUTH', self.password)])
+        if self.db:
+            self._roundtrip([('SELECT', self.db)])
+
+    def close(self) -> None:
+        if self._sock:
+            try:
+                # The makefile() reader holds its own reference to the socket
+                self._file.close()
+                self._sock.close()
+            finally:
+                self._sock, self._file = None, None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(out)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by Redis server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            return RESPConnection.Error(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2].decode()
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected RESP reply: {line!r}")
+
+    def _roundtrip(self, commands: List[tuple]) -> list:
+        self._sock.sendall(b''.join(self._encode(cmd) for cmd in commands))
+        return [self._read_reply() for _ in commands]
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """Send all commands in one write and read the replies in order (reconnects once)"""
+        for attempt in range(2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._roundtrip(commands)
+            except (OSError, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+        return []
+
+
+class RedisBucketStore(BucketStore):
+    """Buckets in Redis (or any RESP-compatible server), updated atomically by a Lua script"""
+
+    SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = capacity
+else
+  tokens = math.min(capacity, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url: str, key_prefix: str = 'ratelimit:', connection: Optional[RESPConnection] = None):
+        self.key_prefix = key_prefix
+        self._conn = connection or RESPConnection(url)
+        self._lock = threading.Lock()
+        self._sha: Optional[str] = None
+
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> BucketResult:
+        return self.take_many([(key, capacity, refill_per_second)], cost)[0]
+
+    def take_many(self, requests: List[BucketRequest], cost: float = 1.0) -> List[BucketResult]:
+        with self._lock:
+            if self._sha is None:
+                self._sha = self._conn.pipeline([('SCRIPT', 'LOAD', self.SCRIPT)])[0]
+            commands = [
+                ('EVALSHA', self._sha, 1, self.key_prefix + key, capacity, refill_per_second, cost)
+                for key, capacity, refill_per_second in requests
+            ]
+            replies = self._conn.pipeline(commands)
+            # Script cache flushed (server restart): fall back to EVAL for the failed entries
+            retry = [i for i, r in enumerate(replies) if isinstance(r, RESPConnection.Error) and 'NOSCRIPT' in str(r)]
+            if retry:
+                self._sha = None
+                evals = [('EVAL', self.SCRIPT) + commands[i][2:] for i in retry]
+                for i, reply in zip(retry, self._conn.pipeline(evals)):
+                    replies[i] = reply
+
+        results = []
+        for reply in replies:
+            if isinstance(reply, RESPConnection.Error):
+                raise reply
+            results.append((int(reply[0]) == 1, float(reply[1])))
+        return results
+
+
+def create_bucket_store(backend: str) -> BucketStore:
+    """Build the bucket store selected by RATE_LIMIT_BACKEND"""
+    backend = (backend or 'memory').lower()
+    if backend == 'sqlite':
+        return SQLiteBucketStore(settings.RATE_LIMIT_SQLITE_PATH)
+    if backend == 'redis':
+        return RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+    if backend != 'memory':
+        logger.warning(f"Unknown RATE_LIMIT_BACKEND '{backend}', using in-memory buckets")
+    return MemoryBucketStore(
+        algorithm=settings.RATE_LIMIT_ALGORITHM,
+        max_buckets=settings.RATE_LIMIT_MAX_BUCKETS
+    )
+
+
+def _month_reset_epoch(now: float) -> float:
+    """Unix time of the first day of next month (UTC)"""
+    today = datetime.utcfromtimestamp(now)
+    if today.month == 12:
+        next_month = datetime(today.year + 1, 1, 1)
+    else:
+        next_month = datetime(today.year, today.month + 1, 1)
+    return (next_month - datetime(1970, 1, 1)).total_seconds()
+
+
+class RateLimitResult(Mapping):
+    """
+    Outcome of a rate limit check.
+
+    Behaves like the dict check_limit used to return ('allowed', 'limit',
+    'remaining', 'reset_at', ...) but keeps the reset time as a number and only
+    formats the ISO string when a header actually reads it.
+    """
+
+    __slots__ = ('allowed', 'limit', 'remaining', 'reason', 'retry_after', 'reset_epoch', '_reset_at')
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset_epoch: float,
+                 reason: Optional[str] = None, retry_after: Optional[int] = None):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_epoch = reset_epoch
+        self.reason = reason
+        self.retry_after = retry_after
+        self._reset_at: Optional[str] = None
+
+    @property
+    def reset_at(self) -> str:
+        if self._reset_at is None:
+            self._reset_at = datetime.utcfromtimestamp(self.reset_epoch).isoformat()
+        return self._reset_at
+
+    def _keys(self) -> List[str]:
+        keys = ['allowed']
+        if self.reason is not None:
+            keys.append('reason')
+        keys += ['limit', 'remaining', 'reset_at']
+        if self.retry_after is not None:
+            keys.append('retry_after')
+        return keys
+
+    def __getitem__(self, key: str):
+        if key not in self._keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def to_dict(self) -> Dict:
+        return dict(self)
+
 
 class RateLimiter:
-    def __init__(self):
-        # In-memory storage (use Redis in production for distributed systems)
-        self.buckets: Dict[str, Dict] = {}
-        
+    def __init__(self, store: Optional[BucketStore] = None):
+        # Bucket storage (shared across workers unless the memory backend is used)
+        self.store = store or MemoryBucketStore()
+
         # Rate limits per tier (requests per minute)
         self.limits = {
             'free': {'per_minute': 10, 'per_month': 1000},
             'pro': {'per_minute': 100, 'per_month': 10000},
             'enterprise': {'per_minute': 1000, 'per_month': 100000}
         }
-    
-    def check_limit(self, key_id: str, tier: str = 'free', requests_count: int = 0, requests_limit: int = 1000) -> Dict:
+
+    def check_limit(self, key_id: str, tier: str = 'free', requests_count: int = 0,
+                    requests_limit: int = 1000) -> RateLimitResult:
         """
         Check if request is within rate limits
-        
+
         Args:
             key_id: API key ID
             tier: Tier level
             requests_count: Current monthly request count
             requests_limit: Monthly request limit
-        
+
         Returns:
-            dict with 'allowed' boolean and rate limit info
+            RateLimitResult (dict-like) with 'allowed' and rate limit info
         """
-        now = datetime.utcnow()
-        
+        now = time.time()
+
         # Check monthly limit
         if requests_count >= requests_limit:
-            return {
-                'allowed': False,
-                'reason': 'monthly_limit_exceeded',
-                'limit': requests_limit,
-                'remaining': 0,
-                'reset_at': self._get_month_reset()
-            }
-        
-        # Get or create bucket
-        if key_id not in self.buckets:
-            self.buckets[key_id] = {
-                'tokens': self.limits[tier]['per_minute'],
-                'last_refill': now
-            }
-        
-        bucket = self.buckets[key_id]
-        
-        # Refill tokens based on time elapsed
-        time_elapsed = (now - bucket['last_refill']).total_seconds()
-        refill_rate = self.limits[tier]['per_minute'] / 60  # tokens per second
-        tokens_to_add = time_elapsed * refill_rate
-        
-        bucket['tokens'] = min(
-            self.limits[tier]['per_minute'],
-            bucket['tokens'] + tokens_to_add
-        )
-        bucket['last_refill'] = now
-        
+            REJECTIONS.inc(reason='monthly_limit_exceeded', tier=tier)
+            return RateLimitResult(
+                False, requests_limit, 0, _month_reset_epoch(now), reason='monthly_limit_exceeded'
+            )
+
+        per_minute = self.limits.get(tier, self.limits['free'])['per_minute']
+        try:
+            allowed, tokens = self.store.take(key_id, per_minute, per_minute / 60)
+        except Exception as e:
+            # A broken shared store must not take the API down: fail open and log
+            logger.error(f"Rate limiter store error, allowing request: {e}")
+            STORE_ERRORS.inc()
+            allowed, tokens = True, per_minute - 1
+
         # Check if we have tokens available
-        if bucket['tokens'] >= 1:
-            bucket['tokens'] -= 1
-            return {
-                'allowed': True,
-                'limit': self.limits[tier]['per_minute'],
-                'remaining': int(bucket['tokens']),
-                'reset_at': (now + timedelta(minutes=1)).isoformat()
-            }
-        else:
-            return {
-                'allowed': False,
-                'reason': 'rate_limit_exceeded',
-                'limit': self.limits[tier]['per_minute'],
-                'remaining': 0,
-                'reset_at': (now + timedelta(seconds=60)).isoformat(),
-                'retry_after': 60
-            }
-    
+        if allowed:
+            return RateLimitResult(True, per_minute, int(tokens), now + 60)
+        REJECTIONS.inc(reason='rate_limit_exceeded', tier=tier)
+        return RateLimitResult(
+            False, per_minute, 0, now + 60, reason='rate_limit_exceeded', retry_after=60
+        )
+
     def _get_month_reset(self) -> str:
         """Get the first day of next month"""
-        now = datetime.utcnow()
-        if now.month == 12:
-            next_month = datetime(now.year + 1, 1, 1)
-        else:
-            next_month = datetime(now.year, now.month + 1, 1)
-        return next_month.isoformat()
+        return datetime.utcfromtimestamp(_month_reset_epoch(time.time())).isoformat()
 
 
 # Singleton instance
@@ -104,5 +506,5 @@ def get_rate_limiter() -> RateLimiter:
     """Get or create the rate limiter singleton"""
     global _rate_limiter
     if _rate_limiter is None:
-        _rate_limiter = RateLimiter()
+        _rate_limiter = RateLimiter(create_bucket_store(settings.RATE_LIMIT_BACKEND))
     return _rate_limiter
@@ -2,7 +2,8 @@ import os
 import logging
 from typing import Dict, Optional
 from backend.core.config import settings
-from services.gemini_service import GeminiService
+from backend.core.llm_cache import cache_key, get_llm_cache
+from backend.core.providers import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +11,7 @@ class ResumeOptimizerService:
     """Service for optimizing resumes for ATS compatibility"""
     
     def __init__(self):
-        self.gemini_service = GeminiService()
+        self.gemini_service = get_gemini_service()
     
     def optimize_resume(
         self, 
@@ -36,13 +37,16 @@ class ResumeOptimizerService:
             else:
                 prompt = self._build_general_optimization_prompt(resume_text)
             
-            # Generate optimized resume using Gemini
-            response = self.gemini_service.client.models.generate_content(
-                model=settings.GEMINI_MODEL_STARTER,
-                contents=prompt
-            )
-            
-            latex_content = response.text.strip()
+            # Generate optimized resume using Gemini (identical resume + job description hits the cache)
+            key = cache_key(settings.GEMINI_MODEL_STARTER, prompt, namespace='optimize_resume')
+            latex_content = get_llm_cache().get_or_compute(
+                key,
+                lambda: self.gemini_service.generate_content(
+                    model=settings.GEMINI_MODEL_STARTER,
+                    contents=prompt,
+                    mode='resume'
+                ).text
+            ).strip()
             
             # Clean markdown code blocks if present
             if latex_content.startswith('```latex'):
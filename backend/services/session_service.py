@@ -0,0 +1,287 @@
+"""
+Session Service
+Stores editor sessions: a small metadata row in `sessions` plus an append-only
+`session_messages` log
+
+Chat turns insert their messages as new rows instead of re-writing the whole
+`sessions.messages` JSONB array, so the cost of a turn does not grow with the
+conversation and concurrent turns cannot overwrite each other. Messages are
+read newest-first with keyset pagination on the message id.
+
+Sessions created before the `session_messages` table existed keep their
+history in `sessions.messages`; reads return those messages ahead of any
+appended rows. If the table is missing (migration not applied) writes fall
+back to the legacy JSONB array.
+
+The LaTeX written by chat turns goes through DocumentVersionService, which
+stores compressed deltas; `sessions.current_latex` only holds version 0.
+
+Dashboard listings are keyset-paginated on (created_at, session_id) with an
+opaque cursor and cached per user for a few seconds; creating or deleting a
+session drops that user's cached pages.
+"""
+
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+import logging
+
+from backend.core.config import settings
+
+from backend.services.document_version_service import DocumentVersionService, get_document_version_service
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+SESSION_META_COLUMNS = "session_id, title, mode, current_latex, created_at"
+
+# Columns the dashboard may request; the keyset columns are always included
+LIST_FIELDS = ('session_id', 'title', 'mode', 'created_at')
+KEYSET_FIELDS = ('created_at', 'session_id')
+
+
+def encode_cursor(row: Dict) -> str:
+    raw = json.dumps([row['created_at'], row['session_id']], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError for cursors this service did not issue
+
+    Both values end up inside a PostgREST `or=(...)` filter, so they must be a
+    real timestamp and a real UUID, not arbitrary text.
+    """
+    try:
+        created_at, session_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        datetime.fromisoformat(created_at)
+        uuid.UUID(session_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, session_id
+
+
+class SessionListCache:
+    """Per-user cache of listing pages: user_id -> {(limit, cursor, fields): (expires_at, page)}"""
+
+    def __init__(self, ttl_seconds: float = 15.0, max_users: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._pages: Dict[str, Dict[tuple, tuple]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id: str, key: tuple) -> Optional[Dict]:
+        with self._lock:
+            entry = self._pages.get(user_id, {}).get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def set(self, user_id: str, key: tuple, page: Dict) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if user_id not in self._pages and len(self._pages) >= self.max_users:
+                self._pages.pop(next(iter(self._pages)))
+            self._pages.setdefault(user_id, {})[key] = (time.monotonic() + self.ttl_seconds, page)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            if self._pages.pop(user_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+
+class SessionService:
+    def __init__(self, supabase_client: "Client", versions: Optional[DocumentVersionService] = None):
+        self.supabase = supabase_client
+        self.versions = versions or get_document_version_service(supabase_client)
+        self.list_cache = SessionListCache(ttl_seconds=settings.SESSION_LIST_CACHE_TTL_SECONDS)
+
+    def list_sessions(self, user_id: str, limit: int = 30, cursor: Optional[str] = None,
+                      fields: Optional[List[str]] = None) -> Dict:
+        """
+        One page of the user's sessions, newest first.
+
+        Args:
+            user_id: Owner of the sessions
+            limit: Page size
+            cursor: `next_cursor` from the previous page
+            fields: Subset of LIST_FIELDS to return (defaults to all)
+
+        Returns:
+            dict with 'sessions', 'next_cursor' and 'etag' (hash of the page)
+
+        Raises:
+            ValueError: unknown field or malformed cursor
+        """
+        fields = list(fields or LIST_FIELDS)
+        unknown = set(fields) - set(LIST_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        columns = [f for f in LIST_FIELDS if f in fields or f in KEYSET_FIELDS]
+
+        cache_key = (limit, cursor, tuple(columns))
+        cached = self.list_cache.get(user_id, cache_key)
+        if cached is not None:
+            return cached
+
+        query = self.supabase.table('sessions').select(', '.join(columns)).eq('user_id', user_id)
+        if cursor:
+            created_at, session_id = decode_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",session_id.lt."{session_id}")'
+            )
+        rows = (
+            query.order('created_at', desc=True).order('session_id', desc=True)
+            .limit(limit).execute().data or []
+        )
+
+        next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+        sessions = [{f: row.get(f) for f in fields} for row in rows]
+        body = json.dumps([sessions, next_cursor], sort_keys=True, default=str).encode()
+        page = {
+            'sessions': sessions,
+            'next_cursor': next_cursor,
+            'etag': '"' + hashlib.sha1(body).hexdigest() + '"'
+        }
+        self.list_cache.set(user_id, cache_key, page)
+        return page
+
+    def create_session(self, session_id: str, user_id: str, title: str, mode: str,
+                       current_latex: str, messages: List[Dict]) -> None:
+        """Insert the session row and its first messages"""
+        self.supabase.table('sessions').insert({
+            'session_id': session_id,
+            'user_id': user_id,
+            'title': title,
+            'messages': [],
+            'current_latex': current_latex,
+            'mode': mode,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }).execute()
+        self.list_cache.invalidate(user_id)
+        self._insert_messages(session_id, user_id, messages)
+
+    def append_turn(self, session_id: str, user_id: str, messages: List[Dict],
+                    current_latex: Optional[str] = None) -> bool:
+        """
+        Record one chat turn: save the new LaTeX as a version, then insert the messages.
+
+        Returns False if the session does not exist or belongs to another user.
+        """
+        if current_latex is not None:
+            if self.versions.save(session_id, user_id, current_latex) is None:
+                return False
+        else:
+            result = (
+                self.supabase.table('sessions').select('session_id')
+                .eq('session_id', session_id).eq('user_id', user_id).execute()
+            )
+            if not result.data:
+                return False
+        self._insert_messages(session_id, user_id, messages)
+        return True
+
+    def _insert_messages(self, session_id: str, user_id: str, messages: List[Dict]) -> None:
+        if not messages:
+            return
+        rows = [
+            {'session_id': session_id, 'user_id': user_id, 'role': m['role'], 'content': m['content']}
+            for m in messages
+        ]
+        try:
+            self.supabase.table('session_messages').insert(rows).execute()
+        except Exception as e:
+            logger.warning(f"session_messages insert failed, appending to sessions.messages instead: {e}")
+            self._append_legacy(session_id, messages)
+
+    def _append_legacy(self, session_id: str, messages: List[Dict]) -> None:
+        """Read-modify-write of sessions.messages (only used without the session_messages table)"""
+        existing = self.supabase.table('sessions').select('messages').eq('session_id', session_id).execute()
+        previous = (existing.data[0].get('messages') or []) if existing.data else []
+        self.supabase.table('sessions').update({
+            'messages': previous + messages
+        }).eq('session_id', session_id).execute()
+
+    def get_session(self, session_id: str, user_id: str) -> Optional[Dict]:
+        """Return the session metadata row with the newest LaTeX (without messages), or None"""
+        result = (
+            self.supabase.table('sessions').select(SESSION_META_COLUMNS)
+            .eq('session_id', session_id).eq('user_id', user_id).execute()
+        )
+        if not result.data:
+            return None
+        session = result.data[0]
+        try:
+            session['version'], session['current_latex'] = self.versions.get_head(
+                session_id, user_id, base_text=session.get('current_latex') or ''
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load LaTeX versions for {session_id}, using stored text: {e}")
+            session['version'] = None
+        return session
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> Dict:
+        """
+        Return messages in chronological order.
+
+        Args:
+            session_id: Session to read
+            limit: Newest `limit` messages older than `before`; None returns everything
+            before: Message id cursor from a previous page's `next_cursor`
+
+        Returns:
+            dict with 'messages' and 'next_cursor' (None once the oldest message is included)
+        """
+        query = (
+            self.supabase.table('session_messages').select('id, role, content, created_at')
+            .eq('session_id', session_id)
+        )
+        if before is not None:
+            query = query.lt('id', before)
+        query = query.order('id', desc=True)
+        if limit is not None:
+            query = query.limit(limit)
+
+        try:
+            rows = list(reversed(query.execute().data or []))
+        except Exception as e:
+            logger.warning(f"Failed to read session_messages for {session_id}, using legacy messages: {e}")
+            rows = []
+
+        if limit is not None and len(rows) == limit:
+            return {'messages': rows, 'next_cursor': rows[0]['id']}
+
+        # Reached the start of the log: older sessions keep their history in the JSONB column
+        legacy = self.supabase.table('sessions').select('messages').eq('session_id', session_id).execute()
+        legacy_messages = (legacy.data[0].get('messages') or []) if legacy.data else []
+        return {'messages': legacy_messages + rows, 'next_cursor': None}
+
+    def delete_session(self, session_id: str, user_id: str) -> None:
+        # session_messages and session_versions rows are removed by ON DELETE CASCADE
+        self.versions.forget(session_id)
+        self.supabase.table('sessions').delete().eq('session_id', session_id).eq('user_id', user_id).execute()
+        self.list_cache.invalidate(user_id)
+
+
+# Singleton instance
+_session_service: Optional[SessionService] = None
+
+
+def get_session_service(supabase_client: "Client") -> SessionService:
+    """Get or create the session service singleton"""
+    global _session_service
+    if _session_service is None:
+        _session_service = SessionService(supabase_client)
+    return _session_service
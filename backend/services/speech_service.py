@@ -4,7 +4,6 @@ Handles audio transcription for voice input feature
 """
 
 import os
-from google.cloud import speech
 from typing import Optional
 import logging
 
@@ -25,8 +24,9 @@ class SpeechService:
         if credentials_path and os.path.isfile(credentials_path):
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
         
-        # Initialize the Speech client (v1)
+        # Initialize the Speech client (v1); google.cloud.speech is imported here, not at module load
         try:
+            from google.cloud import speech
             self.client = speech.SpeechClient()
         except Exception as e:
             logger.error(f"Failed to initialize Speech client: {e}")
@@ -57,6 +57,8 @@ class SpeechService:
                 "error": "Speech client not initialized. Please check credentials configuration."
             }
 
+        from google.cloud import speech
+
         try:
             # Prepare the audio
             audio = speech.RecognitionAudio(content=audio_content)
@@ -0,0 +1,206 @@
+"""
+TeX Engine Service
+Picks the engine (pdflatex, xelatex, lualatex, tectonic) each document is compiled with
+
+pdflatex is the fastest engine but cannot load fontspec, unicode-math or
+polyglossia and has no glyphs for most non-Latin scripts. `select()` reads
+what a document needs and returns the first engine in TEX_ENGINE_PREFERENCE
+that is installed and able to compile it:
+
+- `% !TeX program = <engine>` on a line of its own forces an engine, if it is
+  in TEX_ENGINE_PREFERENCE and installed (otherwise it is ignored)
+- \\directlua / luacode / luatexja need lualatex
+- fontspec, unicode-math, polyglossia, xeCJK, or body text outside the
+  Latin, punctuation and currency blocks need a Unicode engine (xelatex,
+  lualatex or tectonic)
+- everything else can use pdflatex
+
+If an engine still rejects the document for engine reasons (e.g. inputenc's
+"Unicode character ... not set up"), PDFService moves on to the next capable
+engine via `fallback()`. TEX_ENGINE pins one engine for every document.
+
+tectonic is a self-contained XeTeX that fetches only the packages a document
+uses from a bundle and caches them under TECTONIC_CACHE_DIR; pointing
+TECTONIC_BUNDLE at a local bundle file (and TECTONIC_ONLY_CACHED=true) makes
+cold compiles reproducible and network-free. It reruns itself until
+references settle, so PDFService never adds a second pass for it.
+
+Each engine compiles on its own pool (core/executors.py), so a burst of slow
+lualatex documents cannot starve pdflatex previews.
+"""
+
+import os
+import re
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from backend.core.config import settings
+from backend.core.metrics import get_metrics
+from backend.services.tex_log_service import TexError
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SELECTIONS = get_metrics().counter(
+    'tex_engine_selections_total', 'Documents routed to each TeX engine', ('engine', 'reason')
+)
+
+
+@dataclass(frozen=True)
+class TexEngine:
+    name: str
+    binary: str
+    unicode: bool           # native UTF-8 input and OpenType fonts (fontspec)
+    lua: bool = False       # \directlua
+    reruns_itself: bool = False
+
+    @property
+    def pool(self) -> str:
+        return 'compile' if self.name == 'pdflatex' else f'compile-{self.name}'
+
+    def command(self, tex_file: Path, output_dir: Path) -> List[str]:
+        if self.name == 'tectonic':
+            command = [self.binary, '--keep-logs', '--chatter', 'minimal', '--outdir', str(output_dir)]
+            if settings.TECTONIC_BUNDLE:
+                command += ['--bundle', settings.TECTONIC_BUNDLE]
+            if settings.TECTONIC_ONLY_CACHED:
+                command.append('--only-cached')
+            return command + [str(tex_file)]
+        return [self.binary, '-interaction=nonstopmode', '-output-directory', str(output_dir), str(tex_file)]
+
+    def environment(self) -> Optional[Dict[str, str]]:
+        """Extra environment for the subprocess (None = inherit)"""
+        if self.name == 'tectonic' and settings.TECTONIC_CACHE_DIR:
+            return {**os.environ, 'TECTONIC_CACHE_DIR': settings.TECTONIC_CACHE_DIR}
+        return None
+
+    def can_compile(self, needs: str) -> bool:
+        if needs == 'lua':
+            return self.lua
+        if needs == 'unicode':
+            return self.unicode
+        return True
+
+
+ENGINES: Dict[str, TexEngine] = {
+    'pdflatex': TexEngine('pdflatex', 'pdflatex', unicode=False),
+    'xelatex': TexEngine('xelatex', 'xelatex', unicode=True),
+    'lualatex': TexEngine('lualatex', 'lualatex', unicode=True, lua=True),
+    'tectonic': TexEngine('tectonic', 'tectonic', unicode=True, reruns_itself=True),
+}
+
+
+def get_engine(name: str) -> TexEngine:
+    if name not in ENGINES:
+        raise ValueError(f"Unknown TeX engine '{name}'")
+    return ENGINES[name]
+
+
+MAGIC_COMMENT = re.compile(r'^\s*%\s*!\s*TeX\s+(?:TS-)?program\s*=\s*(\w+)', re.IGNORECASE | re.MULTILINE)
+LUA_ONLY = re.compile(r'\\directlua\b|\\usepackage\s*(?:\[[^\]]*\])?\s*\{[^}]*\b(?:luacode|luatexja|luaotfload)\b')
+UNICODE_ONLY = re.compile(
+    r'\\usepackage\s*(?:\[[^\]]*\])?\s*\{[^}]*\b(?:fontspec|unicode-math|polyglossia|xeCJK|xunicode)\b'
+    r'|\\set(?:main|sans|mono)font\b'
+)
+# Characters pdflatex's utf8 inputenc handles out of the box with T1/TS1 fonts
+PDFLATEX_SAFE = re.compile(r'[\u0000-\u024f\u2000-\u206f\u20a0-\u20cf\u2100-\u214f]')
+# Messages that mean "wrong engine", not "broken document" (the log continues them on the next line)
+ENGINE_MISMATCH = re.compile(
+    r'inputenc Error: Unicode character'
+    r'|requires either XeTeX or'
+    r'|Undefined control sequence.*\\directlua'
+)
+
+
+def needs_of(latex: str) -> Tuple[str, str]:
+    """(capability, reason): capability is 'lua', 'unicode' or 'any'"""
+    if LUA_ONLY.search(latex):
+        return 'lua', 'lua'
+    if UNICODE_ONLY.search(latex):
+        return 'unicode', 'fontspec'
+    body_start = latex.find('\\begin{document}')
+    body = latex[body_start:] if body_start != -1 else latex
+    if PDFLATEX_SAFE.sub('', body):
+        return 'unicode', 'unicode_text'
+    return 'any', 'default'
+
+
+class TexEngineService:
+    def __init__(self, preference: Optional[List[str]] = None, pinned: Optional[str] = None):
+        names = preference if preference is not None else [
+            n.strip() for n in settings.TEX_ENGINE_PREFERENCE.split(',') if n.strip()
+        ]
+        unknown = [n for n in names if n not in ENGINES]
+        if unknown:
+            raise ValueError(f"Unknown TeX engines in TEX_ENGINE_PREFERENCE: {', '.join(unknown)}")
+        self.preference = [ENGINES[n] for n in names]
+        pinned = settings.TEX_ENGINE if pinned is None else pinned
+        if pinned not in ('auto', '') and pinned not in ENGINES:
+            raise ValueError(f"Unknown TEX_ENGINE '{pinned}'")
+        self.pinned = ENGINES.get(pinned)
+        self._installed: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def installed(self, engine: TexEngine) -> bool:
+        with self._lock:
+            if engine.name not in self._installed:
+                self._installed[engine.name] = shutil.which(engine.binary) is not None
+            return self._installed[engine.name]
+
+    def candidates(self, latex: str) -> Tuple[List[TexEngine], str]:
+        """Installed engines able to compile `latex`, fastest first, and why they were chosen"""
+        if self.pinned is not None:
+            return [self.pinned], 'pinned'
+        magic = MAGIC_COMMENT.search(latex)
+        if magic:
+            # Only engines the deployment offers: the document cannot opt into one that is not allowed
+            requested = ENGINES.get(magic.group(1).lower())
+            if requested in self.preference and self.installed(requested):
+                return [requested], 'magic_comment'
+        needs, reason = needs_of(latex)
+        capable = [e for e in self.preference if e.can_compile(needs) and self.installed(e)]
+        if not capable:
+            # Nothing suitable installed: let the preferred engine report the problem
+            return [self.preference[0] if self.preference else ENGINES['pdflatex']], 'unavailable'
+        return capable, reason
+
+    def select(self, latex: str) -> TexEngine:
+        engines, reason = self.candidates(latex)
+        ENGINE_SELECTIONS.inc(engine=engines[0].name, reason=reason)
+        if engines[0].name != 'pdflatex':
+            logger.info("Compiling with %s (%s)", engines[0].name, reason)
+        return engines[0]
+
+    def fallback(self, errors: List[TexError], tried: List[TexEngine]) -> Optional[TexEngine]:
+        """Next engine to try when `errors` say the last one in `tried` was the wrong choice, else None"""
+        messages = [f"{e.message} {e.command or ''}" for e in errors]
+        if self.pinned is not None or not any(ENGINE_MISMATCH.search(m) for m in messages):
+            return None
+        needs = 'lua' if any('directlua' in m for m in messages) else 'unicode'
+        engine = tried[-1]
+        for candidate in self.preference:
+            if candidate not in tried and candidate.can_compile(needs) and self.installed(candidate):
+                ENGINE_SELECTIONS.inc(engine=candidate.name, reason='fallback')
+                logger.info("%s cannot compile this document, retrying with %s", engine.name, candidate.name)
+                return candidate
+        return None
+
+    def available(self) -> Dict[str, bool]:
+        return {name: self.installed(engine) for name, engine in ENGINES.items()}
+
+
+_engine_service: Optional[TexEngineService] = None
+_service_lock = threading.Lock()
+
+
+def get_tex_engine_service() -> TexEngineService:
+    global _engine_service
+    if _engine_service is None:
+        with _service_lock:
+            if _engine_service is None:
+                _engine_service = TexEngineService()
+    return _engine_service
+
@@ -0,0 +1,102 @@
+"""
+TeX Log Service
+Turns a pdflatex `document.log` into structured, line-numbered errors
+
+pdflatex (nonstopmode) reports each error as a `! message` line followed by
+help text and a context line `l.<n> <source up to the error>`; the source
+line number, the offending control sequence (the last one before the error
+point) and, for "File `x' not found", the missing file are read from that
+block. Log lines are hard-wrapped at max_print_line (79) characters and are
+re-joined first. Follow-on "Emergency stop" entries only lend their line
+number to the error that caused them.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+# pdflatex's default max_print_line: longer lines continue on the next one
+LOG_LINE_WIDTH = 79
+
+CONTEXT_LINE = re.compile(r'^l\.(?P<line>\d+) ?(?P<before>.*)$')
+MISSING_FILE = re.compile(r"(?:File|I can't find file) `(?P<file>[^']+)'(?: not found)?")
+LAST_COMMAND = re.compile(r'(\\(?:[A-Za-z@]+|[^A-Za-z@\s]))\s*$')
+EMERGENCY_STOP = 'Emergency stop.'
+FATAL = '==> Fatal error occurred'
+
+
+@dataclass
+class TexError:
+    message: str
+    line: Optional[int] = None
+    command: Optional[str] = None
+    missing_file: Optional[str] = None
+    context: str = ''
+
+    @property
+    def description(self) -> str:
+        if self.command and self.command not in self.message:
+            return f"{self.message} ({self.command})"
+        return self.message
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.description}" if self.line else self.description
+
+
+class LatexCompileError(Exception):
+    """pdflatex produced no PDF; carries the errors parsed from its log"""
+
+    def __init__(self, errors: List[TexError], log_tail: str = ''):
+        self.errors = errors
+        self.log_tail = log_tail
+        details = "\n".join(str(e) for e in errors) if errors else f"Log tail:\n{log_tail}"
+        super().__init__(f"PDF generation failed: LaTeX compilation failed.\n{details}")
+
+
+def unwrap_log(log: str, width: int = LOG_LINE_WIDTH) -> List[str]:
+    lines: List[str] = []
+    pending = ''
+    for line in log.splitlines():
+        pending += line
+        if len(line) != width:
+            lines.append(pending)
+            pending = ''
+    if pending:
+        lines.append(pending)
+    return lines
+
+
+def parse_tex_log(log: str) -> List[TexError]:
+    """Errors in log order; follow-on stops are folded into the error before them"""
+    lines = unwrap_log(log)
+    starts = [i for i, line in enumerate(lines) if line.startswith('! ')]
+    errors: List[TexError] = []
+    for n, start in enumerate(starts):
+        block = lines[start + 1:starts[n + 1] if n + 1 < len(starts) else len(lines)]
+        error = TexError(message=lines[start][2:].strip())
+        missing = MISSING_FILE.search(error.message)
+        if missing:
+            error.missing_file = missing.group('file')
+        for line in block:
+            context = CONTEXT_LINE.match(line)
+            if context:
+                error.line = int(context.group('line'))
+                error.context = context.group('before')
+                break
+        # Context lines end at the error point: the innermost one ending in a control sequence names the culprit
+        for line in block:
+            if line.startswith('<') or CONTEXT_LINE.match(line):
+                command = LAST_COMMAND.search(CONTEXT_LINE.sub(r'\g<before>', line))
+                if command:
+                    error.command = command.group(1)
+                    break
+
+        if error.message.startswith(FATAL):
+            continue
+        if error.message.startswith(EMERGENCY_STOP) and errors:
+            if errors[-1].line is None:
+                errors[-1].line, errors[-1].context = error.line, error.context
+                errors[-1].command = errors[-1].command or error.command
+            continue
+        errors.append(error)
+    return errors
@@ -0,0 +1,303 @@
+"""
+API Usage Tracking Service
+Buffers API usage events in memory and writes them to Supabase in batches
+
+Request handlers only enqueue an event. A background thread drains the queue
+every few seconds, aggregates events per API key into one counter increment
+and writes all usage rows with a single bulk insert. When the queue is full the
+caller waits briefly (backpressure) and then spills the event to a local JSONL
+file; failed flushes are spilled too and replayed on the next flush.
+
+Every process spills to its own file (usage_spill.<pid>.jsonl next to the
+configured path), so uvicorn workers never replay a file another worker is
+still appending to. Files left by exited processes are claimed (renamed) by
+whichever worker flushes next; a tracker that finds such files at startup
+starts its flush thread right away.
+
+Each (API key, flush) increment is a batch with its own id, and spilled events
+keep the id of the batch they failed in. apply_api_usage_batch (see
+migrations/api_usage_batch_keys.sql) records applied ids, so a batch whose
+write timed out after the database had applied it is not counted again when
+it is replayed.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+
+class PartialCountWrite(Exception):
+    """The per-request fallback failed after `written` increments had been applied"""
+
+    def __init__(self, written: int, error: Exception):
+        self.written = written
+        super().__init__(f"{error} (after {written} increments)")
+
+
+class UsageTracker:
+    def __init__(
+        self,
+        supabase_client: "Client",
+        flush_interval_seconds: float = 5.0,
+        max_queue_size: int = 10000,
+        spill_path: Optional[Path] = None,
+        enqueue_timeout_seconds: float = 0.05,
+        on_counts_flushed: Optional[Callable[[str, int], None]] = None
+    ):
+        """
+        Args:
+            supabase_client: Admin client used for the batched writes
+            flush_interval_seconds: How often the background thread flushes
+            max_queue_size: Events buffered in memory before backpressure applies
+            spill_path: JSONL file for events that could not be queued or written
+            enqueue_timeout_seconds: How long record() waits on a full queue before spilling
+            on_counts_flushed: Called with (key_id, amount) after a counter increment is persisted
+        """
+        self.supabase = supabase_client
+        self.flush_interval_seconds = flush_interval_seconds
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.enqueue_timeout_seconds = enqueue_timeout_seconds
+        self.on_counts_flushed = on_counts_flushed
+
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue_size)
+        # Events recorded locally but not yet reflected in api_keys.requests_count
+        self._pending_counts: Counter = Counter()
+        self._counts_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {'recorded': 0, 'flushed': 0, 'spilled': 0, 'flush_errors': 0}
+        if self._claimable_spills():
+            self._ensure_worker()
+
+    # ------------------------------------------------------------------ producer
+
+    def record(self, key_id: str, endpoint: str, status_code: int) -> None:
+        """Enqueue one usage event (never blocks for longer than the enqueue timeout)"""
+        event = {
+            'api_key_id': key_id,
+            'endpoint': endpoint,
+            'status_code': status_code,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        with self._counts_lock:
+            self._pending_counts[key_id] += 1
+        self.stats['recorded'] += 1
+        self._ensure_worker()
+
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout_seconds)
+        except queue.Full:
+            logger.warning("Usage queue full, spilling event to disk")
+            self._spill([event])
+
+    def pending_count(self, key_id: str) -> int:
+        """Requests for `key_id` recorded locally but not yet counted in the database"""
+        with self._counts_lock:
+            return self._pending_counts.get(key_id, 0)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    # ------------------------------------------------------------------ consumer
+
+    def flush(self) -> int:
+        """Drain the queue (plus any spilled events) and write them in one batch"""
+        with self._flush_lock:
+            events = self._load_spill()
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not events:
+                return 0
+
+            batches: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+            batch_ids: Dict[str, str] = {}
+            for event in events:
+                # Fresh events (and spills from before batch ids) join this flush's batch for their key
+                if not event.get('batch_id'):
+                    event['batch_id'] = batch_ids.setdefault(event['api_key_id'], str(uuid.uuid4()))
+                batches[(event['api_key_id'], event['batch_id'])].append(event)
+
+            counts: Counter = Counter()
+            written: List[Dict] = []
+            for (key_id, batch_id), batch in batches.items():
+                try:
+                    self._write_count(key_id, len(batch), batch_id)
+                except Exception as e:
+                    self.stats['flush_errors'] += 1
+                    logger.error(f"Failed to flush {len(batch)} API usage events for key {key_id}: {e}")
+                    done = e.written if isinstance(e, PartialCountWrite) else 0
+                    # Retry only what was not counted; the batch id makes a replay of an applied batch a no-op
+                    self._spill(batch[done:])
+                    batch = batch[:done]
+                counts[key_id] += len(batch)
+                written.extend(batch)
+
+            counts = +counts
+            if not written:
+                return 0
+            self._settle_counts(counts)
+
+            try:
+                rows = [{k: v for k, v in event.items() if k != 'batch_id'} for event in written]
+                self.supabase.table('api_usage').insert(rows).execute()
+            except Exception as e:
+                # Counters are already persisted; losing analytics rows is preferable to double counting
+                self.stats['flush_errors'] += 1
+                logger.error(f"Failed to insert {len(written)} api_usage rows: {e}")
+
+            self.stats['flushed'] += len(written)
+            return len(written)
+
+    def _write_count(self, key_id: str, amount: int, batch_id: str) -> None:
+        # Older databases lack the keyed (api_usage_batch_keys.sql) or batched
+        # (api_usage_batching.sql) RPC; any other error is a failed write
+        try:
+            self.supabase.rpc(
+                'apply_api_usage_batch', {'batch_id': batch_id, 'key_id': key_id, 'amount': amount}
+            ).execute()
+            return
+        except Exception as e:
+            if not self._missing_function(e, 'apply_api_usage_batch'):
+                raise
+            logger.debug(f"apply_api_usage_batch unavailable, falling back: {e}")
+        try:
+            self.supabase.rpc('increment_api_key_requests_by', {'key_id': key_id, 'amount': amount}).execute()
+            return
+        except Exception as e:
+            if not self._missing_function(e, 'increment_api_key_requests_by'):
+                raise
+            logger.debug(f"increment_api_key_requests_by unavailable, falling back: {e}")
+        for done in range(amount):
+            try:
+                self.supabase.rpc('increment_api_key_requests', {'key_id': key_id}).execute()
+            except Exception as e:
+                raise PartialCountWrite(done, e)
+
+    @staticmethod
+    def _missing_function(error: Exception, name: str) -> bool:
+        message = str(error)
+        return name in message and ('PGRST202' in message or '42883' in message or 'Could not find the function' in message)
+
+    def _settle_counts(self, counts: Counter) -> None:
+        with self._counts_lock:
+            for key_id, amount in counts.items():
+                remaining = self._pending_counts[key_id] - amount
+                if remaining > 0:
+                    self._pending_counts[key_id] = remaining
+                else:
+                    # Replayed spill events from an earlier process were never counted here
+                    self._pending_counts.pop(key_id, None)
+        if self.on_counts_flushed:
+            for key_id, amount in counts.items():
+                self.on_counts_flushed(key_id, amount)
+
+    # ------------------------------------------------------------------ disk spill
+
+    def _process_file(self, pid: int, suffix: str) -> Path:
+        return self.spill_path.with_name(f"{self.spill_path.stem}.{pid}{suffix}")
+
+    def _claimable_spills(self) -> List[Path]:
+        """This process's spill file plus spill/replay files left behind by exited processes"""
+        if not self.spill_path or not self.spill_path.parent.is_dir():
+            return []
+        claimable = []
+        for path in self.spill_path.parent.glob(f"{self.spill_path.stem}.*"):
+            pid, _, suffix = path.name[len(self.spill_path.stem) + 1:].partition('.')
+            if not pid.isdigit() or f".{suffix}" not in (self.spill_path.suffix, '.replay'):
+                continue
+            if int(pid) == os.getpid() or not _process_alive(int(pid)):
+                claimable.append(path)
+        if self.spill_path.exists():  # written by versions before per-process files
+            claimable.append(self.spill_path)
+        return claimable
+
+    def _spill(self, events: List[Dict]) -> None:
+        if not self.spill_path:
+            logger.error(f"Dropping {len(events)} usage events (no spill path configured)")
+            return
+        try:
+            with self._spill_lock:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self._process_file(os.getpid(), self.spill_path.suffix), 'a', encoding='utf-8') as f:
+                    for event in events:
+                        f.write(json.dumps(event) + '\n')
+            self.stats['spilled'] += len(events)
+        except Exception as e:
+            logger.error(f"Failed to spill {len(events)} usage events: {e}")
+
+    def _load_spill(self) -> List[Dict]:
+        lines: List[str] = []
+        with self._spill_lock:
+            replay_path = self._process_file(os.getpid(), '.replay') if self.spill_path else None
+            # Our own replay file first: it holds events a failed read left behind
+            for path in sorted(self._claimable_spills(), key=lambda path: path != replay_path):
+                try:
+                    # The rename claims the file: another worker replaying the same leftover loses the race
+                    if path != replay_path:
+                        path.replace(replay_path)
+                    lines.extend(replay_path.read_text(encoding='utf-8').splitlines())
+                    replay_path.unlink()
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    # Leave the replay file for the next flush rather than overwrite it with another claim
+                    logger.error(f"Failed to read spilled usage events from {path.name}: {e}")
+                    break
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping corrupt spilled usage event")
+        if events:
+            logger.info(f"Replaying {len(events)} spilled usage events")
+        return events
+
+    # ------------------------------------------------------------------ lifecycle
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._flush_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="api-usage-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Usage flush loop error: {e}")
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
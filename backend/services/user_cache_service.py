@@ -0,0 +1,97 @@
+"""
+User Cache Service
+Short-lived, process-wide cache of rows from the `users` table
+
+A single request used to read the same users row three to five times
+(auth dependency, credit check, credit deduction, API v1 lookup). The auth
+dependency now loads the row once per request and every later consumer reuses
+it; this cache additionally lets back-to-back requests from the same user skip
+the read entirely. Writes made through CreditService invalidate the entry.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import logging
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """Thread-safe LRU cache of user rows with a short TTL"""
+
+    def __init__(self, ttl_seconds: float = 5.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        """Return a copy of the cached row, or None if missing/expired"""
+        if not user_id or self.ttl_seconds <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            expires_at, row = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats['hits'] += 1
+        # Callers mutate the returned dict (e.g. credit bookkeeping), never share it
+        return copy.deepcopy(row)
+
+    def set(self, user_id: str, row: Dict) -> None:
+        """Store a freshly read row"""
+        if not user_id or not row or self.ttl_seconds <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[user_id] = (expires_at, copy.deepcopy(row))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop the cached row after a write to the users table"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'hit_rate_percent': round(self.stats['hits'] / total * 100, 2) if total else 0
+            }
+
+
+# Singleton instance
+_user_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> UserCache:
+    """Get or create the user cache singleton"""
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = UserCache(
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            max_entries=settings.USER_CACHE_MAX_ENTRIES
+        )
+    return _user_cache
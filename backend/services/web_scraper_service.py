@@ -1,8 +1,12 @@
-import requests
 from bs4 import BeautifulSoup
+from typing import List
 import logging
 import re
 
+from backend.core.executors import get_executor, run_in_pool
+from backend.core.http_client import get_http_client
+from backend.core.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class WebScraperService:
@@ -11,33 +15,55 @@ class WebScraperService:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
 
-    def scrape_url(self, url: str) -> str:
+    @staticmethod
+    def _extract_text(content: bytes) -> str:
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # Remove unwanted elements
+        for element in soup(["script", "style", "nav", "footer", "header", "aside", "form"]):
+            element.decompose()
+            
+        # Get text
+        text = soup.get_text(separator=' ')
+        
+        # Clean text
+        # specialized cleaning
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        text = '\n'.join(chunk for chunk in chunks if chunk)
+        
+        # Limit length to avoid context window explosion (e.g. 15k chars per source)
+        return text[:15000]
+
+    @traced('scrape.url', phase='scrape')
+    async def scrape_url_async(self, url: str) -> str:
         """
         Fetches and extracts clean text from a URL.
         """
         try:
             logger.info(f"Scraping URL: {url}")
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = await get_http_client().request('GET', url, headers=self.headers, timeout=10)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup(["script", "style", "nav", "footer", "header", "aside", "form"]):
-                element.decompose()
-                
-            # Get text
-            text = soup.get_text(separator=' ')
-            
-            # Clean text
-            # specialized cleaning
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            # Limit length to avoid context window explosion (e.g. 15k chars per source)
-            return text[:15000]
-            
+            # HTML parsing is CPU work; keep it off the event loop
+            return await run_in_pool('scrape', self._extract_text, response.content)
         except Exception as e:
             logger.error(f"Failed to scrape {url}: {str(e)}")
             return ""
+
+    @traced('scrape.url', phase='scrape')
+    def scrape_url(self, url: str) -> str:
+        """Blocking variant of scrape_url_async"""
+        try:
+            logger.info(f"Scraping URL: {url}")
+            response = get_http_client().request_sync('GET', url, headers=self.headers, timeout=10)
+            response.raise_for_status()
+            return self._extract_text(response.content)
+        except Exception as e:
+            logger.error(f"Failed to scrape {url}: {str(e)}")
+            return ""
+
+    def scrape_urls(self, urls: List[str]) -> List[str]:
+        """Scrape several URLs concurrently on the scrape pool (for blocking callers)"""
+        pool = get_executor('scrape')
+        futures = [pool.submit(self.scrape_url, url) for url in urls]
+        return [future.result() for future in futures]
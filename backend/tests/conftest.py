@@ -0,0 +1,126 @@
+import sys
+from pathlib import Path
+
+# Mirror the PATH HACK in server.py so both 'backend.*' and 'services.*' imports resolve
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.append(str(BACKEND_DIR.parent))
+sys.path.append(str(BACKEND_DIR))
+
+import pytest
+
+
+class FakeTable:
+    """Tiny in-memory stand-in for the supabase-py query builder (filters, order, limit)"""
+
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self.op, self.payload = 'select', None
+        self.filters, self.order_by, self.row_limit = [], None, None
+
+    def select(self, *args):
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = 'insert', payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = 'update', payload
+        return self
+
+    def delete(self):
+        self.op = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) < value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) <= value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) > value)
+        return self
+
+    def or_(self, expression):
+        # Only the shapes the services emit: 'a.op."v",and(b.op."v",c.op."v")'
+        def parse(term):
+            column, op, value = term.split('.', 2)
+            value = value.strip('"')
+            compare = {'lt': lambda x: x < value, 'eq': lambda x: x == value, 'gt': lambda x: x > value}[op]
+            return lambda row: compare(row.get(column))
+
+        first, rest = expression.split(',', 1)
+        inner = [parse(t) for t in rest[len('and('):-1].split(',')]
+        alternatives = [parse(first), lambda row: all(f(row) for f in inner)]
+        self.filters.append(lambda row: any(f(row) for f in alternatives))
+        return self
+
+    def order(self, column, desc=False):
+        # Later calls are tie-breakers, so sort by them first (stable sort)
+        self.order_by = [(column, desc)] + (self.order_by or [])
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.name, [])
+        self.db.calls.append((self.name, self.op))
+        if self.op == 'insert':
+            new_rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            for row in new_rows:
+                self.db.next_id += 1
+                rows.append({'id': self.db.next_id, **row})
+            return type('Res', (), {'data': new_rows})()
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.op == 'update':
+            for row in matched:
+                row.update(self.payload)
+        elif self.op == 'delete':
+            self.db.tables[self.name] = [row for row in rows if row not in matched]
+        for column, desc in self.order_by or []:
+            matched.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        return type('Res', (), {'data': [dict(row) for row in matched]})()
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.calls.append(('rpc', self.name))
+        function = self.db.functions.get(self.name)
+        if function is None:
+            raise Exception(f"{{'code': 'PGRST202', 'message': 'Could not find the function public.{self.name}'}}")
+        return type('Res', (), {'data': function(**self.params)})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables, self.calls, self.next_id = {}, [], 0
+        self.functions = {}  # rpc name -> callable(**params)
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+@pytest.fixture
+def fake_supabase():
+    return FakeSupabase()
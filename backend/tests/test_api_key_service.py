@@ -0,0 +1,80 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.services.api_key_service import APIKeyService, LastUsedWriter
+
+API_KEY = 'pdf_live_secret'
+
+
+def make_service(fake_supabase, **row):
+    fake_supabase.tables['api_keys'] = [{
+        'id': 'k1', 'user_id': 'u1', 'name': 'CI', 'tier': 'free', 'is_active': True,
+        'key_hash': hashlib.sha256(API_KEY.encode()).hexdigest(),
+        'requests_count': 5, 'requests_limit': 1000, **row
+    }]
+    service = APIKeyService(fake_supabase)
+    service.last_used_writer._thread = object()  # flushed by hand in tests
+    service.usage_tracker._thread = object()
+    return service
+
+
+def key_selects(fake_supabase):
+    return fake_supabase.calls.count(('api_keys', 'select'))
+
+
+def test_valid_and_unknown_keys_are_cached_and_revocation_evicts(fake_supabase):
+    service = make_service(fake_supabase)
+
+    assert service.validate_api_key(API_KEY)['requests_count'] == 5
+    service.track_usage('k1', '/api/v1/generate', 200)
+    assert service.validate_api_key(API_KEY)['requests_count'] == 6  # includes unflushed usage
+    assert key_selects(fake_supabase) == 1
+
+    assert service.validate_api_key('pdf_live_unknown') is None
+    assert service.validate_api_key('pdf_live_unknown') is None
+    assert key_selects(fake_supabase) == 2  # negative cache
+
+    assert service.revoke_api_key('k1', 'u1')
+    assert service.validate_api_key(API_KEY) is None
+    assert key_selects(fake_supabase) == 3
+
+
+def test_expiry_is_rechecked_on_every_cache_hit(fake_supabase, monkeypatch):
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    service = make_service(fake_supabase, expires_at=expires_at.isoformat())
+    assert service.validate_api_key(API_KEY) is not None
+    assert service.validate_api_key(API_KEY) is not None
+    assert key_selects(fake_supabase) == 1
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 600)
+    assert service.validate_api_key(API_KEY) is None
+    assert service.validate_api_key(API_KEY) is None
+    assert key_selects(fake_supabase) == 2
+
+    expired = make_service(fake_supabase, expires_at='2020-01-01T00:00:00')
+    assert expired.validate_api_key(API_KEY) is None
+
+
+def test_last_used_writer_coalesces_touches_into_one_update(fake_supabase):
+    fake_supabase.tables['api_keys'] = [{'id': k, 'last_used_at': None} for k in ('k1', 'k2', 'k3')]
+    writer = LastUsedWriter(fake_supabase, interval_seconds=60)
+    writer._thread = object()
+    for key_id in ('k1', 'k2', 'k1', 'k1'):
+        writer.touch(key_id)
+
+    assert writer.flush() == 2
+    assert fake_supabase.calls == [('api_keys', 'update')]
+    assert [row['last_used_at'] is not None for row in fake_supabase.tables['api_keys']] == [True, True, False]
+    assert writer.flush() == 0
+
+    class Failing:
+        def table(self, name):
+            raise ConnectionError('supabase unavailable')
+
+    writer.supabase = Failing()
+    writer.touch('k3')
+    assert writer.flush() == 0
+    writer.supabase = fake_supabase
+    assert writer.flush() == 1  # the failed batch was kept for the next flush
@@ -0,0 +1,119 @@
+import base64
+import time
+from types import SimpleNamespace
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from backend.services.auth_service import AuthService, JWKSKeyCache, VerifiedTokenCache
+
+
+def make_service(monkeypatch, secret='test-secret', encoding='raw'):
+    monkeypatch.setenv('SUPABASE_JWT_SECRET', secret)
+    monkeypatch.setenv('SUPABASE_JWT_SECRET_ENCODING', encoding)
+    monkeypatch.delenv('SUPABASE_URL', raising=False)
+    return AuthService()
+
+
+def hs256(claims, key='test-secret', **headers):
+    return jwt.encode({'exp': int(time.time()) + 3600, **claims}, key, algorithm='HS256', headers=headers or None)
+
+
+def counting_decode(monkeypatch):
+    calls = []
+    decode = jwt.decode
+
+    def wrapper(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, 'decode', wrapper)
+    return calls
+
+
+def test_verified_tokens_are_served_from_the_cache(monkeypatch):
+    service = make_service(monkeypatch)
+    decodes = counting_decode(monkeypatch)
+    token = hs256({'sub': 'u1', 'email': 'a@example.com'})
+
+    first = service.verify_token(token)
+    assert first['user_id'] == 'u1' and first['email'] == 'a@example.com'
+    first['user_id'] = 'tampered'  # callers get copies
+    assert service.verify_token(token)['user_id'] == 'u1'
+    assert len(decodes) == 1
+    assert service.token_cache.stats == {'hits': 1, 'misses': 1}
+
+
+def test_failed_verifications_are_not_cached(monkeypatch):
+    service = make_service(monkeypatch)
+    forged = hs256({'sub': 'u1'}, key='wrong-secret')
+    expired = jwt.encode({'sub': 'u1', 'exp': int(time.time()) - 10}, 'test-secret', algorithm='HS256')
+    no_subject = hs256({'email': 'a@example.com'})
+
+    for token in (forged, expired, no_subject, 'not-a-jwt'):
+        assert service.verify_supabase_token(token) is None
+    assert service.token_cache._entries == {}
+
+
+def test_cached_claims_expire_with_the_token_and_after_max_ttl():
+    cache = VerifiedTokenCache(max_entries=2, max_ttl=300)
+    cache.set('expired', {'user_id': 'u1', 'exp': time.time() - 1})
+    assert cache.get('expired') is None and 'expired' not in cache._entries
+
+    # A revoked (signed-out) session is served from the cache for at most max_ttl
+    short = VerifiedTokenCache(max_ttl=0)
+    short.set('revoked', {'user_id': 'u1', 'exp': time.time() + 3600})
+    assert short.get('revoked') is None
+
+    for name in ('a', 'b', 'c'):
+        cache.set(name, {'user_id': name})
+    assert list(cache._entries) == ['b', 'c']
+
+
+def test_base64_secret_is_pinned_after_the_first_token(monkeypatch):
+    raw = b'supabase-signing-secret'
+    service = make_service(monkeypatch, secret=base64.b64encode(raw).decode(), encoding='auto')
+    assert len(service.hs256_keys) == 2
+    assert service.verify_supabase_token(hs256({'sub': 'u1'}, key=raw))['user_id'] == 'u1'
+    assert service.hs256_keys == [raw]
+
+
+class FakeJWKClient:
+    def __init__(self, keys):
+        self.keys, self.fetches = keys, 0
+
+    def get_jwk_set(self, refresh=False):
+        self.fetches += 1
+        return SimpleNamespace(keys=[SimpleNamespace(key_id=kid, key=key) for kid, key in self.keys.items()])
+
+
+def jwks_cache(keys, min_refresh_interval=30):
+    cache = JWKSKeyCache('https://project.supabase.co/auth/v1/.well-known/jwks.json',
+                         min_refresh_interval=min_refresh_interval)
+    cache._client = FakeJWKClient(keys)
+    cache._refresher = object()  # no background refresh thread in tests
+    return cache
+
+
+def test_jwks_keys_are_fetched_once_and_refetched_only_for_unknown_kids(monkeypatch):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    cache = jwks_cache({'k1': private_key.public_key()})
+    service = make_service(monkeypatch)
+    service.jwks = cache
+
+    token = jwt.encode({'sub': 'u1', 'exp': int(time.time()) + 3600}, private_key, algorithm='ES256',
+                       headers={'kid': 'k1'})
+    assert service.verify_supabase_token(token)['user_id'] == 'u1'
+    assert cache._client.fetches == 1  # cold cache
+    service.token_cache = VerifiedTokenCache()
+    assert service.verify_supabase_token(token)['user_id'] == 'u1'
+    assert cache._client.fetches == 1
+
+    # An unknown kid triggers one refetch, then none until min_refresh_interval has passed
+    assert cache.get_key('rotated') is None
+    assert cache.get_key('rotated') is None
+    assert cache._client.fetches == 1
+    cache._last_refresh -= 30
+    cache._client.keys['rotated'] = private_key.public_key()
+    assert cache.get_key('rotated') is not None
+    assert cache._client.fetches == 2
@@ -0,0 +1,45 @@
+from backend.services.document_version_service import DocumentVersionService
+
+
+def make_document(turn):
+    body = ''.join(f"\\section{{Part {i}}}\nParagraph {i} of a long e-book chapter.\n" for i in range(200))
+    return f"\\documentclass{{book}}\n% revision {turn}\n{body}\\end{{document}}\n"
+
+
+def test_versions_round_trip_through_snapshots_and_deltas(fake_supabase):
+    fake_supabase.tables['sessions'] = [{'session_id': 's1', 'user_id': 'u1', 'current_latex': make_document(0)}]
+    writer = DocumentVersionService(fake_supabase, snapshot_interval=4)
+
+    for turn in range(1, 10):
+        assert writer.save('s1', 'u1', make_document(turn)) == turn
+    assert writer.save('s1', 'other', make_document(99)) is None
+
+    rows = fake_supabase.tables['session_versions']
+    assert [row['kind'] for row in rows] == ['delta'] * 3 + ['snapshot'] + ['delta'] * 3 + ['snapshot', 'delta']
+    assert writer.stats['bytes_written'] < writer.stats['bytes_full'] / 20
+
+    # A fresh instance (another worker) rebuilds every version from the stored rows
+    reader = DocumentVersionService(fake_supabase, snapshot_interval=4)
+    assert reader.get_head('s1', 'u1') == (9, make_document(9))
+    for version in range(10):
+        assert reader.get_version('s1', 'u1', version) == make_document(version)
+
+    diff = reader.diff('s1', 'u1', 2, 3)
+    assert [c['text'] for c in diff['changes']] == ['% revision 3\n']
+
+
+def test_cached_head_is_checked_against_other_workers(fake_supabase):
+    fake_supabase.tables['sessions'] = [{'session_id': 's1', 'user_id': 'u1', 'current_latex': make_document(0)}]
+    first = DocumentVersionService(fake_supabase, snapshot_interval=4)
+    second = DocumentVersionService(fake_supabase, snapshot_interval=4)
+
+    assert first.save('s1', 'u1', make_document(1)) == 1
+    assert second.get_head('s1', 'u1') == (1, make_document(1))
+    assert first.save('s1', 'u1', make_document(2)) == 2
+
+    # The second worker's cached head (version 1) is stale and must not be served
+    assert second.get_head('s1', 'u1') == (2, make_document(2))
+    assert second.save('s1', 'u1', make_document(3)) == 3
+    assert second.stats['conflicts'] == 0
+    assert second.get_head('s1', 'u1') == (3, make_document(3))
+    assert second.stats['head_hits'] >= 1
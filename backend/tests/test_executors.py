@@ -0,0 +1,28 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from backend.core.executors import executor_stats, run_in_pool
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def test_blocking_calls_run_concurrently_off_the_loop():
+    loop_thread = threading.get_ident()
+
+    def blocking_call():
+        time.sleep(0.2)
+        return request_id.get(), threading.get_ident()
+
+    async def main():
+        request_id.set('req-1')
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_in_pool('llm', blocking_call) for _ in range(10)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(main())
+    assert elapsed < 1.0
+    assert all(rid == 'req-1' and thread != loop_thread for rid, thread in results)
+    stats = executor_stats()['llm']
+    assert stats['completed'] >= 10 and stats['queued'] == 0 and stats['active'] == 0
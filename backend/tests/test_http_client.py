@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.core.http_client import HTTPClient, RetryPolicy
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 to the first request of each method, then 200"""
+    hits = {}
+
+    def _reply(self):
+        count = self.hits[self.command] = self.hits.get(self.command, 0) + 1
+        self.send_response(503 if count == 1 else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def test_retries_idempotent_requests_on_a_pooled_client():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    client = HTTPClient(timeout=5)
+    retry = RetryPolicy(backoff_base=0.01)
+
+    async def main():
+        get = await client.request('GET', url, retry=retry)
+        post = await client.request('POST', url, retry=retry)
+        again = await client.request('GET', url, retry=retry)
+        await client.aclose()
+        return get, post, again
+
+    try:
+        get, post, again = asyncio.run(main())
+    finally:
+        server.shutdown()
+
+    assert get.status_code == 200 and again.status_code == 200
+    # POST is not idempotent, so the 503 is returned to the caller
+    assert post.status_code == 503
+    assert FlakyHandler.hits == {'GET': 3, 'POST': 1}
+    stats = client.get_stats()
+    assert stats['retries'] == 1 and list(stats['hosts'].values()) == [1]
+
+
+def test_least_recently_used_host_client_is_closed_when_idle():
+    servers = [ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler) for _ in range(3)]
+    for server in servers:
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/" for server in servers]
+    client = HTTPClient(timeout=5, max_hosts=2)
+    FlakyHandler.hits = {'GET': 1}  # no 503s
+    try:
+        client.request_sync('GET', urls[0])
+        first = client._sync_clients[client._host(urls[0])]
+        client.request_sync('GET', urls[1])
+        client.request_sync('GET', urls[0])
+
+        # A third host evicts the least recently used one (urls[1]), closed since it is idle
+        second = client._sync_clients[client._host(urls[1])]
+        client.request_sync('GET', urls[2])
+        assert second.is_closed and not first.is_closed
+        assert list(client._sync_clients) == [client._host(urls[0]), client._host(urls[2])]
+
+        # A client evicted mid-request is closed only once that request finishes
+        leased, _ = client._sync_client(urls[0])
+        client.request_sync('GET', urls[1])
+        client.request_sync('GET', urls[2])
+        assert leased is first and not first.is_closed
+        assert client._checkin(first) and client.get_stats()['evictions'] == 3
+    finally:
+        for server in servers:
+            server.shutdown()
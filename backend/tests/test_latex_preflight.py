@@ -0,0 +1,79 @@
+import time
+
+from backend.services.latex_preflight_service import LatexPreflightService, TexPackageIndex
+
+INSTALLED = TexPackageIndex(frozenset({'article.cls', 'amsmath.sty', 'graphicx.sty'}), source='test', verify=False)
+
+
+def check(latex):
+    return LatexPreflightService(INSTALLED).preflight(latex)
+
+
+def test_truncated_document_is_closed_not_rejected():
+    result = check(
+        "\\documentclass{article}\n\\begin{document}\n\\begin{itemize}\n\\item One\n"
+        "% a stray } in a comment\n\\verb|{|\n\\begin{verbatim}\n{ \\begin{x}\n\\end{verbatim}\n"
+    )
+    assert result.errors == []
+    assert [d.code for d in result.fixed] == ['unclosed_environment', 'missing_end_document']
+    assert result.latex.endswith("\\end{itemize}\n\\end{document}\n")
+
+
+def test_environments_open_at_end_document_are_closed():
+    result = check("\\documentclass{article}\n\\begin{document}\n\\begin{center}\nHi\n\\end{document}\n")
+    assert result.errors == []
+    assert "\\end{center}\n\\end{document}" in result.latex
+
+
+def test_doomed_documents_get_line_numbered_errors_fast():
+    latex = (
+        "\\documentclass{article}\n"
+        "\\usepackage[utf8]{inputenc}\n"          # line 2: not installed
+        "\\usepackage{amsmath, graphicx}\n"
+        "\\begin{document}\n"
+        "\\begin{itemize}\n"
+        "\\item {unclosed\n"                      # line 6
+        "\\end{enumerate}\n"                      # line 7
+        "\\end{document}\n"
+    )
+    started = time.perf_counter()
+    result = check(latex)
+    assert time.perf_counter() - started < 0.05
+    assert [(d.line, d.code) for d in result.errors] == [
+        (2, 'missing_package'), (6, 'unclosed_brace'), (7, 'mismatched_environment'),
+    ]
+    assert result.packages == ['article', 'inputenc', 'amsmath', 'graphicx']
+
+
+def test_ls_r_parsing_and_missing_index():
+    lines = ["% ls-R -- filename database\n", "./tex/latex/geometry:\n", "geometry.sty\n", "README\n", "beamer.cls\n"]
+    assert TexPackageIndex.parse_ls_r(lines) == ['geometry.sty', 'beamer.cls']
+    assert TexPackageIndex().has('geometry.sty') is None
+
+
+def test_url_arguments_are_verbatim():
+    result = check(
+        "\\documentclass{article}\n\\begin{document}\n"
+        "\\url{https://example.com/a%20b} and \\href{https://example.com/#x%7B}{the {docs}}\n"
+        "\\path|C:\\temp%|\n\\end{document}\n"
+    )
+    assert result.diagnostics == []
+
+
+def test_definition_bodies_are_not_tracked_as_environments():
+    latex = (
+        "\\documentclass{article}\n"
+        "\\newcommand{\\boxed}[1]{\\begin{center}#1}\n"
+        "\\newenvironment{note}[1][Note]{\\begin{center}\\textbf{#1}}{\\end{center}}\n"
+        "\\def\\open#1{\\begin{quote}#1}\n"
+        "\\begin{document}\n"
+        "\\renewcommand*\\close{\\end{center}}\n"
+        "\\begin{note}Hi\\end{note}\n"
+        "\\end{document}\n"
+    )
+    result = check(latex)
+    assert result.diagnostics == []
+    assert result.latex == latex
+
+    unbalanced = check("\\documentclass{article}\n\\newcommand{\\x}{\\textbf{x}\n\\begin{document}\nA\n\\end{document}\n")
+    assert [(d.line, d.code) for d in unbalanced.errors] == [(2, 'unclosed_brace')]
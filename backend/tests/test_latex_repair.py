@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+from backend.core.config import settings
+from backend.services.latex_repair_service import LatexRepairService
+from backend.services.pdf_service import PDFService
+from backend.services.tex_log_service import LatexCompileError, TexError, parse_tex_log
+
+UNDEFINED_LOG = r"""This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)
+(./document.tex
+LaTeX2e <2022-11-01> patch level 1
+! Undefined control sequence.
+l.6 Revenue grew \growth
+                        {12} percent.
+The control sequence at the end of the top line
+of your error message was never \def'ed.
+
+! LaTeX Error: Environment itemise undefined.
+
+See the LaTeX manual or LaTeX Companion for explanation.
+Type  H <return>  for immediate help.
+ ...
+
+l.8 \begin{itemise}
+
+[1{/usr/local/texlive/2023/texmf-var/fonts/map/pdftex/updmap/pdftex.map}]
+"""
+
+MISSING_FILE_LOG = r"""(./document.tex
+! LaTeX Error: File `FiraSansExtraCondensedMediumItalicWithAVeryLongName.sty' n
+ot found.
+
+Type X to quit or <RETURN> to proceed,
+or enter new name. (Default extension: sty)
+
+Enter file name: 
+! Emergency stop.
+<read *> 
+         
+l.3 \usepackage
+               {FiraSansExtraCondensedMediumItalicWithAVeryLongName}^^M
+!  ==> Fatal error occurred, no output PDF file produced!
+"""
+
+
+def test_parse_tex_log_extracts_lines_commands_and_missing_files():
+    errors = parse_tex_log(UNDEFINED_LOG)
+    assert [(e.line, e.command) for e in errors] == [(6, '\\growth'), (8, None)]
+    assert str(errors[0]) == 'line 6: Undefined control sequence. (\\growth)'
+    assert errors[1].message == 'LaTeX Error: Environment itemise undefined.'
+
+    [missing] = parse_tex_log(MISSING_FILE_LOG)
+    assert missing.missing_file == 'FiraSansExtraCondensedMediumItalicWithAVeryLongName.sty'
+    assert (missing.line, missing.command) == (3, '\\usepackage')
+
+
+class FakeGemini:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def generate_content(self, model, contents, **kwargs):
+        self.prompts.append(contents)
+        return SimpleNamespace(text=self.answer)
+
+
+def test_repair_sends_only_the_excerpt_and_patches_it():
+    lines = [f'line {n}' for n in range(1, 21)]
+    lines[9] = 'Revenue grew \\growth{12} percent.'
+    gemini = FakeGemini("```latex\n" + '\n'.join(lines[7:12]).replace('\\growth{12}', '12') + "\n```")
+    service = LatexRepairService(gemini, context_lines=2)
+
+    repaired = service.repair('\n'.join(lines), [TexError('Undefined control sequence.', line=10, command='\\growth')])
+    assert repaired.split('\n')[9] == 'Revenue grew 12 percent.'
+    assert repaired.split('\n')[:9] == lines[:9] and repaired.split('\n')[10:] == lines[10:]
+    assert '  10| Revenue grew' in gemini.prompts[0] and 'line 1\n' not in gemini.prompts[0]
+
+    assert service.repair('\n'.join(lines), [TexError('Emergency stop.')]) is None
+    whole_document = FakeGemini('\\documentclass{article}\n\\begin{document}\n\\end{document}')
+    assert LatexRepairService(whole_document, 2).repair('\n'.join(lines), [TexError('x', line=10)]) is None
+
+
+def test_compile_is_retried_with_the_repaired_source(monkeypatch, tmp_path):
+    source = '\\documentclass{article}\n\\begin{document}\nbroken\n\\end{document}\n'
+    compiled = []
+
+    def fake_compile(latex, preview_mode, tmpdir_path, engine):
+        compiled.append(latex)
+        if 'broken' in latex:
+            raise LatexCompileError([TexError('Undefined control sequence.', line=3)])
+        return b'%PDF'
+
+    monkeypatch.setattr(PDFService, '_compile_pdf', staticmethod(fake_compile))
+    monkeypatch.setattr(settings, 'LATEX_REPAIR_ENABLED', True)
+    monkeypatch.setattr(settings, 'LATEX_PREFLIGHT_ENABLED', False)
+    monkeypatch.setattr(
+        'backend.services.pdf_service.get_latex_repair_service',
+        lambda: LatexRepairService(FakeGemini('fixed'), context_lines=0)
+    )
+
+    assert asyncio.run(PDFService._compile_with_repair(source, {}, True, tmp_path)) == b'%PDF'
+    assert compiled[1] == source.replace('broken', 'fixed')
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from backend.services.latex_sanitizer_service import LatexSanitizer, SanitizeRule, load_rules
+
+BEAMER = r"""\documentclass{beamer}
+\usepackage[sfdefaultsans]{FiraSans}
+\usepackage[italic]{mathastext}
+\usepackage{sansmathaccent}
+\begin{document}
+\texttt{\fontfamily{fvm}\selectfont code}
+\end{document}
+"""
+
+
+def test_default_rules_rewrite_fonts_in_one_pass():
+    latex, fired = LatexSanitizer(load_rules()).sanitize(BEAMER)
+    assert fired == {'firasans': 1, 'mathastext': 1, 'sansmathaccent': 1, 'fvm': 1}
+    assert r'\usepackage{helvet}\renewcommand{\familydefault}{\sfdefault}' in latex
+    assert '% mathastext removed' in latex
+    assert '% sansmathaccent removed (font not available)' in latex
+    assert r'\fontfamily{pcr}' in latex
+    assert 'FiraSans' not in latex
+
+
+def test_dependent_rule_needs_its_prerequisite():
+    latex = '\\documentclass{article}\n\\usepackage[italic]{mathastext}\n'
+    assert LatexSanitizer(load_rules()).sanitize(latex) == (latex, {})
+
+
+def test_rules_from_config_and_disabled_defaults():
+    extra = json.dumps([{'name': 'tikz_external', 'pattern': r'\\usetikzlibrary\{external\}', 'replacement': ''}])
+    sanitizer = LatexSanitizer(load_rules(extra, disabled='sansmathaccent, fvm'))
+    latex, fired = sanitizer.sanitize('\\usetikzlibrary{external}\\usepackage{sansmathaccent}{fvm}')
+    assert latex == '\\usepackage{sansmathaccent}{fvm}'
+    assert fired == {'tikz_external': 1}
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        LatexSanitizer([SanitizeRule('named', r'(?P<pkg>x)', '')])
+    with pytest.raises(ValueError):
+        LatexSanitizer([SanitizeRule('orphan', 'x', '', requires='missing')])
+
+
+def test_lookarounds_and_groups_expand_from_the_document():
+    sanitizer = LatexSanitizer(load_rules() + [
+        # Only when followed by hyperref, which the lookahead sees past the match
+        SanitizeRule('bookmark', r'\\usepackage\{bookmark\}(?=\s*\\usepackage\{hyperref\})', ''),
+        SanitizeRule('geometry', r'\\usepackage\[(\w+)paper\]\{(geometry)\}', r'\\usepackage[\1paper,margin=1in]{\2}'),
+    ])
+    latex, fired = sanitizer.sanitize(
+        '\\usepackage{bookmark}\n\\usepackage{hyperref}\n\\usepackage[a4paper]{geometry}\n\\usepackage{bookmark}'
+    )
+    assert latex == '\n\\usepackage{hyperref}\n\\usepackage[a4paper,margin=1in]{geometry}\n\\usepackage{bookmark}'
+    assert fired == {'bookmark': 1, 'geometry': 1}
+
+
+def test_backreferences_are_rejected():
+    with pytest.raises(ValueError):
+        LatexSanitizer([SanitizeRule('twice', r'(\w+) \1', '')])
+    with pytest.raises(ValueError):
+        LatexSanitizer([SanitizeRule('missing', r'(\w+)', r'\2')])
+    assert LatexSanitizer([SanitizeRule('literal', r'\\\\1', 'x')]).sanitize('a\\\\1') == ('ax', {'literal': 1})
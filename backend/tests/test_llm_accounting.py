@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from backend.core.llm_accounting import LLMAccounting, get_llm_accounting
+from backend.core.llm_resilience import ResilientLLM
+from backend.core.llm_scheduler import LLMScheduler, llm_user
+from backend.core.metrics import MetricsRegistry
+
+
+def response(prompt, output, cached=0):
+    usage = SimpleNamespace(prompt_token_count=prompt, candidates_token_count=output,
+                            cached_content_token_count=cached, thoughts_token_count=None)
+    return SimpleNamespace(text='ok', usage_metadata=usage)
+
+
+def test_series_and_user_summary():
+    registry = MetricsRegistry()
+    accounting = LLMAccounting(max_users=1, registry=registry)
+    accounting.record('flash', 0.4, 'ok', response(1200, 300, cached=1000), mode='normal', tier='starter', user_id='u1')
+    accounting.record('flash', 3.0, 'ok', response(800, 100), mode='normal', tier='starter', user_id='u1')
+    accounting.record('flash', 1.0, 'error', mode='<script>', user_id='u1')
+
+    series = accounting.get_stats()['series']
+    ok = next(s for s in series if s['outcome'] == 'ok')
+    assert (ok['calls'], ok['prompt_tokens'], ok['cached_tokens'], ok['output_tokens']) == (2, 2000, 1000, 400)
+    # Histograms are read back from the shared registry (cumulative buckets)
+    assert ok['latency_seconds']['buckets']['0.5'] == 1 and ok['latency_seconds']['buckets']['5'] == 2
+    assert ok['p50_latency_le_s'] == 0.5 and ok['prompt_tokens_hist']['count'] == 2
+    assert 'llm_request_seconds_bucket{model="flash",mode="normal",tier="starter",outcome="ok",le="0.5"} 1' \
+        in registry.render()
+    # Unknown modes collapse into one label
+    assert next(s for s in series if s['outcome'] == 'error')['mode'] == 'other'
+
+    summary = accounting.user_summary('u1')
+    assert summary['calls'] == 3 and summary['errors'] == 1 and summary['total_tokens'] == 2400
+    assert summary['by_mode']['normal']['calls'] == 2
+
+    # Bounded: the oldest user is evicted
+    accounting.record('flash', 0.1, 'ok', response(10, 10), user_id='u2')
+    assert accounting.user_summary('u1')['calls'] == 0
+
+
+def test_model_calls_are_recorded_with_the_caller():
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=lambda **kwargs: response(50, 20)))
+    llm = ResilientLLM(LLMScheduler(), fallback_model='flash')
+    token = llm_user.set('accounting-user')
+    try:
+        llm.generate(client, 'flash', 'prompt', mode='extract_json')
+    finally:
+        llm_user.reset(token)
+
+    summary = get_llm_accounting().user_summary('accounting-user')
+    assert summary['calls'] == 1 and summary['by_mode']['extract_json']['tokens'] == 70
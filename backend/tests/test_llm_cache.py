@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from backend.core.llm_cache import LLMResponseCache, cache_key
+
+
+def test_concurrent_identical_calls_compute_once(tmp_path):
+    cache = LLMResponseCache(disk_dir=str(tmp_path))
+    key = cache_key('flash', 'outline prompt', schema={'type': 'object'})
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'slides': [1, 2]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(key, compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'slides': [1, 2]}] * 5
+    # Callers get independent copies
+    results[0]['slides'].append(3)
+    assert cache.get_or_compute(key, compute) == {'slides': [1, 2]}
+
+    # A new process (fresh memory) is served from disk
+    restarted = LLMResponseCache(disk_dir=str(tmp_path))
+    assert restarted.get_or_compute(key, compute) == {'slides': [1, 2]}
+    assert len(calls) == 1 and restarted.stats['disk_hits'] == 1
+
+
+def test_failures_are_not_cached_and_keys_cover_schema():
+    cache = LLMResponseCache()
+    key = cache_key('flash', 'prompt', schema={'a': 1})
+    assert key != cache_key('flash', 'prompt', schema={'a': 2})
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute(key, fail)
+    assert cache.get_or_compute(key, lambda: 'ok') == 'ok'
+    assert cache.get_stats()['misses'] == 2
@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+from backend.core.llm_resilience import DeadlineExceeded, ResilientLLM, set_deadline
+from backend.core.llm_scheduler import LLMScheduler
+
+
+class ClientError(Exception):
+    """Shaped like google.genai.errors.APIError"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeModels:
+    def __init__(self, delays, failing=(), error=None):
+        self.delays = delays
+        self.failing = set(failing)
+        self.error = error or Exception("500 INTERNAL")
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(model)
+        time.sleep(self.delays.get(model, 0))
+        if model in self.failing:
+            raise self.error
+        return type('Response', (), {'text': model, 'usage_metadata': None})()
+
+
+class FakeClient:
+    def __init__(self, delays, failing=(), error=None):
+        self.models = FakeModels(delays, failing, error)
+
+
+def make_llm(**kwargs):
+    return ResilientLLM(LLMScheduler(), fallback_model='fast', hedge_min_delay=0.05, hedge_min_samples=3, **kwargs)
+
+
+def test_slow_primary_is_hedged_to_the_fast_model():
+    llm = make_llm()
+    for _ in range(3):
+        llm.latency('slow').record(0.05)
+    client = FakeClient({'slow': 1.0, 'fast': 0.01})
+
+    started = time.monotonic()
+    response = llm.generate(client, 'slow', 'prompt', hedge=True)
+
+    assert response.text == 'fast'
+    assert time.monotonic() - started < 0.5
+    assert llm.stats['hedges_fired'] == 1 and llm.stats['hedges_won'] == 1
+
+
+def test_breaker_opens_and_calls_go_to_the_fallback():
+    llm = make_llm(failure_threshold=2, reset_seconds=60)
+    client = FakeClient({}, failing={'pro'})
+
+    for _ in range(3):
+        assert llm.generate(client, 'pro', 'prompt').text == 'fast'
+
+    # The third call skipped the open 'pro' circuit entirely
+    assert client.models.calls == ['pro', 'fast', 'pro', 'fast', 'fast']
+    assert llm.get_stats()['models']['pro']['circuit'] == 'open'
+
+
+def test_client_errors_neither_open_the_breaker_nor_fall_back():
+    llm = make_llm(failure_threshold=2, reset_seconds=60)
+    client = FakeClient({}, failing={'pro'}, error=ClientError(400, "INVALID_ARGUMENT"))
+
+    for _ in range(3):
+        with pytest.raises(ClientError):
+            llm.generate(client, 'pro', 'prompt')
+
+    assert client.models.calls == ['pro', 'pro', 'pro']
+    assert llm.get_stats()['models']['pro']['circuit'] == 'closed'
+    assert llm.stats['fallbacks'] == 0
+
+
+def test_losing_hedge_is_dropped_from_the_queue():
+    llm = make_llm()
+    for _ in range(3):
+        llm.latency('slow').record(0.05)
+    client = FakeClient({'slow': 0.3})
+    # Saturate the fast lane so the hedge has to queue
+    lane = llm.scheduler.lane('fast')
+    held = [llm.scheduler.acquire('fast', 1) for _ in range(lane.max_concurrency)]
+    try:
+        assert llm.generate(client, 'slow', 'prompt', hedge=True).text == 'slow'
+        deadline = time.monotonic() + 2
+        while any(lane.snapshot()['queued'].values()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not any(lane.snapshot()['queued'].values())
+    finally:
+        for ticket in held:
+            llm.scheduler.release('fast', ticket)
+    assert client.models.calls == ['slow']
+    assert llm.stats['hedges_fired'] == 1 and llm.stats['hedges_won'] == 0
+
+
+def test_expired_deadline_fails_without_calling_the_model():
+    llm = make_llm()
+    client = FakeClient({})
+    set_deadline(0.01)
+    time.sleep(0.02)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            llm.generate(client, 'pro', 'prompt')
+    finally:
+        set_deadline(None)
+    assert client.models.calls == []
+
+
+def test_half_open_probe_is_given_back_by_calls_without_an_outcome():
+    llm = make_llm(reset_seconds=0)
+    breaker = llm.breaker('fast')
+    breaker.state = 'open'
+    for _ in range(3):
+        llm.latency('slow').record(0.05)
+    client = FakeClient({'slow': 0.3})
+
+    # The hedge takes the probe, then loses while queued behind a saturated lane
+    lane = llm.scheduler.lane('fast')
+    held = [llm.scheduler.acquire('fast', 1) for _ in range(lane.max_concurrency)]
+    try:
+        assert llm.generate(client, 'slow', 'prompt', hedge=True).text == 'slow'
+        deadline = time.monotonic() + 2
+        while breaker._probing and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        for ticket in held:
+            llm.scheduler.release('fast', ticket)
+    assert breaker.state == 'half_open' and not breaker._probing
+
+    # A probe that fails its deadline before calling the model is given back too
+    set_deadline(0.01)
+    time.sleep(0.02)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            llm.generate(client, 'fast', 'prompt')
+    finally:
+        set_deadline(None)
+    assert not breaker._probing
+
+    assert llm.generate(client, 'fast', 'prompt').text == 'fast'
+    assert breaker.state == 'closed'
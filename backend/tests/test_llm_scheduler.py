@@ -0,0 +1,64 @@
+import threading
+import time
+
+from backend.core.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler
+
+
+class FakeModels:
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            self.calls.append(contents)
+            if len(self.calls) <= self.fail_first:
+                raise Exception("429 RESOURCE_EXHAUSTED")
+        time.sleep(0.05)
+        return type('Response', (), {'text': contents, 'usage_metadata': None})()
+
+
+class FakeClient:
+    def __init__(self, fail_first: int = 0):
+        self.models = FakeModels(fail_first)
+
+
+def test_interactive_first_then_round_robin_across_users():
+    scheduler = LLMScheduler()
+    scheduler.configure('m', max_concurrency=1)
+    client = FakeClient()
+    # Hold the only slot so every call below queues
+    blocker = scheduler.acquire('m', 1)
+
+    callers = [('a1', 'alice', BATCH), ('a2', 'alice', BATCH), ('a3', 'alice', BATCH),
+               ('b1', 'bob', BATCH), ('i1', 'carol', INTERACTIVE)]
+    threads = []
+    for contents, user, priority in callers:
+        thread = threading.Thread(target=scheduler.generate, args=(client, 'm', contents),
+                                  kwargs={'priority': priority, 'user_id': user})
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+
+    scheduler.release('m', blocker)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert client.models.calls == ['i1', 'a1', 'b1', 'a2', 'a3']
+    stats = scheduler.get_stats()['m']
+    assert stats['granted'] == 6 and stats['in_flight'] == 0
+
+
+def test_throttling_halves_the_limit_and_retries():
+    scheduler = LLMScheduler(backoff_base=0.01)
+    scheduler.configure('m', max_concurrency=8)
+    client = FakeClient(fail_first=1)
+
+    response = scheduler.generate(client, 'm', 'hello')
+
+    assert response.text == 'hello'
+    assert client.models.calls == ['hello', 'hello']
+    stats = scheduler.get_stats()['m']
+    assert stats['throttled'] == 1
+    assert 4 < stats['limit'] < 8
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+from google import genai
+from google.genai import types
+from postgrest import APIError, SyncPostgrestClient
+
+from backend.loadtest.fakes import FakeGemini, FakeSupabase, FaultProfile
+
+
+@pytest.fixture
+def fake_rest():
+    fake = FakeSupabase().start()
+    yield fake, SyncPostgrestClient(f"{fake.url}/rest/v1", headers={'apikey': 'test'})
+    fake.stop()
+
+
+def test_postgrest_fake_filters_orders_and_enforces_unique_keys(fake_rest):
+    fake, client = fake_rest
+    for day in range(1, 5):
+        client.table('session_messages').insert(
+            {'session_id': 's1', 'content': f'm{day}', 'created_at': f'2024-01-0{day}'}
+        ).execute()
+    client.table('session_messages').insert({'session_id': 's2', 'content': 'other'}).execute()
+
+    page = (client.table('session_messages').select('id, content').eq('session_id', 's1')
+            .lt('id', 4).order('id', desc=True).limit(2).execute().data)
+    assert page == [{'id': 3, 'content': 'm3'}, {'id': 2, 'content': 'm2'}]
+
+    # Keyset cursor shape used by SessionService.list_sessions
+    rows = (client.table('session_messages').select('content')
+            .or_('created_at.lt."2024-01-02",and(created_at.eq."2024-01-03",id.lt."9")').execute().data)
+    assert [r['content'] for r in rows] == ['m1', 'm3']
+
+    client.table('users').insert({'user_id': 'u1', 'credits': 3}).execute()
+    with pytest.raises(APIError) as error:
+        client.table('users').insert({'user_id': 'u1'}).execute()
+    assert error.value.code == '23505'
+
+    assert client.table('users').update({'credits': 2}).eq('user_id', 'u1').execute().data[0]['credits'] == 2
+    assert fake.store.rows('users')[0]['credits'] == 2
+
+
+def test_gemini_fake_serves_text_json_and_injected_errors():
+    fake = FakeGemini().start()
+    try:
+        client = genai.Client(api_key='test', http_options={'base_url': fake.url})
+        text = client.models.generate_content(model='gemini-2.5-pro', contents='Write a report').text
+        assert '\\documentclass' in text
+
+        schema = {'type': 'object', 'properties': {'slides': {'type': 'array', 'items': {
+            'type': 'object', 'properties': {'title': {'type': 'string'}}}}}}
+        response = client.models.generate_content(
+            model='gemini-2.5-flash', contents='Outline',
+            config=types.GenerateContentConfig(response_mime_type='application/json', response_schema=schema)
+        )
+        assert json.loads(response.text)['slides'][0] == {'title': 'Sample title'}
+
+        fake.profile = FaultProfile.parse('errors=1,status=429')
+        with pytest.raises(Exception, match='429'):
+            client.models.generate_content(model='gemini-2.5-pro', contents='x')
+        assert fake.stats['injected_errors'] == 1
+    finally:
+        fake.stop()
+
+
+def test_fault_profile_parsing():
+    profile = FaultProfile.parse('latency=800,jitter=200,dist=lognormal,errors=0.05,status=503')
+    assert (profile.latency_ms, profile.jitter_ms, profile.distribution, profile.error_rate) == (800, 200, 'lognormal', 0.05)
+    with pytest.raises(ValueError):
+        FaultProfile.parse('latency=1,bogus=2')
@@ -0,0 +1,35 @@
+import json
+import logging
+import queue
+
+from backend.core.logging_setup import JSONFormatter, NonBlockingQueueHandler, SamplingFilter, parse_sampling
+
+
+def test_sampling_is_per_call_site_and_spares_warnings():
+    sampler = SamplingFilter(parse_sampling("noisy=0.25, bad=x"))
+    logger = logging.getLogger('noisy.child')
+
+    def record(msg, level=logging.INFO):
+        return logger.makeRecord(logger.name, level, __file__, 1, msg, (1,), None)
+
+    kept = [sampler.filter(record("hot %s")) for _ in range(8)]
+    assert kept == [True, False, False, False, True, False, False, False]
+    # A different template in the same logger has its own counter
+    assert sampler.filter(record("rare %s"))
+    assert all(sampler.filter(record("hot %s", logging.WARNING)) for _ in range(3))
+    assert sampler.filter(logging.getLogger('quiet').makeRecord('quiet', logging.INFO, __file__, 1, 'x', (), None))
+
+
+def test_records_are_queued_unformatted_and_rendered_as_json():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger('structured')
+    args = {'n': 3}
+    handler.handle(logger.makeRecord('structured', logging.INFO, __file__, 1, "compiled %(n)s pages", (args,), None,
+                                     extra={'artifact': 'latex-1'}))
+    handler.handle(logger.makeRecord('structured', logging.INFO, __file__, 1, "dropped", (), None))
+    assert handler.dropped == 1
+
+    record = handler.queue.get_nowait()
+    assert record.args == args  # formatting is left to the listener thread
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry['msg'] == 'compiled 3 pages' and entry['artifact'] == 'latex-1' and entry['level'] == 'INFO'
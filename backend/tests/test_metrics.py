@@ -0,0 +1,27 @@
+from backend.core.metrics import OVERFLOW, MetricsRegistry
+
+
+def test_render_and_cardinality_bound():
+    registry = MetricsRegistry(max_series=2)
+    requests = registry.counter('http_requests_total', 'HTTP requests', ('route',))
+    requests.inc(route='/a')
+    requests.inc(route='/b"x')
+    requests.inc(route='/c')
+    requests.inc(route='/d')
+    assert requests.value(route='/a') == 1
+    assert requests.value(route=OVERFLOW) == 2
+
+    latency = registry.histogram('compile_seconds', 'Compile time', ('preview',), buckets=(1, 5))
+    latency.observe(0.5, preview='true')
+    latency.observe(3, preview='true')
+    latency.observe(9, preview='true')
+    assert latency.snapshot(preview='true') == ([1, 2, 3], 12.5, 3)
+
+    registry.register_collector(lambda: [('queue_depth', 'gauge', 'Queued', [({'pool': 'db'}, 4)])])
+    text = registry.render()
+    assert '# TYPE http_requests_total counter' in text
+    assert 'http_requests_total{route="/b\\"x"} 1' in text
+    assert 'compile_seconds_bucket{preview="true",le="5"} 2' in text
+    assert 'compile_seconds_bucket{preview="true",le="+Inf"} 3' in text
+    assert 'compile_seconds_count{preview="true"} 3' in text
+    assert 'queue_depth{pool="db"} 4' in text
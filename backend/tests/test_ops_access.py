@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+
+from backend.core.config import settings
+from backend.core.deps import require_ops_access
+
+
+def test_ops_endpoints_require_the_configured_token(monkeypatch):
+    monkeypatch.setattr(settings, 'OPS_TOKEN', '')
+    with pytest.raises(HTTPException) as unset:
+        require_ops_access('Bearer ')
+    assert unset.value.status_code == 403
+
+    monkeypatch.setattr(settings, 'OPS_TOKEN', 'ops-secret')
+    for header in (None, 'ops-secret', 'Bearer wrong'):
+        with pytest.raises(HTTPException):
+            require_ops_access(header)
+    assert require_ops_access('Bearer ops-secret') is None
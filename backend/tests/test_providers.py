@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from backend.core.providers import Provider
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_provider_builds_once():
+    built = []
+
+    def factory():
+        built.append(1)
+        time.sleep(0.05)
+        return object()
+
+    get_service = Provider('test', factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_service())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1 and len(set(map(id, results))) == 1
+    assert get_service.initialized and get_service.init_seconds >= 0.05
+
+
+def test_importing_server_defers_heavy_clients():
+    check = (
+        "import sys, server; "
+        "heavy = [m for m in ('google.genai', 'google.cloud.speech', 'firecrawl', 'supabase', 'dodopayments') "
+        "if m in sys.modules]; "
+        "print('HEAVY=' + ','.join(heavy))"
+    )
+    env = dict(os.environ, GEMINI_API_KEY='test')
+    result = subprocess.run([sys.executable, '-c', check], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip().splitlines()[-1] == 'HEAVY='
@@ -0,0 +1,92 @@
+import socketserver
+import threading
+import time
+
+from backend.services.rate_limiter_service import (
+    MemoryBucketStore, RateLimiter, RedisBucketStore, RESPConnection, SQLiteBucketStore, _refill
+)
+
+
+def test_sqlite_store_shares_limit_between_workers(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    worker_a = RateLimiter(SQLiteBucketStore(path))
+    worker_b = RateLimiter(SQLiteBucketStore(path))
+
+    results = [worker.check_limit('key-1', 'free')['allowed'] for worker in (worker_a, worker_b) * 6]
+
+    # The free tier allows 10 requests per minute in total, not 10 per worker
+    assert results.count(True) == 10
+    assert results[-2:] == [False, False]
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Local stand-in that speaks RESP and runs the bucket script's logic in Python"""
+
+    buckets = {}
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == 'SCRIPT':
+                self.wfile.write(b'$4\r\nsha1\r\n')
+            elif command == 'EVALSHA':
+                key, capacity, rate, cost = args[3], float(args[4]), float(args[5]), float(args[6])
+                tokens, updated = self.buckets.get(key, (None, None))
+                allowed, tokens = _refill(tokens, updated, 0.0, capacity, rate, cost)
+                self.buckets[key] = (tokens, 0.0)
+                value = str(tokens).encode()
+                self.wfile.write(b'*2\r\n:%d\r\n$%d\r\n%s\r\n' % (int(allowed), len(value), value))
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+
+def test_redis_store_against_local_stand_in():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeRedisHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"redis://127.0.0.1:{server.server_address[1]}/0"
+        connection = RESPConnection(url)
+        store = RedisBucketStore(url, connection=connection)
+        results = store.take_many([('k', 2, 1 / 30)] * 3)
+        assert [allowed for allowed, _ in results] == [True, True, False]
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_memory_store_evicts_refilled_and_excess_buckets():
+    for algorithm in MemoryBucketStore.ALGORITHMS:
+        store = MemoryBucketStore(algorithm=algorithm, max_buckets=3)
+        # 1000 tokens/s refills a 1-token bucket almost immediately
+        store.take('idle', 1, 1000)
+        time.sleep(0.01)
+        for i in range(5):
+            store.take(f'busy-{i}', 10, 0.001)
+        assert 'idle' not in store.buckets
+        assert len(store) == 3
+
+
+def test_check_limit_result_is_dict_compatible():
+    limiter = RateLimiter(MemoryBucketStore(algorithm='gcra'))
+    results = [limiter.check_limit('key-1', 'free') for _ in range(11)]
+
+    assert [r['allowed'] for r in results].count(True) == 10
+    denied = results[-1]
+    assert denied.get('retry_after') == 60 and denied['reason'] == 'rate_limit_exceeded'
+    assert set(results[0]) == {'allowed', 'limit', 'remaining', 'reset_at'}
+    assert isinstance(denied['reset_at'], str)
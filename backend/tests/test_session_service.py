@@ -0,0 +1,61 @@
+import pytest
+
+from backend.services.session_service import SessionService, decode_cursor, encode_cursor
+
+
+def test_chat_turns_are_inserted_and_paged_after_legacy_history(fake_supabase):
+    service = SessionService(fake_supabase)
+    service.create_session('s1', 'u1', 'Title', 'normal', 'v0', [{'role': 'user', 'content': 'hi'}])
+    # A session created before session_messages existed
+    fake_supabase.tables['sessions'][0]['messages'] = [{'role': 'user', 'content': 'legacy'}]
+
+    for turn in range(3):
+        assert service.append_turn('s1', 'u1', [{'role': 'assistant', 'content': f'a{turn}'}], f'v{turn + 1}')
+    assert not service.append_turn('s1', 'someone-else', [{'role': 'user', 'content': 'x'}], 'evil')
+
+    page = service.get_messages('s1', limit=2)
+    assert [m['content'] for m in page['messages']] == ['a1', 'a2']
+    older = service.get_messages('s1', limit=3, before=page['next_cursor'])
+    assert [m['content'] for m in older['messages']] == ['legacy', 'hi', 'a0']
+    assert older['next_cursor'] is None
+    assert service.get_session('s1', 'u1')['current_latex'] == 'v3'
+
+
+def test_session_list_is_keyset_paginated_and_cached(fake_supabase):
+    fake_supabase.tables['sessions'] = [
+        {'session_id': f'00000000-0000-4000-8000-{i:012d}', 'user_id': 'u1', 'title': f'Doc {i}', 'mode': 'normal',
+         # Pairs share a timestamp so the session_id tie-breaker matters
+         'created_at': f'2024-01-01T00:00:{i // 2:02d}+00:00'}
+        for i in range(7)
+    ]
+    service = SessionService(fake_supabase)
+
+    seen, cursor = [], None
+    while True:
+        page = service.list_sessions('u1', limit=3, cursor=cursor, fields=['title'])
+        seen += [row['title'] for row in page['sessions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert seen == [f'Doc {i}' for i in reversed(range(7))]
+
+    selects = len(fake_supabase.calls)
+    assert service.list_sessions('u1', limit=3) is service.list_sessions('u1', limit=3)
+    assert len(fake_supabase.calls) == selects + 1
+
+    service.create_session('s99', 'u1', 'New', 'normal', '', [])
+    assert service.list_sessions('u1', limit=3)['sessions'][0]['title'] == 'New'
+
+
+def test_cursor_must_hold_a_timestamp_and_a_uuid(fake_supabase):
+    service = SessionService(fake_supabase)
+    row = {'created_at': '2024-01-01T00:00:00+00:00', 'session_id': '00000000-0000-4000-8000-000000000001'}
+    assert decode_cursor(encode_cursor(row)) == (row['created_at'], row['session_id'])
+    for forged in (
+        {**row, 'created_at': '2024-01-01",user_id.neq."x'},
+        {**row, 'session_id': 'x",and(user_id.neq.x'},
+    ):
+        with pytest.raises(ValueError):
+            service.list_sessions('u1', limit=3, cursor=encode_cursor(forged))
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
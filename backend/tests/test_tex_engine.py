@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+
+from backend.services.pdf_service import PDFService
+from backend.services.tex_engine_service import ENGINES, TexEngineService
+from backend.services.tex_log_service import LatexCompileError, TexError
+
+
+def engines(*installed, preference=('pdflatex', 'xelatex', 'lualatex')):
+    service = TexEngineService(list(preference), pinned='auto')
+    service._installed = {name: name in installed for name in ENGINES}
+    return service
+
+
+def document(preamble='', body='Plain text.'):
+    return f"\\documentclass{{article}}\n{preamble}\n\\begin{{document}}\n{body}\n\\end{{document}}\n"
+
+
+def test_select_prefers_the_fastest_capable_engine():
+    service = engines('pdflatex', 'xelatex', 'lualatex')
+    assert service.select(document(body='Caf\u00e9 \u2014 \u20ac5')).name == 'pdflatex'
+    assert service.select(document('\\usepackage{fontspec}\n\\setmainfont{DejaVu Serif}')).name == 'xelatex'
+    assert service.select(document(body='\u6f22\u5b57 and \u0394')).name == 'xelatex'
+    assert service.select(document(body='\\directlua{tex.print("x")}')).name == 'lualatex'
+    assert service.select('% !TeX program = lualatex\n' + document()).name == 'lualatex'
+    # Engines outside the preference list, or not installed, cannot be requested
+    assert service.select('% !TeX program = tectonic\n' + document()).name == 'pdflatex'
+    assert engines('pdflatex', 'xelatex').select('% !TeX program = lualatex\n' + document()).name == 'pdflatex'
+
+    assert engines('pdflatex', 'lualatex').select(document('\\usepackage{fontspec}')).name == 'lualatex'
+    assert TexEngineService(['xelatex'], pinned='tectonic').select(document()).name == 'tectonic'
+
+
+def test_fallback_only_for_engine_mismatches():
+    service = engines('pdflatex', 'xelatex', 'lualatex')
+    unicode_error = TexError('Package inputenc Error: Unicode character \u2261 (U+2261)', line=4)
+    assert service.fallback([unicode_error], [ENGINES['pdflatex']]).name == 'xelatex'
+    assert service.fallback([unicode_error], [ENGINES['pdflatex'], ENGINES['xelatex']]).name == 'lualatex'
+    assert service.fallback([TexError('Undefined control sequence.', line=4, command='\\foo')],
+                            [ENGINES['pdflatex']]) is None
+
+
+def test_tectonic_command_uses_the_local_bundle(monkeypatch):
+    from backend.core.config import settings
+    monkeypatch.setattr(settings, 'TECTONIC_BUNDLE', '/srv/tex/bundle.tar')
+    monkeypatch.setattr(settings, 'TECTONIC_ONLY_CACHED', True)
+    command = ENGINES['tectonic'].command(Path('/tmp/x/document.tex'), Path('/tmp/x'))
+    assert command[:2] == ['tectonic', '--keep-logs']
+    assert ['--bundle', '/srv/tex/bundle.tar'] == command[command.index('--bundle'):command.index('--bundle') + 2]
+    assert '--only-cached' in command and command[-1] == '/tmp/x/document.tex'
+    assert ENGINES['xelatex'].pool == 'compile-xelatex' and ENGINES['pdflatex'].pool == 'compile'
+
+
+def test_compile_moves_to_a_unicode_engine_when_pdflatex_rejects_the_text(monkeypatch, tmp_path):
+    used = []
+
+    def fake_compile(latex, preview_mode, tmpdir_path, engine):
+        used.append(engine.name)
+        if engine.name == 'pdflatex':
+            raise LatexCompileError([TexError('Package inputenc Error: Unicode character \u2261 (U+2261)', line=4)])
+        return b'%PDF'
+
+    monkeypatch.setattr(PDFService, '_compile_pdf', staticmethod(fake_compile))
+    monkeypatch.setattr('backend.services.pdf_service.get_tex_engine_service',
+                        lambda: engines('pdflatex', 'xelatex'))
+    assert asyncio.run(PDFService._compile_with_repair(document(), {}, True, tmp_path)) == b'%PDF'
+    assert used == ['pdflatex', 'xelatex']
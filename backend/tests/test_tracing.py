@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from backend.core.executors import run_in_pool
+from backend.core.tracing import (
+    JSONLExporter, OTLPExporter, finish_trace, format_server_timing, parse_traceparent, span, start_trace, traced,
+)
+
+
+@traced('supabase.query', phase='supabase')
+def query():
+    with span('supabase.retry', phase='supabase'):
+        return 'row'
+
+
+def test_spans_nest_across_pool_hops_and_summarise_phases(tmp_path):
+    async def handle():
+        root, token = start_trace('GET', traceparent='00-' + 'a' * 32 + '-' + 'b' * 16 + '-01')
+        with span('gemini.generate_content', phase='gemini', model='flash'):
+            assert await run_in_pool('db', query) == 'row'
+        finish_trace(root, token)
+        return root
+
+    root = asyncio.run(handle())
+    trace = root.trace
+    assert trace.trace_id == 'a' * 32 and root.parent_id == 'b' * 16
+    by_name = {s.name: s for s in trace.spans}
+    hop = by_name['pool.db']
+    assert by_name['supabase.query'].parent_id == hop.span_id
+    assert hop.parent_id == by_name['gemini.generate_content'].span_id
+    assert 'queue_wait_ms' in hop.attributes
+
+    timing = trace.server_timing()
+    # The hop and both decorated spans are one 'supabase' phase, counted once
+    assert set(timing) == {'gemini', 'supabase'}
+    assert abs(timing['supabase'] - hop.duration * 1000) < 1e-6
+    assert format_server_timing(root).endswith(f"total;dur={root.duration * 1000:.1f}")
+
+    JSONLExporter(tmp_path / 'spans.jsonl').export(trace.spans)
+    lines = [json.loads(line) for line in (tmp_path / 'spans.jsonl').read_text().splitlines()]
+    assert len(lines) == len(trace.spans) and lines[0]['trace_id'] == 'a' * 32
+
+    payload = OTLPExporter('http://collector:4318', 'test').payload(trace.spans)
+    spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert {s['name'] for s in spans} == set(by_name)
+
+
+def test_no_spans_outside_a_request_and_bad_traceparent():
+    with span('orphan') as orphan:
+        assert orphan is None
+    assert query() == 'row'
+    assert parse_traceparent('00-' + '0' * 32 + '-' + 'b' * 16 + '-01') is None
+    assert parse_traceparent('garbage') is None
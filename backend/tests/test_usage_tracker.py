@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+
+from backend.services.usage_tracker_service import UsageTracker
+
+
+def counting(fake_supabase, applied=None):
+    """api_keys.requests_count as a dict, maintained by the fake RPCs"""
+    counts = {}
+
+    def increment_by(key_id, amount):
+        counts[key_id] = counts.get(key_id, 0) + amount
+
+    def apply_batch(batch_id, key_id, amount):
+        if batch_id in applied:
+            return False
+        applied.add(batch_id)
+        increment_by(key_id, amount)
+        return True
+
+    fake_supabase.functions['increment_api_key_requests_by'] = increment_by
+    if applied is not None:
+        fake_supabase.functions['apply_api_usage_batch'] = apply_batch
+    return counts
+
+
+def test_flush_writes_one_increment_per_key_and_one_insert(fake_supabase, tmp_path):
+    counts = counting(fake_supabase, applied=set())
+    flushed = []
+    tracker = UsageTracker(fake_supabase, spill_path=tmp_path / 'usage.jsonl',
+                           on_counts_flushed=lambda key_id, amount: flushed.append((key_id, amount)))
+    tracker._thread = object()  # no background flushes
+    for key_id in ('k1', 'k1', 'k2', 'k1'):
+        tracker.record(key_id, '/v1/generate', 200)
+    assert tracker.pending_count('k1') == 3
+
+    assert tracker.flush() == 4
+    assert counts == {'k1': 3, 'k2': 1}
+    assert sorted(flushed) == [('k1', 3), ('k2', 1)]
+    assert fake_supabase.calls.count(('rpc', 'apply_api_usage_batch')) == 2
+    assert fake_supabase.calls.count(('api_usage', 'insert')) == 1
+    assert all('batch_id' not in row for row in fake_supabase.tables['api_usage'])
+    assert tracker.pending_count('k1') == 0
+
+
+def test_falls_back_only_when_the_function_is_missing(fake_supabase, tmp_path):
+    counts = counting(fake_supabase)
+    tracker = UsageTracker(fake_supabase, spill_path=tmp_path / 'usage.jsonl')
+    tracker._thread = object()
+    tracker.record('k1', '/v1/generate', 200)
+    tracker.record('k1', '/v1/generate', 200)
+    assert tracker.flush() == 2
+    assert counts == {'k1': 2}
+    assert ('rpc', 'increment_api_key_requests') not in fake_supabase.calls
+
+    # A timeout is not a missing function: no per-request fallback, the batch is spilled
+    def timeout(key_id, amount):
+        raise TimeoutError('canceling statement due to statement timeout')
+    fake_supabase.functions['increment_api_key_requests_by'] = timeout
+    tracker.record('k1', '/v1/generate', 200)
+    assert tracker.flush() == 0
+    assert ('rpc', 'increment_api_key_requests') not in fake_supabase.calls
+    assert tracker.stats['spilled'] == 1 and tracker.pending_count('k1') == 1
+
+
+def test_replayed_batch_is_counted_once(fake_supabase, tmp_path):
+    applied = set()
+    counts = counting(fake_supabase, applied)
+    apply_batch = fake_supabase.functions['apply_api_usage_batch']
+
+    def applied_then_timed_out(**params):
+        apply_batch(**params)
+        raise TimeoutError('read timeout')
+
+    fake_supabase.functions['apply_api_usage_batch'] = applied_then_timed_out
+    tracker = UsageTracker(fake_supabase, spill_path=tmp_path / 'usage.jsonl')
+    tracker._thread = object()
+    for _ in range(3):
+        tracker.record('k1', '/v1/generate', 200)
+    assert tracker.flush() == 0
+    assert counts == {'k1': 3} and tracker.stats['spilled'] == 3
+
+    # The replay reuses the spilled batch id; new events get a batch of their own
+    fake_supabase.functions['apply_api_usage_batch'] = apply_batch
+    tracker.record('k1', '/v1/generate', 200)
+    assert tracker.flush() == 4
+    assert counts == {'k1': 4}
+    assert len(applied) == 2
+    assert len(fake_supabase.tables['api_usage']) == 4
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_files_are_per_process_and_leftovers_are_replayed(fake_supabase, tmp_path):
+    counts = counting(fake_supabase, applied=set())
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    event = {'api_key_id': 'k1', 'endpoint': '/v1/generate', 'status_code': 200, 'created_at': '2024-01-01T00:00:00'}
+    # Left by an exited worker, and by a live one (our parent) that may still be appending
+    (tmp_path / f'usage.{exited}.jsonl').write_text(json.dumps(event) + '\n')
+    (tmp_path / f'usage.{os.getppid()}.jsonl').write_text(json.dumps(event) + '\n')
+
+    tracker = UsageTracker(fake_supabase, spill_path=tmp_path / 'usage.jsonl')
+    assert tracker._thread is not None  # leftovers start the flush thread
+    tracker._spill([dict(event, api_key_id='k2')])
+    assert (tmp_path / f'usage.{os.getpid()}.jsonl').exists()
+
+    assert tracker.flush() == 2
+    assert counts == {'k1': 1, 'k2': 1}
+    assert [path.name for path in tmp_path.iterdir()] == [f'usage.{os.getppid()}.jsonl']
@@ -0,0 +1,120 @@
+from backend.services.credit_service import CreditService
+from backend.services.user_cache_service import UserCache, get_user_cache
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = 'select'
+        self.payload = None
+        self.filters = {}
+
+    def select(self, *args):
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = 'update', payload
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = 'insert', payload
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def execute(self):
+        self.db.calls.append((self.table, self.op))
+        if self.table == 'users' and self.op == 'select':
+            return Result([dict(self.db.user)])
+        if self.table == 'users' and self.op == 'update':
+            if any(self.db.user.get(column) != value for column, value in self.filters.items()):
+                return Result([])
+            self.db.user.update(self.payload)
+        return Result([self.payload])
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.calls.append(('rpc', self.name))
+        if not self.db.has_rpc:
+            raise Exception(f"{{'code': 'PGRST202', 'message': 'Could not find the function public.{self.name}'}}")
+        field = self.params['p_field']
+        if self.db.user.get(field, 0) <= 0:
+            return Result(None)
+        self.db.user[field] -= 1
+        return Result(self.db.user[field])
+
+
+class FakeDB:
+    def __init__(self, user, has_rpc=True):
+        self.user = user
+        self.has_rpc = has_rpc
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+def test_user_cache_expires_and_copies():
+    cache = UserCache(ttl_seconds=60)
+    row = {'user_id': 'u1', 'credits': 3}
+    cache.set('u1', row)
+    cached = cache.get('u1')
+    cached['credits'] = 0
+    assert cache.get('u1')['credits'] == 3
+
+    cache.invalidate('u1')
+    assert cache.get('u1') is None
+
+
+def test_request_row_skips_users_reads():
+    get_user_cache().clear()
+    db = FakeDB({'user_id': 'u1', 'credits': 2, 'plan': 'free'})
+    user = dict(db.user)
+    service = CreditService(db)
+
+    ok, _ = service.check_credit_available('u1', 'pdf', user=user)
+    assert ok
+    assert service.deduct_credit('u1', 'pdf', 'test', user=user)
+
+    assert ('users', 'select') not in db.calls
+    assert user['credits'] == 1
+    assert get_user_cache().get('u1') is None
+
+
+def test_deduction_is_applied_in_the_database_not_from_the_cached_balance():
+    get_user_cache().clear()
+    # Another worker already spent credits: the request-scoped row says 2, the database 5
+    db = FakeDB({'user_id': 'u1', 'credits': 5, 'plan': 'free'})
+    user = {'user_id': 'u1', 'credits': 2, 'plan': 'free'}
+    assert CreditService(db).deduct_credit('u1', 'pdf', 'test', user=user)
+    assert db.user['credits'] == 4 and user['credits'] == 4
+
+    db.user['credits'] = 0
+    assert not CreditService(db).deduct_credit('u1', 'pdf', 'test', user={'user_id': 'u1', 'credits': 3, 'plan': 'free'})
+    assert db.user['credits'] == 0
+
+
+def test_compare_and_set_fallback_retries_on_a_changed_balance():
+    db = FakeDB({'user_id': 'u1', 'credits': 5, 'plan': 'free'}, has_rpc=False)
+    assert CreditService(db).consume_credit('u1', 'credits', known_value=2) == 4
+    assert db.user['credits'] == 4
+    # The stale compare-and-set missed, the retry re-read the row
+    assert db.calls.count(('users', 'update')) == 2
+
+    db.user['credits'] = 0
+    assert CreditService(db).consume_credit('u1', 'credits') is None